@@ -0,0 +1 @@
+# Este archivo permite que Python reconozca 'crypto' como un paquete
@@ -0,0 +1,205 @@
+"""
+Compresión por bloques previa al cifrado.
+
+El texto cifrado no se puede comprimir, así que los bloques del contenedor
+se comprimen antes de cifrarse. Cada bloque se comprime por separado para
+conservar el acceso aleatorio; si un bloque no se reduce, se guarda tal
+cual. El códec se elige por archivo: los tipos que ya vienen comprimidos
+(imágenes, audio, video, ZIP...) y los archivos cuya muestra inicial no se
+reduce lo suficiente no se comprimen.
+
+Códecs: zlib y lzma (biblioteca estándar) y zstd si está instalado el
+paquete opcional `zstandard`.
+"""
+
+import lzma
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Dependencia opcional
+    zstandard = None
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODEC_ZSTD = 3
+
+CODEC_NAMES = {
+    CODEC_NONE: "none",
+    CODEC_ZLIB: "zlib",
+    CODEC_LZMA: "lzma",
+    CODEC_ZSTD: "zstd",
+}
+CODEC_IDS = {name: codec for codec, name in CODEC_NAMES.items()}
+
+# Niveles: zlib y zstd priorizan velocidad; lzma, la tasa de compresión
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+
+# Códec por defecto: el más rápido disponible
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+# Muestra inicial que se comprime para decidir si vale la pena
+SAMPLE_SIZE = 64 * 1024
+# Si la muestra no baja de este tamaño relativo, el archivo no se comprime
+MAX_SAMPLE_RATIO = 0.9
+
+# Extensiones de formatos que ya están comprimidos
+INCOMPRESSIBLE_EXTENSIONS = frozenset(
+    {
+        # Imágenes
+        "png",
+        "jpg",
+        "jpeg",
+        "gif",
+        "webp",
+        "heic",
+        # Audio y video
+        "mp3",
+        "mp4",
+        "m4a",
+        "aac",
+        "ogg",
+        "flac",
+        "avi",
+        "mkv",
+        "mov",
+        "webm",
+        # Archivos comprimidos y documentos empaquetados en ZIP
+        "zip",
+        "rar",
+        "7z",
+        "gz",
+        "tgz",
+        "bz2",
+        "xz",
+        "zst",
+        "docx",
+        "xlsx",
+        "pptx",
+        "odt",
+        "ods",
+        "jar",
+        "apk",
+    }
+)
+
+# Marca de cada bloque: indica si el contenido está comprimido
+_FRAME_STORED = b"\x00"
+_FRAME_COMPRESSED = b"\x01"
+FRAME_MARKER_SIZE = 1
+
+
+def available_codecs() -> list:
+    """Códecs que se pueden usar en este entorno"""
+    codecs = [CODEC_NONE, CODEC_ZLIB, CODEC_LZMA]
+    if zstandard is not None:
+        codecs.append(CODEC_ZSTD)
+    return codecs
+
+
+def is_available(codec: int) -> bool:
+    """Indica si un códec es conocido y está disponible"""
+    return codec in available_codecs()
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == CODEC_LZMA:
+        return lzma.compress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Códec desconocido: {codec}")
+
+
+def _decompress(codec: int, data: bytes, max_size: int) -> bytes:
+    """Descomprime sin producir más de `max_size` bytes"""
+    if codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+        plaintext = decompressor.decompress(data, max_size)
+        complete = decompressor.eof and not decompressor.unconsumed_tail
+    elif codec == CODEC_LZMA:
+        decompressor = lzma.LZMADecompressor(
+            format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS
+        )
+        plaintext = decompressor.decompress(data, max_length=max_size)
+        complete = decompressor.eof
+    elif codec == CODEC_ZSTD:
+        plaintext = zstandard.ZstdDecompressor().decompress(
+            data, max_output_size=max_size
+        )
+        complete = True
+    else:
+        raise ValueError(f"Códec desconocido: {codec}")
+    if not complete or len(plaintext) > max_size:
+        raise ValueError("Bloque comprimido inválido")
+    return plaintext
+
+
+def encode_frame(codec: int, chunk: bytes) -> bytes:
+    """
+    Prepara un bloque de texto plano para cifrarlo
+
+    Args:
+        codec (int): Códec del contenedor (CODEC_NONE no añade nada)
+        chunk (bytes): Bloque de texto plano
+
+    Returns:
+        bytes: Marca y contenido, comprimido solo si ocupa menos
+    """
+    if codec == CODEC_NONE:
+        return chunk
+    compressed = _compress(codec, chunk)
+    if len(compressed) < len(chunk):
+        return _FRAME_COMPRESSED + compressed
+    return _FRAME_STORED + chunk
+
+
+def decode_frame(codec: int, payload: bytes, max_size: int) -> bytes:
+    """
+    Recupera el texto plano de un bloque ya descifrado
+
+    Args:
+        codec (int): Códec del contenedor
+        payload (bytes): Bloque descifrado
+        max_size (int): Tamaño máximo del texto plano (tamaño de bloque)
+
+    Returns:
+        bytes: Texto plano del bloque
+    """
+    if codec == CODEC_NONE:
+        return payload
+    marker, data = payload[:FRAME_MARKER_SIZE], payload[FRAME_MARKER_SIZE:]
+    if marker == _FRAME_STORED:
+        return data
+    if marker == _FRAME_COMPRESSED:
+        return _decompress(codec, data, max_size)
+    raise ValueError("Marca de bloque desconocida")
+
+
+def choose_codec(filename: str, sample: bytes, preferred: int = DEFAULT_CODEC):
+    """
+    Elige el códec de un archivo a partir de su extensión y su inicio
+
+    Args:
+        filename (str): Nombre original del archivo
+        sample (bytes): Primeros bytes del archivo (hasta SAMPLE_SIZE)
+        preferred (int): Códec a usar si el archivo se puede comprimir
+
+    Returns:
+        int: `preferred` o CODEC_NONE
+    """
+    if preferred == CODEC_NONE or not sample:
+        return CODEC_NONE
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension in INCOMPRESSIBLE_EXTENSIONS:
+        return CODEC_NONE
+    # zlib rápido como estimación: lo que no reduce, ningún códec lo reduce mucho
+    sample = sample[:SAMPLE_SIZE]
+    if len(zlib.compress(sample, 1)) > len(sample) * MAX_SAMPLE_RATIO:
+        return CODEC_NONE
+    return preferred
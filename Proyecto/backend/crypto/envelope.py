@@ -0,0 +1,100 @@
+"""
+Cifrado en sobre (envelope encryption) de los blobs.
+
+Cada blob se cifra con su propia clave de datos aleatoria de 32 bytes. La
+clave de datos se guarda en la BD envuelta con AES Key Wrap (RFC 3394)
+bajo una clave de cifrado de claves (KEK) derivada de la clave maestra:
+
+- Sin su clave envuelta (40 bytes) un blob no se puede descifrar, aunque
+  queden copias del texto cifrado en el disco o en un respaldo antiguo.
+  Destruir la clave borra el archivo de forma segura, sea cual sea su
+  tamaño.
+- Rotar la clave maestra solo vuelve a envolver las claves de datos; los
+  blobs no se reescriben.
+
+AES Key Wrap incluye una comprobación de integridad: desenvolver con otra
+KEK, o una clave alterada, falla en lugar de producir una clave errónea.
+"""
+
+import os
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.keywrap import (
+    InvalidUnwrap,
+    aes_key_unwrap,
+    aes_key_wrap,
+)
+
+DATA_KEY_SIZE = 32
+# AES Key Wrap añade un bloque de integridad de 8 bytes
+WRAPPED_KEY_SIZE = DATA_KEY_SIZE + 8
+
+_KEK_INFO = b"fortifile-kek-v1"
+
+
+class KeyUnwrapError(ValueError):
+    """La clave envuelta no corresponde a la clave maestra o fue manipulada"""
+
+
+def generate_data_key() -> bytes:
+    """Genera una clave de datos aleatoria para un blob nuevo"""
+    return os.urandom(DATA_KEY_SIZE)
+
+
+class KeyWrapper:
+    """Envuelve y desenvuelve claves de datos con la KEK de una clave maestra"""
+
+    def __init__(self, master_key: bytes):
+        """
+        Inicializa el envoltorio de claves
+
+        Args:
+            master_key (bytes): Clave maestra de 32 bytes
+        """
+        if len(master_key) != 32:
+            raise ValueError("La clave maestra debe tener 32 bytes")
+        self._kek = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=_KEK_INFO
+        ).derive(master_key)
+
+    def wrap(self, data_key: bytes) -> bytes:
+        """
+        Envuelve una clave de datos
+
+        Args:
+            data_key (bytes): Clave de datos de 32 bytes
+
+        Returns:
+            bytes: Clave envuelta de WRAPPED_KEY_SIZE bytes
+        """
+        if len(data_key) != DATA_KEY_SIZE:
+            raise ValueError(f"La clave de datos debe tener {DATA_KEY_SIZE} bytes")
+        return aes_key_wrap(self._kek, data_key)
+
+    def unwrap(self, wrapped_key: bytes) -> bytes:
+        """
+        Recupera una clave de datos envuelta
+
+        Args:
+            wrapped_key (bytes): Clave envuelta guardada en la BD
+
+        Returns:
+            bytes: Clave de datos de 32 bytes
+        """
+        if wrapped_key is None or len(wrapped_key) != WRAPPED_KEY_SIZE:
+            raise KeyUnwrapError("Clave envuelta inválida")
+        try:
+            return aes_key_unwrap(self._kek, bytes(wrapped_key))
+        except InvalidUnwrap as e:
+            raise KeyUnwrapError(
+                "La clave envuelta no corresponde a la clave maestra"
+            ) from e
+
+    def can_unwrap(self, wrapped_key: bytes) -> bool:
+        """Indica si una clave envuelta se creó con esta clave maestra"""
+        try:
+            self.unwrap(wrapped_key)
+            return True
+        except KeyUnwrapError:
+            return False
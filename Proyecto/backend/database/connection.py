@@ -1,6 +1,143 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 import os
+import threading
+
+from backend.database.migrations import backfill_event_types, run_migrations
+from backend.database.search_index import drop_search_index, ensure_search_index
+from backend.database.storage_stats import drop_storage_stats, ensure_storage_stats
+
+# Perfiles de configuración de SQLite que se aplican a cada conexión nueva.
+#
+# "performance": WAL permite leer mientras se escribe y, con
+# synchronous=NORMAL, cada commit solo escribe en el WAL sin esperar a
+# fsync (la BD sigue siendo consistente ante un corte de luz; como mucho
+# se pierden los últimos commits). Caché de 64 MB, lectura por mmap y
+# temporales en memoria.
+#
+# "safe": el comportamiento por defecto de SQLite (journal de rollback y
+# fsync en cada commit).
+#
+# En ambos, secure_delete sobrescribe con ceros el contenido borrado: las
+# claves envueltas de los archivos eliminados no quedan en páginas libres.
+DATABASE_PROFILES = {
+    "performance": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -64000,  # En KiB cuando es negativo
+            "mmap_size": 256 * 1024 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,  # ms esperando un bloqueo antes de fallar
+            "secure_delete": "ON",
+        },
+        "pool_size": 5,
+        "max_overflow": 10,
+    },
+    "safe": {
+        "pragmas": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "busy_timeout": 5000,
+            "secure_delete": "ON",
+        },
+        "pool_size": 5,
+        "max_overflow": 10,
+    },
+}
+DEFAULT_PROFILE = "performance"
+
+# Archivos auxiliares que SQLite crea junto a la BD en modo WAL
+WAL_SUFFIXES = ("-wal", "-shm")
+
+
+def _apply_pragmas(pragmas: dict):
+    """Crea el listener que configura cada conexión nueva del pool"""
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return on_connect
+
+
+class _SharedEngine:
+    """Engine, fábricas de sesiones y estado del esquema de una BD"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        # autocommit=False: Los cambios deben confirmarse manualmente
+        # autoflush=False: Los cambios no se envían automáticamente
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # Archivo (dispositivo, inodo) en el que ya se creó el esquema
+        self.schema_file = None
+        self.schema_lock = threading.Lock()
+
+
+# Registro del proceso: un engine (y su pool) por BD y perfil
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _registry_key(db_path, profile) -> tuple:
+    path = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    if isinstance(profile, str):
+        return path, profile
+    return path, repr(sorted(profile.items()))
+
+
+def _file_identity(db_path):
+    """Identifica el archivo de la BD para detectar si se borró o reemplazó"""
+    if db_path == ":memory:":
+        return ":memory:"
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def _create_engine(db_path: str, profile: dict):
+    # sqlite:/// indica que usamos SQLite con archivo local
+    if db_path == ":memory:":
+        # Una sola conexión compartida: cada conexión nueva sería otra BD
+        pool_options = {"poolclass": StaticPool}
+    else:
+        pool_options = {
+            "poolclass": QueuePool,
+            "pool_size": profile.get("pool_size", 5),
+            "max_overflow": profile.get("max_overflow", 10),
+        }
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        echo=False,
+        # Las sesiones se usan desde los hilos de subida y descarga
+        connect_args={"check_same_thread": False},
+        **pool_options,
+    )
+    event.listen(engine, "connect", _apply_pragmas(profile.get("pragmas", {})))
+    return engine
+
+
+def dispose_engines(db_path=None):
+    """
+    Cierra y olvida los engines compartidos
+
+    Args:
+        db_path (str): Solo los de esta BD (por defecto, todos)
+    """
+    path = None
+    if db_path is not None:
+        path = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _engines_lock:
+        for key in [key for key in _engines if path is None or key[0] == path]:
+            shared = _engines.pop(key)
+            shared.engine.dispose()
 
 
 class DatabaseManager:
@@ -12,42 +149,101 @@ class DatabaseManager:
     - Crear y eliminar tablas
     """
 
-    def __init__(self, db_path="fortifile.db"):
+    def __init__(self, db_path="fortifile.db", profile=DEFAULT_PROFILE):
         """
         Inicializa el gestor de base de datos
 
         Args:
             db_path (str): Ruta del archivo de base de datos SQLite
+            profile (str | dict): Nombre de un perfil de DATABASE_PROFILES o
+                un diccionario con la misma estructura
         """
         self.db_path = db_path
-
-        # Crear el engine (motor de base de datos)
-        # sqlite:/// indica que usamos SQLite con archivo local
-        self.engine = create_engine(f"sqlite:///{db_path}", echo=False)
-
-        # Crear la fábrica de sesiones
-        # autocommit=False: Los cambios deben confirmarse manualmente
-        # autoflush=False: Los cambios no se envían automáticamente
-        self.SessionLocal = sessionmaker(
-            autocommit=False, autoflush=False, bind=self.engine
+        self.profile = (
+            DATABASE_PROFILES[profile] if isinstance(profile, str) else profile
         )
 
-        print(f"✅ DatabaseManager inicializado con archivo: {db_path}")
+        # El engine se comparte entre todos los gestores de la misma BD:
+        # crearlo (pool, listeners) y el DDL del esquema ocurren una vez
+        key = _registry_key(db_path, profile)
+        with _engines_lock:
+            shared = _engines.get(key)
+            if shared is None:
+                shared = _SharedEngine(_create_engine(db_path, self.profile))
+                _engines[key] = shared
+                print(f"✅ DatabaseManager inicializado con archivo: {db_path}")
+        self._shared = shared
+        self.engine = shared.engine
+        self.SessionLocal = shared.SessionLocal
 
     def create_tables(self):
         """
         Crea todas las tablas definidas en los modelos
+
+        El DDL y las migraciones se ejecutan una sola vez por proceso y
+        archivo de BD; las llamadas siguientes no consultan la BD. Si el
+        archivo se borró o se reemplazó, el esquema se vuelve a crear.
+
+        Returns:
+            bool: True si el esquema está listo, False si hubo un error
         """
+        shared = self._shared
+        with shared.schema_lock:
+            identity = _file_identity(self.db_path)
+            if identity is not None and shared.schema_file == identity:
+                return True
+            if shared.schema_file is not None:
+                # Las conexiones del pool apuntan al archivo anterior
+                shared.engine.dispose()
+                shared.schema_file = None
+            if self._create_schema():
+                shared.schema_file = _file_identity(self.db_path)
+                return True
+            return False
+
+    def _create_schema(self):
         try:
             # Importar todos los modelos para que SQLAlchemy los conozca
             from backend.models.user_model import Usuario
-            from backend.models.file_model import Archivo
-            from backend.models.event_model import Evento
+            from backend.models.file_model import (
+                Archivo,
+                BlobPendiente,
+                ClaveSistema,
+                EstadisticaAlmacenamiento,
+                IntercambioBlob,
+                MigracionBlobs,
+            )
+            from backend.models.event_model import Evento, ResumenEvento
             from backend.models.base import Base
 
             # Crear todas las tablas usando la Base compartida
             Base.metadata.create_all(bind=self.engine)
 
+            # Agregar columnas e índices nuevos a tablas ya existentes
+            applied = run_migrations(self.engine, Base.metadata)
+            for change in applied:
+                print(f"✅ Migración aplicada: {change}")
+
+            # Eventos anteriores a la columna `tipo`: deducirlo de la descripción
+            if "Columna eventos.tipo" in applied:
+                from backend.models.event_model import (
+                    EVENT_TYPE_OTHER,
+                    EVENT_TYPE_PREFIXES,
+                )
+
+                updated = backfill_event_types(
+                    self.engine, EVENT_TYPE_PREFIXES, EVENT_TYPE_OTHER
+                )
+                print(f"✅ Tipo asignado a {updated} evento(s) existentes")
+
+            # Índice de búsqueda por nombre (FTS5) y sus triggers
+            if ensure_search_index(self.engine):
+                print("✅ Índice de búsqueda de archivos creado")
+
+            # Contadores de almacenamiento por usuario y globales (triggers)
+            if ensure_storage_stats(self.engine):
+                print("✅ Estadísticas de almacenamiento calculadas")
+
             print("✅ Todas las tablas creadas correctamente")
             return True
 
@@ -70,11 +266,21 @@ class DatabaseManager:
         """
         try:
             from backend.models.user_model import Usuario
-            from backend.models.file_model import Archivo
-            from backend.models.event_model import Evento
+            from backend.models.file_model import (
+                Archivo,
+                BlobPendiente,
+                ClaveSistema,
+                EstadisticaAlmacenamiento,
+                IntercambioBlob,
+                MigracionBlobs,
+            )
+            from backend.models.event_model import Evento, ResumenEvento
             from backend.models.base import Base
 
+            drop_search_index(self.engine)
+            drop_storage_stats(self.engine)
             Base.metadata.drop_all(bind=self.engine)
+            self._shared.schema_file = None
 
             print("✅ Todas las tablas eliminadas correctamente")
             return True
@@ -83,6 +289,39 @@ class DatabaseManager:
             print(f"❌ Error eliminando tablas: {e}")
             return False
 
+    def dispose(self):
+        """
+        Cierra las conexiones del pool (p. ej. antes de borrar la BD)
+
+        El engine sigue registrado: la próxima sesión abre conexiones
+        nuevas y create_tables vuelve a crear el esquema.
+        """
+        self.engine.dispose()
+        self._shared.schema_file = None
+
+    def checkpoint(self):
+        """
+        Vuelca el WAL en el archivo principal de la base de datos
+
+        Necesario antes de copiar el archivo .db directamente: en modo WAL
+        los últimos commits pueden estar solo en el archivo -wal.
+        """
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_pragmas(self) -> dict:
+        """
+        Obtiene los valores efectivos de los pragmas del perfil
+
+        Returns:
+            dict: Pragma -> valor actual en una conexión del pool
+        """
+        with self.engine.connect() as connection:
+            return {
+                name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                for name in self.profile.get("pragmas", {})
+            }
+
     def database_exists(self):
         """
         Verifica si el archivo de base de datos existe
@@ -0,0 +1,107 @@
+"""
+Migraciones ligeras del esquema SQLite de FortiFile.
+
+`Base.metadata.create_all` solo crea las tablas que no existen. Este módulo
+agrega a las tablas ya existentes las columnas e índices que se hayan
+definido después en los modelos, para que una base de datos creada con una
+versión anterior siga funcionando sin perder datos.
+"""
+
+from sqlalchemy import inspect, text
+
+
+def run_migrations(engine, metadata) -> list:
+    """
+    Agrega las columnas e índices que faltan en las tablas existentes
+
+    Args:
+        engine: Engine de SQLAlchemy de la base de datos
+        metadata: MetaData con la definición actual de los modelos
+
+    Returns:
+        list: Descripción de los cambios aplicados
+    """
+    applied = []
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                connection.execute(text(ddl))
+                applied.append(f"Columna {table.name}.{column.name}")
+
+            # sqlite_master incluye también los índices sobre expresiones,
+            # que el inspector de SQLAlchemy omite
+            existing_indexes = set(
+                connection.execute(
+                    text(
+                        "SELECT name FROM sqlite_master "
+                        "WHERE type = 'index' AND tbl_name = :table"
+                    ),
+                    {"table": table.name},
+                ).scalars()
+            )
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    applied.append(f"Índice {index.name}")
+
+            # Índices de los modelos ("ix_...") que ya no están definidos:
+            # los reemplazó otro índice
+            defined_indexes = {index.name for index in table.indexes}
+            for name in sorted(existing_indexes - defined_indexes):
+                if name.startswith("ix_"):
+                    connection.execute(text(f'DROP INDEX "{name}"'))
+                    applied.append(f"Índice {name} eliminado")
+
+    return applied
+
+
+def backfill_event_types(engine, prefixes, default_type: str) -> int:
+    """
+    Asigna `tipo` a los eventos registrados antes de existir la columna
+
+    Un solo UPDATE recorre la tabla y asigna el tipo del primer prefijo con
+    el que empieza la descripción.
+
+    Args:
+        engine: Engine de SQLAlchemy de la base de datos
+        prefixes: Pares (prefijo de la descripción, tipo) en orden de prioridad
+        default_type (str): Tipo de los eventos que no coinciden con ninguno
+
+    Returns:
+        int: Eventos actualizados
+    """
+    cases = []
+    params = {"default_type": default_type}
+    for position, (prefix, event_type) in enumerate(prefixes):
+        cases.append(
+            f"WHEN substr(descripcion, 1, {len(prefix)}) = :prefix{position} "
+            f"THEN :type{position}"
+        )
+        params[f"prefix{position}"] = prefix
+        params[f"type{position}"] = event_type
+
+    with engine.begin() as connection:
+        result = connection.execute(
+            text(
+                "UPDATE eventos SET tipo = CASE "
+                + " ".join(cases)
+                + " ELSE :default_type END WHERE tipo IS NULL"
+            ),
+            params,
+        )
+        return result.rowcount
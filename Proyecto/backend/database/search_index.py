@@ -0,0 +1,111 @@
+"""
+Índice de búsqueda de texto completo sobre los nombres de archivo.
+
+Usa una tabla virtual FTS5 con tokenizador trigram enlazada a `archivos`
+(tabla de contenido externo): solo guarda el índice, no una copia de los
+nombres. Los triggers la mantienen sincronizada al subir, renombrar y
+eliminar archivos, incluso si los cambios se hacen fuera de FileService.
+"""
+
+from sqlalchemy import text
+
+SEARCH_TABLE = "archivos_fts"
+# Vista fts5vocab con la cantidad de archivos que contiene cada trigrama
+VOCAB_TABLE = "archivos_fts_vocab"
+
+_CREATE_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        nombre_archivo,
+        content='archivos',
+        content_rowid='id_archivo',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {VOCAB_TABLE}
+    USING fts5vocab({SEARCH_TABLE}, 'row')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS archivos_fts_insert AFTER INSERT ON archivos
+    BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, nombre_archivo)
+        VALUES (new.id_archivo, new.nombre_archivo);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS archivos_fts_delete AFTER DELETE ON archivos
+    BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, nombre_archivo)
+        VALUES ('delete', old.id_archivo, old.nombre_archivo);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS archivos_fts_update
+    AFTER UPDATE OF nombre_archivo ON archivos
+    BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, nombre_archivo)
+        VALUES ('delete', old.id_archivo, old.nombre_archivo);
+        INSERT INTO {SEARCH_TABLE}(rowid, nombre_archivo)
+        VALUES (new.id_archivo, new.nombre_archivo);
+    END
+    """,
+]
+
+
+def ensure_search_index(engine) -> bool:
+    """
+    Crea el índice de búsqueda y sus triggers si todavía no existen
+
+    Si el índice es nuevo y ya había archivos, se reconstruye a partir de
+    la tabla `archivos`.
+
+    Args:
+        engine: Engine de SQLAlchemy de la base de datos
+
+    Returns:
+        bool: True si el índice se creó en esta llamada
+    """
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SEARCH_TABLE},
+        ).first()
+
+        for statement in _CREATE_STATEMENTS:
+            connection.execute(text(statement))
+
+        if not exists:
+            connection.execute(
+                text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+            )
+    return not exists
+
+
+def drop_search_index(engine):
+    """
+    Elimina el índice de búsqueda y sus triggers
+
+    Args:
+        engine: Engine de SQLAlchemy de la base de datos
+    """
+    with engine.begin() as connection:
+        for trigger in ("insert", "delete", "update"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS archivos_fts_{trigger}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {VOCAB_TABLE}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+
+
+def phrase(term: str) -> str:
+    """Convierte un texto en una frase FTS5 literal (sin operadores)"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def trigrams(term: str) -> list:
+    """Trigramas distintos de un texto, en el orden en que aparecen"""
+    seen = []
+    for start in range(len(term) - 2):
+        gram = term[start : start + 3]
+        if gram not in seen:
+            seen.append(gram)
+    return seen
@@ -0,0 +1,213 @@
+"""
+Contadores de almacenamiento mantenidos por triggers.
+
+La tabla `estadisticas_almacenamiento` guarda, por usuario y en total
+(usuario_id 0), la cantidad de archivos y sus bytes originales y cifrados.
+Los triggers de `archivos` la actualizan en la misma transacción que sube,
+elimina o convierte un archivo, así que consultar el estado del
+almacenamiento no necesita recorrer el disco.
+
+La fila global también cuenta los blobs distintos y los bytes que ocupan:
+un blob nuevo suma cuando lo referencia su primer registro y resta cuando
+se elimina el último.
+"""
+
+from sqlalchemy import text
+
+from backend.models.file_model import GLOBAL_STATS_ID
+
+STATS_TABLE = "estadisticas_almacenamiento"
+
+# Suma un archivo a los contadores de su usuario (creando la fila si falta)
+_ADD_TO_USER = f"""
+    INSERT INTO {STATS_TABLE}
+        (usuario_id, archivos, bytes_originales, bytes_cifrados, blobs,
+         bytes_en_disco)
+    VALUES (new.usuario_id, 1, coalesce(new.tamano_original, 0),
+            coalesce(new.tamano_cifrado, 0), 0, 0)
+    ON CONFLICT(usuario_id) DO UPDATE SET
+        archivos = archivos + 1,
+        bytes_originales = bytes_originales + excluded.bytes_originales,
+        bytes_cifrados = bytes_cifrados + excluded.bytes_cifrados;
+"""
+
+_REMOVE_FROM_USER = f"""
+    UPDATE {STATS_TABLE} SET
+        archivos = archivos - 1,
+        bytes_originales = bytes_originales - coalesce(old.tamano_original, 0),
+        bytes_cifrados = bytes_cifrados - coalesce(old.tamano_cifrado, 0)
+    WHERE usuario_id = old.usuario_id;
+"""
+
+# El registro es el primero que referencia su blob / el blob quedó sin uso
+_NEW_BLOB = """
+    NOT EXISTS (
+        SELECT 1 FROM archivos
+        WHERE ruta_archivo = new.ruta_archivo AND id_archivo <> new.id_archivo
+    )
+"""
+_RELEASED_BLOB = """
+    NOT EXISTS (SELECT 1 FROM archivos WHERE ruta_archivo = old.ruta_archivo)
+"""
+
+_CREATE_STATEMENTS = [
+    f"""
+    INSERT OR IGNORE INTO {STATS_TABLE}
+        (usuario_id, archivos, bytes_originales, bytes_cifrados, blobs,
+         bytes_en_disco)
+    VALUES ({GLOBAL_STATS_ID}, 0, 0, 0, 0, 0)
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS archivos_stats_insert AFTER INSERT ON archivos
+    BEGIN
+        {_ADD_TO_USER}
+        UPDATE {STATS_TABLE} SET
+            archivos = archivos + 1,
+            bytes_originales = bytes_originales + coalesce(new.tamano_original, 0),
+            bytes_cifrados = bytes_cifrados + coalesce(new.tamano_cifrado, 0),
+            blobs = blobs + ({_NEW_BLOB}),
+            bytes_en_disco = bytes_en_disco
+                + CASE WHEN {_NEW_BLOB} THEN coalesce(new.tamano_cifrado, 0)
+                  ELSE 0 END
+        WHERE usuario_id = {GLOBAL_STATS_ID};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS archivos_stats_delete AFTER DELETE ON archivos
+    BEGIN
+        {_REMOVE_FROM_USER}
+        UPDATE {STATS_TABLE} SET
+            archivos = archivos - 1,
+            bytes_originales = bytes_originales - coalesce(old.tamano_original, 0),
+            bytes_cifrados = bytes_cifrados - coalesce(old.tamano_cifrado, 0),
+            blobs = blobs - ({_RELEASED_BLOB}),
+            bytes_en_disco = bytes_en_disco
+                - CASE WHEN {_RELEASED_BLOB} THEN coalesce(old.tamano_cifrado, 0)
+                  ELSE 0 END
+        WHERE usuario_id = {GLOBAL_STATS_ID};
+    END
+    """,
+    # Conversión de blobs heredados y relleno de metadatos: si el blob no
+    # cambia, su tamaño lo aporta el registro más antiguo que lo referencia
+    # (el mismo que lo sumó al insertarse)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS archivos_stats_update
+    AFTER UPDATE OF usuario_id, ruta_archivo, tamano_original, tamano_cifrado
+    ON archivos
+    BEGIN
+        {_REMOVE_FROM_USER}
+        {_ADD_TO_USER}
+        UPDATE {STATS_TABLE} SET
+            bytes_originales = bytes_originales
+                + coalesce(new.tamano_original, 0)
+                - coalesce(old.tamano_original, 0),
+            bytes_cifrados = bytes_cifrados
+                + coalesce(new.tamano_cifrado, 0)
+                - coalesce(old.tamano_cifrado, 0),
+            blobs = blobs + CASE
+                WHEN old.ruta_archivo = new.ruta_archivo THEN 0
+                ELSE ({_NEW_BLOB}) - ({_RELEASED_BLOB}) END,
+            bytes_en_disco = bytes_en_disco + CASE
+                WHEN old.ruta_archivo = new.ruta_archivo THEN
+                    CASE WHEN new.id_archivo = (
+                        SELECT min(id_archivo) FROM archivos
+                        WHERE ruta_archivo = new.ruta_archivo
+                    )
+                    THEN coalesce(new.tamano_cifrado, 0)
+                        - coalesce(old.tamano_cifrado, 0)
+                    ELSE 0 END
+                ELSE
+                    CASE WHEN {_NEW_BLOB} THEN coalesce(new.tamano_cifrado, 0)
+                    ELSE 0 END
+                    - CASE WHEN {_RELEASED_BLOB}
+                      THEN coalesce(old.tamano_cifrado, 0) ELSE 0 END
+                END
+        WHERE usuario_id = {GLOBAL_STATS_ID};
+    END
+    """,
+]
+
+_TRIGGERS = ("insert", "delete", "update")
+
+
+def ensure_storage_stats(engine) -> bool:
+    """
+    Crea los triggers de los contadores de almacenamiento si no existen
+
+    Si los triggers son nuevos (BD anterior a los contadores o recién
+    creada), los contadores se recalculan a partir de `archivos`.
+
+    Args:
+        engine: Engine de SQLAlchemy de la base de datos
+
+    Returns:
+        bool: True si los triggers se crearon en esta llamada
+    """
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+            {"name": "archivos_stats_insert"},
+        ).first()
+
+        for statement in _CREATE_STATEMENTS:
+            connection.execute(text(statement))
+
+        if not exists:
+            rebuild_storage_stats(connection)
+    return not exists
+
+
+def drop_storage_stats(engine):
+    """
+    Elimina los triggers de los contadores de almacenamiento
+
+    Args:
+        engine: Engine de SQLAlchemy de la base de datos
+    """
+    with engine.begin() as connection:
+        for trigger in _TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS archivos_stats_{trigger}"))
+
+
+def rebuild_storage_stats(connection):
+    """
+    Recalcula todos los contadores a partir de la tabla `archivos`
+
+    El tamaño de cada blob se toma del registro más antiguo que lo
+    referencia, igual que hacen los triggers.
+
+    Args:
+        connection: Conexión o sesión dentro de la transacción a usar
+    """
+    connection.execute(text(f"DELETE FROM {STATS_TABLE}"))
+    connection.execute(
+        text(
+            f"""
+            INSERT INTO {STATS_TABLE}
+                (usuario_id, archivos, bytes_originales, bytes_cifrados, blobs,
+                 bytes_en_disco)
+            SELECT usuario_id, count(*), coalesce(sum(tamano_original), 0),
+                   coalesce(sum(tamano_cifrado), 0), 0, 0
+            FROM archivos GROUP BY usuario_id
+            """
+        )
+    )
+    connection.execute(
+        text(
+            f"""
+            INSERT INTO {STATS_TABLE}
+                (usuario_id, archivos, bytes_originales, bytes_cifrados, blobs,
+                 bytes_en_disco)
+            SELECT :global_id, count(*), coalesce(sum(tamano_original), 0),
+                   coalesce(sum(tamano_cifrado), 0),
+                   (SELECT count(DISTINCT ruta_archivo) FROM archivos),
+                   (SELECT coalesce(sum(tamano_cifrado), 0) FROM archivos
+                    WHERE id_archivo IN (
+                        SELECT min(id_archivo) FROM archivos
+                        GROUP BY ruta_archivo
+                    ))
+            FROM archivos
+            """
+        ),
+        {"global_id": GLOBAL_STATS_ID},
+    )
@@ -48,8 +48,9 @@ def check_system_health():
                 f"✅ Directorio seguro: {'OK' if status['secure_files_dir_exists'] else 'FALTA'}"
             )
 
-            # Verificar integridad
-            integrity = system_service.verify_system_integrity()
+            # Verificar integridad (solo blobs nuevos, modificados o con
+            # la última verificación vencida)
+            integrity = system_service.verify_system_integrity(incremental=True)
             if integrity["success"]:
                 if integrity["integrity_ok"]:
                     print("✅ Integridad del sistema: OK")
@@ -88,6 +89,13 @@ def initialize_system():
             os.makedirs("secure_files")
             print("✅ Directorio de archivos seguros creado")
 
+        # Archivar los eventos antiguos (retención del registro)
+        from backend.services.system_service import SystemService
+
+        retention = SystemService().apply_event_retention()
+        if not retention["success"]:
+            print(f"⚠️ {retention['message']}")
+
         print("✅ Sistema FortiFile listo para usar")
 
     except Exception as e:
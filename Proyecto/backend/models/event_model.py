@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
 from backend.models.base import Base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -11,8 +20,95 @@ class Evento(Base):
     descripcion = Column(String(500), nullable=False)
     fecha_evento = Column(DateTime, default=datetime.utcnow)
     usuario_id = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False)
+    tipo = Column(String(40))  # Tipo de evento (constantes EVENT_*)
 
     def __repr__(self):
         return (
             f"<Evento(id={self.id_evento}, descripcion='{self.descripcion[:30]}...')>"
         )
+
+
+class ResumenEvento(Base):
+    """Cantidad de eventos de un tipo por usuario y día (eventos ya archivados)"""
+
+    __tablename__ = "resumen_eventos"
+    __table_args__ = (UniqueConstraint("usuario_id", "fecha", "tipo"),)
+
+    id_resumen = Column(Integer, primary_key=True, autoincrement=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False)
+    fecha = Column(Date, nullable=False)
+    tipo = Column(String(40), nullable=False)
+    cantidad = Column(Integer, nullable=False, default=0)
+    primer_evento = Column(DateTime)
+    ultimo_evento = Column(DateTime)
+
+    def __repr__(self):
+        return (
+            f"<ResumenEvento(usuario={self.usuario_id}, fecha={self.fecha}, "
+            f"tipo='{self.tipo}', cantidad={self.cantidad})>"
+        )
+
+
+# Índices compuestos para recorrer el historial de un usuario del más
+# reciente al más antiguo con paginación por cursor (id_evento desempata),
+# con o sin filtro de tipo.
+Index(
+    "ix_eventos_usuario_fecha",
+    Evento.usuario_id,
+    Evento.fecha_evento,
+    Evento.id_evento,
+)
+Index(
+    "ix_eventos_usuario_tipo_fecha",
+    Evento.usuario_id,
+    Evento.tipo,
+    Evento.fecha_evento,
+    Evento.id_evento,
+)
+
+
+# Tipos de evento
+EVENT_LOGIN = "inicio_sesion"
+EVENT_LOGIN_FAILED = "inicio_sesion_fallido"
+EVENT_ACCOUNT_LOCKED = "cuenta_bloqueada"
+EVENT_REGISTER = "registro"
+EVENT_PASSWORD_CHANGED = "cambio_contrasena"
+EVENT_PASSWORD_CHANGE_FAILED = "cambio_contrasena_fallido"
+EVENT_ACCOUNT_DELETE_FAILED = "eliminacion_cuenta_fallida"
+EVENT_UPLOAD = "subida"
+EVENT_DOWNLOAD = "descarga"
+EVENT_RENAME = "renombrado"
+EVENT_DELETE = "eliminacion"
+EVENT_TYPE_OTHER = "otro"
+
+# Tipo de los eventos registrados sin él (antes de existir la columna),
+# según el inicio de su descripción (el primero que coincide)
+EVENT_TYPE_PREFIXES = (
+    ("Inicio de sesión exitoso", EVENT_LOGIN),
+    ("Intento de inicio de sesión fallido", EVENT_LOGIN_FAILED),
+    ("Cuenta bloqueada", EVENT_ACCOUNT_LOCKED),
+    ("Usuario registrado", EVENT_REGISTER),
+    ("Contraseña cambiada", EVENT_PASSWORD_CHANGED),
+    ("Intento de cambio de contraseña fallido", EVENT_PASSWORD_CHANGE_FAILED),
+    ("Intento de eliminación de cuenta fallido", EVENT_ACCOUNT_DELETE_FAILED),
+    ("Archivo subido", EVENT_UPLOAD),
+    ("Archivo descargado", EVENT_DOWNLOAD),
+    ("Archivo renombrado", EVENT_RENAME),
+    ("Archivo eliminado", EVENT_DELETE),
+)
+
+
+def classify_event(description: str) -> str:
+    """
+    Obtiene el tipo de un evento a partir de su descripción
+
+    Args:
+        description (str): Descripción del evento
+
+    Returns:
+        str: Tipo del evento (EVENT_TYPE_OTHER si no se reconoce)
+    """
+    for prefix, event_type in EVENT_TYPE_PREFIXES:
+        if description.startswith(prefix):
+            return event_type
+    return EVENT_TYPE_OTHER
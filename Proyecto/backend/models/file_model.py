@@ -1,4 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+)
 from backend.models.base import Base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -9,9 +19,169 @@ class Archivo(Base):
 
     id_archivo = Column(Integer, primary_key=True, autoincrement=True)
     nombre_archivo = Column(String(255), nullable=False)
+    # nombre_archivo.lower() calculado en Python (orden y búsqueda por
+    # prefijo): lower() de SQLite solo convierte letras ASCII
+    nombre_minusculas = Column(String(255))
     ruta_archivo = Column(String(500), nullable=False)
     fecha_subida = Column(DateTime, default=datetime.utcnow)
     usuario_id = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False)
 
+    # Metadatos calculados al subir el archivo (evitan leer el disco al listar)
+    tamano_original = Column(BigInteger)
+    tamano_cifrado = Column(BigInteger)
+    tipo_mime = Column(String(100))
+    hash_contenido = Column(String(64))  # SHA-256 del contenido original
+    extension = Column(String(50))  # En minúsculas y sin punto ("" si no tiene)
+    compresion = Column(String(10))  # Códec del blob ("none", "zlib", "lzma"...)
+    formato = Column(Integer)  # 0: token Fernet heredado; 1+: versión del contenedor
+    # Clave de datos del blob envuelta con la clave maestra (ver envelope);
+    # NULL en los blobs cifrados directamente con la clave maestra
+    clave_envuelta = Column(LargeBinary(40))
+    # Última verificación completa del contenido del blob (integridad)
+    fecha_verificacion = Column(DateTime)
+
     def __repr__(self):
         return f"<Archivo(id={self.id_archivo}, nombre='{self.nombre_archivo}')>"
+
+
+# Índices compuestos para listar los archivos de un usuario ordenados por
+# nombre, tipo o fecha con paginación por cursor (id_archivo desempata).
+Index(
+    "ix_archivos_usuario_nombre_minusculas",
+    Archivo.usuario_id,
+    Archivo.nombre_minusculas,
+    Archivo.id_archivo,
+)
+Index(
+    "ix_archivos_usuario_extension",
+    Archivo.usuario_id,
+    Archivo.extension,
+    Archivo.id_archivo,
+)
+Index(
+    "ix_archivos_usuario_fecha",
+    Archivo.usuario_id,
+    Archivo.fecha_subida,
+    Archivo.id_archivo,
+)
+# Referencias a un blob compartido (almacén direccionado por contenido)
+Index("ix_archivos_ruta", Archivo.ruta_archivo)
+
+
+class BlobPendiente(Base):
+    """
+    Blob cifrado a eliminar del disco si ya no lo referencia ningún archivo
+
+    Se registra en la misma transacción que borra los archivos, así que
+    una caída antes de borrar el blob no lo deja huérfano: BlobReaper lo
+    elimina al reanudarse.
+    """
+
+    __tablename__ = "blobs_pendientes"
+
+    ruta_archivo = Column(String(500), primary_key=True)
+    fecha_registro = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<BlobPendiente(ruta='{self.ruta_archivo}')>"
+
+
+# Clave de ClaveSistema con la que se direccionan los blobs por contenido
+ADDRESS_KEY_NAME = "direccion"
+
+
+class ClaveSistema(Base):
+    """
+    Clave del sistema guardada envuelta con la clave maestra
+
+    Al rotar la clave maestra, la clave de direcciones de los blobs se
+    guarda aquí para que las direcciones no cambien (ver envelope).
+    """
+
+    __tablename__ = "claves_sistema"
+
+    nombre = Column(String(50), primary_key=True)
+    clave_envuelta = Column(LargeBinary(40), nullable=False)
+
+    def __repr__(self):
+        return f"<ClaveSistema(nombre='{self.nombre}')>"
+
+
+class MigracionBlobs(Base):
+    """
+    Trabajo de re-cifrado de blobs al formato actual (ver blob_migration)
+
+    `ultima_ruta` es el punto de control: los blobs con una ruta menor o
+    igual ya se procesaron, así que el trabajo se reanuda desde ahí.
+    """
+
+    __tablename__ = "migraciones_blobs"
+
+    id_migracion = Column(Integer, primary_key=True, autoincrement=True)
+    # True: nueva clave de datos para todos los blobs, no solo los antiguos
+    recifrar_todo = Column(Boolean, nullable=False, default=False)
+    estado = Column(String(20), nullable=False, default="en_curso")
+    ultima_ruta = Column(String(500))
+    total = Column(Integer, nullable=False, default=0)
+    migrados = Column(Integer, nullable=False, default=0)
+    omitidos = Column(Integer, nullable=False, default=0)
+    fallidos = Column(Integer, nullable=False, default=0)
+    bytes_procesados = Column(BigInteger, nullable=False, default=0)
+    fecha_inicio = Column(DateTime, default=datetime.utcnow)
+    fecha_fin = Column(DateTime)
+
+    def __repr__(self):
+        return (
+            f"<MigracionBlobs(id={self.id_migracion}, estado='{self.estado}', "
+            f"migrados={self.migrados}/{self.total})>"
+        )
+
+
+class IntercambioBlob(Base):
+    """
+    Blob re-cifrado a punto de reemplazar al anterior
+
+    Se registra antes de reemplazar el archivo y se borra en la misma
+    transacción que actualiza sus registros: si el proceso termina entre
+    medio, al iniciar se comprueba con qué clave quedó el blob.
+    """
+
+    __tablename__ = "intercambios_blob"
+
+    ruta_archivo = Column(String(500), primary_key=True)
+    clave_envuelta = Column(LargeBinary(40), nullable=False)
+    compresion = Column(String(10))
+    tamano_cifrado = Column(BigInteger)
+
+    def __repr__(self):
+        return f"<IntercambioBlob(ruta='{self.ruta_archivo}')>"
+
+
+# Fila de EstadisticaAlmacenamiento con los totales de todos los usuarios
+GLOBAL_STATS_ID = 0
+
+
+class EstadisticaAlmacenamiento(Base):
+    """
+    Contadores de almacenamiento de un usuario (o globales, usuario_id 0)
+
+    Los mantienen los triggers de `archivos` (ver storage_stats) en la
+    misma transacción que sube o elimina el archivo. `blobs` y
+    `bytes_en_disco` solo se llevan en la fila global: un blob compartido
+    se cuenta una vez aunque lo referencien varios usuarios.
+    """
+
+    __tablename__ = "estadisticas_almacenamiento"
+
+    usuario_id = Column(Integer, primary_key=True, autoincrement=False)
+    archivos = Column(Integer, nullable=False, default=0)
+    bytes_originales = Column(BigInteger, nullable=False, default=0)
+    bytes_cifrados = Column(BigInteger, nullable=False, default=0)
+    blobs = Column(Integer, nullable=False, default=0)
+    bytes_en_disco = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<EstadisticaAlmacenamiento(usuario={self.usuario_id}, "
+            f"archivos={self.archivos}, bytes_cifrados={self.bytes_cifrados})>"
+        )
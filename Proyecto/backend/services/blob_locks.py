@@ -0,0 +1,32 @@
+"""
+Locks de los blobs del almacén direccionado por contenido.
+
+Un blob lo comparten todos los archivos con el mismo contenido. Las
+subidas que lo reutilizan o lo escriben y las eliminaciones que comprueban
+si sigue referenciado antes de borrarlo deben usar el mismo lock, sea cual
+sea el servicio que lo haga (cada FileService de la interfaz, SystemService
+o BlobReaper), así que los locks son del proceso y no de cada instancia.
+"""
+
+import os
+import threading
+
+# Un lock por primer byte de la dirección (uno por subdirectorio)
+_blob_locks = [threading.Lock() for _ in range(256)]
+
+
+def blob_lock(blob_path: str) -> threading.Lock:
+    """
+    Obtiene el lock de un blob
+
+    Args:
+        blob_path (str): Ruta del blob (<dirección>.enc)
+
+    Returns:
+        threading.Lock: Lock compartido por el proceso
+    """
+    try:
+        return _blob_locks[int(os.path.basename(blob_path)[:2], 16)]
+    except ValueError:
+        # Rutas heredadas fuera del almacén por contenido
+        return _blob_locks[0]
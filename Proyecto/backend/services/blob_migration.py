@@ -0,0 +1,471 @@
+"""
+RF-04: Re-cifrado de blobs en segundo plano.
+
+Convierte los blobs guardados en formatos anteriores al formato actual
+(contenedor por bloques con índice, cifrado con su propia clave de datos
+envuelta) y, con `rekey`, da una clave de datos nueva a todos los blobs:
+
+- Los blobs se procesan en orden de ruta, por lotes, en varios hilos. Al
+  terminar cada lote se guarda en `migraciones_blobs` la última ruta
+  procesada, así que un trabajo interrumpido (stop o caída del proceso)
+  se reanuda desde ahí con el siguiente `run`.
+- La lectura se limita a `max_bytes_per_second` para no saturar el disco
+  mientras el almacén se sigue usando.
+- Cada blob se re-cifra en un temporal que luego reemplaza al anterior.
+  El reemplazo se registra antes en `intercambios_blob` y se borra en la
+  misma transacción que actualiza los registros; si el proceso termina
+  entre medio, el primer FileService del siguiente proceso lo completa o
+  lo descarta.
+
+Las subidas, descargas y eliminaciones siguen funcionando durante la
+migración: el reemplazo y la actualización de los registros se hacen con
+el lock del blob y el de la clave maestra. Una lectura que obtuvo el
+registro justo antes del reemplazo y abre el blob justo después no lo
+autentica con la clave anterior: FileService vuelve a leer la clave con
+el lock del blob y reintenta.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import or_
+
+from backend.crypto.compression import CODEC_NAMES, SAMPLE_SIZE, choose_codec
+from backend.crypto.envelope import generate_data_key
+from backend.crypto.stream_cipher import DEFAULT_WORKERS, FORMAT_VERSION
+from backend.models.file_model import Archivo, IntercambioBlob, MigracionBlobs
+from backend.services.blob_locks import blob_lock
+from backend.services.file_service import (
+    BLOB_FORMAT_FERNET,
+    SWAP_TEMP_SUFFIX,
+    FileService,
+    _ChunkReader,
+    release_unreferenced_blobs,
+)
+
+DEFAULT_BATCH_SIZE = 100
+
+STATE_RUNNING = "en_curso"
+STATE_COMPLETED = "completada"
+
+# Resultado de cada blob
+MIGRATED = "migrados"
+SKIPPED = "omitidos"
+FAILED = "fallidos"
+PENDING = "pendiente"
+
+
+class _RateLimiter:
+    """Limita los bytes por segundo repartidos entre varios hilos"""
+
+    def __init__(self, bytes_per_second: int):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, size: int):
+        """Espera el turno de `size` bytes (cada llamada reserva su tramo)"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + size / self.bytes_per_second
+        if start > now:
+            time.sleep(start - now)
+
+
+class BlobMigration:
+    """
+    Trabajo reanudable que re-cifra los blobs al formato actual.
+
+    Solo debe haber un trabajo en curso por almacén: `run` reanuda el que
+    quedó sin terminar (con su modo `rekey`) antes de empezar otro.
+    """
+
+    def __init__(
+        self,
+        file_service: FileService,
+        workers=None,
+        max_bytes_per_second=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+    ):
+        """
+        Inicializa el trabajo de migración
+
+        Args:
+            file_service (FileService): Servicio con las claves y el almacén
+            workers (int): Blobs re-cifrados en paralelo
+            max_bytes_per_second (int): Límite de lectura (por defecto, sin límite)
+            batch_size (int): Blobs por lote (y por punto de control)
+        """
+        self.file_service = file_service
+        self.db_manager = file_service.db_manager
+        self.workers = workers or DEFAULT_WORKERS
+        self.batch_size = batch_size
+        self._limiter = (
+            _RateLimiter(max_bytes_per_second) if max_bytes_per_second else None
+        )
+        self._stop = threading.Event()
+        self._thread = None
+        self._result = None
+        # Modo del trabajo en curso y blobs ya escritos por esta ejecución
+        # (no se vuelven a procesar)
+        self._rekey = False
+        self._fresh_paths = set()
+
+    def start(self, rekey: bool = False, progress_callback=None):
+        """Ejecuta `run` en un hilo en segundo plano"""
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError("La migración ya está en curso")
+        self._stop.clear()
+        self._result = None
+        self._thread = threading.Thread(
+            target=self._run_in_background,
+            args=(rekey, progress_callback),
+            name="BlobMigration",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run_in_background(self, rekey, progress_callback):
+        self._result = self.run(rekey, progress_callback)
+
+    def stop(self):
+        """Detiene el trabajo después de los blobs en curso (se puede reanudar)"""
+        self._stop.set()
+
+    def wait(self, timeout=None) -> dict:
+        """
+        Espera a que termine el trabajo iniciado con `start`
+
+        Args:
+            timeout (float): Segundos máximos de espera (por defecto, sin límite)
+
+        Returns:
+            dict: Resultado de `run`, o None si sigue en curso
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return None
+        return self._result
+
+    def run(self, rekey: bool = False, progress_callback=None) -> dict:
+        """
+        Re-cifra los blobs pendientes, reanudando un trabajo interrumpido
+
+        Args:
+            rekey (bool): Clave de datos nueva para todos los blobs (no
+                solo los que están en un formato anterior)
+            progress_callback (callable): Recibe `status()` tras cada lote
+
+        Returns:
+            dict: {"success": bool, "message": str, "completed": bool,
+                   "migrated": int, "skipped": int, "failed": int}
+        """
+        self._fresh_paths.clear()
+        session = self.db_manager.get_session()
+        try:
+            job = (
+                session.query(MigracionBlobs)
+                .filter(MigracionBlobs.estado == STATE_RUNNING)
+                .order_by(MigracionBlobs.id_migracion)
+                .first()
+            )
+            if job is None:
+                job = MigracionBlobs(
+                    recifrar_todo=rekey,
+                    total=self._pending_paths(session, rekey).count(),
+                )
+                session.add(job)
+                session.commit()
+            else:
+                print(
+                    f"🔄 Reanudando la migración {job.id_migracion}: "
+                    f"{job.migrados + job.omitidos + job.fallidos}/{job.total}"
+                )
+
+            self._rekey = job.recifrar_todo
+            with ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="BlobMigration"
+            ) as executor:
+                while not self._stop.is_set():
+                    paths = [
+                        path
+                        for (path,) in self._pending_paths(
+                            session, job.recifrar_todo, job.ultima_ruta
+                        ).limit(self.batch_size)
+                    ]
+                    if not paths:
+                        job.estado = STATE_COMPLETED
+                        job.fecha_fin = datetime.utcnow()
+                        session.commit()
+                        break
+                    self._run_batch(executor, session, job, paths)
+                    if progress_callback:
+                        progress_callback(self._job_status(job))
+
+            completed = job.estado == STATE_COMPLETED
+            message = (
+                f"{job.migrados} blob(s) re-cifrado(s), {job.omitidos} "
+                f"omitido(s), {job.fallidos} con error"
+            )
+            print(f"{'✅' if completed else '⏸️'} Migración de blobs: {message}")
+            return {
+                "success": True,
+                "message": message if completed else f"Migración detenida: {message}",
+                "completed": completed,
+                "migrated": job.migrados,
+                "skipped": job.omitidos,
+                "failed": job.fallidos,
+            }
+        except Exception as e:
+            session.rollback()
+            print(f"❌ Error en la migración de blobs: {e}")
+            return {
+                "success": False,
+                "message": f"Error en la migración de blobs: {e}",
+                "completed": False,
+                "migrated": 0,
+                "skipped": 0,
+                "failed": 0,
+            }
+        finally:
+            session.close()
+
+    def status(self) -> dict:
+        """
+        Estado del último trabajo de migración
+
+        Returns:
+            dict: Contadores del trabajo, o None si nunca se ejecutó
+        """
+        session = self.db_manager.get_session()
+        try:
+            job = (
+                session.query(MigracionBlobs)
+                .order_by(MigracionBlobs.id_migracion.desc())
+                .first()
+            )
+            return self._job_status(job) if job else None
+        finally:
+            session.close()
+
+    @staticmethod
+    def _job_status(job: MigracionBlobs) -> dict:
+        return {
+            "id": job.id_migracion,
+            "state": job.estado,
+            "rekey": job.recifrar_todo,
+            "total": job.total,
+            "migrated": job.migrados,
+            "skipped": job.omitidos,
+            "failed": job.fallidos,
+            "bytes": job.bytes_procesados,
+        }
+
+    @staticmethod
+    def _pending_paths(session, rekey: bool, after: str = None):
+        """Consulta de las rutas de blobs por procesar, en orden"""
+        query = session.query(Archivo.ruta_archivo).distinct()
+        if after is not None:
+            query = query.filter(Archivo.ruta_archivo > after)
+        if not rekey:
+            query = query.filter(
+                or_(
+                    Archivo.clave_envuelta.is_(None),
+                    Archivo.formato.is_(None),
+                    Archivo.formato != FORMAT_VERSION,
+                )
+            )
+        return query.order_by(Archivo.ruta_archivo)
+
+    def _run_batch(self, executor, session, job: MigracionBlobs, paths: list):
+        """
+        Re-cifra un lote y guarda el punto de control
+
+        Los blobs empiezan en orden y la detención se comprueba antes de
+        cada uno, así que los procesados forman un prefijo del lote.
+        """
+        results = list(executor.map(self._migrate_blob, paths))
+        done = 0
+        for outcome, size in results:
+            if outcome == PENDING:
+                break
+            done += 1
+            setattr(job, outcome, getattr(job, outcome) + 1)
+            job.bytes_procesados += size
+        if done:
+            job.ultima_ruta = paths[done - 1]
+        session.commit()
+
+    def _migrate_blob(self, path: str) -> tuple:
+        """
+        Re-cifra un blob y actualiza sus registros
+
+        Returns:
+            tuple: (resultado, bytes de contenido procesados)
+        """
+        if self._stop.is_set():
+            return PENDING, 0
+        if path in self._fresh_paths:
+            return SKIPPED, 0
+
+        file_service = self.file_service
+        session = self.db_manager.get_session()
+        temp_path = path + SWAP_TEMP_SUFFIX
+        try:
+            file = (
+                session.query(Archivo)
+                .filter(Archivo.ruta_archivo == path)
+                .order_by(Archivo.id_archivo)
+                .first()
+            )
+            if file is None:
+                # Eliminado después de elegir el lote
+                return SKIPPED, 0
+            if file.formato == BLOB_FORMAT_FERNET:
+                # Los tokens Fernet se leen completos y cambian de ruta
+                size = file.tamano_cifrado or os.path.getsize(path)
+                if self._limiter:
+                    self._limiter.consume(size)
+                if not file_service._upgrade_legacy_blob(session, file):
+                    return FAILED, 0
+                new_path = (
+                    session.query(Archivo.ruta_archivo)
+                    .filter(Archivo.id_archivo == file.id_archivo)
+                    .scalar()
+                )
+                self._fresh_paths.add(new_path)
+                return MIGRATED, size
+            if not (
+                self._rekey
+                or file.clave_envuelta is None
+                or file.formato != FORMAT_VERSION
+            ):
+                # Ya convertido por otro medio (descarga de un heredado)
+                return SKIPPED, 0
+
+            old_wrapped = file.clave_envuelta
+            with file_service._master_key_lock():
+                old_key = (
+                    file_service.key_wrapper.unwrap(old_wrapped)
+                    if old_wrapped is not None
+                    else None
+                )
+            new_key = generate_data_key()
+            digest = hashlib.sha256()
+            info = self._reencrypt(file, old_key, new_key, temp_path, digest)
+            if file.hash_contenido and digest.hexdigest() != file.hash_contenido:
+                raise ValueError("El contenido descifrado no coincide con su hash")
+
+            if not self._swap(session, path, old_key, new_key, info, temp_path):
+                return SKIPPED, 0
+            self._fresh_paths.add(path)
+            return MIGRATED, info["plaintext_size"]
+
+        except Exception as e:
+            session.rollback()
+            print(f"⚠️ No se pudo re-cifrar {path}: {e}")
+            return FAILED, 0
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            session.close()
+
+    def _reencrypt(self, file, old_key, new_key, temp_path, digest) -> dict:
+        """Descifra el blob con `old_key` y lo cifra con `new_key` en `temp_path`"""
+        file_service = self.file_service
+
+        def throttled():
+            # Con la clave ya desenvuelta: una rotación en paralelo no afecta
+            with open(file.ruta_archivo, "rb") as source:
+                for chunk in file_service._data_cipher(old_key).iter_decrypt(source):
+                    if self._limiter:
+                        self._limiter.consume(len(chunk))
+                    digest.update(chunk)
+                    yield chunk
+
+        # Muestra del inicio para elegir el códec (como al subir)
+        plaintext = throttled()
+        head = []
+        sampled = 0
+        for chunk in plaintext:
+            head.append(chunk)
+            sampled += len(chunk)
+            if sampled >= SAMPLE_SIZE:
+                break
+        codec = choose_codec(
+            file.nombre_archivo, b"".join(head)[:SAMPLE_SIZE], file_service.compression
+        )
+
+        with open(temp_path, "wb") as encrypted_file:
+            info = file_service._data_cipher(new_key).encrypt_stream(
+                io.BufferedReader(_ChunkReader(chain(head, plaintext))),
+                encrypted_file,
+                workers=1,
+                codec=codec,
+            )
+            encrypted_file.flush()
+            os.fsync(encrypted_file.fileno())
+        return {**info, "codec": CODEC_NAMES[codec]}
+
+    def _swap(self, session, path, old_key, new_key, info, temp_path) -> bool:
+        """
+        Reemplaza el blob por su versión re-cifrada y actualiza los registros
+
+        Returns:
+            bool: False si el blob cambió mientras se re-cifraba (se descarta)
+        """
+        file_service = self.file_service
+        with blob_lock(path), file_service._master_key_lock():
+            # Los registros pudieron cambiar mientras se re-cifraba
+            current = (
+                session.query(Archivo.formato, Archivo.clave_envuelta)
+                .filter(Archivo.ruta_archivo == path)
+                .distinct()
+                .all()
+            )
+            if any(formato == BLOB_FORMAT_FERNET for formato, _ in current):
+                return False
+            keys = {
+                file_service.key_wrapper.unwrap(wrapped) if wrapped else None
+                for _, wrapped in current
+            }
+            if keys != {old_key}:
+                return False
+
+            swap = IntercambioBlob(
+                ruta_archivo=path,
+                clave_envuelta=file_service.key_wrapper.wrap(new_key),
+                compresion=info["codec"],
+                tamano_cifrado=info["ciphertext_size"],
+            )
+            session.add(swap)
+            session.commit()
+            try:
+                os.replace(temp_path, path)
+            except BaseException:
+                session.delete(swap)
+                session.commit()
+                raise
+
+            try:
+                updated = FileService._apply_blob_swap(session, swap)
+                session.delete(swap)
+                session.commit()
+            except Exception:
+                # El blob ya es el nuevo: se completa como tras una caída
+                session.rollback()
+                file_service._complete_blob_swaps()
+                raise
+        if not updated:
+            # Sus registros se eliminaron durante el reemplazo (fuera del
+            # lock del blob, que release_unreferenced_blobs vuelve a tomar)
+            release_unreferenced_blobs(session, [path])
+        return True
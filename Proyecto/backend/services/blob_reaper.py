@@ -0,0 +1,248 @@
+"""
+RF-10: Eliminación diferida de blobs cifrados.
+
+Al eliminar una cuenta, sus blobs se registran en `blobs_pendientes` en la
+misma transacción que borra los archivos y la cuenta; la eliminación
+vuelve enseguida y un hilo en segundo plano borra los blobs del disco en
+paralelo, por lotes. Como la lista está en la BD, si el proceso termina
+antes de borrarlos, se retoman al iniciar el siguiente FileService.
+
+Un blob solo se borra si ningún archivo lo referencia: los blobs son
+compartidos por contenido y otro usuario puede seguir usándolo (o haberlo
+vuelto a subir mientras tanto). La comprobación y el borrado se hacen con
+el lock del blob, el mismo que toman las subidas que lo reutilizan.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import text
+
+from backend.crypto.stream_cipher import DEFAULT_WORKERS
+from backend.models.file_model import Archivo, BlobPendiente
+from backend.services.blob_locks import blob_lock
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def schedule_user_blobs(session, user_id: int) -> int:
+    """
+    Registra los blobs de un usuario como pendientes de eliminar
+
+    Debe llamarse en la transacción que borra sus archivos, antes de
+    borrarlos.
+
+    Args:
+        session (Session): Sesión con la transacción en curso
+        user_id (int): ID del usuario
+
+    Returns:
+        int: Cantidad de blobs registrados
+    """
+    return session.execute(
+        text(
+            "INSERT OR IGNORE INTO blobs_pendientes (ruta_archivo, fecha_registro) "
+            "SELECT DISTINCT ruta_archivo, :now FROM archivos "
+            "WHERE usuario_id = :user_id"
+        ),
+        {"user_id": user_id, "now": datetime.utcnow()},
+    ).rowcount
+
+
+def _remove_blob(path: str):
+    """Borra un blob; no es un error si ya no existe"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class BlobReaper:
+    """
+    Hilo que vacía `blobs_pendientes` borrando los blobs sin referencias.
+
+    Se comparte uno por base de datos (ver get_blob_reaper).
+    """
+
+    def __init__(self, db_manager, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Inicializa el eliminador de blobs
+
+        Args:
+            db_manager (DatabaseManager): Gestor de la BD con la lista
+            workers (int): Hilos que borran blobs en paralelo
+            batch_size (int): Blobs por lote (y por transacción)
+        """
+        self.db_manager = db_manager
+        self.workers = workers or DEFAULT_WORKERS
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+        self._rerun = False
+        self._idle = threading.Event()
+        self._idle.set()
+        # Estadísticas
+        self.removed = 0
+        self.failed = 0
+
+    def wake(self):
+        """Procesa la lista en segundo plano (arranca el hilo si hace falta)"""
+        with self._lock:
+            self._rerun = True
+            self._idle.clear()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="BlobReaper", daemon=True
+                )
+                self._thread.start()
+
+    def resume(self):
+        """Retoma los blobs pendientes de una ejecución anterior, si los hay"""
+        session = self.db_manager.get_session()
+        try:
+            pending = session.query(BlobPendiente.ruta_archivo).first()
+        except Exception:
+            # BD todavía sin tablas
+            pending = None
+        finally:
+            session.close()
+        if pending is not None:
+            self.wake()
+
+    def wait(self, timeout=None) -> bool:
+        """
+        Espera a que la lista quede vacía (o a que falle un lote)
+
+        Args:
+            timeout (float): Segundos máximos de espera (por defecto, sin límite)
+
+        Returns:
+            bool: True si terminó antes del timeout
+        """
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="BlobReaper"
+        ) as executor:
+            while True:
+                with self._lock:
+                    self._rerun = False
+                try:
+                    processed = self._process_batch(executor)
+                except Exception as e:
+                    print(f"❌ Error eliminando blobs pendientes: {e}")
+                    processed = 0
+                if processed:
+                    continue
+                with self._lock:
+                    if self._rerun:
+                        continue
+                    self._thread = None
+                    self._idle.set()
+                    return
+
+    def _reap_blob(self, path: str) -> bool:
+        """
+        Borra un blob pendiente si ningún archivo lo referencia
+
+        Las referencias se vuelven a comprobar con el lock del blob: una
+        subida deduplicada registrada después de leer el lote conserva el
+        blob, y una que espera el lock lo vuelve a escribir tras el borrado.
+
+        Args:
+            path (str): Ruta del blob
+
+        Returns:
+            bool: True si se borró (False si sigue referenciado)
+        """
+        with blob_lock(path):
+            session = self.db_manager.get_session()
+            try:
+                referenced = (
+                    session.query(Archivo.id_archivo)
+                    .filter(Archivo.ruta_archivo == path)
+                    .first()
+                )
+            finally:
+                session.close()
+            if referenced is not None:
+                return False
+            _remove_blob(path)
+            return True
+
+    def _process_batch(self, executor) -> int:
+        """
+        Borra un lote de blobs pendientes
+
+        Returns:
+            int: Entradas quitadas de la lista (0 si está vacía o algún
+                 blob no se pudo borrar; se reintentan en el próximo wake)
+        """
+        session = self.db_manager.get_session()
+        try:
+            paths = [
+                path
+                for (path,) in session.query(BlobPendiente.ruta_archivo)
+                .order_by(BlobPendiente.ruta_archivo)
+                .limit(self.batch_size)
+            ]
+            if not paths:
+                return 0
+
+            referenced = {
+                path
+                for (path,) in session.query(Archivo.ruta_archivo)
+                .filter(Archivo.ruta_archivo.in_(paths))
+                .distinct()
+            }
+            orphaned = [path for path in paths if path not in referenced]
+            futures = [executor.submit(self._reap_blob, path) for path in orphaned]
+
+            done = list(referenced)
+            removed = failed = 0
+            for path, future in zip(orphaned, futures):
+                try:
+                    removed += future.result()
+                    done.append(path)
+                except OSError as e:
+                    failed += 1
+                    print(f"⚠️ No se pudo eliminar el blob {path}: {e}")
+
+            session.query(BlobPendiente).filter(
+                BlobPendiente.ruta_archivo.in_(done)
+            ).delete(synchronize_session=False)
+            session.commit()
+            self.removed += removed
+            self.failed += failed
+            return 0 if failed else len(done)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+# Un eliminador por engine, compartido por los servicios de la misma BD
+_reapers = {}
+_reapers_lock = threading.Lock()
+
+
+def get_blob_reaper(db_manager) -> BlobReaper:
+    """
+    Obtiene el eliminador de blobs compartido de una base de datos
+
+    Args:
+        db_manager (DatabaseManager): Gestor de la BD
+
+    Returns:
+        BlobReaper: Eliminador compartido por todos los servicios de esa BD
+    """
+    with _reapers_lock:
+        reaper = _reapers.get(db_manager.engine)
+        if reaper is None:
+            reaper = BlobReaper(db_manager)
+            _reapers[db_manager.engine] = reaper
+        return reaper
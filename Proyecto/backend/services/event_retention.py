@@ -0,0 +1,463 @@
+"""
+RF-11: Retención del registro de eventos.
+
+Cada inicio de sesión, subida o descarga agrega una fila a `eventos`. Para
+que la tabla y el archivo de la BD no crezcan sin límite, los eventos que
+superan la antigüedad máxima (o que exceden el número máximo de filas,
+empezando por los más antiguos) se archivan:
+
+- Se resumen en `resumen_eventos`: cantidad por usuario, día y tipo.
+- Se guardan completos en segmentos JSONL comprimidos con gzip dentro de
+  `event_archive/`, que se pueden consultar cuando hace falta.
+- Se eliminan de `eventos`.
+
+El segmento se escribe (y se sincroniza a disco) antes de borrar las filas.
+Si el proceso se interrumpe entre ambos pasos, los eventos quedan en un
+segmento y en la tabla; la siguiente ejecución los vuelve a archivar y la
+consulta del archivo descarta los duplicados por id.
+"""
+
+import glob
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.models.event_model import Evento, ResumenEvento, classify_event
+
+ARCHIVE_DIRECTORY = "event_archive"
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_ROWS = 100_000
+# Eventos que se archivan por transacción (y por segmento)
+RETENTION_BATCH_SIZE = 5000
+
+_SEGMENT_PATTERN = "eventos_*.jsonl.gz"
+_SEGMENT_DATE_FORMAT = "%Y%m%d"
+
+
+def _segment_dates(path: str):
+    """Primer y último día de un segmento, según su nombre"""
+    parts = os.path.basename(path).split("_")
+    try:
+        return (
+            datetime.strptime(parts[1], _SEGMENT_DATE_FORMAT).date(),
+            datetime.strptime(parts[2], _SEGMENT_DATE_FORMAT).date(),
+        )
+    except (IndexError, ValueError):
+        return None, None
+
+
+def _write_gzip_lines(directory: str, path: str, lines: list):
+    """Escribe un segmento de forma atómica y lo sincroniza a disco"""
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with (
+            os.fdopen(fd, "wb") as raw,
+            gzip.GzipFile(fileobj=raw, mode="wb") as compressed,
+        ):
+            for line in lines:
+                compressed.write(line.encode("utf-8"))
+                compressed.write(b"\n")
+            compressed.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class EventRetention:
+    """Aplica la política de retención y consulta los eventos archivados"""
+
+    def __init__(
+        self,
+        db_manager,
+        archive_directory=ARCHIVE_DIRECTORY,
+        max_age_days=DEFAULT_MAX_AGE_DAYS,
+        max_rows=DEFAULT_MAX_ROWS,
+        batch_size=RETENTION_BATCH_SIZE,
+    ):
+        """
+        Inicializa la retención de eventos
+
+        Args:
+            db_manager (DatabaseManager): Gestor de la BD con los eventos
+            archive_directory (str): Directorio de los segmentos archivados
+            max_age_days (int): Días que un evento permanece en `eventos`
+                (None: sin límite de antigüedad)
+            max_rows (int): Filas máximas en `eventos` (None: sin límite)
+            batch_size (int): Eventos por segmento y transacción
+        """
+        self.db_manager = db_manager
+        self.archive_directory = archive_directory
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+
+    def apply(self, now: datetime = None) -> dict:
+        """
+        Archiva y resume los eventos que la política no deja en la tabla
+
+        Una BD sin la tabla `eventos` (instalación nueva) no tiene nada que
+        archivar.
+
+        Args:
+            now (datetime): Fecha de referencia en UTC (por defecto, ahora)
+
+        Returns:
+            dict: {"success": bool, "message": str, "archived": int,
+                   "segments": int, "summaries": int}
+        """
+        now = now or datetime.utcnow()
+        cutoff = (
+            now - timedelta(days=self.max_age_days)
+            if self.max_age_days is not None
+            else None
+        )
+        archived = segments = summaries = 0
+
+        session = self.db_manager.get_session()
+        try:
+            if not inspect(self.db_manager.engine).has_table(Evento.__tablename__):
+                return {
+                    "success": True,
+                    "message": "Sin eventos que archivar",
+                    "archived": 0,
+                    "segments": 0,
+                    "summaries": 0,
+                }
+
+            excess = 0
+            if self.max_rows is not None:
+                total = session.query(func.count(Evento.id_evento)).scalar()
+                excess = max(0, total - self.max_rows)
+
+            while True:
+                # Los más antiguos primero (los ids crecen con el tiempo)
+                rows = (
+                    session.query(
+                        Evento.id_evento,
+                        Evento.usuario_id,
+                        Evento.descripcion,
+                        Evento.fecha_evento,
+                        Evento.tipo,
+                    )
+                    .order_by(Evento.id_evento)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                selected = []
+                for row in rows:
+                    expired = cutoff is not None and (row.fecha_evento or now) < cutoff
+                    if not expired and excess <= 0:
+                        break
+                    selected.append(row)
+                    excess -= 1
+                if not selected:
+                    break
+
+                segment_path = self._write_segment(selected)
+                try:
+                    summaries += self._rollup(session, selected)
+                    session.execute(
+                        delete(Evento).where(Evento.id_evento <= selected[-1].id_evento)
+                    )
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    os.remove(segment_path)
+                    raise
+                archived += len(selected)
+                segments += 1
+                if len(selected) < len(rows) or len(rows) < self.batch_size:
+                    break
+
+            if archived:
+                print(f"🗄️ Eventos archivados: {archived} en {segments} segmento(s)")
+            return {
+                "success": True,
+                "message": f"{archived} evento(s) archivado(s)",
+                "archived": archived,
+                "segments": segments,
+                "summaries": summaries,
+            }
+
+        except Exception as e:
+            session.rollback()
+            return {
+                "success": False,
+                "message": f"Error aplicando la retención de eventos: {e}",
+                "archived": archived,
+                "segments": segments,
+                "summaries": summaries,
+            }
+        finally:
+            session.close()
+
+    def _write_segment(self, rows: list) -> str:
+        """Guarda los eventos en un segmento nuevo y devuelve su ruta"""
+        os.makedirs(self.archive_directory, exist_ok=True)
+        dates = [row.fecha_evento for row in rows if row.fecha_evento is not None]
+        first = min(dates) if dates else datetime.utcnow()
+        last = max(dates) if dates else first
+        name = (
+            f"eventos_{first:{_SEGMENT_DATE_FORMAT}}_{last:{_SEGMENT_DATE_FORMAT}}_"
+            f"{rows[0].id_evento:010d}-{rows[-1].id_evento:010d}.jsonl.gz"
+        )
+        path = os.path.join(self.archive_directory, name)
+        _write_gzip_lines(
+            self.archive_directory,
+            path,
+            [
+                json.dumps(
+                    {
+                        "id": row.id_evento,
+                        "usuario_id": row.usuario_id,
+                        "descripcion": row.descripcion,
+                        "fecha": (
+                            row.fecha_evento.isoformat() if row.fecha_evento else None
+                        ),
+                        "tipo": row.tipo or classify_event(row.descripcion),
+                    },
+                    ensure_ascii=False,
+                )
+                for row in rows
+            ],
+        )
+        return path
+
+    @staticmethod
+    def _rollup(session, rows: list) -> int:
+        """Suma los eventos a sus resúmenes diarios. Devuelve los grupos"""
+        groups = {}
+        for row in rows:
+            if row.fecha_evento is None:
+                continue
+            key = (
+                row.usuario_id,
+                row.fecha_evento.date(),
+                row.tipo or classify_event(row.descripcion),
+            )
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {
+                    "usuario_id": key[0],
+                    "fecha": key[1],
+                    "tipo": key[2],
+                    "cantidad": 1,
+                    "primer_evento": row.fecha_evento,
+                    "ultimo_evento": row.fecha_evento,
+                }
+            else:
+                group["cantidad"] += 1
+                group["primer_evento"] = min(group["primer_evento"], row.fecha_evento)
+                group["ultimo_evento"] = max(group["ultimo_evento"], row.fecha_evento)
+        if not groups:
+            return 0
+
+        statement = sqlite_insert(ResumenEvento).values(list(groups.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=["usuario_id", "fecha", "tipo"],
+            set_={
+                "cantidad": ResumenEvento.cantidad + statement.excluded.cantidad,
+                "primer_evento": func.min(
+                    ResumenEvento.primer_evento, statement.excluded.primer_evento
+                ),
+                "ultimo_evento": func.max(
+                    ResumenEvento.ultimo_evento, statement.excluded.ultimo_evento
+                ),
+            },
+        )
+        session.execute(statement)
+        return len(groups)
+
+    def _segments(self, since=None, until=None) -> list:
+        """Segmentos cuyo rango de días se solapa con [since, until]"""
+        segments = []
+        for path in sorted(
+            glob.glob(os.path.join(self.archive_directory, _SEGMENT_PATTERN))
+        ):
+            first, last = _segment_dates(path)
+            if first is not None:
+                if since is not None and last < since.date():
+                    continue
+                if until is not None and first > until.date():
+                    continue
+            segments.append(path)
+        return segments
+
+    @staticmethod
+    def _read_segment(path: str):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def query_archive(
+        self,
+        user_id: int,
+        since: datetime = None,
+        until: datetime = None,
+        event_type: str = None,
+        limit: int = None,
+    ) -> list:
+        """
+        Busca eventos archivados de un usuario
+
+        Solo se descomprimen los segmentos cuyo rango de días se solapa con
+        el pedido.
+
+        Args:
+            user_id (int): ID del usuario
+            since (datetime): Desde esta fecha (incluida)
+            until (datetime): Hasta esta fecha (excluida)
+            event_type (str): Solo eventos de este tipo (ver classify_event)
+            limit (int): Número máximo de eventos
+
+        Returns:
+            list: Eventos del más reciente al más antiguo, con las claves
+                  "id", "descripcion", "fecha" y "tipo"
+        """
+        events = {}
+        for path in self._segments(since, until):
+            for record in self._read_segment(path):
+                if record["usuario_id"] != user_id:
+                    continue
+                if event_type is not None and record["tipo"] != event_type:
+                    continue
+                fecha = (
+                    datetime.fromisoformat(record["fecha"]) if record["fecha"] else None
+                )
+                if since is not None and (fecha is None or fecha < since):
+                    continue
+                if until is not None and (fecha is None or fecha >= until):
+                    continue
+                events[record["id"]] = {
+                    "id": record["id"],
+                    "descripcion": record["descripcion"],
+                    "fecha": fecha,
+                    "tipo": record["tipo"],
+                }
+
+        result = sorted(
+            events.values(),
+            key=lambda event: (event["fecha"] or datetime.min, event["id"]),
+            reverse=True,
+        )
+        return result[:limit] if limit is not None else result
+
+    def get_summary(self, user_id: int, since=None, until=None) -> list:
+        """
+        Obtiene los resúmenes diarios de los eventos archivados
+
+        Args:
+            user_id (int): ID del usuario
+            since (date): Desde este día (incluido)
+            until (date): Hasta este día (incluido)
+
+        Returns:
+            list: {"fecha", "tipo", "cantidad"} ordenados por día y tipo
+        """
+        session = self.db_manager.get_session()
+        try:
+            query = session.query(ResumenEvento).filter(
+                ResumenEvento.usuario_id == user_id
+            )
+            if since is not None:
+                query = query.filter(ResumenEvento.fecha >= since)
+            if until is not None:
+                query = query.filter(ResumenEvento.fecha <= until)
+            return [
+                {
+                    "fecha": summary.fecha,
+                    "tipo": summary.tipo,
+                    "cantidad": summary.cantidad,
+                }
+                for summary in query.order_by(ResumenEvento.fecha, ResumenEvento.tipo)
+            ]
+        finally:
+            session.close()
+
+    def purge_user(self, session, user_id: int) -> list:
+        """
+        Elimina los resúmenes de un usuario y anota sus segmentos
+
+        En `session` solo se borran los resúmenes (el llamador hace commit);
+        los segmentos no se leen dentro de la transacción. Después del
+        commit, el llamador pasa la lista devuelta a purge_segments. Si la
+        transacción se revierte, el archivo queda como estaba.
+
+        Args:
+            session (Session): Sesión activa de base de datos
+            user_id (int): ID del usuario
+
+        Returns:
+            list: Segmentos que pueden contener eventos del usuario
+        """
+        session.execute(
+            delete(ResumenEvento).where(ResumenEvento.usuario_id == user_id)
+        )
+        # Los segmentos que se escriban después ya no tendrán sus eventos
+        return self._segments()
+
+    def purge_segments(self, user_id: int, segments: list) -> tuple:
+        """
+        Quita de los segmentos los eventos archivados de un usuario
+
+        Se llama después del commit de purge_user. Cada segmento se lee y se
+        filtra línea a línea (sin cargarlo en memoria) en un temporal que lo
+        reemplaza; un segmento sin eventos restantes se elimina.
+
+        Args:
+            user_id (int): ID del usuario eliminado
+            segments (list): Segmentos devueltos por purge_user
+
+        Returns:
+            tuple: (eventos eliminados, segmentos que no se pudieron reescribir)
+        """
+        removed = failed = 0
+        for path in segments:
+            try:
+                removed += self._purge_segment(path, user_id)
+            except (OSError, ValueError) as e:
+                failed += 1
+                print(f"❌ Error reescribiendo {os.path.basename(path)}: {e}")
+        return removed, failed
+
+    def _purge_segment(self, path: str, user_id: int) -> int:
+        """Reescribe un segmento sin los eventos de un usuario"""
+        if not os.path.exists(path):
+            return 0
+        removed = kept = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.archive_directory, suffix=".part")
+        try:
+            with (
+                os.fdopen(fd, "wb") as raw,
+                gzip.GzipFile(fileobj=raw, mode="wb") as compressed,
+                gzip.open(path, "rb") as source,
+            ):
+                for line in source:
+                    if not line.strip():
+                        continue
+                    if json.loads(line)["usuario_id"] == user_id:
+                        removed += 1
+                        continue
+                    compressed.write(line.rstrip(b"\n") + b"\n")
+                    kept += 1
+                compressed.close()
+                raw.flush()
+                os.fsync(raw.fileno())
+            if removed and kept:
+                os.replace(temp_path, path)
+            elif removed:
+                os.remove(path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return removed
@@ -0,0 +1,326 @@
+"""
+RF-11: Registro de eventos con escritura diferida por lotes.
+
+Los servicios registran eventos sin abrir una transacción propia: el
+evento se encola y un hilo en segundo plano los inserta por lotes, cuando
+se juntan `batch_size` eventos, cuando pasa `flush_interval` desde el
+primero pendiente o al cerrar la aplicación. La cola es acotada: si se
+llena, quien registra espera a que el hilo escriba (contrapresión).
+
+Los eventos críticos (bloqueos, eliminaciones) se escriben antes de
+volver, junto con los que estaban pendientes, para que no se pierdan. Un
+lote que falla se reintenta; si sigue fallando, flush() y log() de un
+evento crítico devuelven False.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from backend.models.event_model import Evento, classify_event
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.5  # Segundos que puede esperar un evento
+DEFAULT_MAX_PENDING = 10_000
+# Segundos sin eventos tras los que el hilo de escritura termina
+IDLE_TIMEOUT = 30
+# Intentos de escritura de un lote (p. ej. con la BD bloqueada)
+WRITE_ATTEMPTS = 3
+RETRY_DELAY = 0.05  # Segundos antes del primer reintento (se duplica)
+# Segundos entre intentos de encolar mientras la cola está llena
+FULL_QUEUE_WAIT = 0.01
+
+
+class _FlushRequest:
+    """Marca en la cola: se completa cuando todo lo anterior está escrito"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class EventSink:
+    """
+    Cola de eventos que se insertan en la base de datos por lotes.
+
+    Se comparte una por base de datos (ver get_event_sink).
+    """
+
+    def __init__(
+        self,
+        db_manager,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        max_pending=DEFAULT_MAX_PENDING,
+    ):
+        """
+        Inicializa la cola de eventos
+
+        Args:
+            db_manager (DatabaseManager): Gestor de la BD donde se guardan
+            batch_size (int): Eventos por transacción como máximo
+            flush_interval (float): Segundos máximos que espera un evento
+                antes de escribirse
+            max_pending (int): Eventos en cola antes de bloquear al que registra
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        # Protege el hilo de escritura y el cierre; nunca se mantiene
+        # mientras se espera a la cola, así que el hilo no queda bloqueado
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        # Estadísticas
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        # Eventos fallidos ya informados por un flush()
+        self._reported_failures = 0
+        self._failed_lock = threading.Lock()
+
+    def log(
+        self,
+        user_id: int,
+        description: str,
+        event_type: str = None,
+        critical: bool = False,
+    ) -> bool:
+        """
+        Registra un evento
+
+        Args:
+            user_id (int): ID del usuario
+            description (str): Descripción del evento
+            event_type (str): Tipo del evento (constantes EVENT_* de
+                event_model; por defecto se deduce de la descripción)
+            critical (bool): Escribirlo (con los pendientes) antes de volver
+
+        Returns:
+            bool: False si el evento es crítico y no pudo escribirse
+        """
+        row = {
+            "descripcion": description,
+            "usuario_id": user_id,
+            "fecha_evento": datetime.utcnow(),
+            "tipo": event_type or classify_event(description),
+        }
+        self._put(row)
+        if critical:
+            return self.flush()
+        return True
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Escribe todos los eventos pendientes
+
+        Args:
+            timeout (float): Segundos máximos de espera (por defecto, sin límite)
+
+        Returns:
+            bool: True si se escribieron antes del timeout; False también si
+                algún evento no se pudo escribir desde el último flush
+        """
+        reported = self._reported_failures
+        request = _FlushRequest()
+        written = not self._put(request) or request.done.wait(timeout)
+        with self._failed_lock:
+            failed = self.failed
+            self._reported_failures = max(self._reported_failures, failed)
+        if failed != reported:
+            print(f"❌ {failed - reported} evento(s) no se pudieron registrar")
+        return written and failed == reported
+
+    def close(self):
+        """Escribe los eventos pendientes y detiene el hilo de escritura"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            # Los eventos ya encolados se escriben antes de la marca de fin
+            self._queue.put(None)
+            thread.join()
+
+    def _put(self, item) -> bool:
+        """
+        Encola un evento o una petición de escritura
+
+        Returns:
+            bool: False si la cola está cerrada y el evento se escribió aquí
+        """
+        while True:
+            with self._lock:
+                if self._closed:
+                    break
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="EventSink", daemon=True
+                    )
+                    self._thread.start()
+                try:
+                    self._queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    pass
+            # Cola llena: esperar a que el hilo escriba, sin el lock
+            time.sleep(FULL_QUEUE_WAIT)
+        # Cerrada (al salir de la aplicación): escritura directa
+        if isinstance(item, dict):
+            self._write([item])
+        return False
+
+    def _run(self):
+        """Hilo de escritura: agrupa eventos y los inserta por lotes"""
+        while True:
+            try:
+                item = self._queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        # Sin actividad: el próximo evento arranca otro hilo
+                        self._thread = None
+                        return
+                continue
+
+            rows = []
+            waiters = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, _FlushRequest):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                if stop or waiters or len(rows) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            # Lo que ya está en cola entra en el mismo lote
+            while not stop and len(rows) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                elif isinstance(item, _FlushRequest):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+
+            if rows:
+                self._write(rows)
+            if waiters and not self._queue.empty() and not stop:
+                # Quedan eventos anteriores a la petición: escribirlos también
+                self._drain()
+            for request in waiters:
+                request.done.set()
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        """Escribe todo lo que quede en la cola en lotes de `batch_size`"""
+        rows = []
+        waiters = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                waiters.append(item)
+            elif item is not None:
+                rows.append(item)
+            if len(rows) >= self.batch_size:
+                self._write(rows)
+                rows = []
+        if rows:
+            self._write(rows)
+        for request in waiters:
+            request.done.set()
+
+    def _write(self, rows: list) -> bool:
+        """
+        Inserta un lote de eventos en una sola transacción
+
+        Los errores se reintentan WRITE_ATTEMPTS veces; si el lote no se
+        puede escribir, se cuenta en `failed` para que flush() lo informe.
+
+        Returns:
+            bool: True si el lote quedó escrito
+        """
+        delay = RETRY_DELAY
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            session = self.db_manager.get_session()
+            try:
+                session.execute(insert(Evento), rows)
+                session.commit()
+                self.written += len(rows)
+                self.batches += 1
+                return True
+            except Exception as e:
+                session.rollback()
+                error = e
+            finally:
+                session.close()
+            if attempt < WRITE_ATTEMPTS:
+                time.sleep(delay)
+                delay *= 2
+        with self._failed_lock:
+            self.failed += len(rows)
+        print(f"❌ Error registrando {len(rows)} evento(s): {error}")
+        return False
+
+
+# Una cola por engine: los servicios de la misma BD comparten la cola
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_event_sink(db_manager) -> EventSink:
+    """
+    Obtiene la cola de eventos compartida de una base de datos
+
+    Args:
+        db_manager (DatabaseManager): Gestor de la BD
+
+    Returns:
+        EventSink: Cola compartida por todos los servicios de esa BD
+    """
+    with _sinks_lock:
+        sink = _sinks.get(db_manager.engine)
+        if sink is None:
+            sink = EventSink(db_manager)
+            _sinks[db_manager.engine] = sink
+        return sink
+
+
+def flush_all_event_sinks():
+    """Escribe los eventos pendientes de todas las bases de datos"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.flush()
+
+
+@atexit.register
+def _close_event_sinks():
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
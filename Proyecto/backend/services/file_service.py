@@ -1,12 +1,280 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import io
+import json
+import mimetypes
 import os
 import shutil
+import tarfile
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from sqlalchemy import bindparam, func, text, tuple_, update
 from sqlalchemy.orm import Session
 
-from backend.models.file_model import Archivo
-from backend.models.event_model import Evento
+from backend.crypto.compression import (
+    CODEC_NAMES,
+    CODEC_NONE,
+    DEFAULT_CODEC,
+    SAMPLE_SIZE,
+    choose_codec,
+)
+from backend.crypto.envelope import KeyWrapper, generate_data_key
+from backend.crypto.stream_cipher import (
+    DEFAULT_WORKERS,
+    FORMAT_VERSION,
+    HEADER_SIZE,
+    MAGIC,
+    InvalidContainerError,
+    StreamCipher,
+    container_codec,
+    is_stream_container,
+)
+from backend.database.search_index import (
+    SEARCH_TABLE,
+    VOCAB_TABLE,
+    phrase,
+    trigrams,
+)
+from backend.database.storage_stats import rebuild_storage_stats
+from backend.models.file_model import (
+    ADDRESS_KEY_NAME,
+    GLOBAL_STATS_ID,
+    Archivo,
+    ClaveSistema,
+    EstadisticaAlmacenamiento,
+    IntercambioBlob,
+)
+from backend.models.event_model import (
+    EVENT_DELETE,
+    EVENT_DOWNLOAD,
+    EVENT_RENAME,
+    EVENT_UPLOAD,
+    Evento,
+)
 from backend.database.connection import DatabaseManager
+from backend.services.blob_locks import blob_lock
+from backend.services.blob_reaper import get_blob_reaper
+from backend.services.event_sink import get_event_sink
+
+
+# Almacén direccionado por contenido: <files_directory>/objects/ab/<dirección>.enc
+OBJECTS_DIRECTORY = "objects"
+_ADDRESS_KDF_INFO = b"fortifile-blob-address-v1"
+# Clave maestra nueva mientras se rota (ver rotate_master_key)
+PENDING_KEY_SUFFIX = ".new"
+# Temporal de un blob re-cifrado antes de reemplazar al anterior
+SWAP_TEMP_SUFFIX = ".migracion.part"
+HASH_READ_SIZE = 1024 * 1024
+
+# Valor de Archivo.formato para los tokens Fernet heredados; los blobs en
+# contenedor por bloques guardan su FORMAT_VERSION
+BLOB_FORMAT_FERNET = 0
+
+# Formatos de exportación admitidos por download_files
+ARCHIVE_FORMATS = {"zip": ".zip", "tar": ".tar"}
+
+# Criterios de orden admitidos por list_files (cada uno tiene su índice)
+LIST_SORT_KEYS = ("nombre", "tipo", "fecha")
+LIST_MAX_LIMIT = 500
+
+# Límites de search_files para mantener acotado el costo de cada búsqueda:
+# trigramas muestreados y usados para filtrar, apariciones a partir de las
+# cuales un trigrama se considera común y coincidencias examinadas
+SEARCH_MAX_SAMPLED = 12
+SEARCH_MAX_TERMS = 3
+SEARCH_RARE_LIMIT = 1000
+SEARCH_CANDIDATES = 200
+FUZZY_MIN_SIMILARITY = 0.4
+
+
+class _MasterKeyState:
+    """Estado de una clave maestra compartido por los FileService del proceso"""
+
+    def __init__(self):
+        # Envolver claves y confirmar registros no se solapa con una rotación
+        self.lock = threading.Lock()
+        # Aumenta con cada rotación: las demás instancias recargan la clave
+        self.generation = 0
+
+
+_master_keys = {}
+_master_keys_lock = threading.Lock()
+
+
+def _master_key_state(key_file: str) -> _MasterKeyState:
+    """Estado compartido de la clave maestra guardada en `key_file`"""
+    with _master_keys_lock:
+        return _master_keys.setdefault(os.path.abspath(key_file), _MasterKeyState())
+
+
+# Engines (uno por BD) cuyos re-cifrados interrumpidos ya se recuperaron:
+# se hace una vez por proceso, no en cada FileService
+_recovered_swaps = set()
+_recovered_swaps_lock = threading.Lock()
+
+# Claves de datos de blobs recién escritos que todavía no tienen registro en
+# la BD (para que otra subida del mismo contenido las reutilice, desde
+# cualquier instancia); protegidas por el lock del blob (ver blob_locks)
+_pending_data_keys = {}
+
+
+class TransferCancelled(Exception):
+    """La subida o descarga se canceló antes de terminar"""
+
+
+class _ProgressReader:
+    """Lector que informa los bytes leídos y se detiene si se cancela"""
+
+    def __init__(self, source, progress_callback=None, cancel_event=None):
+        self._source = source
+        self._progress_callback = progress_callback
+        self._cancel_event = cancel_event
+
+    def read(self, size=-1):
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise TransferCancelled("Transferencia cancelada")
+        data = self._source.read(size)
+        if data and self._progress_callback:
+            self._progress_callback(len(data))
+        return data
+
+
+def _track_progress(chunks, progress_callback=None, cancel_event=None):
+    """Recorre fragmentos descifrados informando el avance y la cancelación"""
+    try:
+        for chunk in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                raise TransferCancelled("Transferencia cancelada")
+            if progress_callback:
+                progress_callback(len(chunk))
+            yield chunk
+    finally:
+        # Cerrar el archivo cifrado aunque la descarga se interrumpa
+        chunks.close()
+
+
+class _ChunkReader(io.RawIOBase):
+    """Adapta un iterador de fragmentos de bytes a un objeto tipo archivo"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class _HashingReader:
+    """Envuelve un archivo de lectura y calcula su SHA-256 mientras se lee"""
+
+    def __init__(self, source):
+        self._source = source
+        self._digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        self._digest.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def _source_stat(source) -> tuple:
+    """Tamaño y fecha de modificación de un archivo abierto"""
+    stat = os.fstat(source.fileno())
+    return stat.st_size, stat.st_mtime_ns
+
+
+def release_unreferenced_blobs(session: Session, paths) -> int:
+    """
+    Elimina del disco los archivos cifrados que ya no referencia ningún `Archivo`
+
+    Los registros con el mismo contenido comparten un único blob, así que
+    este solo se borra al eliminar su última referencia. Debe llamarse
+    después de confirmar (o revertir) la transacción que quitó los registros.
+
+    La comprobación y el borrado se hacen con el lock del blob: una subida
+    que lo reutiliza confirma su registro y luego comprueba, con el mismo
+    lock, que el blob sigue en el disco (si no, lo vuelve a escribir).
+
+    Args:
+        session (Session): Sesión de base de datos
+        paths: Rutas de los blobs que pudieron quedar sin referencias
+
+    Returns:
+        int: Cantidad de blobs eliminados
+    """
+    removed = 0
+    for path in set(paths):
+        with blob_lock(path):
+            referenced = (
+                session.query(Archivo.id_archivo)
+                .filter(Archivo.ruta_archivo == path)
+                .first()
+            )
+            if referenced is None and os.path.exists(path):
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def _guess_mime_type(filename: str) -> str:
+    """Obtiene el tipo MIME a partir de la extensión del nombre"""
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def _file_extension(filename: str) -> str:
+    """Extensión en minúsculas y sin punto ("" si el nombre no tiene)"""
+    return os.path.splitext(filename)[1].lstrip(".").lower()[:50]
+
+
+def _escape_like(text: str) -> str:
+    """Escapa los comodines de LIKE para buscar el texto literal"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _encode_cursor(sort: str, order: str, value, file_id: int) -> str:
+    """Codifica la posición del último elemento de una página"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, file_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str):
+    """Decodifica un cursor de list_files y valida que sea del mismo orden"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        cursor_sort, cursor_order, value, file_id = payload
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(file_id, int):
+        raise ValueError("El cursor no corresponde al orden solicitado")
+    if sort == "fecha":
+        value = datetime.fromisoformat(value)
+    return value, file_id
 
 
 class FileService:
@@ -21,15 +289,27 @@ class FileService:
     - RF-07: Eliminación segura
     """
 
-    def __init__(self, files_directory="secure_files"):
+    def __init__(
+        self,
+        files_directory="secure_files",
+        encryption_workers=None,
+        compression=DEFAULT_CODEC,
+    ):
         """
         Inicializa el servicio de archivos
 
         Args:
             files_directory (str): Directorio donde se almacenan los archivos cifrados
+            encryption_workers (int): Hilos de cifrado por archivo
+                (por defecto, hasta 4 según los núcleos disponibles)
+            compression (int): Códec con el que se comprimen los archivos
+                compresibles antes de cifrarlos (CODEC_NONE lo desactiva)
         """
         self.db_manager = DatabaseManager("fortifile.db")
+        # RF-11: Eventos por lotes, compartidos con los demás servicios
+        self.events = get_event_sink(self.db_manager)
         self.files_directory = files_directory
+        self.objects_directory = os.path.join(files_directory, OBJECTS_DIRECTORY)
         self.key_file = "fortifile.key"
 
         # Crear directorio de archivos si no existe
@@ -37,9 +317,28 @@ class FileService:
             os.makedirs(self.files_directory)
             print(f"✅ Directorio creado: {self.files_directory}")
 
-        # Generar o cargar clave de cifrado
+        # Generar o cargar clave de cifrado (y completar una rotación
+        # interrumpida)
+        self._key_state = _master_key_state(self.key_file)
+        self._key_generation = self._key_state.generation
+        if os.path.exists(self.key_file + PENDING_KEY_SUFFIX):
+            self._recover_key_rotation()
         self.encryption_key = self._get_or_create_key()
-        self.cipher = Fernet(self.encryption_key)
+        # Cifrado por bloques para archivos nuevos (memoria constante)
+        self.encryption_workers = encryption_workers or DEFAULT_WORKERS
+        self.compression = compression
+        self._load_master_key(self.encryption_key)
+        # Clave para direccionar blobs por contenido sin exponer su SHA-256
+        self.address_key = self._load_address_key()
+        self._pending_data_keys = _pending_data_keys
+
+        # Migración de datos: archivos subidos antes de guardar sus metadatos
+        self.backfill_file_metadata()
+
+        # Blobs de cuentas eliminadas que quedaron sin borrar
+        get_blob_reaper(self.db_manager).resume()
+        # Re-cifrados interrumpidos a mitad del reemplazo (BlobMigration)
+        self._recover_blob_swaps()
 
         print("✅ FileService inicializado")
 
@@ -64,8 +363,197 @@ class FileService:
                 print("✅ Nueva clave de cifrado generada")
                 return key
 
+    def _load_master_key(self, encryption_key: bytes):
+        """Prepara los cifradores que dependen de la clave maestra"""
+        master_key = base64.urlsafe_b64decode(encryption_key)
+        # Tokens Fernet heredados
+        self.cipher = Fernet(encryption_key)
+        # Blobs cifrados con la clave maestra antes del cifrado en sobre
+        self.stream_cipher = StreamCipher(master_key, workers=self.encryption_workers)
+        # RF-07: Claves de datos por blob, envueltas con la clave maestra
+        self.key_wrapper = KeyWrapper(master_key)
+
+    def _refresh_master_key(self):
+        """Recarga la clave maestra si otra instancia la rotó"""
+        if self._key_generation != self._key_state.generation:
+            generation = self._key_state.generation
+            self.encryption_key = self._get_or_create_key()
+            self._load_master_key(self.encryption_key)
+            self._key_generation = generation
+
+    @contextmanager
+    def _master_key_lock(self):
+        """
+        Bloquea la clave maestra mientras se envuelven claves y se confirman
+        registros (con la clave vigente)
+        """
+        with self._key_state.lock:
+            self._refresh_master_key()
+            yield
+
+    def _load_address_key(self) -> bytes:
+        """
+        Obtiene la clave con la que se direccionan los blobs
+
+        Se deriva de la clave maestra original; después de una rotación se
+        guarda envuelta en `claves_sistema`, así que las direcciones de los
+        blobs no cambian al rotar.
+
+        Returns:
+            bytes: Clave HMAC de 32 bytes
+        """
+        session = self.db_manager.get_session()
+        try:
+            stored = session.get(ClaveSistema, ADDRESS_KEY_NAME)
+        except Exception:
+            # BD todavía sin tablas
+            stored = None
+        finally:
+            session.close()
+        if stored is not None:
+            return self.key_wrapper.unwrap(stored.clave_envuelta)
+        return HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=_ADDRESS_KDF_INFO
+        ).derive(base64.urlsafe_b64decode(self.encryption_key))
+
+    def _recover_key_rotation(self):
+        """
+        Completa o descarta una rotación de la clave maestra interrumpida
+
+        La clave nueva se escribe junto a la actual antes de volver a
+        envolver las claves en la BD, y la reemplaza después del commit. Si
+        la BD ya usa la clave nueva se termina el reemplazo; si no, se
+        descarta y se conserva la anterior.
+        """
+        pending_key_file = self.key_file + PENDING_KEY_SUFFIX
+        with open(pending_key_file, "rb") as key_file:
+            new_key = key_file.read()
+
+        session = self.db_manager.get_session()
+        try:
+            stored = session.get(ClaveSistema, ADDRESS_KEY_NAME)
+        except Exception:
+            stored = None
+        finally:
+            session.close()
+
+        try:
+            wrapper = KeyWrapper(base64.urlsafe_b64decode(new_key))
+        except ValueError:
+            # Escritura de la clave nueva incompleta
+            wrapper = None
+        if (
+            wrapper is not None
+            and stored is not None
+            and wrapper.can_unwrap(stored.clave_envuelta)
+        ):
+            os.replace(pending_key_file, self.key_file)
+            print("✅ Rotación de la clave maestra completada")
+        else:
+            os.remove(pending_key_file)
+            print(
+                "⚠️ Rotación de la clave maestra no confirmada: se conserva la anterior"
+            )
+
+    def rotate_master_key(self) -> dict:
+        """
+        Reemplaza la clave maestra volviendo a envolver las claves de datos
+
+        No se reescribe ningún blob: solo cambian las claves envueltas de la
+        BD (y la clave de direcciones, que se guarda envuelta). Los blobs
+        cifrados directamente con la clave maestra (tokens Fernet y
+        contenedores anteriores al cifrado en sobre) dependen de la clave
+        anterior, así que deben convertirse antes de rotar (BlobMigration
+        los convierte en segundo plano). Los respaldos
+        anteriores a la rotación siguen necesitando la clave anterior.
+
+        Returns:
+            dict: {"success": bool, "message": str, "rewrapped": int}
+        """
+        pending_key_file = self.key_file + PENDING_KEY_SUFFIX
+        with self._master_key_lock():
+            session = self.db_manager.get_session()
+            try:
+                legacy = (
+                    session.query(func.count(Archivo.id_archivo))
+                    .filter(Archivo.clave_envuelta.is_(None))
+                    .scalar()
+                )
+                if legacy:
+                    return {
+                        "success": False,
+                        "message": f"{legacy} archivo(s) cifrados con la clave "
+                        "maestra: conviértelos antes de rotarla",
+                        "rewrapped": 0,
+                    }
+
+                new_key = Fernet.generate_key()
+                new_wrapper = KeyWrapper(base64.urlsafe_b64decode(new_key))
+                # La clave nueva queda en disco antes de usarla en la BD
+                with open(pending_key_file, "wb") as key_file:
+                    key_file.write(new_key)
+                    key_file.flush()
+                    os.fsync(key_file.fileno())
+
+                # Los registros que comparten un blob comparten su clave
+                rewrapped = {}
+                updates = []
+                for file_id, wrapped_key in session.query(
+                    Archivo.id_archivo, Archivo.clave_envuelta
+                ):
+                    wrapped_key = bytes(wrapped_key)
+                    if wrapped_key not in rewrapped:
+                        rewrapped[wrapped_key] = new_wrapper.wrap(
+                            self.key_wrapper.unwrap(wrapped_key)
+                        )
+                    updates.append(
+                        {
+                            "id_archivo": file_id,
+                            "clave_envuelta": rewrapped[wrapped_key],
+                        }
+                    )
+                if updates:
+                    session.execute(update(Archivo), updates)
+                session.merge(
+                    ClaveSistema(
+                        nombre=ADDRESS_KEY_NAME,
+                        clave_envuelta=new_wrapper.wrap(self.address_key),
+                    )
+                )
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                if os.path.exists(pending_key_file):
+                    os.remove(pending_key_file)
+                return {
+                    "success": False,
+                    "message": f"Error al rotar la clave maestra: {e}",
+                    "rewrapped": 0,
+                }
+            finally:
+                session.close()
+
+            os.replace(pending_key_file, self.key_file)
+            self.encryption_key = new_key
+            self._load_master_key(new_key)
+            self._key_state.generation += 1
+            self._key_generation = self._key_state.generation
+
+        print(f"✅ Clave maestra rotada: {len(rewrapped)} clave(s) de datos")
+        return {
+            "success": True,
+            "message": f"Clave maestra rotada: {len(rewrapped)} clave(s) de "
+            f"datos envueltas de nuevo ({len(updates)} archivo(s))",
+            "rewrapped": len(rewrapped),
+        }
+
     def upload_file(
-        self, user_id: int, source_file_path: str, original_filename: str = None
+        self,
+        user_id: int,
+        source_file_path: str,
+        original_filename: str = None,
+        progress_callback=None,
+        cancel_event=None,
     ) -> dict:
         """
         RF-03 y RF-04: Carga y cifra un archivo automáticamente
@@ -74,6 +562,10 @@ class FileService:
             user_id (int): ID del usuario propietario
             source_file_path (str): Ruta del archivo a subir
             original_filename (str): Nombre original (opcional)
+            progress_callback (callable): Recibe los bytes leídos en cada paso
+                (opcional)
+            cancel_event (threading.Event): Si se activa, la subida se detiene
+                y se elimina el archivo cifrado parcial (opcional)
 
         Returns:
             dict: {"success": bool, "message": str, "file_id": int}
@@ -90,34 +582,29 @@ class FileService:
             original_filename = os.path.basename(source_file_path)
 
         session = self.db_manager.get_session()
+        encrypted_path = None
         try:
-            # Generar nombre único para archivo cifrado
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            encrypted_filename = f"user_{user_id}_{timestamp}_{original_filename}.enc"
-            encrypted_path = os.path.join(self.files_directory, encrypted_filename)
-
-            # Leer y cifrar archivo
-            with open(source_file_path, "rb") as original_file:
-                file_data = original_file.read()
-                encrypted_data = self.cipher.encrypt(file_data)
-
-            # Guardar archivo cifrado
-            with open(encrypted_path, "wb") as encrypted_file:
-                encrypted_file.write(encrypted_data)
-
-            # Registrar en base de datos
-            new_file = Archivo(
-                nombre_archivo=original_filename,
-                ruta_archivo=encrypted_path,
-                usuario_id=user_id,
+            # Cifrar por bloques sin cargar el archivo completo en memoria
+            # (o reutilizar el blob si el mismo contenido ya está guardado)
+            blob = self._encrypt_to_store(
+                source_file_path,
+                original_filename,
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
             )
+            encrypted_path = blob["ruta"]
 
-            session.add(new_file)
-            session.commit()
+            # Registrar en base de datos junto con tamaños, tipo, hash y
+            # la clave envuelta del blob
+            with self._master_key_lock():
+                new_file = self._new_archivo(user_id, blob)
+                session.add(new_file)
+                session.commit()
+            self._ensure_blob(blob, source_file_path)
 
             # Registrar evento
             self._log_event(
-                session, user_id, f"Archivo subido y cifrado: {original_filename}"
+                user_id, f"Archivo subido y cifrado: {original_filename}", EVENT_UPLOAD
             )
 
             return {
@@ -128,232 +615,2017 @@ class FileService:
 
         except Exception as e:
             session.rollback()
-            # Limpiar archivo si se creó
-            if os.path.exists(encrypted_path):
-                os.remove(encrypted_path)
+            # Limpiar el blob si ningún otro archivo lo comparte
+            if encrypted_path:
+                release_unreferenced_blobs(session, [encrypted_path])
             return {
                 "success": False,
                 "message": f"Error al subir archivo: {e}",
                 "file_id": None,
             }
         finally:
+            if encrypted_path:
+                self._forget_data_key(blob)
             session.close()
 
-    def get_user_files(self, user_id: int) -> dict:
+    def upload_files(
+        self,
+        user_id: int,
+        source_file_paths: list,
+        progress_callback=None,
+        cancel_event=None,
+    ) -> dict:
         """
-        RF-05: Obtiene la lista de archivos del usuario
+        RF-03 y RF-04: Carga y cifra varios archivos en una sola operación
+
+        Los archivos se cifran en paralelo y todos los registros de
+        `Archivo` y sus eventos se guardan en una única transacción.
 
         Args:
-            user_id (int): ID del usuario
+            user_id (int): ID del usuario propietario
+            source_file_paths (list): Rutas de los archivos a subir
+            progress_callback (callable): Recibe los bytes leídos en cada paso;
+                se llama desde los hilos de cifrado (opcional)
+            cancel_event (threading.Event): Detiene las subidas pendientes y
+                elimina sus archivos cifrados parciales (opcional)
 
         Returns:
-            dict: {"success": bool, "files": list, "count": int}
+            dict: {"success": bool, "message": str, "results": list,
+                   "uploaded": int, "failed": int}
         """
+        results = [
+            {"path": path, "success": False, "message": "", "file_id": None}
+            for path in source_file_paths
+        ]
+
+        def encrypt(position):
+            path = source_file_paths[position]
+            if not os.path.isfile(path):
+                raise FileNotFoundError("El archivo fuente no existe")
+            # Cada archivo se cifra en un solo hilo; el paralelismo es entre archivos
+            return self._encrypt_to_store(
+                path,
+                os.path.basename(path),
+                workers=1,
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
+            )
+
+        stored = []
+        with ThreadPoolExecutor(max_workers=self.encryption_workers) as executor:
+            futures = [
+                executor.submit(encrypt, position)
+                for position in range(len(source_file_paths))
+            ]
+            for position, future in enumerate(futures):
+                try:
+                    stored.append((position, future.result()))
+                except Exception as e:
+                    results[position]["message"] = f"Error al subir archivo: {e}"
+
         session = self.db_manager.get_session()
         try:
-            files = session.query(Archivo).filter(Archivo.usuario_id == user_id).all()
+            new_files = []
+            with self._master_key_lock():
+                for position, blob in stored:
+                    new_file = self._new_archivo(user_id, blob)
+                    session.add(new_file)
+                    session.add(
+                        Evento(
+                            descripcion=f"Archivo subido y cifrado: {blob['nombre']}",
+                            usuario_id=user_id,
+                            fecha_evento=datetime.utcnow(),
+                            tipo=EVENT_UPLOAD,
+                        )
+                    )
+                    new_files.append((position, new_file))
 
-            file_list = []
-            for file in files:
-                file_info = {
-                    "id": file.id_archivo,
-                    "nombre": file.nombre_archivo,
-                    "fecha_subida": file.fecha_subida,
-                    "size_mb": self._get_file_size(file.ruta_archivo),
-                }
-                file_list.append(file_info)
+                # Una sola transacción para todos los registros
+                session.commit()
+            for position, blob in stored:
+                self._ensure_blob(blob, source_file_paths[position])
 
-            return {"success": True, "files": file_list, "count": len(file_list)}
+            for position, new_file in new_files:
+                results[position].update(
+                    success=True,
+                    message=f"Archivo '{new_file.nombre_archivo}' subido y cifrado correctamente",
+                    file_id=new_file.id_archivo,
+                )
 
         except Exception as e:
-            return {
-                "success": False,
-                "message": f"Error obteniendo archivos: {e}",
-                "files": [],
-                "count": 0,
-            }
+            session.rollback()
+            # Sin registros en BD los archivos cifrados quedarían huérfanos
+            release_unreferenced_blobs(session, [blob["ruta"] for _, blob in stored])
+            for position, blob in stored:
+                results[position]["message"] = f"Error al registrar archivo: {e}"
         finally:
+            for _, blob in stored:
+                self._forget_data_key(blob)
             session.close()
 
-    def download_file(self, user_id: int, file_id: int, output_path: str) -> dict:
-        """
-        RF-06: Descarga y descifra un archivo
+        uploaded = sum(1 for result in results if result["success"])
+        failed = len(results) - uploaded
 
-        Args:
-            user_id (int): ID del usuario
-            file_id (int): ID del archivo
-            output_path (str): Ruta donde guardar el archivo descifrado
+        return {
+            "success": failed == 0,
+            "message": f"{uploaded} archivo(s) subido(s), {failed} con error",
+            "results": results,
+            "uploaded": uploaded,
+            "failed": failed,
+        }
+
+    def backfill_file_metadata(self) -> dict:
+        """
+        Completa tamaños, tipo MIME y hash de archivos subidos antes de que
+        estos metadatos se guardaran en `Archivo`.
 
         Returns:
-            dict: {"success": bool, "message": str, "output_path": str}
+            dict: {"success": bool, "message": str, "updated": int}
         """
         session = self.db_manager.get_session()
         try:
-            # Verificar que el archivo pertenece al usuario
-            file = (
-                session.query(Archivo)
-                .filter(Archivo.id_archivo == file_id, Archivo.usuario_id == user_id)
-                .first()
-            )
-
-            if not file:
-                return {
-                    "success": False,
-                    "message": "Archivo no encontrado o no pertenece al usuario",
-                    "output_path": None,
-                }
+            # La extensión y el nombre en minúsculas solo dependen del nombre:
+            # no hace falta descifrar
+            for file in session.query(Archivo).filter(
+                (Archivo.extension.is_(None)) | (Archivo.nombre_minusculas.is_(None))
+            ):
+                file.extension = _file_extension(file.nombre_archivo)
+                file.nombre_minusculas = file.nombre_archivo.lower()
+            # Formato y códec están en la cabecera: tampoco hace falta descifrar
+            for file in session.query(Archivo).filter(
+                (Archivo.formato.is_(None)) | (Archivo.compresion.is_(None))
+            ):
+                if os.path.exists(file.ruta_archivo):
+                    file.formato, file.compresion = self._blob_format(file.ruta_archivo)
+            session.commit()
 
-            if not os.path.exists(file.ruta_archivo):
-                return {
-                    "success": False,
-                    "message": "El archivo cifrado no existe en el sistema",
-                    "output_path": None,
-                }
+            pending = (
+                session.query(Archivo).filter(Archivo.hash_contenido.is_(None)).all()
+            )
 
-            # Leer y descifrar archivo
-            with open(file.ruta_archivo, "rb") as encrypted_file:
-                encrypted_data = encrypted_file.read()
-                decrypted_data = self.cipher.decrypt(encrypted_data)
+            updated = 0
+            for file in pending:
+                if not os.path.exists(file.ruta_archivo):
+                    continue
+                try:
+                    digest = hashlib.sha256()
+                    plaintext_size = 0
+                    for chunk in self._iter_decrypted_blob(
+                        file.ruta_archivo,
+                        wrapped_key=file.clave_envuelta,
+                        refresh_key=True,
+                    ):
+                        digest.update(chunk)
+                        plaintext_size += len(chunk)
+                except Exception as e:
+                    print(f"❌ No se pudo leer {file.nombre_archivo}: {e}")
+                    continue
 
-            # Guardar archivo descifrado
-            with open(output_path, "wb") as output_file:
-                output_file.write(decrypted_data)
+                file.tamano_original = plaintext_size
+                file.tamano_cifrado = os.path.getsize(file.ruta_archivo)
+                file.tipo_mime = _guess_mime_type(file.nombre_archivo)
+                file.hash_contenido = digest.hexdigest()
+                updated += 1
 
-            # Registrar evento
-            self._log_event(
-                session, user_id, f"Archivo descargado: {file.nombre_archivo}"
-            )
+            if updated:
+                session.commit()
+                print(f"✅ Metadatos completados para {updated} archivo(s)")
 
             return {
                 "success": True,
-                "message": f"Archivo '{file.nombre_archivo}' descargado correctamente",
-                "output_path": output_path,
+                "message": f"Metadatos completados para {updated} archivo(s)",
+                "updated": updated,
             }
 
         except Exception as e:
+            session.rollback()
             return {
                 "success": False,
-                "message": f"Error al descargar archivo: {e}",
-                "output_path": None,
+                "message": f"Error completando metadatos: {e}",
+                "updated": 0,
             }
         finally:
             session.close()
 
-    def delete_file(self, user_id: int, file_id: int) -> dict:
+    def upgrade_legacy_blobs(self, limit: int = None) -> dict:
         """
-        RF-07: Elimina un archivo de forma segura
+        Reescribe en el contenedor por bloques los archivos que siguen
+        guardados como token Fernet
+
+        Los archivos heredados también se reescriben solos la primera vez
+        que se descargan o se leen; esto permite migrarlos todos de una vez.
 
         Args:
-            user_id (int): ID del usuario
-            file_id (int): ID del archivo
+            limit (int): Cantidad máxima de archivos a reescribir (opcional)
 
         Returns:
-            dict: {"success": bool, "message": str}
+            dict: {"success": bool, "message": str, "upgraded": int}
         """
         session = self.db_manager.get_session()
         try:
-            # Verificar que el archivo pertenece al usuario
-            file = (
-                session.query(Archivo)
-                .filter(Archivo.id_archivo == file_id, Archivo.usuario_id == user_id)
-                .first()
-            )
-
-            if not file:
-                return {
-                    "success": False,
-                    "message": "Archivo no encontrado o no pertenece al usuario",
-                }
-
-            filename = file.nombre_archivo
-            file_path = file.ruta_archivo
-
-            # Eliminar archivo físico
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
-            # Eliminar registro de base de datos
-            session.delete(file)
-            session.commit()
-
-            # Registrar evento
-            self._log_event(session, user_id, f"Archivo eliminado: {filename}")
+            query = session.query(Archivo).filter(Archivo.formato == BLOB_FORMAT_FERNET)
+            if limit is not None:
+                query = query.limit(limit)
 
+            upgraded = sum(
+                1 for file in query.all() if self._upgrade_legacy_blob(session, file)
+            )
             return {
                 "success": True,
-                "message": f"Archivo '{filename}' eliminado correctamente",
+                "message": f"{upgraded} archivo(s) convertido(s) al nuevo formato",
+                "upgraded": upgraded,
             }
-
         except Exception as e:
             session.rollback()
-            return {"success": False, "message": f"Error al eliminar archivo: {e}"}
+            return {
+                "success": False,
+                "message": f"Error convirtiendo archivos: {e}",
+                "upgraded": 0,
+            }
         finally:
             session.close()
 
-    def _get_file_size(self, file_path: str) -> float:
+    def get_user_files(self, user_id: int) -> dict:
         """
-        Obtiene el tamaño de un archivo en MB
+        RF-05: Obtiene la lista de archivos del usuario
 
         Args:
-            file_path (str): Ruta del archivo
+            user_id (int): ID del usuario
 
         Returns:
-            float: Tamaño en MB
+            dict: {"success": bool, "files": list, "count": int}
         """
+        session = self.db_manager.get_session()
         try:
-            if os.path.exists(file_path):
-                size_bytes = os.path.getsize(file_path)
-                return round(size_bytes / 1024 / 1024, 2)
-            return 0.0
-        except BaseException:
-            return 0.0
+            files = session.query(Archivo).filter(Archivo.usuario_id == user_id).all()
+
+            file_list = [self._file_info(file) for file in files]
+
+            return {"success": True, "files": file_list, "count": len(file_list)}
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error obteniendo archivos: {e}",
+                "files": [],
+                "count": 0,
+            }
+        finally:
+            session.close()
 
-    def _log_event(self, session: Session, user_id: int, description: str):
+    def list_files(
+        self,
+        user_id: int,
+        query: str = None,
+        sort: str = "nombre",
+        order: str = "asc",
+        limit: int = 100,
+        cursor: str = None,
+        extensions: list = None,
+        uploaded_after: datetime = None,
+        uploaded_before: datetime = None,
+    ) -> dict:
         """
-        Registra un evento del sistema
+        Obtiene una página de archivos del usuario ordenada y filtrada en la BD
+
+        La paginación es por cursor (keyset): cada página continúa después del
+        último elemento de la anterior usando los índices compuestos de
+        `archivos`, por lo que su costo no depende de cuántas páginas se hayan
+        recorrido. Los filtros se aplican en la misma consulta; las páginas
+        siguientes deben pedirse con los mismos filtros.
 
         Args:
-            session (Session): Sesión activa de base de datos
             user_id (int): ID del usuario
-            description (str): Descripción del evento
+            query (str): Texto a buscar en el nombre (opcional)
+            sort (str): "nombre", "tipo" (extensión) o "fecha" (fecha de subida)
+            order (str): "asc" o "desc"
+            limit (int): Cantidad máxima de archivos de la página
+            cursor (str): Valor de `next_cursor` de la página anterior
+            extensions (list): Solo archivos con estas extensiones (sin
+                importar mayúsculas ni el punto inicial; "" para los que no
+                tienen extensión)
+            uploaded_after (datetime): Subidos desde esta fecha UTC (incluida)
+            uploaded_before (datetime): Subidos antes de esta fecha UTC
+
+        Returns:
+            dict: {"success": bool, "files": list, "count": int,
+                   "next_cursor": str | None}
         """
+        if sort not in LIST_SORT_KEYS or order not in ("asc", "desc"):
+            return {
+                "success": False,
+                "message": f"Orden no válido: {sort} {order}",
+                "files": [],
+                "count": 0,
+                "next_cursor": None,
+            }
+        limit = max(1, min(int(limit), LIST_MAX_LIMIT))
+
+        session = self.db_manager.get_session()
         try:
-            event = Evento(
-                descripcion=description,
-                usuario_id=user_id,
-                fecha_evento=datetime.utcnow(),
+            sort_column = {
+                "nombre": Archivo.nombre_minusculas,
+                "tipo": Archivo.extension,
+                "fecha": Archivo.fecha_subida,
+            }[sort]
+            key = tuple_(sort_column, Archivo.id_archivo)
+
+            # El valor de orden se lee de la BD: el cursor se compara con el
+            # mismo valor que usa ORDER BY
+            files_query = session.query(Archivo, sort_column).filter(
+                Archivo.usuario_id == user_id
             )
-            session.add(event)
-            session.commit()
-        except Exception as e:
-            print(f"❌ Error registrando evento: {e}")
+            if query:
+                files_query = files_query.filter(
+                    Archivo.nombre_archivo.ilike(
+                        f"%{_escape_like(query)}%", escape="\\"
+                    )
+                )
+            if extensions:
+                files_query = files_query.filter(
+                    Archivo.extension.in_(
+                        {extension.lstrip(".").lower() for extension in extensions}
+                    )
+                )
+            if uploaded_after is not None:
+                files_query = files_query.filter(Archivo.fecha_subida >= uploaded_after)
+            if uploaded_before is not None:
+                files_query = files_query.filter(Archivo.fecha_subida < uploaded_before)
+            if cursor:
+                position = tuple_(*_decode_cursor(cursor, sort, order))
+                files_query = files_query.filter(
+                    key > position if order == "asc" else key < position
+                )
 
-    def get_storage_info(self) -> dict:
-        """
-        Obtiene información del almacenamiento
+            if order == "asc":
+                files_query = files_query.order_by(
+                    sort_column.asc(), Archivo.id_archivo.asc()
+                )
+            else:
+                files_query = files_query.order_by(
+                    sort_column.desc(), Archivo.id_archivo.desc()
+                )
 
-        Returns:
-            dict: Información del almacenamiento
-        """
-        try:
-            total_files = 0
-            total_size = 0
+            # Pedir un elemento extra para saber si hay otra página
+            rows = files_query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
 
-            if os.path.exists(self.files_directory):
-                for filename in os.listdir(self.files_directory):
-                    file_path = os.path.join(self.files_directory, filename)
-                    if os.path.isfile(file_path):
-                        total_files += 1
-                        total_size += os.path.getsize(file_path)
+            next_cursor = None
+            if has_more:
+                last, last_value = rows[-1]
+                next_cursor = _encode_cursor(sort, order, last_value, last.id_archivo)
 
+            file_list = [self._file_info(file) for file, _ in rows]
             return {
                 "success": True,
-                "total_files": total_files,
-                "total_size_mb": round(total_size / 1024 / 1024, 2),
-                "storage_directory": self.files_directory,
+                "files": file_list,
+                "count": len(file_list),
+                "next_cursor": next_cursor,
             }
+
         except Exception as e:
             return {
                 "success": False,
-                "message": f"Error obteniendo info de almacenamiento: {e}",
+                "message": f"Error listando archivos: {e}",
+                "files": [],
+                "count": 0,
+                "next_cursor": None,
             }
+        finally:
+            session.close()
+
+    def search_files(self, user_id: int, query: str, limit: int = 20) -> dict:
+        """
+        Busca archivos por nombre usando el índice FTS5 de trigramas
+
+        Los resultados se ordenan por relevancia: primero los nombres que
+        empiezan por el texto buscado, luego los que tienen una palabra que
+        empieza por él y después los que solo lo contienen (a igualdad, los
+        más recientes primero). Si no alcanzan, se completa con coincidencias
+        aproximadas que comparten suficientes trigramas con la búsqueda
+        (tolera errores de tipeo). Las búsquedas de menos de 3 caracteres se
+        resuelven como prefijo del nombre con
+        `ix_archivos_usuario_nombre_minusculas`.
+
+        Args:
+            user_id (int): ID del usuario
+            query (str): Texto a buscar
+            limit (int): Cantidad máxima de resultados
+
+        Returns:
+            dict: {"success": bool, "files": list, "count": int}
+                  Cada archivo incluye "match": "exact" o "fuzzy".
+        """
+        term = (query or "").strip().lower()
+        if not term:
+            return {"success": True, "files": [], "count": 0}
+        limit = max(1, min(int(limit), LIST_MAX_LIMIT))
+
+        session = self.db_manager.get_session()
+        try:
+            exact = self._search_name_prefix(session, user_id, term, limit)
+            fuzzy = []
+
+            if len(term) >= 3 and len(exact) < limit:
+                grams = trigrams(term)
+                counts = self._trigram_counts(session, grams)
+
+                # Si falta algún trigrama, ningún nombre contiene el texto
+                if all(counts.values()):
+                    exact += self._search_substring(
+                        session, user_id, term, counts, limit - len(exact), exact
+                    )
+                if len(exact) < limit:
+                    fuzzy = self._search_fuzzy(
+                        session, user_id, grams, counts, limit - len(exact), exact
+                    )
+
+            ranked = [(file_id, "exact") for file_id in exact]
+            ranked += [(file_id, "fuzzy") for file_id in fuzzy]
+
+            files = {}
+            if ranked:
+                files = {
+                    file.id_archivo: file
+                    for file in session.query(Archivo).filter(
+                        Archivo.id_archivo.in_([file_id for file_id, _ in ranked])
+                    )
+                }
+
+            file_list = []
+            for file_id, match in ranked:
+                if file_id in files:
+                    file_info = self._file_info(files[file_id])
+                    file_info["match"] = match
+                    file_list.append(file_info)
+
+            return {"success": True, "files": file_list, "count": len(file_list)}
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error buscando archivos: {e}",
+                "files": [],
+                "count": 0,
+            }
+        finally:
+            session.close()
+
+    @staticmethod
+    def _search_name_prefix(session: Session, user_id: int, term: str, limit: int):
+        """IDs de los archivos cuyo nombre empieza por `term` (rango del índice)"""
+        # `term` y `nombre_minusculas` se pasan a minúsculas con str.lower
+        lowered_name = Archivo.nombre_minusculas
+        rows = (
+            session.query(Archivo.id_archivo)
+            .filter(
+                Archivo.usuario_id == user_id,
+                lowered_name >= term,
+                lowered_name < term + "\U0010ffff",
+            )
+            .order_by(lowered_name, Archivo.id_archivo)
+            .limit(limit)
+        )
+        return [file_id for (file_id,) in rows]
+
+    @staticmethod
+    def _trigram_counts(session: Session, grams: list) -> dict:
+        """
+        Cuenta en cuántos archivos aparece cada trigrama, hasta
+        SEARCH_RARE_LIMIT: solo interesa distinguir los poco frecuentes, y
+        contar todas las apariciones de un trigrama común es costoso
+
+        Args:
+            session (Session): Sesión de base de datos
+            grams (list): Trigramas de la búsqueda
+
+        Returns:
+            dict: {trigrama: apariciones (como máximo SEARCH_RARE_LIMIT)}
+        """
+        # En búsquedas largas basta una muestra repartida por todo el texto
+        step = max(1, len(grams) // SEARCH_MAX_SAMPLED)
+        counts = {}
+        for gram in grams[::step]:
+            counts[gram] = session.execute(
+                text(
+                    f"SELECT count(*) FROM (SELECT rowid FROM {SEARCH_TABLE} "
+                    f"WHERE {SEARCH_TABLE} MATCH :match LIMIT :cap)"
+                ),
+                {"match": phrase(gram), "cap": SEARCH_RARE_LIMIT},
+            ).scalar()
+        return counts
+
+    @staticmethod
+    def _iter_fts_candidates(session: Session, user_id: int, grams: list, operator):
+        """
+        Recorre (id, nombre) de los archivos del usuario que contienen los
+        trigramas indicados (unidos con AND u OR), de los más recientes a los
+        más antiguos, sin calcular relevancia sobre todas las coincidencias
+        """
+        return session.execute(
+            text(
+                f"SELECT a.id_archivo, a.nombre_archivo FROM {SEARCH_TABLE} AS f "
+                "JOIN archivos AS a ON a.id_archivo = f.rowid "
+                f"WHERE {SEARCH_TABLE} MATCH :match AND a.usuario_id = :user_id "
+                "ORDER BY f.rowid DESC"
+            ),
+            {
+                "match": f" {operator} ".join(phrase(g) for g in grams),
+                "user_id": user_id,
+            },
+        )
+
+    def _search_substring(
+        self,
+        session: Session,
+        user_id: int,
+        term: str,
+        counts: dict,
+        limit: int,
+        exclude: list,
+    ):
+        """IDs de los archivos cuyo nombre contiene `term`, ordenados por relevancia"""
+        # Los trigramas menos frecuentes acotan los candidatos; entre los
+        # comunes se prefieren el primero, el último y el del medio, que
+        # juntos descartan más nombres que trigramas contiguos. El nombre se
+        # comprueba después porque tener los trigramas no implica contener
+        # el texto completo
+        grams = list(counts)
+        spread = [grams[0], grams[-1], grams[len(grams) // 2]]
+        rare = sorted(
+            grams,
+            key=lambda g: (counts[g], spread.index(g) if g in spread else 3),
+        )[:SEARCH_MAX_TERMS]
+        excluded = set(exclude)
+
+        candidates = []
+        for file_id, name in self._iter_fts_candidates(session, user_id, rare, "AND"):
+            lowered = name.lower()
+            position = lowered.find(term)
+            if position < 0 or file_id in excluded:
+                continue
+            if position == 0:
+                tier = 0
+            elif not lowered[position - 1].isalnum():
+                tier = 1  # Una palabra del nombre empieza por el texto
+            else:
+                tier = 2
+            candidates.append((tier, -file_id))
+            if len(candidates) >= SEARCH_CANDIDATES:
+                break
+
+        candidates.sort()
+        return [-negative_id for _, negative_id in candidates[:limit]]
+
+    def _search_fuzzy(
+        self,
+        session: Session,
+        user_id: int,
+        grams: list,
+        counts: dict,
+        limit: int,
+        exclude: list,
+    ):
+        """IDs de archivos con nombres parecidos a la búsqueda según sus trigramas"""
+        # Solo los trigramas poco frecuentes: con los muy comunes cualquier
+        # nombre sería candidato y la búsqueda dejaría de estar acotada
+        selected = [g for g in counts if 0 < counts[g] < SEARCH_RARE_LIMIT]
+        if not selected:
+            return []
+
+        excluded = set(exclude)
+        scored = []
+        rows = self._iter_fts_candidates(session, user_id, selected, "OR")
+        for file_id, name in rows.fetchmany(SEARCH_CANDIDATES):
+            if file_id in excluded:
+                continue
+            # Parecido: proporción de trigramas de la búsqueda en el nombre
+            name_grams = set(trigrams(name.lower()))
+            similarity = sum(g in name_grams for g in grams) / len(grams)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((-similarity, -file_id))
+
+        scored.sort()
+        return [-negative_id for _, negative_id in scored[:limit]]
+
+    def rename_file(self, user_id: int, file_id: int, new_name: str) -> dict:
+        """
+        Cambia el nombre visible de un archivo (el archivo cifrado no cambia)
+
+        Args:
+            user_id (int): ID del usuario
+            file_id (int): ID del archivo
+            new_name (str): Nuevo nombre del archivo
+
+        Returns:
+            dict: {"success": bool, "message": str}
+        """
+        new_name = (new_name or "").strip()
+        if not new_name or os.path.basename(new_name) != new_name:
+            return {"success": False, "message": "Nombre de archivo no válido"}
+
+        session = self.db_manager.get_session()
+        try:
+            file = (
+                session.query(Archivo)
+                .filter(Archivo.id_archivo == file_id, Archivo.usuario_id == user_id)
+                .first()
+            )
+
+            if not file:
+                return {
+                    "success": False,
+                    "message": "Archivo no encontrado o no pertenece al usuario",
+                }
+
+            old_name = file.nombre_archivo
+            file.nombre_archivo = new_name
+            file.nombre_minusculas = new_name.lower()
+            file.extension = _file_extension(new_name)
+            file.tipo_mime = _guess_mime_type(new_name)
+            session.commit()
+
+            self._log_event(
+                user_id, f"Archivo renombrado: {old_name} -> {new_name}", EVENT_RENAME
+            )
+
+            return {
+                "success": True,
+                "message": f"Archivo renombrado a '{new_name}'",
+            }
+
+        except Exception as e:
+            session.rollback()
+            return {"success": False, "message": f"Error al renombrar archivo: {e}"}
+        finally:
+            session.close()
+
+    @staticmethod
+    def _file_info(file: Archivo) -> dict:
+        """Convierte un registro `Archivo` en el diccionario que usa la interfaz"""
+        return {
+            "id": file.id_archivo,
+            "nombre": file.nombre_archivo,
+            "fecha_subida": file.fecha_subida,
+            "size_bytes": file.tamano_original or 0,
+            "size_mb": round((file.tamano_original or 0) / 1024 / 1024, 2),
+            "encrypted_size_bytes": file.tamano_cifrado or 0,
+            "mime": file.tipo_mime,
+            "hash": file.hash_contenido,
+            "compression": file.compresion,
+        }
+
+    def download_file(
+        self,
+        user_id: int,
+        file_id: int,
+        output_path: str,
+        progress_callback=None,
+        cancel_event=None,
+    ) -> dict:
+        """
+        RF-06: Descarga y descifra un archivo
+
+        Args:
+            user_id (int): ID del usuario
+            file_id (int): ID del archivo
+            output_path (str): Ruta donde guardar el archivo descifrado
+            progress_callback (callable): Recibe los bytes descifrados en cada
+                paso (opcional)
+            cancel_event (threading.Event): Si se activa, la descarga se detiene
+                sin dejar un archivo de salida parcial (opcional)
+
+        Returns:
+            dict: {"success": bool, "message": str, "output_path": str}
+        """
+        session = self.db_manager.get_session()
+        try:
+            # Verificar que el archivo pertenece al usuario
+            file = (
+                session.query(Archivo)
+                .filter(Archivo.id_archivo == file_id, Archivo.usuario_id == user_id)
+                .first()
+            )
+
+            if not file:
+                return {
+                    "success": False,
+                    "message": "Archivo no encontrado o no pertenece al usuario",
+                    "output_path": None,
+                }
+
+            if not os.path.exists(file.ruta_archivo):
+                return {
+                    "success": False,
+                    "message": "El archivo cifrado no existe en el sistema",
+                    "output_path": None,
+                }
+
+            # Descifrar bloque a bloque hacia un archivo temporal
+            self._decrypt_to_path(
+                file.ruta_archivo,
+                output_path,
+                progress_callback,
+                cancel_event,
+                wrapped_key=file.clave_envuelta,
+                refresh_key=True,
+            )
+
+            # Registrar evento
+            self._log_event(
+                user_id, f"Archivo descargado: {file.nombre_archivo}", EVENT_DOWNLOAD
+            )
+
+            if file.formato == BLOB_FORMAT_FERNET:
+                self._upgrade_legacy_blob(session, file)
+
+            return {
+                "success": True,
+                "message": f"Archivo '{file.nombre_archivo}' descargado correctamente",
+                "output_path": output_path,
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error al descargar archivo: {e}",
+                "output_path": None,
+            }
+        finally:
+            session.close()
+
+    def download_files(
+        self,
+        user_id: int,
+        file_ids: list,
+        dest_dir: str,
+        archive_format: str = None,
+        archive_name: str = None,
+        progress_callback=None,
+        cancel_event=None,
+    ) -> dict:
+        """
+        RF-06: Descarga y descifra varios archivos en una sola operación
+
+        Los metadatos se obtienen con una sola consulta y los eventos se
+        registran en una sola transacción. Sin `archive_format`, cada archivo
+        se descifra en paralelo hacia `dest_dir`; con "zip" o "tar", todos se
+        escriben secuencialmente dentro de un único archivo empaquetado.
+
+        Args:
+            user_id (int): ID del usuario
+            file_ids (list): IDs de los archivos a descargar
+            dest_dir (str): Carpeta de destino
+            archive_format (str): None, "zip" o "tar"
+            archive_name (str): Nombre del paquete (opcional)
+            progress_callback (callable): Recibe los bytes descifrados en cada
+                paso; se llama desde los hilos de descifrado (opcional)
+            cancel_event (threading.Event): Detiene la exportación sin dejar
+                archivos de salida ni paquetes parciales (opcional)
+
+        Returns:
+            dict: {"success": bool, "message": str, "results": list,
+                   "downloaded": int, "failed": int, "archive_path": str}
+        """
+        results = {
+            file_id: {
+                "file_id": file_id,
+                "success": False,
+                "message": "Archivo no encontrado o no pertenece al usuario",
+                "output_path": None,
+            }
+            for file_id in file_ids
+        }
+        archive_path = None
+
+        if archive_format is not None and archive_format not in ARCHIVE_FORMATS:
+            return {
+                "success": False,
+                "message": f"Formato de exportación no soportado: {archive_format}",
+                "results": list(results.values()),
+                "downloaded": 0,
+                "failed": len(results),
+                "archive_path": None,
+            }
+
+        session = self.db_manager.get_session()
+        try:
+            # Una sola consulta para todos los archivos del usuario
+            files = (
+                session.query(Archivo)
+                .filter(
+                    Archivo.id_archivo.in_(list(results)),
+                    Archivo.usuario_id == user_id,
+                )
+                .order_by(Archivo.id_archivo)
+                .all()
+            )
+
+            available = []
+            for file in files:
+                if os.path.exists(file.ruta_archivo):
+                    available.append(file)
+                else:
+                    results[file.id_archivo][
+                        "message"
+                    ] = "El archivo cifrado no existe en el sistema"
+
+            output_names = self._unique_output_names(
+                [file.nombre_archivo for file in available]
+            )
+
+            if archive_format:
+                if not archive_name:
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    archive_name = f"fortifile_export_{timestamp}"
+                if not archive_name.endswith(ARCHIVE_FORMATS[archive_format]):
+                    archive_name += ARCHIVE_FORMATS[archive_format]
+                archive_path = os.path.join(dest_dir, archive_name)
+                self._export_archive(
+                    available,
+                    output_names,
+                    archive_path,
+                    archive_format,
+                    results,
+                    progress_callback,
+                    cancel_event,
+                )
+            else:
+                self._export_directory(
+                    available,
+                    output_names,
+                    dest_dir,
+                    results,
+                    progress_callback,
+                    cancel_event,
+                )
+
+            # Registrar todos los eventos en una sola transacción
+            downloaded_files = [
+                file for file in available if results[file.id_archivo]["success"]
+            ]
+            for file in downloaded_files:
+                session.add(
+                    Evento(
+                        descripcion=f"Archivo descargado: {file.nombre_archivo}",
+                        usuario_id=user_id,
+                        fecha_evento=datetime.utcnow(),
+                        tipo=EVENT_DOWNLOAD,
+                    )
+                )
+            if downloaded_files:
+                session.commit()
+
+        except Exception as e:
+            session.rollback()
+            for result in results.values():
+                if not result["success"]:
+                    result["message"] = f"Error al descargar archivo: {e}"
+        finally:
+            session.close()
+
+        downloaded = sum(1 for result in results.values() if result["success"])
+        failed = len(results) - downloaded
+
+        return {
+            "success": failed == 0,
+            "message": f"{downloaded} archivo(s) descargado(s), {failed} con error",
+            "results": list(results.values()),
+            "downloaded": downloaded,
+            "failed": failed,
+            "archive_path": archive_path if downloaded else None,
+        }
+
+    def _export_directory(
+        self,
+        files,
+        output_names,
+        dest_dir,
+        results,
+        progress_callback=None,
+        cancel_event=None,
+    ):
+        """Descifra cada archivo en paralelo hacia su propio archivo de salida"""
+
+        def export(file, output_name):
+            output_path = os.path.join(dest_dir, output_name)
+            self._decrypt_to_path(
+                file.ruta_archivo,
+                output_path,
+                progress_callback,
+                cancel_event,
+                wrapped_key=file.clave_envuelta,
+                refresh_key=True,
+            )
+            return output_path
+
+        with ThreadPoolExecutor(max_workers=self.encryption_workers) as executor:
+            futures = [
+                (file, executor.submit(export, file, output_name))
+                for file, output_name in zip(files, output_names)
+            ]
+            for file, future in futures:
+                result = results[file.id_archivo]
+                try:
+                    result.update(
+                        success=True,
+                        message=f"Archivo '{file.nombre_archivo}' descargado correctamente",
+                        output_path=future.result(),
+                    )
+                except Exception as e:
+                    result["message"] = f"Error al descargar archivo: {e}"
+
+    def _export_archive(
+        self,
+        files,
+        output_names,
+        archive_path,
+        archive_format,
+        results,
+        progress_callback=None,
+        cancel_event=None,
+    ):
+        """
+        Escribe todos los archivos descifrados dentro de un único paquete.
+
+        El paquete se construye en un archivo temporal con una sola
+        escritura secuencial y se renombra al terminar; si algún archivo no
+        se puede descifrar, no se genera ningún paquete.
+        """
+        output_dir = os.path.dirname(os.path.abspath(archive_path))
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".fortifile_", suffix=".part", dir=output_dir
+        )
+        try:
+            with os.fdopen(fd, "wb") as output_file:
+                if archive_format == "zip":
+                    with zipfile.ZipFile(output_file, "w", zipfile.ZIP_STORED) as zf:
+                        for file, name in zip(files, output_names):
+                            with zf.open(name, "w", force_zip64=True) as member:
+                                for chunk in self._iter_decrypted_blob(
+                                    file.ruta_archivo,
+                                    progress_callback,
+                                    cancel_event,
+                                    wrapped_key=file.clave_envuelta,
+                                    refresh_key=True,
+                                ):
+                                    member.write(chunk)
+                else:
+                    with tarfile.open(fileobj=output_file, mode="w") as tf:
+                        for file, name in zip(files, output_names):
+                            tar_info = tarfile.TarInfo(name)
+                            tar_info.size = (
+                                file.tamano_original
+                                if file.tamano_original is not None
+                                else self._blob_plaintext_size(
+                                    file.ruta_archivo,
+                                    file.clave_envuelta,
+                                    refresh_key=True,
+                                )
+                            )
+                            if file.fecha_subida:
+                                # fecha_subida se guarda en UTC
+                                tar_info.mtime = calendar.timegm(
+                                    file.fecha_subida.utctimetuple()
+                                )
+                            tf.addfile(
+                                tar_info,
+                                io.BufferedReader(
+                                    _ChunkReader(
+                                        self._iter_decrypted_blob(
+                                            file.ruta_archivo,
+                                            progress_callback,
+                                            cancel_event,
+                                            wrapped_key=file.clave_envuelta,
+                                            refresh_key=True,
+                                        )
+                                    )
+                                ),
+                            )
+            os.replace(temp_path, archive_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        for file in files:
+            results[file.id_archivo].update(
+                success=True,
+                message=f"Archivo '{file.nombre_archivo}' exportado correctamente",
+                output_path=archive_path,
+            )
+
+    @staticmethod
+    def _unique_output_names(names: list) -> list:
+        """Evita que dos archivos con el mismo nombre se sobrescriban"""
+        used = set()
+        unique_names = []
+        for name in names:
+            candidate = name
+            stem, ext = os.path.splitext(name)
+            counter = 2
+            while candidate in used:
+                candidate = f"{stem} ({counter}){ext}"
+                counter += 1
+            used.add(candidate)
+            unique_names.append(candidate)
+        return unique_names
+
+    def read_range(self, user_id: int, file_id: int, offset: int, length: int) -> dict:
+        """
+        Lee un rango del contenido descifrado de un archivo.
+
+        Solo se descifran los bloques que cubren el rango, por lo que leer
+        la cabecera de un archivo grande no requiere descifrarlo completo.
+
+        Args:
+            user_id (int): ID del usuario
+            file_id (int): ID del archivo
+            offset (int): Posición inicial en bytes del contenido original
+            length (int): Cantidad máxima de bytes a leer
+
+        Returns:
+            dict: {"success": bool, "message": str, "data": bytes, "total_size": int}
+        """
+        if offset < 0 or length < 0:
+            return {
+                "success": False,
+                "message": "El offset y la longitud deben ser positivos",
+                "data": b"",
+                "total_size": 0,
+            }
+
+        session = self.db_manager.get_session()
+        try:
+            # Verificar que el archivo pertenece al usuario
+            file = (
+                session.query(Archivo)
+                .filter(Archivo.id_archivo == file_id, Archivo.usuario_id == user_id)
+                .first()
+            )
+
+            if not file:
+                return {
+                    "success": False,
+                    "message": "Archivo no encontrado o no pertenece al usuario",
+                    "data": b"",
+                    "total_size": 0,
+                }
+
+            if not os.path.exists(file.ruta_archivo):
+                return {
+                    "success": False,
+                    "message": "El archivo cifrado no existe en el sistema",
+                    "data": b"",
+                    "total_size": 0,
+                }
+
+            data, total_size = self._read_blob_range(
+                file.ruta_archivo,
+                offset,
+                length,
+                file.clave_envuelta,
+                refresh_key=True,
+            )
+
+            if file.formato == BLOB_FORMAT_FERNET:
+                self._upgrade_legacy_blob(session, file)
+
+            return {
+                "success": True,
+                "message": f"{len(data)} bytes leídos de '{file.nombre_archivo}'",
+                "data": data,
+                "total_size": total_size,
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error al leer archivo: {e}",
+                "data": b"",
+                "total_size": 0,
+            }
+        finally:
+            session.close()
+
+    def delete_file(self, user_id: int, file_id: int) -> dict:
+        """
+        RF-07: Elimina un archivo de forma segura
+
+        Al borrar el registro se destruye su clave de datos envuelta (la BD
+        usa secure_delete): el blob deja de poder descifrarse aunque quede
+        una copia del texto cifrado. Si nadie más comparte el blob, también
+        se borra del disco.
+
+        Args:
+            user_id (int): ID del usuario
+            file_id (int): ID del archivo
+
+        Returns:
+            dict: {"success": bool, "message": str}
+        """
+        session = self.db_manager.get_session()
+        try:
+            # Verificar que el archivo pertenece al usuario
+            file = (
+                session.query(Archivo)
+                .filter(Archivo.id_archivo == file_id, Archivo.usuario_id == user_id)
+                .first()
+            )
+
+            if not file:
+                return {
+                    "success": False,
+                    "message": "Archivo no encontrado o no pertenece al usuario",
+                }
+
+            filename = file.nombre_archivo
+            file_path = file.ruta_archivo
+
+            # Eliminar registro de base de datos
+            session.delete(file)
+            session.commit()
+
+            # Eliminar el blob cifrado si era su última referencia
+            release_unreferenced_blobs(session, [file_path])
+
+            # Registrar evento
+            self._log_event(
+                user_id, f"Archivo eliminado: {filename}", EVENT_DELETE, critical=True
+            )
+
+            return {
+                "success": True,
+                "message": f"Archivo '{filename}' eliminado correctamente",
+            }
+
+        except Exception as e:
+            session.rollback()
+            return {"success": False, "message": f"Error al eliminar archivo: {e}"}
+        finally:
+            session.close()
+
+    def _encrypt_to_store(
+        self,
+        source_file_path: str,
+        original_filename: str,
+        workers: int = None,
+        progress_callback=None,
+        cancel_event=None,
+    ) -> dict:
+        """
+        Guarda un archivo en el almacén direccionado por contenido
+
+        La dirección del blob depende solo del contenido (ver `_hash_source`),
+        así que archivos idénticos comparten un único blob cifrado y su
+        clave de datos: si ya existe, no se vuelve a cifrar ni a escribir
+        nada. Un blob nuevo se cifra con una clave de datos aleatoria. Si el
+        cifrado falla o se cancela, no queda ningún blob parcial.
+
+        Args:
+            source_file_path (str): Ruta del archivo a cifrar
+            original_filename (str): Nombre original del archivo
+            workers (int): Hilos de cifrado (por defecto los del servicio)
+            progress_callback (callable): Recibe los bytes cifrados (opcional)
+            cancel_event (threading.Event): Cancela el cifrado (opcional)
+
+        Returns:
+            dict: {"nombre": str, "ruta": str, "hash": str, "mime": str,
+                   "plaintext_size": int, "ciphertext_size": int,
+                   "frames": int | None, "codec": str, "deduplicated": bool,
+                   "data_key": bytes | None}
+        """
+        digests = self._hash_source(source_file_path, cancel_event)
+        blob_path = self._blob_path(digests["address"])
+
+        # Dos subidas simultáneas del mismo contenido cifran una sola vez
+        with blob_lock(blob_path):
+            deduplicated = False
+            if os.path.exists(blob_path):
+                # Un blob cuya clave ya se destruyó no se puede reutilizar
+                deduplicated, data_key = self._blob_data_key(blob_path)
+            if deduplicated:
+                if progress_callback:
+                    progress_callback(digests["size"])
+                info = {
+                    "plaintext_size": digests["size"],
+                    "ciphertext_size": os.path.getsize(blob_path),
+                    "frames": None,
+                    "codec": self._blob_format(blob_path)[1],
+                }
+            else:
+                data_key = generate_data_key()
+                with open(source_file_path, "rb") as source:
+                    info = self._write_blob(
+                        source,
+                        blob_path,
+                        original_filename,
+                        data_key,
+                        expected_stat=digests["stat"],
+                        workers=workers,
+                        progress_callback=progress_callback,
+                        cancel_event=cancel_event,
+                    )
+                self._pending_data_keys[blob_path] = data_key
+
+        return {
+            "nombre": original_filename,
+            "ruta": blob_path,
+            "hash": digests["hash"],
+            "mime": _guess_mime_type(original_filename),
+            "deduplicated": deduplicated,
+            "data_key": data_key,
+            "stat": digests["stat"],
+            **info,
+        }
+
+    def _blob_data_key(self, blob_path: str) -> tuple:
+        """
+        Obtiene la clave de datos de un blob ya guardado
+
+        Returns:
+            tuple: (se conoce su clave, clave de datos o None si el blob
+                    está cifrado con la clave maestra). Un blob sin
+                    registros (pendiente de eliminar) ya no tiene clave.
+        """
+        data_key = self._pending_data_keys.get(blob_path)
+        if data_key is not None:
+            return True, data_key
+        session = self.db_manager.get_session()
+        try:
+            row = (
+                session.query(Archivo.clave_envuelta)
+                .filter(Archivo.ruta_archivo == blob_path)
+                .first()
+            )
+        finally:
+            session.close()
+        if row is None:
+            return False, None
+        if row.clave_envuelta is None:
+            return True, None
+        self._refresh_master_key()
+        return True, self.key_wrapper.unwrap(row.clave_envuelta)
+
+    def _forget_data_key(self, blob: dict):
+        """Descarta la clave de un blob nuevo una vez registrado (o descartado)"""
+        if not blob["deduplicated"]:
+            self._pending_data_keys.pop(blob["ruta"], None)
+
+    def _data_cipher(self, data_key: bytes = None) -> StreamCipher:
+        """Cifrador de un blob con su clave de datos (o la clave maestra)"""
+        if data_key is None:
+            return self.stream_cipher
+        return StreamCipher(data_key, workers=self.encryption_workers)
+
+    def _blob_cipher(self, wrapped_key: bytes = None) -> StreamCipher:
+        """Cifrador de un blob a partir de la clave envuelta de su registro"""
+        if wrapped_key is None:
+            return self.stream_cipher
+        self._refresh_master_key()
+        return self._data_cipher(self.key_wrapper.unwrap(wrapped_key))
+
+    def _recover_blob_swaps(self) -> int:
+        """
+        Termina los reemplazos de blobs re-cifrados que quedaron a medias
+
+        Solo los deja a medias una caída, así que se recuperan una vez por
+        proceso y BD. Se hace con `_master_key_lock`, que BlobMigration
+        mantiene desde que registra un reemplazo hasta que lo confirma: un
+        reemplazo en curso nunca se ve como interrumpido.
+
+        Returns:
+            int: Reemplazos completados
+        """
+        with _recovered_swaps_lock:
+            if self.db_manager.engine in _recovered_swaps:
+                return 0
+            _recovered_swaps.add(self.db_manager.engine)
+        with self._master_key_lock():
+            return self._complete_blob_swaps()
+
+    def _complete_blob_swaps(self) -> int:
+        """
+        Completa o descarta los reemplazos registrados en `intercambios_blob`
+
+        Si el blob en disco ya es el nuevo (su índice se autentica con la
+        clave nueva), se actualizan sus registros; si no, se conserva el
+        anterior y el re-cifrado se repite al reanudar la migración. Debe
+        llamarse con `_master_key_lock`.
+
+        Returns:
+            int: Reemplazos completados
+        """
+        session = self.db_manager.get_session()
+        try:
+            swaps = session.query(IntercambioBlob).all()
+        except Exception:
+            # BD todavía sin tablas
+            session.close()
+            return 0
+
+        completed = 0
+        try:
+            for swap in swaps:
+                try:
+                    with open(swap.ruta_archivo, "rb") as encrypted_file:
+                        self._blob_cipher(swap.clave_envuelta).read_index(
+                            encrypted_file
+                        )
+                    replaced = True
+                except Exception:
+                    replaced = False
+                if replaced:
+                    self._apply_blob_swap(session, swap)
+                    completed += 1
+                elif os.path.exists(swap.ruta_archivo + SWAP_TEMP_SUFFIX):
+                    os.remove(swap.ruta_archivo + SWAP_TEMP_SUFFIX)
+                session.delete(swap)
+                session.commit()
+            if completed:
+                print(f"✅ {completed} blob(s) re-cifrado(s) recuperado(s)")
+            return completed
+        except Exception as e:
+            session.rollback()
+            print(f"⚠️ No se pudieron recuperar los blobs re-cifrados: {e}")
+            return completed
+        finally:
+            session.close()
+
+    @staticmethod
+    def _apply_blob_swap(session: Session, swap: IntercambioBlob) -> int:
+        """
+        Actualiza los registros de un blob re-cifrado (sin confirmar)
+
+        Returns:
+            int: Registros actualizados
+        """
+        return (
+            session.query(Archivo)
+            .filter(Archivo.ruta_archivo == swap.ruta_archivo)
+            .update(
+                {
+                    Archivo.clave_envuelta: swap.clave_envuelta,
+                    Archivo.formato: FORMAT_VERSION,
+                    Archivo.compresion: swap.compresion,
+                    Archivo.tamano_cifrado: swap.tamano_cifrado,
+                    Archivo.fecha_verificacion: None,
+                },
+                synchronize_session=False,
+            )
+        )
+
+    def _hash_source(self, source_file_path: str, cancel_event=None) -> dict:
+        """
+        Calcula el SHA-256 de un archivo y su dirección en el almacén
+
+        La dirección es un HMAC del SHA-256 con una clave derivada de la
+        clave maestra: no revela el hash del contenido a quien vea los
+        nombres de `secure_files/` y solo requiere leer el archivo una vez.
+
+        Returns:
+            dict: {"hash": str, "address": str, "size": int,
+                   "stat": (tamaño, mtime_ns) del archivo al calcular el hash}
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with open(source_file_path, "rb") as source:
+            stat = _source_stat(source)
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise TransferCancelled("Transferencia cancelada")
+                data = source.read(HASH_READ_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                size += len(data)
+        address = hmac.new(self.address_key, digest.digest(), hashlib.sha256)
+        return {
+            "hash": digest.hexdigest(),
+            "address": address.hexdigest(),
+            "size": size,
+            "stat": stat,
+        }
+
+    def _blob_path(self, address: str) -> str:
+        """Ruta del blob de una dirección (repartida en subdirectorios)"""
+        return os.path.join(self.objects_directory, address[:2], f"{address}.enc")
+
+    def _write_blob(
+        self,
+        source,
+        blob_path: str,
+        original_filename: str,
+        data_key: bytes,
+        expected_stat: tuple = None,
+        workers: int = None,
+        progress_callback=None,
+        cancel_event=None,
+    ) -> dict:
+        """
+        Comprime (si conviene) y cifra un flujo hacia `blob_path` a través
+        de un temporal
+
+        El códec se elige según la extensión y una muestra del inicio del
+        contenido. El blob solo aparece con su nombre definitivo cuando está
+        completo. Con `expected_stat`, si el archivo de origen cambió desde
+        que se calculó su dirección (otro tamaño o fecha de modificación),
+        se descarta: el blob no correspondería a su dirección.
+
+        Args:
+            source: Archivo de origen abierto en modo binario (con seek)
+            blob_path (str): Ruta final del blob
+            original_filename (str): Nombre original (para elegir el códec)
+            data_key (bytes): Clave de datos del blob (None: clave maestra)
+            expected_stat (tuple): (tamaño, mtime_ns) al calcular el hash
+
+        Returns:
+            dict: {"plaintext_size": int, "ciphertext_size": int, "frames": int,
+                   "codec": str}
+        """
+
+        def check_unchanged():
+            if expected_stat is not None and _source_stat(source) != expected_stat:
+                raise ValueError("El archivo cambió durante la subida")
+
+        blob_dir = os.path.dirname(blob_path)
+        os.makedirs(blob_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".part", dir=blob_dir)
+        try:
+            with os.fdopen(fd, "wb") as encrypted_file:
+                check_unchanged()
+                start = source.tell()
+                codec = choose_codec(
+                    original_filename, source.read(SAMPLE_SIZE), self.compression
+                )
+                source.seek(start)
+                info = self._data_cipher(data_key).encrypt_stream(
+                    _ProgressReader(source, progress_callback, cancel_event),
+                    encrypted_file,
+                    workers=workers,
+                    codec=codec,
+                )
+                check_unchanged()
+            os.replace(temp_path, blob_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return {**info, "codec": CODEC_NAMES[codec]}
+
+    @staticmethod
+    def _blob_format(encrypted_path: str) -> tuple:
+        """
+        Formato y códec de compresión de un blob, leídos sin descifrarlo
+
+        Returns:
+            tuple: (valor de Archivo.formato, nombre del códec)
+        """
+        with open(encrypted_path, "rb") as encrypted_file:
+            prefix = encrypted_file.read(HEADER_SIZE)
+        if not is_stream_container(prefix):
+            return BLOB_FORMAT_FERNET, CODEC_NAMES[CODEC_NONE]
+        return prefix[len(MAGIC)], CODEC_NAMES[container_codec(prefix)]
+
+    def _ensure_blob(self, blob: dict, source_file_path: str):
+        """
+        Vuelve a escribir un blob reutilizado si se eliminó mientras se
+        registraba la subida (su última referencia se borró en paralelo)
+        """
+        with blob_lock(blob["ruta"]):
+            if not os.path.exists(blob["ruta"]):
+                with open(source_file_path, "rb") as source:
+                    self._write_blob(
+                        source,
+                        blob["ruta"],
+                        blob["nombre"],
+                        blob["data_key"],
+                        expected_stat=blob["stat"],
+                        workers=1,
+                    )
+
+    def _upgrade_legacy_blob(self, session: Session, file: Archivo) -> bool:
+        """
+        Reescribe un token Fernet heredado en el almacén por contenido
+
+        El token se descifra completo (el formato antiguo no permite otra
+        cosa), se vuelve a cifrar en el contenedor por bloques y se actualizan
+        los registros que lo usaban. Un error no afecta al archivo original:
+        se registra y se reintenta en el próximo acceso.
+
+        Args:
+            session (Session): Sesión de base de datos
+            file (Archivo): Registro con formato BLOB_FORMAT_FERNET
+
+        Returns:
+            bool: True si el archivo quedó en el nuevo formato
+        """
+        old_path = file.ruta_archivo
+        blob_path = None
+        deduplicated = False
+        pending_key = False
+        try:
+            with open(old_path, "rb") as encrypted_file:
+                plaintext = self.cipher.decrypt(encrypted_file.read())
+            digest = hashlib.sha256(plaintext)
+            address = hmac.new(self.address_key, digest.digest(), hashlib.sha256)
+            blob_path = self._blob_path(address.hexdigest())
+
+            with blob_lock(blob_path):
+                if (
+                    os.path.exists(blob_path)
+                    and self._blob_format(blob_path)[0] != BLOB_FORMAT_FERNET
+                ):
+                    deduplicated, data_key = self._blob_data_key(blob_path)
+                if deduplicated:
+                    codec = self._blob_format(blob_path)[1]
+                else:
+                    data_key = generate_data_key()
+                    codec = self._write_blob(
+                        io.BytesIO(plaintext), blob_path, file.nombre_archivo, data_key
+                    )["codec"]
+                    # Hasta confirmar los registros, una subida del mismo
+                    # contenido reutiliza esta clave (ver _encrypt_to_store)
+                    self._pending_data_keys[blob_path] = data_key
+                    pending_key = True
+
+            with self._master_key_lock():
+                session.query(Archivo).filter(Archivo.ruta_archivo == old_path).update(
+                    {
+                        Archivo.ruta_archivo: blob_path,
+                        Archivo.formato: FORMAT_VERSION,
+                        Archivo.compresion: codec,
+                        Archivo.tamano_original: len(plaintext),
+                        Archivo.tamano_cifrado: os.path.getsize(blob_path),
+                        Archivo.hash_contenido: digest.hexdigest(),
+                        Archivo.clave_envuelta: (
+                            self.key_wrapper.wrap(data_key) if data_key else None
+                        ),
+                    },
+                    synchronize_session=False,
+                )
+                session.commit()
+            release_unreferenced_blobs(session, [old_path])
+            print(f"✅ Archivo convertido al nuevo formato: {file.nombre_archivo}")
+            return True
+
+        except Exception as e:
+            session.rollback()
+            if blob_path and not deduplicated:
+                release_unreferenced_blobs(session, [blob_path])
+            print(f"⚠️ No se pudo convertir {file.nombre_archivo}: {e}")
+            return False
+        finally:
+            if pending_key:
+                self._pending_data_keys.pop(blob_path, None)
+
+    def _new_archivo(self, user_id: int, blob: dict) -> Archivo:
+        """
+        Crea el registro de un archivo recién cifrado con sus metadatos
+
+        Debe llamarse con `_master_key_lock`: la clave de un blob reutilizado
+        se vuelve a leer porque pudo cambiar desde que se eligió (re-cifrado
+        por BlobMigration).
+        """
+        if blob["deduplicated"]:
+            found, data_key = self._blob_data_key(blob["ruta"])
+            if found:
+                blob["data_key"] = data_key
+        return Archivo(
+            nombre_archivo=blob["nombre"],
+            nombre_minusculas=blob["nombre"].lower(),
+            ruta_archivo=blob["ruta"],
+            usuario_id=user_id,
+            tamano_original=blob["plaintext_size"],
+            tamano_cifrado=blob["ciphertext_size"],
+            tipo_mime=blob["mime"],
+            hash_contenido=blob["hash"],
+            extension=_file_extension(blob["nombre"]),
+            compresion=blob["codec"],
+            formato=FORMAT_VERSION,
+            clave_envuelta=(
+                self.key_wrapper.wrap(blob["data_key"]) if blob["data_key"] else None
+            ),
+        )
+
+    def _iter_decrypted_blob(
+        self,
+        encrypted_path: str,
+        progress_callback=None,
+        cancel_event=None,
+        wrapped_key: bytes = None,
+        refresh_key: bool = False,
+    ):
+        """
+        Descifra un archivo cifrado en cualquiera de los formatos soportados
+
+        Los archivos nuevos usan el contenedor por bloques y se entregan
+        bloque a bloque; los archivos antiguos son un único token Fernet.
+
+        Args:
+            encrypted_path (str): Ruta del archivo cifrado
+            progress_callback (callable): Recibe los bytes de cada fragmento
+            cancel_event (threading.Event): Interrumpe el descifrado con
+                TransferCancelled
+            wrapped_key (bytes): Clave de datos envuelta del registro (None
+                en los blobs cifrados con la clave maestra)
+            refresh_key (bool): Si el blob no se autentica, volver a leer
+                la clave de su registro y reintentar (re-cifrado por
+                BlobMigration después de leer el registro)
+
+        Returns:
+            iterator: Fragmentos (bytes) del contenido descifrado
+        """
+        if refresh_key:
+            chunks = self._iter_blob_chunks(encrypted_path, wrapped_key)
+        else:
+            chunks = self._read_blob_chunks(encrypted_path, wrapped_key)
+        if progress_callback is None and cancel_event is None:
+            return chunks
+        return _track_progress(chunks, progress_callback, cancel_event)
+
+    def _iter_blob_chunks(self, encrypted_path: str, wrapped_key: bytes = None):
+        """
+        Fragmentos descifrados; si el primer bloque no se autentica porque
+        BlobMigration reemplazó el blob después de leer su registro, se
+        reintenta con la clave nueva (ver `_iter_decrypted_blob`)
+        """
+        started = False
+        try:
+            for chunk in self._read_blob_chunks(encrypted_path, wrapped_key):
+                started = True
+                yield chunk
+            return
+        except InvalidContainerError:
+            if started:
+                raise
+            changed, wrapped_key = self._reload_wrapped_key(encrypted_path, wrapped_key)
+            if not changed:
+                raise
+        yield from self._read_blob_chunks(encrypted_path, wrapped_key)
+
+    def _read_blob_chunks(self, encrypted_path: str, wrapped_key: bytes = None):
+        """Fragmentos descifrados de un blob con la clave indicada"""
+        with open(encrypted_path, "rb") as encrypted_file:
+            prefix = encrypted_file.read(HEADER_SIZE)
+            encrypted_file.seek(0)
+
+            if is_stream_container(prefix):
+                yield from self._blob_cipher(wrapped_key).iter_decrypt(encrypted_file)
+            else:
+                # Formato heredado: token Fernet de archivo completo
+                yield self.cipher.decrypt(encrypted_file.read())
+
+    def _read_blob_range(
+        self,
+        encrypted_path: str,
+        offset: int,
+        length: int,
+        wrapped_key=None,
+        refresh_key: bool = False,
+    ):
+        """
+        Lee un rango de texto plano de un archivo cifrado
+
+        Args:
+            encrypted_path (str): Ruta del archivo cifrado
+            offset (int): Posición inicial en el texto plano
+            length (int): Cantidad máxima de bytes a leer
+            wrapped_key (bytes): Clave de datos envuelta del registro
+            refresh_key (bool): Si el blob no se autentica, volver a leer
+                la clave de su registro y reintentar (re-cifrado por
+                BlobMigration después de leer el registro)
+
+        Returns:
+            tuple: (bytes del rango, tamaño total del texto plano)
+        """
+        if not refresh_key:
+            return self._read_blob_range_once(
+                encrypted_path, offset, length, wrapped_key
+            )
+        try:
+            return self._read_blob_range_once(
+                encrypted_path, offset, length, wrapped_key
+            )
+        except InvalidContainerError:
+            # Blob re-cifrado después de leer su registro
+            changed, wrapped_key = self._reload_wrapped_key(encrypted_path, wrapped_key)
+            if not changed:
+                raise
+        return self._read_blob_range_once(encrypted_path, offset, length, wrapped_key)
+
+    def _read_blob_range_once(
+        self, encrypted_path: str, offset: int, length: int, wrapped_key=None
+    ):
+        """Lee un rango con la clave indicada (ver `_read_blob_range`)"""
+        with open(encrypted_path, "rb") as encrypted_file:
+            prefix = encrypted_file.read(HEADER_SIZE)
+
+            if is_stream_container(prefix):
+                cipher = self._blob_cipher(wrapped_key)
+                index = cipher.read_index(encrypted_file)
+                data = b"".join(
+                    cipher.iter_range(encrypted_file, offset, length, index)
+                )
+                return data, index.plaintext_size
+
+            # Formato heredado: no admite acceso aleatorio
+            encrypted_file.seek(0)
+            plaintext = self.cipher.decrypt(encrypted_file.read())
+            return plaintext[offset : offset + length], len(plaintext)
+
+    def _reload_wrapped_key(self, encrypted_path: str, wrapped_key) -> tuple:
+        """
+        Vuelve a leer la clave envuelta de un blob que no se pudo autenticar
+
+        BlobMigration reemplaza el blob y actualiza sus registros con el lock
+        del blob, así que con ese lock el registro corresponde al blob que
+        está en disco.
+
+        Args:
+            encrypted_path (str): Ruta del blob
+            wrapped_key (bytes): Clave con la que falló la lectura
+
+        Returns:
+            tuple: (la clave cambió, clave envuelta registrada)
+        """
+        with blob_lock(encrypted_path):
+            session = self.db_manager.get_session()
+            try:
+                row = (
+                    session.query(Archivo.clave_envuelta)
+                    .filter(Archivo.ruta_archivo == encrypted_path)
+                    .first()
+                )
+            finally:
+                session.close()
+        if row is None or row.clave_envuelta == wrapped_key:
+            return False, wrapped_key
+        return True, row.clave_envuelta
+
+    def _blob_plaintext_size(
+        self, encrypted_path: str, wrapped_key=None, refresh_key: bool = False
+    ) -> int:
+        """
+        Obtiene el tamaño del contenido original de un archivo cifrado
+
+        Args:
+            encrypted_path (str): Ruta del archivo cifrado
+            wrapped_key (bytes): Clave de datos envuelta del registro
+            refresh_key (bool): Si el blob no se autentica, volver a leer
+                la clave de su registro y reintentar (re-cifrado por
+                BlobMigration después de leer el registro)
+
+        Returns:
+            int: Tamaño del texto plano en bytes
+        """
+        return self._read_blob_range(encrypted_path, 0, 0, wrapped_key, refresh_key)[1]
+
+    def _decrypt_to_path(
+        self,
+        encrypted_path: str,
+        output_path: str,
+        progress_callback=None,
+        cancel_event=None,
+        wrapped_key: bytes = None,
+        refresh_key: bool = False,
+    ) -> int:
+        """
+        Descifra un archivo hacia `output_path` de forma atómica.
+
+        Cada bloque se escribe en un archivo temporal junto al destino en
+        cuanto se verifica; solo al terminar se renombra al nombre final,
+        de modo que un error nunca deja un archivo descifrado a medias.
+
+        Args:
+            encrypted_path (str): Ruta del archivo cifrado
+            output_path (str): Ruta final del archivo descifrado
+            progress_callback (callable): Recibe los bytes de cada bloque
+            cancel_event (threading.Event): Cancela la descarga
+            wrapped_key (bytes): Clave de datos envuelta del registro
+            refresh_key (bool): Si el blob no se autentica, volver a leer
+                la clave de su registro y reintentar (re-cifrado por
+                BlobMigration después de leer el registro)
+
+        Returns:
+            int: Bytes de texto plano escritos
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".fortifile_", suffix=".part", dir=output_dir
+        )
+        try:
+            written = 0
+            with os.fdopen(fd, "wb") as output_file:
+                for chunk in self._iter_decrypted_blob(
+                    encrypted_path,
+                    progress_callback,
+                    cancel_event,
+                    wrapped_key,
+                    refresh_key,
+                ):
+                    output_file.write(chunk)
+                    written += len(chunk)
+            os.replace(temp_path, output_path)
+            return written
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _log_event(
+        self,
+        user_id: int,
+        description: str,
+        event_type: str = None,
+        critical: bool = False,
+    ):
+        """
+        Registra un evento del sistema
+
+        El evento se escribe por lotes en segundo plano (EventSink); los
+        críticos se escriben antes de volver.
+
+        Args:
+            user_id (int): ID del usuario
+            description (str): Descripción del evento
+            event_type (str): Tipo del evento (constantes EVENT_*)
+            critical (bool): Escribirlo de inmediato (bloqueos, eliminaciones)
+        """
+        self.events.log(user_id, description, event_type, critical=critical)
+
+    def get_storage_info(self, user_id: int = None) -> dict:
+        """
+        Obtiene información del almacenamiento
+
+        Lee los contadores que mantienen los triggers de `archivos`, sin
+        recorrer el directorio de archivos cifrados.
+
+        Args:
+            user_id (int): ID del usuario (por defecto, totales del sistema)
+
+        Returns:
+            dict: Información del almacenamiento, incluido el espacio que
+                  ahorra compartir blobs entre archivos idénticos
+        """
+        session = self.db_manager.get_session()
+        try:
+            stats = session.get(
+                EstadisticaAlmacenamiento,
+                GLOBAL_STATS_ID if user_id is None else user_id,
+            ) or EstadisticaAlmacenamiento(
+                archivos=0,
+                bytes_originales=0,
+                bytes_cifrados=0,
+                blobs=0,
+                bytes_en_disco=0,
+            )
+
+            info = {
+                "success": True,
+                "file_records": stats.archivos,
+                "original_size_mb": round(stats.bytes_originales / 1024 / 1024, 2),
+                "logical_size_mb": round(stats.bytes_cifrados / 1024 / 1024, 2),
+            }
+            if user_id is not None:
+                info["user_id"] = user_id
+                return info
+
+            info.update(
+                {
+                    "total_files": stats.blobs,
+                    "total_size_mb": round(stats.bytes_en_disco / 1024 / 1024, 2),
+                    "deduplicated_savings_mb": round(
+                        max(0, stats.bytes_cifrados - stats.bytes_en_disco)
+                        / 1024
+                        / 1024,
+                        2,
+                    ),
+                    "storage_directory": self.files_directory,
+                }
+            )
+            return info
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error obteniendo info de almacenamiento: {e}",
+            }
+        finally:
+            session.close()
+
+    def reconcile_storage_stats(self) -> dict:
+        """
+        Recalcula los contadores de almacenamiento a partir de la BD y el disco
+
+        Los contadores salen de `archivos` y los bytes en disco, del tamaño
+        real de cada blob en el directorio. También informa de los blobs
+        referenciados que faltan y de los que están en disco sin ningún
+        registro. El disco se recorre antes de abrir la transacción, para
+        no bloquear las subidas durante el recorrido; los blobs que
+        cambiaron mientras tanto se vuelven a comprobar.
+
+        Returns:
+            dict: {"success": bool, "message": str, "corrected": bool,
+                   "blobs": int, "missing_blobs": list, "orphan_blobs": list}
+        """
+        on_disk = {}
+        for directory, _, filenames in os.walk(self.files_directory):
+            for filename in filenames:
+                # Ignorar temporales de subidas en curso
+                if filename.endswith(".part"):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    on_disk[os.path.normpath(path)] = os.path.getsize(path)
+                except FileNotFoundError:
+                    # Blob liberado mientras se recorría el directorio
+                    continue
+
+        session = self.db_manager.get_session()
+        try:
+            before = self._stats_snapshot(session)
+            rebuild_storage_stats(session)
+
+            # Tamaño registrado de cada blob (el de su registro más antiguo)
+            recorded = {
+                os.path.normpath(path): size or 0
+                for path, size in session.query(
+                    Archivo.ruta_archivo, Archivo.tamano_cifrado
+                ).filter(
+                    Archivo.id_archivo.in_(
+                        session.query(func.min(Archivo.id_archivo)).group_by(
+                            Archivo.ruta_archivo
+                        )
+                    )
+                )
+            }
+            # Blobs escritos después del recorrido
+            for path in recorded.keys() - on_disk.keys():
+                try:
+                    on_disk[path] = os.path.getsize(path)
+                except FileNotFoundError:
+                    continue
+            # Los blobs que faltan conservan su tamaño registrado: los
+            # triggers lo restarán al eliminar su último registro
+            session.query(EstadisticaAlmacenamiento).filter(
+                EstadisticaAlmacenamiento.usuario_id == GLOBAL_STATS_ID
+            ).update(
+                {
+                    EstadisticaAlmacenamiento.bytes_en_disco: sum(
+                        on_disk.get(path, size) for path, size in recorded.items()
+                    ),
+                },
+                synchronize_session=False,
+            )
+            session.flush()
+
+            after = self._stats_snapshot(session)
+            session.commit()
+
+            missing = sorted(recorded.keys() - on_disk.keys())
+            # Sin contar los blobs liberados después del recorrido
+            orphans = sorted(
+                path
+                for path in on_disk.keys() - recorded.keys()
+                if os.path.exists(path)
+            )
+            corrected = before != after
+            print(
+                f"✅ Estadísticas de almacenamiento recalculadas: {len(recorded)} "
+                f"blob(s){' (corregidas)' if corrected else ''}"
+            )
+            return {
+                "success": True,
+                "message": (
+                    f"Estadísticas recalculadas: {len(recorded)} blob(s), "
+                    f"{len(missing)} faltante(s), {len(orphans)} sin referencias"
+                ),
+                "corrected": corrected,
+                "blobs": len(recorded),
+                "missing_blobs": missing,
+                "orphan_blobs": orphans,
+            }
+        except Exception as e:
+            session.rollback()
+            return {
+                "success": False,
+                "message": f"Error recalculando estadísticas de almacenamiento: {e}",
+            }
+        finally:
+            session.close()
+
+    @staticmethod
+    def _stats_snapshot(session: Session) -> dict:
+        """Valores actuales de todos los contadores de almacenamiento"""
+        return {
+            row.usuario_id: tuple(row[1:])
+            for row in session.query(
+                EstadisticaAlmacenamiento.usuario_id,
+                EstadisticaAlmacenamiento.archivos,
+                EstadisticaAlmacenamiento.bytes_originales,
+                EstadisticaAlmacenamiento.bytes_cifrados,
+                EstadisticaAlmacenamiento.blobs,
+                EstadisticaAlmacenamiento.bytes_en_disco,
+            )
+        }
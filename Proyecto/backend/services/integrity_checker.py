@@ -0,0 +1,330 @@
+"""
+Verificación de integridad del almacén de archivos cifrados.
+
+Compara el directorio de blobs con la tabla `archivos` en una sola pasada
+de mezcla ordenada (ambas listas ordenadas por ruta) y detecta:
+
+- Blobs referenciados en la BD que no están en disco.
+- Blobs en disco que ningún registro referencia (huérfanos).
+- Blobs corruptos o truncados: cada blob se descifra completo, lo que
+  comprueba los tags de autenticación de todos sus bloques (o el HMAC de
+  los tokens Fernet heredados), y el SHA-256 y el tamaño del contenido se
+  comparan con los guardados al subirlo. En los contenedores por bloques
+  también se comprueba el índice.
+
+El descifrado se reparte entre varios hilos (AES-GCM y SHA-256 liberan el
+GIL). Cada blob correcto guarda la fecha en `Archivo.fecha_verificacion`;
+el modo incremental solo vuelve a verificar los blobs sin verificar, los
+modificados después de su última verificación y los que no se verifican
+desde hace más de `max_age_days` días.
+
+Un blob que aparece sin registro se vuelve a comprobar antes de informarlo:
+si se escribió después de empezar el recorrido (una subida en curso que
+todavía no confirmó su registro), si ya no existe o si ahora tiene
+registro, no se considera huérfano.
+"""
+
+import hashlib
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.crypto.stream_cipher import (
+    DEFAULT_WORKERS,
+    HEADER_SIZE,
+    is_stream_container,
+)
+from backend.models.file_model import Archivo, BlobPendiente
+
+DEFAULT_REVERIFY_DAYS = 30
+# Rutas por sentencia al guardar las fechas de verificación
+UPDATE_BATCH_SIZE = 500
+
+
+def _utc_from_timestamp(timestamp: float) -> datetime:
+    """Fecha UTC sin zona horaria (como las guardadas en la BD)"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _scan_directory(directory: str) -> list:
+    """Blobs del directorio como (ruta, tamaño, fecha de modificación UTC)"""
+    entries = []
+    for path, _, filenames in os.walk(directory):
+        for filename in filenames:
+            # Ignorar temporales de subidas en curso
+            if filename.endswith(".part"):
+                continue
+            full_path = os.path.join(path, filename)
+            try:
+                stat = os.stat(full_path)
+            except FileNotFoundError:
+                continue
+            entries.append(
+                (full_path, stat.st_size, _utc_from_timestamp(stat.st_mtime))
+            )
+    entries.sort()
+    return entries
+
+
+def _stat_entry(path: str):
+    """Entrada de un blob fuera del directorio (rutas heredadas) o None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_size, _utc_from_timestamp(stat.st_mtime)
+
+
+class IntegrityChecker:
+    """Verifica que los blobs cifrados coinciden con la tabla `archivos`"""
+
+    def __init__(self, db_manager, files_directory, file_service=None, workers=None):
+        """
+        Inicializa el verificador
+
+        Args:
+            db_manager (DatabaseManager): Gestor de la BD
+            files_directory (str): Directorio de los blobs cifrados
+            file_service (FileService): Servicio con las claves para
+                descifrar; sin él solo se comparan BD y directorio
+            workers (int): Hilos de verificación (por defecto, hasta 4
+                según los núcleos disponibles)
+        """
+        self.db_manager = db_manager
+        self.files_directory = files_directory
+        self.file_service = file_service
+        self.workers = workers or DEFAULT_WORKERS
+
+    def run(
+        self,
+        incremental: bool = False,
+        max_age_days: int = DEFAULT_REVERIFY_DAYS,
+        progress_callback=None,
+        now: datetime = None,
+    ) -> dict:
+        """
+        Ejecuta una pasada de verificación
+
+        Args:
+            incremental (bool): Verificar solo los blobs nuevos, modificados
+                o sin verificar desde hace `max_age_days` días
+            max_age_days (int): Antigüedad máxima de una verificación en
+                modo incremental
+            progress_callback (callable): Recibe (verificados, total) tras
+                cada blob verificado
+            now (datetime): Fecha actual (UTC); por defecto, utcnow
+
+        Returns:
+            dict: {"success": bool, "message": str, "integrity_ok": bool,
+                   "issues": list, "checked": int, "skipped": int,
+                   "missing": list, "orphans": list, "corrupted": list}
+        """
+        now = now or datetime.utcnow()
+        stale_before = now - timedelta(days=max_age_days)
+        missing = []
+        orphans = []
+        to_verify = []
+        skipped = 0
+
+        scan_started = _utc_from_timestamp(time.time())
+        session = self.db_manager.get_session()
+        try:
+            # Blobs que BlobReaper todavía tiene que borrar: no son huérfanos
+            scheduled = {path for (path,) in session.query(BlobPendiente.ruta_archivo)}
+            on_disk = iter(_scan_directory(self.files_directory))
+            blobs = itertools.groupby(
+                session.query(
+                    Archivo.ruta_archivo,
+                    Archivo.nombre_archivo,
+                    Archivo.tamano_cifrado,
+                    Archivo.tamano_original,
+                    Archivo.hash_contenido,
+                    Archivo.fecha_verificacion,
+                    Archivo.clave_envuelta,
+                )
+                .order_by(Archivo.ruta_archivo, Archivo.id_archivo)
+                .yield_per(1000),
+                key=lambda row: row.ruta_archivo,
+            )
+
+            # Mezcla ordenada de las dos listas
+            entry = next(on_disk, None)
+            blob = next(blobs, None)
+            while entry is not None or blob is not None:
+                if blob is None or (entry is not None and entry[0] < blob[0]):
+                    # Los escritos durante el recorrido pueden no tener
+                    # registro todavía
+                    if entry[0] not in scheduled and entry[2] < scan_started:
+                        orphans.append(entry[0])
+                    entry = next(on_disk, None)
+                    continue
+
+                path, rows = blob[0], list(blob[1])
+                if entry is not None and entry[0] == path:
+                    found = entry
+                    entry = next(on_disk, None)
+                else:
+                    # Rutas heredadas fuera del directorio de blobs
+                    found = _stat_entry(path)
+                blob = next(blobs, None)
+
+                names = [row.nombre_archivo for row in rows]
+                if found is None:
+                    missing.extend(names)
+                    continue
+
+                first = rows[0]
+                verified_at = min(
+                    (row.fecha_verificacion for row in rows),
+                    key=lambda date: date or datetime.min,
+                )
+                if (
+                    incremental
+                    and verified_at is not None
+                    and verified_at >= stale_before
+                    and found[2] <= verified_at
+                    and found[1] == first.tamano_cifrado
+                ):
+                    skipped += 1
+                    continue
+                to_verify.append(
+                    (
+                        path,
+                        names,
+                        first.tamano_original,
+                        first.hash_contenido,
+                        first.clave_envuelta,
+                    )
+                )
+        finally:
+            session.close()
+        orphans = self._recheck_orphans(orphans)
+
+        corrupted = []
+        verified = []
+        if self.file_service is not None and to_verify:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    executor.submit(self._verify_blob, path, size, digest, key): (
+                        path,
+                        names,
+                    )
+                    for path, names, size, digest, key in to_verify
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    path, names = futures[future]
+                    error = future.result()
+                    if error is None:
+                        verified.append(path)
+                    else:
+                        corrupted.append({"path": path, "files": names, "error": error})
+                    if progress_callback:
+                        progress_callback(done, len(futures))
+            self._save_verification(verified, corrupted, now)
+
+        issues = [f"Archivo referenciado en BD no existe: {name}" for name in missing]
+        issues += [
+            f"Blob corrupto ({', '.join(item['files'])}): {item['error']}"
+            for item in sorted(corrupted, key=lambda item: item["path"])
+        ]
+        issues += [f"Blob sin registro en BD: {path}" for path in orphans]
+        checked = len(verified) + len(corrupted)
+
+        return {
+            "success": True,
+            "message": (
+                f"Verificados {checked} blob(s), {skipped} sin cambios, "
+                f"{len(issues)} problema(s)"
+            ),
+            "integrity_ok": not issues,
+            "issues": issues,
+            "checked": checked,
+            "skipped": skipped,
+            "missing": missing,
+            "orphans": orphans,
+            "corrupted": sorted(corrupted, key=lambda item: item["path"]),
+        }
+
+    def _recheck_orphans(self, paths: list) -> list:
+        """
+        Descarta los huérfanos que se eliminaron o se registraron después
+        de consultar `archivos`
+
+        Returns:
+            list: Rutas que siguen en disco sin ningún registro
+        """
+        if not paths:
+            return []
+        session = self.db_manager.get_session()
+        try:
+            referenced = {
+                path
+                for (path,) in session.query(Archivo.ruta_archivo)
+                .filter(Archivo.ruta_archivo.in_(paths))
+                .distinct()
+            }
+        finally:
+            session.close()
+        return [
+            path for path in paths if path not in referenced and os.path.exists(path)
+        ]
+
+    def _verify_blob(self, path: str, expected_size, expected_hash, wrapped_key):
+        """
+        Descifra un blob completo y compara su contenido con el registrado
+
+        Una clave envuelta que no corresponde a la clave maestra también se
+        informa como blob corrupto: sin ella el contenido es ilegible.
+
+        Returns:
+            str: Descripción del problema, o None si el blob es correcto
+        """
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in self.file_service._iter_decrypted_blob(
+                path, wrapped_key=wrapped_key
+            ):
+                digest.update(chunk)
+                size += len(chunk)
+
+            if expected_size is not None and size != expected_size:
+                return f"tamaño {size} distinto del registrado ({expected_size})"
+            if expected_hash and digest.hexdigest() != expected_hash:
+                return "el SHA-256 del contenido no coincide"
+
+            with open(path, "rb") as encrypted_file:
+                if is_stream_container(encrypted_file.read(HEADER_SIZE)):
+                    cipher = self.file_service._blob_cipher(wrapped_key)
+                    index = cipher.read_index(encrypted_file)
+                    if index.plaintext_size != size:
+                        return "el índice de bloques no coincide con el contenido"
+            return None
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    def _save_verification(self, verified: list, corrupted: list, now: datetime):
+        """Guarda la fecha de los blobs correctos y borra la de los corruptos"""
+        session = self.db_manager.get_session()
+        try:
+            for paths, value in (
+                (verified, now),
+                ([item["path"] for item in corrupted], None),
+            ):
+                for start in range(0, len(paths), UPDATE_BATCH_SIZE):
+                    session.query(Archivo).filter(
+                        Archivo.ruta_archivo.in_(
+                            paths[start : start + UPDATE_BATCH_SIZE]
+                        )
+                    ).update(
+                        {Archivo.fecha_verificacion: value},
+                        synchronize_session=False,
+                    )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"⚠️ No se pudieron guardar las fechas de verificación: {e}")
+        finally:
+            session.close()
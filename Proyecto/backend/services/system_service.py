@@ -1,6 +1,21 @@
 import os
 import shutil
-from backend.database.connection import DatabaseManager
+from sqlalchemy.exc import OperationalError
+from backend.database.connection import WAL_SUFFIXES, DatabaseManager
+from backend.models.file_model import GLOBAL_STATS_ID, EstadisticaAlmacenamiento
+from backend.services.event_retention import (
+    ARCHIVE_DIRECTORY,
+    DEFAULT_MAX_AGE_DAYS,
+    DEFAULT_MAX_ROWS,
+    EventRetention,
+)
+from backend.services.event_sink import get_event_sink
+from backend.services.file_service import FileService
+from backend.services.integrity_checker import (
+    DEFAULT_REVERIFY_DAYS,
+    IntegrityChecker,
+)
+from backend.services.vault_backup import VaultBackup
 
 
 class SystemService:
@@ -13,11 +28,32 @@ class SystemService:
     - Operaciones de mantenimiento
     """
 
-    def __init__(self):
-        """Inicializa el servicio del sistema"""
+    def __init__(self, file_service: FileService = None):
+        """
+        Inicializa el servicio del sistema
+
+        Args:
+            file_service (FileService): Servicio de archivos de la aplicación;
+                si no se indica, se crea uno la primera vez que se necesita
+        """
         self.db_manager = DatabaseManager("fortifile.db")
+        self._file_service = file_service
         print("✅ SystemService inicializado")
 
+    def _get_file_service(self) -> FileService:
+        """
+        Obtiene el servicio de archivos compartido
+
+        Crearlo carga la clave maestra, recupera operaciones interrumpidas y
+        completa los metadatos pendientes, así que se hace una sola vez.
+
+        Returns:
+            FileService: Servicio inyectado o creado al primer uso
+        """
+        if self._file_service is None:
+            self._file_service = FileService()
+        return self._file_service
+
     def reset_system(self, confirmation_text: str = None) -> dict:
         """
         RF-13: Reinicia completamente el sistema FortiFile
@@ -45,7 +81,11 @@ class SystemService:
         try:
             reset_items = []
 
-            # 1. Eliminar base de datos
+            # 1. Eliminar base de datos (con sus archivos WAL)
+            # Escribir los eventos pendientes y cerrar las conexiones del
+            # pool antes de borrar los archivos
+            get_event_sink(self.db_manager).flush()
+            self.db_manager.dispose()
             if os.path.exists("fortifile.db"):
                 os.remove("fortifile.db")
                 reset_items.append("Base de datos principal")
@@ -54,16 +94,31 @@ class SystemService:
                 os.remove("test_fortifile.db")
                 reset_items.append("Base de datos de prueba")
 
+            for db_file in ("fortifile.db", "test_fortifile.db"):
+                for suffix in WAL_SUFFIXES:
+                    if os.path.exists(db_file + suffix):
+                        os.remove(db_file + suffix)
+
             # 2. Eliminar clave de cifrado
             if os.path.exists("fortifile.key"):
                 os.remove("fortifile.key")
                 reset_items.append("Clave de cifrado")
+            # Clave nueva de una rotación interrumpida
+            if os.path.exists("fortifile.key.new"):
+                os.remove("fortifile.key.new")
+            # El servicio de archivos usaba la clave eliminada
+            self._file_service = None
 
             # 3. Eliminar directorio de archivos seguros
             if os.path.exists("secure_files"):
                 shutil.rmtree("secure_files")
                 reset_items.append("Archivos cifrados")
 
+            # Eventos archivados por la retención
+            if os.path.exists(ARCHIVE_DIRECTORY):
+                shutil.rmtree(ARCHIVE_DIRECTORY)
+                reset_items.append("Eventos archivados")
+
             # 4. Limpiar archivos temporales
             temp_files = ["downloaded_document.txt", "test_document.txt"]
             for temp_file in temp_files:
@@ -91,6 +146,26 @@ class SystemService:
         except Exception as e:
             return {"success": False, "message": f"Error al reiniciar sistema: {e}"}
 
+    def apply_event_retention(
+        self, max_age_days=DEFAULT_MAX_AGE_DAYS, max_rows=DEFAULT_MAX_ROWS
+    ) -> dict:
+        """
+        RF-11: Archiva los eventos antiguos y los resume por día y tipo
+
+        Args:
+            max_age_days (int): Días que un evento permanece en la tabla
+            max_rows (int): Filas máximas en la tabla de eventos
+
+        Returns:
+            dict: {"success": bool, "message": str, "archived": int, ...}
+        """
+        # Incluir los eventos pendientes de escribir en el recuento
+        get_event_sink(self.db_manager).flush()
+        retention = EventRetention(
+            self.db_manager, max_age_days=max_age_days, max_rows=max_rows
+        )
+        return retention.apply()
+
     def get_system_status(self) -> dict:
         """
         Obtiene el estado actual del sistema
@@ -113,23 +188,22 @@ class SystemService:
                 db_size = os.path.getsize("fortifile.db")
                 status["database_size_mb"] = round(db_size / 1024 / 1024, 3)
 
-            # Información de archivos seguros
-            if status["secure_files_dir_exists"]:
-                files = os.listdir("secure_files")
-                status["secure_files_count"] = len(
-                    [
-                        f
-                        for f in files
-                        if os.path.isfile(os.path.join("secure_files", f))
-                    ]
-                )
-
-                total_size = 0
-                for file in files:
-                    file_path = os.path.join("secure_files", file)
-                    if os.path.isfile(file_path):
-                        total_size += os.path.getsize(file_path)
-                status["secure_files_size_mb"] = round(total_size / 1024 / 1024, 3)
+            # Información de archivos seguros (contadores que mantienen los
+            # triggers de `archivos`, sin recorrer el directorio)
+            if status["database_exists"]:
+                session = self.db_manager.get_session()
+                try:
+                    stats = session.get(EstadisticaAlmacenamiento, GLOBAL_STATS_ID)
+                except OperationalError:
+                    # BD sin inicializar (todavía no tiene las tablas)
+                    stats = None
+                finally:
+                    session.close()
+                if stats is not None:
+                    status["secure_files_count"] = stats.blobs
+                    status["secure_files_size_mb"] = round(
+                        stats.bytes_en_disco / 1024 / 1024, 3
+                    )
 
             # Estado general
             status["system_initialized"] = all(
@@ -150,43 +224,96 @@ class SystemService:
 
     def backup_system(self, backup_path: str) -> dict:
         """
-        Crea respaldo del sistema (sin incluir archivos por seguridad)
+        Crea o actualiza un respaldo de la BD y de los archivos cifrados
+
+        La BD se copia en línea con la API de backup de SQLite y solo se
+        copian los blobs nuevos o modificados desde el respaldo anterior en
+        el mismo directorio (ver VaultBackup). La clave de cifrado no se
+        respalda por seguridad.
 
         Args:
             backup_path (str): Ruta donde crear el respaldo
 
         Returns:
-            dict: {"success": bool, "message": str}
+            dict: {"success": bool, "message": str, "backup_items": list, ...}
         """
-        try:
-            if not os.path.exists(backup_path):
-                os.makedirs(backup_path)
-
-            backup_items = []
+        if not os.path.exists("fortifile.db"):
+            return {
+                "success": False,
+                "message": "Error creando respaldo: la base de datos no existe",
+            }
 
-            # Respaldar base de datos
-            if os.path.exists("fortifile.db"):
-                shutil.copy2(
-                    "fortifile.db", os.path.join(backup_path, "fortifile_backup.db")
-                )
-                backup_items.append("Base de datos")
+        result = VaultBackup(self.db_manager).backup(backup_path)
+        if result["success"]:
+            result["backup_items"] = ["Base de datos", "Archivos cifrados"]
+        return result
 
-            # NOTA: NO respaldamos la clave de cifrado por seguridad
-            # NOTA: NO respaldamos archivos cifrados por seguridad
+    def restore_system(self, backup_path: str) -> dict:
+        """
+        Restaura la BD y los archivos cifrados desde un respaldo
 
-            return {
-                "success": True,
-                "message": f"Respaldo creado en {backup_path}. Elementos: {', '.join(backup_items)}",
-                "backup_items": backup_items,
-            }
+        El respaldo se verifica antes de restaurarlo y, después, se comprueba
+        que todos los archivos de la BD restaurada tienen su blob y que los
+        blobs se descifran correctamente (si está la clave de cifrado).
 
-        except Exception as e:
-            return {"success": False, "message": f"Error creando respaldo: {e}"}
+        Args:
+            backup_path (str): Directorio creado por backup_system
 
-    def verify_system_integrity(self) -> dict:
+        Returns:
+            dict: {"success": bool, "message": str, "restored_blobs": int,
+                   "issues": list}
+        """
+        result = VaultBackup(self.db_manager).restore(backup_path)
+        if not result["success"]:
+            return result
+
+        file_service = None
+        if os.path.exists("fortifile.key"):
+            file_service = self._get_file_service()
+            # La BD restaurada puede tener otra clave de direcciones y
+            # archivos sin metadatos
+            file_service.address_key = file_service._load_address_key()
+            file_service.backfill_file_metadata()
+        integrity = IntegrityChecker(
+            self.db_manager, "secure_files", file_service
+        ).run()
+        # Los blobs sin registro (subidos después del respaldo) no impiden
+        # usar el sistema restaurado
+        issues = [
+            f"Archivo referenciado en BD no existe: {name}"
+            for name in integrity["missing"]
+        ] + [
+            f"Blob corrupto ({', '.join(item['files'])}): {item['error']}"
+            for item in integrity["corrupted"]
+        ]
+        result["issues"] = issues
+        if issues:
+            result["success"] = False
+            result["message"] += f". Verificación: {len(issues)} problema(s)"
+        return result
+
+    def verify_system_integrity(
+        self,
+        incremental: bool = False,
+        max_age_days: int = DEFAULT_REVERIFY_DAYS,
+        workers: int = None,
+        progress_callback=None,
+    ) -> dict:
         """
         Verifica la integridad del sistema
 
+        Además de los archivos esenciales, descifra cada blob en paralelo
+        para detectar contenido corrupto o truncado y compara el directorio
+        de archivos seguros con la BD (ver IntegrityChecker).
+
+        Args:
+            incremental (bool): Verificar solo los blobs nuevos, modificados
+                o sin verificar desde hace `max_age_days` días
+            max_age_days (int): Antigüedad máxima de una verificación en
+                modo incremental
+            workers (int): Hilos de verificación
+            progress_callback (callable): Recibe (verificados, total)
+
         Returns:
             dict: Resultado de verificación
         """
@@ -197,25 +324,31 @@ class SystemService:
             if not os.path.exists("fortifile.db"):
                 issues.append("Base de datos principal no existe")
 
-            if not os.path.exists("fortifile.key"):
+            key_exists = os.path.exists("fortifile.key")
+            if not key_exists:
                 issues.append("Clave de cifrado no existe")
 
-            if not os.path.exists("secure_files"):
+            directory_exists = os.path.exists("secure_files")
+            if not directory_exists:
                 issues.append("Directorio de archivos seguros no existe")
 
-            # Verificar consistencia base de datos vs archivos
+            # Verificar consistencia y contenido de los blobs; sin la clave
+            # solo se compara la BD con el directorio
+            result = {"checked": 0, "skipped": 0}
             try:
-                session = self.db_manager.get_session()
-                from backend.models.file_model import Archivo
-
-                db_files = session.query(Archivo).all()
-                for db_file in db_files:
-                    if not os.path.exists(db_file.ruta_archivo):
-                        issues.append(
-                            f"Archivo referenciado en BD no existe: {db_file.nombre_archivo}"
-                        )
-
-                session.close()
+                file_service = (
+                    self._get_file_service()
+                    if key_exists and directory_exists
+                    else None
+                )
+                result = IntegrityChecker(
+                    self.db_manager, "secure_files", file_service, workers
+                ).run(
+                    incremental=incremental,
+                    max_age_days=max_age_days,
+                    progress_callback=progress_callback,
+                )
+                issues.extend(result["issues"])
             except Exception as e:
                 issues.append(f"Error verificando consistencia BD: {e}")
 
@@ -226,6 +359,8 @@ class SystemService:
                 "integrity_ok": integrity_ok,
                 "issues": issues,
                 "issues_count": len(issues),
+                "checked": result["checked"],
+                "skipped": result["skipped"],
             }
 
         except Exception as e:
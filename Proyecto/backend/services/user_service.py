@@ -1,12 +1,50 @@
+import base64
 import bcrypt
+import heapq
+import itertools
+import json
 import os
-from sqlalchemy.orm import Session
 from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
 
 from backend.models.user_model import Usuario
-from backend.models.event_model import Evento
-from backend.models.file_model import Archivo
+from backend.models.event_model import (
+    EVENT_ACCOUNT_DELETE_FAILED,
+    EVENT_ACCOUNT_LOCKED,
+    EVENT_LOGIN,
+    EVENT_LOGIN_FAILED,
+    EVENT_PASSWORD_CHANGE_FAILED,
+    EVENT_PASSWORD_CHANGED,
+    EVENT_REGISTER,
+    Evento,
+)
+from backend.models.file_model import Archivo, EstadisticaAlmacenamiento
 from backend.database.connection import DatabaseManager
+from backend.services.event_retention import EventRetention
+from backend.services.event_sink import get_event_sink
+from backend.services.blob_reaper import get_blob_reaper, schedule_user_blobs
+
+# Eventos máximos por página de list_user_events
+EVENTS_MAX_LIMIT = 500
+
+
+def _encode_event_cursor(event_date: datetime, event_id: int) -> str:
+    """Codifica la posición del último evento de una página"""
+    payload = json.dumps(["eventos", event_date.isoformat(), event_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_event_cursor(cursor: str):
+    """Decodifica un cursor de list_user_events"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        kind, event_date, event_id = payload
+        if kind != "eventos" or not isinstance(event_id, int):
+            raise ValueError
+        return datetime.fromisoformat(event_date), event_id
+    except Exception:
+        raise ValueError("Cursor inválido")
 
 
 class UserService:
@@ -26,7 +64,9 @@ class UserService:
     def __init__(self):
         """Inicializa el servicio de usuario"""
         self.db_manager = DatabaseManager("fortifile.db")
-        # Crear las tablas si no existen
+        # RF-11: Eventos por lotes, compartidos con los demás servicios
+        self.events = get_event_sink(self.db_manager)
+        # Crear las tablas si no existen (solo la primera vez en el proceso)
         self.db_manager.create_tables()
         self.max_failed_attempts = 3  # RF-04: Máximo intentos fallidos
         self.failed_attempts = 0  # Contador de intentos fallidos
@@ -96,7 +136,7 @@ class UserService:
 
             # RF-11: Registrar evento
             self._log_event(
-                session, new_user.id_usuario, "Usuario registrado exitosamente"
+                new_user.id_usuario, "Usuario registrado exitosamente", EVENT_REGISTER
             )
 
             return {
@@ -160,7 +200,9 @@ class UserService:
             if bcrypt.checkpw(password_bytes, stored_hash):
                 # Contraseña correcta - resetear contador
                 self.failed_attempts = 0
-                self._log_event(session, user.id_usuario, "Inicio de sesión exitoso")
+                self._log_event(
+                    user.id_usuario, "Inicio de sesión exitoso", EVENT_LOGIN
+                )
                 return {
                     "success": True,
                     "message": "Inicio de sesión exitoso",
@@ -205,16 +247,19 @@ class UserService:
 
         if user_id:
             self._log_event(
-                session,
                 user_id,
                 f"{description} (Intento {self.failed_attempts}/{self.max_failed_attempts})",
+                EVENT_LOGIN_FAILED,
             )
 
         if self.failed_attempts >= self.max_failed_attempts:
             self.account_locked = True
             if user_id:
                 self._log_event(
-                    session, user_id, "Cuenta bloqueada por intentos fallidos"
+                    user_id,
+                    "Cuenta bloqueada por intentos fallidos",
+                    EVENT_ACCOUNT_LOCKED,
+                    critical=True,
                 )
             print(f"⚠️  CUENTA BLOQUEADA - {self.max_failed_attempts} intentos fallidos")
 
@@ -251,9 +296,9 @@ class UserService:
 
             if not bcrypt.checkpw(old_password_bytes, stored_hash):
                 self._log_event(
-                    session,
                     user_id,
                     "Intento de cambio de contraseña fallido - contraseña actual incorrecta",
+                    EVENT_PASSWORD_CHANGE_FAILED,
                 )
                 return {
                     "success": False,
@@ -276,7 +321,12 @@ class UserService:
             user.password_hash = new_password_hash.decode("utf-8")
             session.commit()
 
-            self._log_event(session, user_id, "Contraseña cambiada exitosamente")
+            self._log_event(
+                user_id,
+                "Contraseña cambiada exitosamente",
+                EVENT_PASSWORD_CHANGED,
+                critical=True,
+            )
 
             return {"success": True, "message": "Contraseña cambiada correctamente"}
 
@@ -291,7 +341,8 @@ class UserService:
         RF-10: Eliminación de cuenta con confirmación de contraseña
 
         Elimina completamente:
-        - Todos los archivos físicos cifrados del usuario
+        - Todos los archivos físicos cifrados del usuario (en segundo
+          plano, ver BlobReaper)
         - Todos los registros de archivos de la base de datos
         - Todos los eventos del usuario
         - La cuenta del usuario
@@ -303,6 +354,8 @@ class UserService:
         Returns:
             dict: {"success": bool, "message": str}
         """
+        # Escribir los eventos pendientes para eliminarlos también
+        self.events.flush()
         session = self.db_manager.get_session()
         try:
             user = session.query(Usuario).filter(Usuario.id_usuario == user_id).first()
@@ -316,53 +369,62 @@ class UserService:
 
             if not bcrypt.checkpw(password_bytes, stored_hash):
                 self._log_event(
-                    session,
                     user_id,
                     "Intento de eliminación de cuenta fallido - contraseña incorrecta",
+                    EVENT_ACCOUNT_DELETE_FAILED,
+                    critical=True,
                 )
                 return {"success": False, "message": "Contraseña incorrecta"}
 
             username = user.username
-            archivos_eliminados = 0
-            eventos_eliminados = 0
 
-            # 1. Obtener y eliminar todos los archivos físicos del usuario
-            archivos = (
-                session.query(Archivo).filter(Archivo.usuario_id == user_id).all()
+            # Todo en una transacción, con sentencias por conjunto (sin
+            # cargar los registros). Los blobs cifrados pueden estar
+            # compartidos por contenido: se registran como pendientes y
+            # BlobReaper borra después los que quedaron sin referencias
+            blobs_pendientes = schedule_user_blobs(session, user_id)
+
+            # 1. Archivos del usuario
+            archivos_eliminados = (
+                session.query(Archivo)
+                .filter(Archivo.usuario_id == user_id)
+                .delete(synchronize_session=False)
             )
 
-            for archivo in archivos:
-                try:
-                    # Eliminar archivo físico cifrado
-                    if os.path.exists(archivo.ruta_archivo):
-                        os.remove(archivo.ruta_archivo)
-                        print(f"🗑️ Archivo físico eliminado: {archivo.ruta_archivo}")
-
-                    # Eliminar registro de la base de datos
-                    session.delete(archivo)
-                    archivos_eliminados += 1
-
-                except Exception as e:
-                    print(f"❌ Error eliminando archivo {archivo.nombre_archivo}: {e}")
-                    # Continuar con otros archivos aunque uno falle
-
-            # 2. Eliminar todos los eventos del usuario
-            eventos = session.query(Evento).filter(Evento.usuario_id == user_id).all()
-
-            for evento in eventos:
-                session.delete(evento)
-                eventos_eliminados += 1
+            # 2. Eventos del usuario, y los archivados por la retención
+            eventos_eliminados = (
+                session.query(Evento)
+                .filter(Evento.usuario_id == user_id)
+                .delete(synchronize_session=False)
+            )
+            retention = EventRetention(self.db_manager)
+            segmentos = retention.purge_user(session, user_id)
 
-            # 3. Eliminar la cuenta del usuario
+            # 3. Contadores de almacenamiento y cuenta del usuario
+            session.query(EstadisticaAlmacenamiento).filter(
+                EstadisticaAlmacenamiento.usuario_id == user_id
+            ).delete(synchronize_session=False)
             session.delete(user)
 
             # Confirmar todos los cambios
             session.commit()
 
-            print(f"✅ Cuenta '{username}' eliminada completamente:")
-            print(f"   - Usuario: 1")
-            print(f"   - Archivos: {archivos_eliminados}")
-            print(f"   - Eventos: {eventos_eliminados}")
+            # Los segmentos archivados se reescriben solo si se confirmó,
+            # fuera de la transacción
+            eventos_archivados, fallidos = retention.purge_segments(user_id, segmentos)
+            eventos_eliminados += eventos_archivados
+            if fallidos:
+                print("⚠️ Quedan eventos archivados del usuario sin eliminar")
+
+            # Eliminar los archivos físicos en segundo plano
+            if blobs_pendientes:
+                get_blob_reaper(self.db_manager).wake()
+
+            print(
+                f"✅ Cuenta '{username}' eliminada: {archivos_eliminados} archivo(s), "
+                f"{eventos_eliminados} evento(s), {blobs_pendientes} blob(s) "
+                "pendientes de borrar"
+            )
 
             return {
                 "success": True,
@@ -401,25 +463,26 @@ class UserService:
 
         return {"valid": True, "message": "Contraseña válida"}
 
-    def _log_event(self, session: Session, user_id: int, description: str):
+    def _log_event(
+        self,
+        user_id: int,
+        description: str,
+        event_type: str = None,
+        critical: bool = False,
+    ):
         """
         RF-11: Registra un evento del sistema
 
+        El evento se escribe por lotes en segundo plano (EventSink); los
+        críticos se escriben antes de volver.
+
         Args:
-            session (Session): Sesión activa de base de datos
             user_id (int): ID del usuario
             description (str): Descripción del evento
+            event_type (str): Tipo del evento (constantes EVENT_*)
+            critical (bool): Escribirlo de inmediato (bloqueos, eliminaciones)
         """
-        try:
-            event = Evento(
-                descripcion=description,
-                usuario_id=user_id,
-                fecha_evento=datetime.utcnow(),
-            )
-            session.add(event)
-            session.commit()
-        except Exception as e:
-            print(f"❌ Error registrando evento: {e}")
+        self.events.log(user_id, description, event_type, critical=critical)
 
     def get_user_info(self, user_id: int) -> dict:
         """
@@ -450,48 +513,146 @@ class UserService:
         finally:
             session.close()
 
-    def get_user_events(self, user_id: int, limit: int = 10) -> dict:
+    def list_user_events(
+        self,
+        user_id: int,
+        limit: int = 50,
+        cursor: str = None,
+        since: datetime = None,
+        until: datetime = None,
+        event_types: list = None,
+    ) -> dict:
         """
-        RF-11: Obtiene eventos del usuario
+        RF-11: Obtiene una página del historial de eventos del usuario
+
+        Los eventos van del más reciente al más antiguo. La paginación es por
+        cursor (keyset) sobre los índices compuestos de `eventos`, así que el
+        costo de cada página no depende del tamaño del historial ni de
+        cuántas páginas se hayan recorrido.
 
         Args:
             user_id (int): ID del usuario
-            limit (int): Número máximo de eventos a retornar
+            limit (int): Cantidad máxima de eventos de la página
+            cursor (str): Valor de `next_cursor` de la página anterior
+            since (datetime): Solo eventos desde esta fecha UTC (incluida)
+            until (datetime): Solo eventos hasta esta fecha UTC (excluida)
+            event_types (list): Solo eventos de estos tipos (constantes EVENT_*)
 
         Returns:
-            dict: {"success": bool, "events": list}
+            dict: {"success": bool, "events": list, "count": int,
+                   "next_cursor": str | None}
         """
+        limit = max(1, min(int(limit), EVENTS_MAX_LIMIT))
+        # Incluir los eventos que aún no se escribieron
+        self.events.flush()
         session = self.db_manager.get_session()
         try:
-            events = (
-                session.query(Evento)
-                .filter(Evento.usuario_id == user_id)
-                .order_by(Evento.fecha_evento.desc())
-                .limit(limit)
-                .all()
-            )
+            position = _decode_event_cursor(cursor) if cursor else None
+            key = tuple_(Evento.fecha_evento, Evento.id_evento)
 
-            event_list = []
-            for event in events:
-                event_list.append(
-                    {
-                        "id": event.id_evento,
-                        "descripcion": event.descripcion,
-                        "fecha": event.fecha_evento,
-                    }
+            def page(event_type):
+                events_query = session.query(Evento).filter(
+                    Evento.usuario_id == user_id
+                )
+                if event_type is not None:
+                    events_query = events_query.filter(Evento.tipo == event_type)
+                if since is not None:
+                    events_query = events_query.filter(Evento.fecha_evento >= since)
+                if until is not None:
+                    events_query = events_query.filter(Evento.fecha_evento < until)
+                if position is not None:
+                    events_query = events_query.filter(key < tuple_(*position))
+                # Pedir un elemento extra para saber si hay otra página
+                return (
+                    events_query.order_by(
+                        Evento.fecha_evento.desc(), Evento.id_evento.desc()
+                    )
+                    .limit(limit + 1)
+                    .all()
                 )
 
-            return {"success": True, "events": event_list, "count": len(event_list)}
+            if event_types:
+                # Una consulta por tipo (cada una recorre su tramo del índice)
+                # y se mezclan los resultados, ya ordenados
+                merged = heapq.merge(
+                    *(page(event_type) for event_type in sorted(set(event_types))),
+                    key=lambda event: (event.fecha_evento, event.id_evento),
+                    reverse=True,
+                )
+                events = list(itertools.islice(merged, limit + 1))
+            else:
+                events = page(None)
+
+            has_more = len(events) > limit
+            events = events[:limit]
+            next_cursor = None
+            if has_more:
+                last = events[-1]
+                next_cursor = _encode_event_cursor(last.fecha_evento, last.id_evento)
+
+            event_list = [
+                {
+                    "id": event.id_evento,
+                    "descripcion": event.descripcion,
+                    "fecha": event.fecha_evento,
+                    "tipo": event.tipo,
+                }
+                for event in events
+            ]
+            return {
+                "success": True,
+                "events": event_list,
+                "count": len(event_list),
+                "next_cursor": next_cursor,
+            }
 
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Error obteniendo eventos: {e}",
                 "events": [],
+                "count": 0,
+                "next_cursor": None,
             }
         finally:
             session.close()
 
+    def get_user_events(
+        self, user_id: int, limit: int = 10, include_archived: bool = False
+    ) -> dict:
+        """
+        RF-11: Obtiene los eventos más recientes del usuario
+
+        Args:
+            user_id (int): ID del usuario
+            limit (int): Número máximo de eventos a retornar
+            include_archived (bool): Completar con eventos archivados por la
+                retención si la tabla no tiene suficientes
+
+        Returns:
+            dict: {"success": bool, "events": list}
+        """
+        result = self.list_user_events(user_id, limit)
+        if not result["success"]:
+            return result
+        event_list = result["events"]
+
+        # Los archivados son anteriores a los que siguen en la tabla
+        if include_archived and len(event_list) < limit:
+            try:
+                archived = EventRetention(self.db_manager).query_archive(
+                    user_id, limit=limit - len(event_list)
+                )
+            except Exception as e:
+                return {
+                    "success": False,
+                    "message": f"Error obteniendo eventos archivados: {e}",
+                    "events": [],
+                }
+            event_list.extend(archived)
+
+        return {"success": True, "events": event_list, "count": len(event_list)}
+
     def reset_failed_attempts(self):
         """
         RF-04: Resetea contador de intentos fallidos
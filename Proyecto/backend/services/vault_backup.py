@@ -0,0 +1,424 @@
+"""
+Respaldo en línea e incremental del almacén de FortiFile.
+
+Contenido del directorio de respaldo:
+
+    fortifile_backup.db   Copia consistente de la BD
+    blobs/                Blobs cifrados (misma estructura que secure_files)
+    manifest.json         Tamaño, fecha de modificación y SHA-256 de la BD y
+                          de cada blob respaldado
+
+La BD se copia con la API de backup de SQLite en pasos de `pages_per_step`
+páginas: entre pasos no mantiene ningún bloqueo, así que las subidas y
+eliminaciones siguen funcionando mientras se respalda, y el resultado es
+siempre una instantánea de una transacción confirmada.
+
+Se respaldan los blobs que referencia esa instantánea. El manifiesto del
+respaldo anterior permite copiar solo los blobs nuevos o modificados
+(tamaño o fecha de modificación distintos) y borrar los que ya no se
+usan, por lo que repetir un respaldo transfiere solo las diferencias.
+
+La clave de cifrado nunca se respalda: los blobs solo se pueden leer con
+la clave original.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+from backend.services.event_sink import get_event_sink
+
+BACKUP_DATABASE = "fortifile_backup.db"
+BACKUP_BLOBS = "blobs"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+# Páginas que copia cada paso de la API de backup (4 MB con páginas de 4 KB)
+DEFAULT_PAGES_PER_STEP = 1024
+# Pausa entre pasos para dejar pasar a los escritores
+STEP_SLEEP = 0.005
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """El respaldo está incompleto o no coincide con su manifiesto"""
+
+
+def _copy_file(source: str, destination: str) -> str:
+    """
+    Copia un archivo de forma atómica (temporal + rename) y lo sincroniza
+
+    Returns:
+        str: SHA-256 del contenido copiado
+    """
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(destination) or ".", suffix=".part"
+    )
+    try:
+        with open(source, "rb") as source_file, os.fdopen(fd, "wb") as target:
+            while True:
+                chunk = source_file.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                target.write(chunk)
+            target.flush()
+            os.fsync(target.fileno())
+        shutil.copystat(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return digest.hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+
+def _sqlite_backup(source_path: str, destination_path: str, pages_per_step: int):
+    """Copia una BD SQLite con la API de backup, por pasos"""
+    source = sqlite3.connect(source_path, timeout=30)
+    try:
+        destination = sqlite3.connect(destination_path)
+        try:
+            source.backup(destination, pages=pages_per_step, sleep=STEP_SLEEP)
+        finally:
+            destination.close()
+    finally:
+        source.close()
+
+
+def _check_database(path: str):
+    """Falla si la BD no supera `PRAGMA integrity_check`"""
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        connection.close()
+    if result != "ok":
+        raise BackupError(f"La BD del respaldo está dañada: {result}")
+
+
+def _referenced_blobs(db_path: str) -> list:
+    """Rutas de los blobs que referencia la tabla `archivos` de una BD"""
+    connection = sqlite3.connect(db_path)
+    try:
+        return [
+            row[0]
+            for row in connection.execute(
+                "SELECT DISTINCT ruta_archivo FROM archivos ORDER BY ruta_archivo"
+            )
+        ]
+    finally:
+        connection.close()
+
+
+class VaultBackup:
+    """Crea, verifica y restaura respaldos del almacén (BD y blobs)"""
+
+    def __init__(
+        self,
+        db_manager,
+        files_directory="secure_files",
+        pages_per_step=DEFAULT_PAGES_PER_STEP,
+    ):
+        """
+        Inicializa el gestor de respaldos
+
+        Args:
+            db_manager (DatabaseManager): Gestor de la BD a respaldar
+            files_directory (str): Directorio de los blobs cifrados
+            pages_per_step (int): Páginas por paso de la API de backup
+        """
+        self.db_manager = db_manager
+        self.db_path = db_manager.db_path
+        self.files_directory = files_directory
+        self.pages_per_step = pages_per_step
+
+    def _relative_blob(self, path: str):
+        """Ruta de un blob relativa al directorio de archivos, o None si está fuera"""
+        relative = os.path.relpath(path, self.files_directory)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None
+        return relative
+
+    @staticmethod
+    def read_manifest(backup_path: str) -> dict:
+        """
+        Lee el manifiesto de un respaldo
+
+        Args:
+            backup_path (str): Directorio del respaldo
+
+        Returns:
+            dict: Manifiesto, o None si el directorio no tiene respaldo
+        """
+        path = os.path.join(backup_path, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise BackupError(
+                f"Versión de manifiesto no soportada: {manifest.get('version')}"
+            )
+        return manifest
+
+    @staticmethod
+    def _write_manifest(backup_path: str, manifest: dict):
+        fd, temp_path = tempfile.mkstemp(dir=backup_path, suffix=".part")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, os.path.join(backup_path, MANIFEST_FILE))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def backup(self, backup_path: str) -> dict:
+        """
+        Crea o actualiza un respaldo
+
+        Args:
+            backup_path (str): Directorio del respaldo (se crea si no existe)
+
+        Returns:
+            dict: {"success": bool, "message": str, "copied": int,
+                   "unchanged": int, "removed": int, "bytes_copied": int,
+                   "unavailable": list}
+        """
+        try:
+            os.makedirs(backup_path, exist_ok=True)
+            previous = self.read_manifest(backup_path) or {"blobs": {}}
+
+            # 1. Instantánea de la BD (los eventos pendientes incluidos)
+            get_event_sink(self.db_manager).flush()
+            snapshot_path = os.path.join(backup_path, BACKUP_DATABASE + ".part")
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            _sqlite_backup(self.db_path, snapshot_path, self.pages_per_step)
+
+            # 2. Blobs que referencia la instantánea: copiar solo los cambios
+            blobs = {}
+            copied = unchanged = bytes_copied = 0
+            unavailable = []
+            blobs_directory = os.path.join(backup_path, BACKUP_BLOBS)
+            for path in _referenced_blobs(snapshot_path):
+                relative = self._relative_blob(path)
+                if relative is None:
+                    unavailable.append(path)
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Eliminado después de la instantánea
+                    unavailable.append(path)
+                    continue
+
+                entry = previous["blobs"].get(relative)
+                target = os.path.join(blobs_directory, relative)
+                if (
+                    entry is not None
+                    and entry["size"] == stat.st_size
+                    and entry["mtime_ns"] == stat.st_mtime_ns
+                    and os.path.exists(target)
+                    and os.path.getsize(target) == stat.st_size
+                ):
+                    blobs[relative] = entry
+                    unchanged += 1
+                    continue
+
+                blobs[relative] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": _copy_file(path, target),
+                }
+                copied += 1
+                bytes_copied += stat.st_size
+
+            # 3. Confirmar la BD y el manifiesto
+            database_path = os.path.join(backup_path, BACKUP_DATABASE)
+            os.replace(snapshot_path, database_path)
+            self._write_manifest(
+                backup_path,
+                {
+                    "version": MANIFEST_VERSION,
+                    "created": datetime.utcnow().isoformat(),
+                    "database": {
+                        "file": BACKUP_DATABASE,
+                        "size": os.path.getsize(database_path),
+                        "sha256": _file_sha256(database_path),
+                    },
+                    "blobs": blobs,
+                },
+            )
+
+            # 4. Borrar los blobs que la nueva instantánea ya no usa
+            removed = 0
+            for relative in previous["blobs"].keys() - blobs.keys():
+                target = os.path.join(blobs_directory, relative)
+                if os.path.exists(target):
+                    os.remove(target)
+                    removed += 1
+                    # Subdirectorio que quedó vacío
+                    try:
+                        os.rmdir(os.path.dirname(target))
+                    except OSError:
+                        pass
+
+            message = (
+                f"Respaldo creado en {backup_path}: {copied} blob(s) copiados, "
+                f"{unchanged} sin cambios, {removed} eliminados"
+            )
+            if unavailable:
+                message += f", {len(unavailable)} no disponibles"
+            print(f"✅ {message}")
+            return {
+                "success": True,
+                "message": message,
+                "copied": copied,
+                "unchanged": unchanged,
+                "removed": removed,
+                "bytes_copied": bytes_copied,
+                "unavailable": unavailable,
+            }
+
+        except Exception as e:
+            return {"success": False, "message": f"Error creando respaldo: {e}"}
+
+    def verify(self, backup_path: str) -> dict:
+        """
+        Comprueba que un respaldo coincide con su manifiesto
+
+        Revisa la BD con `PRAGMA integrity_check` y el SHA-256 de la BD y de
+        cada blob.
+
+        Args:
+            backup_path (str): Directorio del respaldo
+
+        Returns:
+            dict: {"success": bool, "message": str, "issues": list}
+        """
+        try:
+            manifest = self.read_manifest(backup_path)
+            if manifest is None:
+                return {
+                    "success": False,
+                    "message": f"No hay un respaldo en {backup_path}",
+                    "issues": [],
+                }
+
+            issues = []
+            database_path = os.path.join(backup_path, manifest["database"]["file"])
+            if not os.path.exists(database_path):
+                issues.append("Falta la BD del respaldo")
+            elif _file_sha256(database_path) != manifest["database"]["sha256"]:
+                issues.append("La BD del respaldo no coincide con el manifiesto")
+            else:
+                _check_database(database_path)
+
+            for relative, entry in sorted(manifest["blobs"].items()):
+                path = os.path.join(backup_path, BACKUP_BLOBS, relative)
+                if not os.path.exists(path):
+                    issues.append(f"Falta el blob {relative}")
+                elif _file_sha256(path) != entry["sha256"]:
+                    issues.append(f"Blob modificado: {relative}")
+
+            return {
+                "success": not issues,
+                "message": (
+                    "Respaldo verificado"
+                    if not issues
+                    else f"Respaldo con {len(issues)} problema(s)"
+                ),
+                "issues": issues,
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error verificando respaldo: {e}",
+                "issues": [str(e)],
+            }
+
+    def restore(self, backup_path: str) -> dict:
+        """
+        Restaura la BD y los blobs desde un respaldo verificado
+
+        El respaldo se verifica antes de tocar nada. La BD se restaura con la
+        API de backup (respeta el WAL de la BD actual) y solo se copian los
+        blobs que faltan o cuyo contenido no coincide.
+
+        Args:
+            backup_path (str): Directorio del respaldo
+
+        Returns:
+            dict: {"success": bool, "message": str, "restored_blobs": int}
+        """
+        verification = self.verify(backup_path)
+        if not verification["success"]:
+            return {
+                "success": False,
+                "message": (
+                    f"No se restauró: {verification['message']}. "
+                    + "; ".join(verification["issues"][:5])
+                ),
+                "restored_blobs": 0,
+            }
+
+        try:
+            manifest = self.read_manifest(backup_path)
+
+            # 1. Blobs (antes que la BD: los registros restaurados los usan)
+            restored = 0
+            for relative, entry in manifest["blobs"].items():
+                target = os.path.join(self.files_directory, relative)
+                if (
+                    os.path.exists(target)
+                    and os.path.getsize(target) == entry["size"]
+                    and _file_sha256(target) == entry["sha256"]
+                ):
+                    continue
+                _copy_file(os.path.join(backup_path, BACKUP_BLOBS, relative), target)
+                restored += 1
+
+            # 2. BD: cerrar las conexiones del pool y copiar la instantánea
+            get_event_sink(self.db_manager).flush()
+            self.db_manager.dispose()
+            _sqlite_backup(
+                os.path.join(backup_path, manifest["database"]["file"]),
+                self.db_path,
+                self.pages_per_step,
+            )
+            # Migraciones pendientes si el respaldo es de una versión anterior
+            self.db_manager.create_tables()
+
+            message = (
+                f"Respaldo restaurado desde {backup_path}: "
+                f"{restored} blob(s) copiados"
+            )
+            print(f"✅ {message}")
+            return {"success": True, "message": message, "restored_blobs": restored}
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error restaurando respaldo: {e}",
+                "restored_blobs": 0,
+            }
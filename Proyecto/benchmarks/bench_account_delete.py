@@ -0,0 +1,131 @@
+"""
+Benchmark de la eliminación de cuentas.
+
+Crea una cuenta con muchos archivos (blobs pequeños sin cifrar: borrar no
+descifra) y un historial de eventos, y compara:
+
+- El borrado anterior: cargar cada Archivo y Evento, session.delete uno a
+  uno y borrar los blobs en serie antes de volver.
+- UserService.delete_account: sentencias por conjunto y blobs borrados en
+  segundo plano por BlobReaper (se mide también cuándo termina).
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_account_delete.py --files 5000 --events 100000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from unittest import mock
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.database.connection import DatabaseManager  # noqa: E402
+from backend.models.event_model import Evento  # noqa: E402
+from backend.models.file_model import Archivo  # noqa: E402
+from backend.models.user_model import Usuario  # noqa: E402
+from backend.services.blob_reaper import get_blob_reaper  # noqa: E402
+from backend.services.user_service import UserService  # noqa: E402
+
+
+def populate(db_file: str, files: int, events: int):
+    """Crea el usuario 1 con `files` blobs y `events` eventos"""
+    directory = os.path.join(os.path.dirname(db_file), "secure_files", "objects")
+    rows = []
+    for index in range(files):
+        shard = os.path.join(directory, f"{index % 256:02x}")
+        path = os.path.join(shard, f"{index:064x}.enc")
+        os.makedirs(shard, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(os.urandom(4096))
+        rows.append((f"archivo_{index}.bin", path, 4000, 4096))
+
+    connection = sqlite3.connect(db_file)
+    connection.execute("DELETE FROM usuarios")
+    connection.execute(
+        "INSERT INTO usuarios (id_usuario, username, password_hash) "
+        "VALUES (1, 'bench', 'x')"
+    )
+    connection.executemany(
+        "INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id, "
+        "tamano_original, tamano_cifrado) VALUES (?, ?, 1, ?, ?)",
+        rows,
+    )
+    connection.executemany(
+        "INSERT INTO eventos (descripcion, usuario_id) VALUES (?, 1)",
+        [("Archivo descargado: informe.pdf",)] * events,
+    )
+    connection.commit()
+    connection.close()
+
+
+def old_delete(db_manager):
+    """Borrado anterior: objeto por objeto y blobs en serie"""
+    session = db_manager.get_session()
+    try:
+        for archivo in session.query(Archivo).filter(Archivo.usuario_id == 1).all():
+            try:
+                os.remove(archivo.ruta_archivo)
+            except FileNotFoundError:
+                pass
+            session.delete(archivo)
+        for evento in session.query(Evento).filter(Evento.usuario_id == 1).all():
+            session.delete(evento)
+        session.delete(session.get(Usuario, 1))
+        session.commit()
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de eliminación de cuentas")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"🔧 Cuenta con {args.files} archivos y {args.events} eventos")
+    print(f"\n{'Método':<34}{'Vuelve en (s)':>15}{'Blobs borrados en (s)':>24}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            db_manager = DatabaseManager("fortifile.db")
+            db_manager.create_tables()
+
+            populate(os.path.abspath("fortifile.db"), args.files, args.events)
+            start = time.perf_counter()
+            old_delete(db_manager)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{'Anterior (ORM, blobs en serie)':<34}{elapsed:>15.2f}{elapsed:>24.2f}"
+            )
+
+            populate(os.path.abspath("fortifile.db"), args.files, args.events)
+            user_service = UserService()
+            start = time.perf_counter()
+            with mock.patch("bcrypt.checkpw", return_value=True):
+                result = user_service.delete_account(1, "x")
+            returned = time.perf_counter() - start
+            assert result["success"], result["message"]
+            get_blob_reaper(user_service.db_manager).wait()
+            finished = time.perf_counter() - start
+            print(
+                f"{'delete_account (por conjuntos)':<34}{returned:>15.2f}{finished:>24.2f}"
+            )
+
+            remaining = sum(len(names) for _, _, names in os.walk("secure_files"))
+            print(f"\nBlobs restantes en disco: {remaining}")
+            db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
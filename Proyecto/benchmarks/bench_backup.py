@@ -0,0 +1,162 @@
+"""
+Benchmark del respaldo incremental del almacén.
+
+Crea un almacén con muchos blobs (contenido aleatorio, sin cifrar: el
+respaldo no descifra) y mide:
+
+- El respaldo anterior: checkpoint y shutil.copy2 de la BD (sin blobs).
+- El primer respaldo con VaultBackup (BD y todos los blobs).
+- Un respaldo repetido sin cambios y otro tras agregar un 1 % de blobs.
+- Cuánto espera una escritura que coincide con el respaldo de la BD.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_backup.py --blobs 2000 --size-kb 256
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.database.connection import DatabaseManager  # noqa: E402
+from backend.services.vault_backup import VaultBackup  # noqa: E402
+
+
+def add_blobs(first: int, count: int, size: int):
+    """Escribe `count` blobs y sus registros en `archivos`"""
+    rows = []
+    for index in range(first, first + count):
+        directory = os.path.join("secure_files", "objects", f"{index % 256:02x}")
+        path = os.path.join(directory, f"{index:064x}.enc")
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        rows.append((f"archivo_{index}.bin", path, 1, size - 60, size))
+    connection = sqlite3.connect("fortifile.db")
+    connection.executemany(
+        "INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id, "
+        "tamano_original, tamano_cifrado) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    connection.commit()
+    connection.close()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def writer_latency(stop: threading.Event, latencies: list):
+    """Inserta eventos continuamente y guarda lo que tarda cada commit"""
+    connection = sqlite3.connect("fortifile.db", timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        connection.execute(
+            "INSERT INTO eventos (descripcion, usuario_id) VALUES ('bench', 1)"
+        )
+        connection.commit()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de respaldos")
+    parser.add_argument("--blobs", type=int, default=2000)
+    parser.add_argument("--size-kb", type=int, default=256)
+    args = parser.parse_args()
+    size = args.size_kb * 1024
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            db_manager = DatabaseManager("fortifile.db")
+            db_manager.create_tables()
+            connection = sqlite3.connect("fortifile.db")
+            connection.execute(
+                "INSERT INTO usuarios (id_usuario, username, password_hash) "
+                "VALUES (1, 'bench', 'x')"
+            )
+            # Historial de eventos para que la BD tenga un tamaño realista
+            connection.executemany(
+                "INSERT INTO eventos (descripcion, usuario_id) VALUES (?, 1)",
+                [("Archivo descargado: informe.pdf",)] * 300_000,
+            )
+            connection.commit()
+            connection.close()
+            add_blobs(0, args.blobs, size)
+            db_mb = os.path.getsize("fortifile.db") / 1024 / 1024
+            print(
+                f"🔧 {args.blobs} blobs de {args.size_kb} KB "
+                f"({args.blobs * size / 1024 / 1024:.0f} MB), BD de {db_mb:.1f} MB"
+            )
+
+            def old_backup():
+                os.makedirs("respaldo_anterior", exist_ok=True)
+                db_manager.checkpoint()
+                shutil.copy2(
+                    "fortifile.db",
+                    os.path.join("respaldo_anterior", "fortifile_backup.db"),
+                )
+
+            backup = VaultBackup(db_manager)
+            print(f"\n{'Respaldo':<36}{'Copiados':>10}{'MB':>10}{'Tiempo (s)':>12}")
+            _, elapsed = timed(old_backup)
+            print(
+                f"{'Anterior (solo BD, copy2)':<36}{'-':>10}{db_mb:>10.1f}{elapsed:>12.2f}"
+            )
+
+            for label, before in (
+                ("Primer respaldo", None),
+                ("Repetido sin cambios", None),
+                (
+                    "Tras agregar 1 % de blobs",
+                    lambda: add_blobs(args.blobs, max(1, args.blobs // 100), size),
+                ),
+            ):
+                if before:
+                    before()
+                result, elapsed = timed(lambda: backup.backup("respaldo"))
+                print(
+                    f"{label:<36}{result['copied']:>10}"
+                    f"{result['bytes_copied'] / 1024 / 1024 + db_mb:>10.1f}"
+                    f"{elapsed:>12.2f}"
+                )
+
+            # Escrituras concurrentes durante el respaldo de la BD
+            stop = threading.Event()
+            latencies = []
+            thread = threading.Thread(target=writer_latency, args=(stop, latencies))
+            thread.start()
+            time.sleep(0.05)
+            VaultBackup(db_manager, pages_per_step=64).backup("respaldo")
+            stop.set()
+            thread.join()
+            latencies.sort()
+            print(
+                f"\nEscrituras durante el respaldo: {len(latencies)}, "
+                f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                f"máx {latencies[-1] * 1000:.2f} ms"
+            )
+
+            _, elapsed = timed(lambda: backup.verify("respaldo"))
+            print(f"Verificación del respaldo: {elapsed:.2f} s")
+            db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark del re-cifrado de blobs en segundo plano (BlobMigration).
+
+Crea blobs en el formato anterior al cifrado en sobre (contenedores
+cifrados con la clave maestra) y mide cuánto tarda la migración al
+formato actual:
+
+- Con un hilo y con varios hilos.
+- Con un límite de lectura, para comprobar que se respeta.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_blob_migration.py --files 200 --size-kb 1024
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.database.connection import dispose_engines  # noqa: E402
+from backend.services.blob_migration import BlobMigration  # noqa: E402
+from backend.services.file_service import FileService  # noqa: E402
+
+
+def populate(file_service: FileService, files: int, size: int):
+    """Crea `files` blobs de `size` bytes cifrados con la clave maestra"""
+    rows = []
+    for index in range(files):
+        content = os.urandom(size)
+        path = file_service._blob_path(f"{index:064x}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            file_service.stream_cipher.encrypt_stream(io.BytesIO(content), f)
+        rows.append(
+            (
+                f"archivo_{index}.bin",
+                path,
+                size,
+                os.path.getsize(path),
+                hashlib.sha256(content).hexdigest(),
+            )
+        )
+    connection = sqlite3.connect("fortifile.db")
+    connection.execute(
+        "INSERT INTO usuarios (id_usuario, username, password_hash) "
+        "VALUES (1, 'bench', 'x')"
+    )
+    connection.executemany(
+        "INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id, "
+        "tamano_original, tamano_cifrado, hash_contenido, formato) "
+        "VALUES (?, ?, 1, ?, ?, ?, 1)",
+        rows,
+    )
+    connection.commit()
+    connection.close()
+
+
+def run_case(args, workers: int, limit_mb: float) -> tuple:
+    """Migra un almacén nuevo; devuelve (segundos, MB/s, blobs migrados)"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            file_service = FileService()
+            file_service.db_manager.create_tables()
+            populate(file_service, args.files, args.size_kb * 1024)
+
+            migration = BlobMigration(
+                file_service,
+                workers=workers,
+                max_bytes_per_second=int(limit_mb * 1024 * 1024) if limit_mb else None,
+            )
+            start = time.perf_counter()
+            result = migration.run()
+            elapsed = time.perf_counter() - start
+            assert result["completed"] and not result["failed"], result["message"]
+            dispose_engines(os.path.abspath("fortifile.db"))
+        finally:
+            os.chdir(previous_dir)
+    total_mb = args.files * args.size_kb / 1024
+    return elapsed, total_mb / elapsed, result["migrated"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de migración de blobs")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit-mb", type=float, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"🔧 {args.files} blobs de {args.size_kb} KB cifrados con la clave maestra "
+        f"({os.cpu_count()} núcleo(s))"
+    )
+    print(f"\n{'Migración':<34}{'Tiempo (s)':>12}{'MB/s':>10}{'Blobs':>8}")
+    cases = [
+        ("1 hilo", 1, None),
+        (f"{args.workers} hilos", args.workers, None),
+        (
+            f"{args.workers} hilos, límite {args.limit_mb:g} MB/s",
+            args.workers,
+            args.limit_mb,
+        ),
+    ]
+    for label, workers, limit_mb in cases:
+        elapsed, throughput, migrated = run_case(args, workers, limit_mb)
+        print(f"{label:<34}{elapsed:>12.2f}{throughput:>10.1f}{migrated:>8}")
+
+
+if __name__ == "__main__":
+    main()
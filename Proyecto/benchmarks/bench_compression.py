@@ -0,0 +1,148 @@
+"""
+Benchmark de compresión previa al cifrado de FortiFile.
+
+Para cada tipo de archivo de un corpus sintético (texto, CSV, JSON, código,
+registros, fotos y binarios aleatorios) y cada códec disponible, mide el
+tamaño cifrado relativo al original y la velocidad de cifrado y descifrado.
+El códec se elige igual que al subir: los formatos ya comprimidos y los
+datos cuya muestra no se reduce se cifran sin comprimir.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_compression.py --size-mb 16
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import sys
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.crypto.compression import (  # noqa: E402
+    CODEC_NAMES,
+    SAMPLE_SIZE,
+    available_codecs,
+    choose_codec,
+)
+from backend.crypto.stream_cipher import StreamCipher  # noqa: E402
+
+WORDS = (
+    "el la de que y en un ser se no haber por con su para como estar tener "
+    "le lo todo pero más hacer o poder decir este ir otro ese si me ya ver "
+    "porque dar cuando muy sin vez mucho saber qué sobre mi alguno mismo"
+).split()
+
+
+def _repeat_to_size(generate, size: int) -> bytes:
+    """Concatena bloques generados hasta llegar a `size` bytes"""
+    parts = []
+    total = 0
+    while total < size:
+        part = generate()
+        parts.append(part)
+        total += len(part)
+    return b"".join(parts)[:size]
+
+
+def build_corpus(size: int) -> dict:
+    """Genera `size` bytes de contenido por tipo de archivo"""
+    generator = random.Random(1)
+
+    def text():
+        words = generator.choices(WORDS, k=200)
+        return (" ".join(words).capitalize() + ".\n").encode()
+
+    def csv_rows():
+        return (
+            f"{generator.randrange(10**6)};2024-{generator.randrange(1, 13):02d}-"
+            f"{generator.randrange(1, 29):02d};{generator.uniform(0, 9999):.2f};"
+            f"{generator.choice(WORDS)}\n"
+        ).encode()
+
+    def json_records():
+        record = {
+            "id": generator.randrange(10**9),
+            "nombre": generator.choice(WORDS),
+            "activo": generator.random() < 0.5,
+            "saldo": round(generator.uniform(0, 1000), 2),
+        }
+        return (json.dumps(record) + ",\n").encode()
+
+    def log_lines():
+        return (
+            f"2024-05-{generator.randrange(1, 29):02d} 12:{generator.randrange(60):02d}"
+            f" INFO servicio.{generator.choice(WORDS)} petición atendida en "
+            f"{generator.randrange(500)} ms\n"
+        ).encode()
+
+    sources = sorted(glob.glob(os.path.join(os.path.dirname(os.__file__), "*.py")))
+    source_code = iter(sources * 10)
+
+    def code():
+        with open(next(source_code), "rb") as f:
+            return f.read()
+
+    return {
+        "informe.txt": _repeat_to_size(text, size),
+        "datos.csv": _repeat_to_size(csv_rows, size),
+        "registros.json": _repeat_to_size(json_records, size),
+        "modulo.py": _repeat_to_size(code, size),
+        "servidor.log": _repeat_to_size(log_lines, size),
+        "foto.jpg": os.urandom(size),
+        "aleatorio.bin": os.urandom(size),
+    }
+
+
+def measure(cipher: StreamCipher, name: str, data: bytes, codec: int) -> dict:
+    """Cifra y descifra `data` con el códec que se elegiría al subirlo"""
+    chosen = choose_codec(name, data[:SAMPLE_SIZE], codec)
+    encrypted = io.BytesIO()
+    start = time.perf_counter()
+    info = cipher.encrypt_stream(io.BytesIO(data), encrypted, codec=chosen)
+    encrypt_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cipher.decrypt_stream(io.BytesIO(encrypted.getvalue()), io.BytesIO())
+    decrypt_time = time.perf_counter() - start
+
+    megabytes = len(data) / 1024 / 1024
+    return {
+        "codec": CODEC_NAMES[chosen],
+        "ratio": info["ciphertext_size"] / len(data),
+        "encrypt_mb_s": megabytes / encrypt_time,
+        "decrypt_mb_s": megabytes / decrypt_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de compresión FortiFile")
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    cipher = StreamCipher(os.urandom(32), workers=args.workers)
+    corpus = build_corpus(args.size_mb * 1024 * 1024)
+    print(f"🔧 {args.size_mb} MB por tipo de archivo, {args.workers} hilo(s)")
+
+    print(
+        f"\n{'Archivo':<16}{'Códec':>8}{'Aplicado':>10}{'Tamaño':>9}"
+        f"{'Cifrar MB/s':>14}{'Descifrar MB/s':>16}"
+    )
+    for name, data in corpus.items():
+        for codec in available_codecs():
+            result = measure(cipher, name, data, codec)
+            print(
+                f"{name:<16}{CODEC_NAMES[codec]:>8}{result['codec']:>10}"
+                f"{result['ratio'] * 100:>8.1f}%"
+                f"{result['encrypt_mb_s']:>14.1f}{result['decrypt_mb_s']:>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
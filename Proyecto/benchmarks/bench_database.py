@@ -0,0 +1,148 @@
+"""
+Benchmark de los perfiles de SQLite de DatabaseManager.
+
+Un hilo escritor registra eventos con un commit por evento (como
+_log_event) mientras varios hilos lectores listan archivos. Para cada
+perfil se informa cuántos commits por segundo logra el escritor y la
+latencia de las lecturas concurrentes.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_database.py --readers 4 --seconds 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.database.connection import DatabaseManager  # noqa: E402
+from backend.models.event_model import Evento  # noqa: E402
+from backend.models.file_model import Archivo  # noqa: E402
+from backend.models.user_model import Usuario  # noqa: E402
+
+
+def populate(db_manager: DatabaseManager, files: int):
+    """Crea un usuario con `files` archivos para las lecturas"""
+    session = db_manager.get_session()
+    try:
+        session.add(Usuario(id_usuario=1, username="bench", password_hash="x"))
+        session.add_all(
+            Archivo(
+                nombre_archivo=f"archivo_{index:06d}.txt",
+                ruta_archivo="sin_contenido",
+                usuario_id=1,
+                extension="txt",
+            )
+            for index in range(files)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def run_profile(db_path: str, profile: str, readers: int, seconds: float) -> dict:
+    """Mide un perfil con un escritor y `readers` lectores concurrentes"""
+    db_manager = DatabaseManager(db_path, profile=profile)
+    stop = threading.Event()
+    commits = 0
+    latencies = []
+    errors = []
+
+    def writer():
+        nonlocal commits
+        while not stop.is_set():
+            session = db_manager.get_session()
+            try:
+                session.add(
+                    Evento(
+                        descripcion="Evento de prueba",
+                        usuario_id=1,
+                        fecha_evento=datetime.utcnow(),
+                    )
+                )
+                session.commit()
+                commits += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+    def reader():
+        while not stop.is_set():
+            session = db_manager.get_session()
+            start = time.perf_counter()
+            try:
+                session.query(Archivo).filter(Archivo.usuario_id == 1).order_by(
+                    Archivo.nombre_archivo
+                ).limit(100).all()
+                session.query(Evento).filter(Evento.usuario_id == 1).order_by(
+                    Evento.id_evento.desc()
+                ).limit(50).all()
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader) for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db_manager.engine.dispose()
+
+    latencies.sort()
+    return {
+        "commits_s": commits / seconds,
+        "reads_s": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles de SQLite")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--files", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(
+        f"🔧 1 escritor, {args.readers} lectores, {args.seconds:.0f} s por perfil, "
+        f"{args.files} archivos"
+    )
+    print(
+        f"\n{'Perfil':<14}{'Commits/s':>11}{'Lecturas/s':>12}"
+        f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'Errores':>9}"
+    )
+    for profile in ("safe", "performance"):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "bench.db")
+            setup = DatabaseManager(db_path, profile=profile)
+            setup.create_tables()
+            populate(setup, args.files)
+            setup.engine.dispose()
+
+            result = run_profile(db_path, profile, args.readers, args.seconds)
+            print(
+                f"{profile:<14}{result['commits_s']:>11.0f}{result['reads_s']:>12.0f}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['errors']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
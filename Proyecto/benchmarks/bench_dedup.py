@@ -0,0 +1,115 @@
+"""
+Benchmark del almacén deduplicado de FortiFile.
+
+Genera un corpus con archivos repetidos (copias de fotos, documentos y
+respaldos guardados varias veces) y lo sube con FileService.upload_files.
+Como referencia sube un corpus con los mismos tamaños pero sin contenido
+repetido, en el que cada subida cifra y escribe un blob nuevo.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_dedup.py --unique 40 --copies 2.5
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.services.file_service import FileService  # noqa: E402
+
+# Tamaños típicos (KB): documentos pequeños, fotos y algún archivo grande
+SIZES_KB = [16, 64, 180, 512, 1500, 3000, 8000]
+
+
+def create_corpus(directory: str, unique: int, copies: float, repeated: bool):
+    """
+    Crea `unique * copies` archivos a partir de `unique` tamaños distintos
+
+    Con `repeated` los archivos adicionales son copias de los originales;
+    sin él tienen el mismo tamaño pero contenido propio.
+    """
+    os.makedirs(directory)
+    generator = random.Random(1)
+    sizes = [generator.choice(SIZES_KB) * 1024 for _ in range(unique)]
+    contents = [os.urandom(size) for size in sizes]
+
+    paths = []
+    for index in range(int(unique * copies)):
+        source = generator.randrange(unique) if index >= unique else index
+        content = contents[source] if repeated else os.urandom(sizes[source])
+        path = os.path.join(directory, f"archivo_{index:03d}.bin")
+        with open(path, "wb") as f:
+            f.write(content)
+        paths.append(path)
+    generator.shuffle(paths)
+    return paths
+
+
+def directory_size(directory: str) -> int:
+    """Bytes ocupados por los archivos de un directorio (recursivo)"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def bench_upload(files_directory: str, paths: list) -> tuple:
+    """Sube `paths` a un almacén vacío. Devuelve (segundos, bytes en disco)"""
+    file_service = FileService(files_directory=files_directory)
+    start = time.perf_counter()
+    result = file_service.upload_files(1, paths)
+    elapsed = time.perf_counter() - start
+    assert result["failed"] == 0, result["message"]
+    return elapsed, directory_size(files_directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de deduplicación")
+    parser.add_argument("--unique", type=int, default=40)
+    parser.add_argument("--copies", type=float, default=2.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # FileService usa rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            FileService().db_manager.create_tables()
+
+            distinct = create_corpus("distintos", args.unique, args.copies, False)
+            repeated = create_corpus("repetidos", args.unique, args.copies, True)
+            corpus_size = sum(os.path.getsize(p) for p in repeated)
+            print(
+                f"🔧 Corpus: {len(repeated)} archivos ({args.unique} distintos), "
+                f"{corpus_size / 1024 / 1024:.1f} MB"
+            )
+
+            baseline_time, baseline_size = bench_upload("almacen_base", distinct)
+            dedup_time, dedup_size = bench_upload("almacen_dedup", repeated)
+
+            print(f"\n{'Almacén':<24}{'MB en disco':>14}{'Tiempo (s)':>14}")
+            print(
+                f"{'Un blob por subida':<24}"
+                f"{baseline_size / 1024 / 1024:>14.1f}{baseline_time:>14.2f}"
+            )
+            print(
+                f"{'Deduplicado':<24}"
+                f"{dedup_size / 1024 / 1024:>14.1f}{dedup_time:>14.2f}"
+            )
+            print(
+                f"\nAhorro: {(1 - dedup_size / baseline_size) * 100:.0f}% de "
+                f"espacio, {(1 - dedup_time / baseline_time) * 100:.0f}% de tiempo"
+            )
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
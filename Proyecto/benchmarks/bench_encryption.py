@@ -0,0 +1,105 @@
+"""
+Benchmark de cifrado de archivos de FortiFile.
+
+Compara el cifrado anterior (un único token Fernet del archivo completo)
+con el contenedor por bloques en modo secuencial y en paralelo.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_encryption.py --size-mb 256 --workers 1 2 4
+"""
+
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.crypto.stream_cipher import DEFAULT_CHUNK_SIZE, StreamCipher  # noqa: E402
+
+
+def create_sample_file(directory: str, size_mb: int) -> str:
+    """Crea un archivo de datos aleatorios del tamaño indicado"""
+    path = os.path.join(directory, "sample.bin")
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+def best_of(repeat: int, func) -> float:
+    """Ejecuta `func` varias veces y devuelve el menor tiempo en segundos"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_fernet(source_path: str, output_path: str, key: bytes):
+    """Ruta anterior: leer todo, cifrar con Fernet y escribir"""
+    cipher = Fernet(key)
+    with open(source_path, "rb") as f:
+        encrypted = cipher.encrypt(f.read())
+    with open(output_path, "wb") as f:
+        f.write(encrypted)
+
+
+def bench_stream(source_path: str, output_path: str, cipher: StreamCipher, workers):
+    """Contenedor por bloques con la cantidad de hilos indicada"""
+    with open(source_path, "rb") as source, open(output_path, "wb") as destination:
+        cipher.encrypt_stream(source, destination, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cifrado FortiFile")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-kb", type=int, default=DEFAULT_CHUNK_SIZE // 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip-fernet", action="store_true", help="No medir la ruta Fernet"
+    )
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    stream_cipher = StreamCipher(
+        base64.urlsafe_b64decode(key), chunk_size=args.chunk_kb * 1024
+    )
+
+    print(f"🔧 Archivo de {args.size_mb} MB, bloques de {args.chunk_kb} KB")
+    print(f"   Núcleos disponibles: {os.cpu_count()}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_path = create_sample_file(temp_dir, args.size_mb)
+        output_path = os.path.join(temp_dir, "sample.enc")
+
+        results = []
+        if not args.skip_fernet:
+            seconds = best_of(
+                args.repeat, lambda: bench_fernet(source_path, output_path, key)
+            )
+            results.append(("Fernet (archivo completo)", seconds))
+
+        for workers in args.workers:
+            seconds = best_of(
+                args.repeat,
+                lambda: bench_stream(source_path, output_path, stream_cipher, workers),
+            )
+            results.append((f"Bloques AES-GCM x{workers} hilos", seconds))
+
+    print(f"\n{'Ruta':<32}{'Tiempo (s)':>12}{'MB/s':>12}")
+    for name, seconds in results:
+        print(f"{name:<32}{seconds:>12.3f}{args.size_mb / seconds:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
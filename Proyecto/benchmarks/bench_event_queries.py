@@ -0,0 +1,151 @@
+"""
+Benchmark de la consulta del historial de eventos.
+
+Llena `eventos` con un historial grande de varios usuarios y mide cuánto
+tarda obtener una página de 50 eventos al principio y a mitad del
+historial de un usuario, con y sin filtro de tipo. Compara:
+
+- Sin índices: la consulta anterior (ORDER BY fecha_evento con OFFSET y
+  el tipo buscado en la descripción con LIKE) sin los índices compuestos.
+- list_user_events: paginación por cursor sobre los índices compuestos.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_event_queries.py --events 2000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.models.event_model import (  # noqa: E402
+    EVENT_DOWNLOAD,
+    EVENT_LOGIN,
+    EVENT_LOGIN_FAILED,
+    EVENT_UPLOAD,
+)
+from backend.services.user_service import UserService  # noqa: E402
+
+PAGE = 50
+USERS = 4
+KINDS = (
+    [(EVENT_LOGIN, "Inicio de sesión exitoso")] * 3
+    + [(EVENT_LOGIN_FAILED, "Intento de inicio de sesión fallido (Intento 1/3)")]
+    + [(EVENT_UPLOAD, "Archivo subido y cifrado: informe.pdf")] * 6
+    + [(EVENT_DOWNLOAD, "Archivo descargado: foto.jpg")] * 10
+)
+
+
+def populate(db_path: str, events: int):
+    """Inserta `events` eventos repartidos entre USERS usuarios"""
+    generator = random.Random(1)
+    start = datetime(2015, 1, 1)
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO usuarios (id_usuario, username, password_hash) VALUES (?, ?, ?)",
+        [(user, f"usuario{user}", "x") for user in range(1, USERS + 1)],
+    )
+
+    def rows():
+        for index in range(events):
+            event_type, description = generator.choice(KINDS)
+            yield (
+                description,
+                (start + timedelta(seconds=index * 30)).strftime(
+                    "%Y-%m-%d %H:%M:%S.%f"
+                ),
+                generator.randint(1, USERS),
+                event_type,
+            )
+
+    connection.executemany(
+        "INSERT INTO eventos (descripcion, fecha_evento, usuario_id, tipo) "
+        "VALUES (?, ?, ?, ?)",
+        rows(),
+    )
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+def best_of(func, repeat=5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def old_query(connection, offset: int, like: str = None):
+    """Consulta anterior: sin índices, OFFSET y filtro por descripción"""
+    where = "usuario_id = 1" + (" AND descripcion LIKE ?" if like else "")
+    params = ([like] if like else []) + [PAGE, offset]
+    return connection.execute(
+        f"SELECT * FROM eventos NOT INDEXED WHERE {where} "
+        "ORDER BY fecha_evento DESC LIMIT ? OFFSET ?",
+        params,
+    ).fetchall()
+
+
+def cursor_at(user_service, offset: int, event_types=None):
+    """Cursor de la página que empieza en `offset` (recorriendo páginas)"""
+    cursor = None
+    for _ in range(offset // 500):
+        cursor = user_service.list_user_events(
+            1, limit=500, cursor=cursor, event_types=event_types
+        )["next_cursor"]
+    return cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de consultas de eventos")
+    parser.add_argument("--events", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            user_service = UserService()
+            populate("fortifile.db", args.events)
+            per_user = args.events // USERS
+            print(f"🔧 {args.events} eventos, ~{per_user} por usuario")
+
+            connection = sqlite3.connect("fortifile.db")
+            print(
+                f"\n{'Página':<34}{'Sin índices (ms)':>18}"
+                f"{'list_user_events (ms)':>23}"
+            )
+            for label, offset in (
+                ("Más reciente", 0),
+                ("Mitad del historial", per_user // 2 // 500 * 500),
+            ):
+                for type_label, like, event_types in (
+                    ("", None, None),
+                    (" (solo descargas)", "Archivo descargado%", [EVENT_DOWNLOAD]),
+                ):
+                    cursor = cursor_at(user_service, offset, event_types)
+                    old = best_of(lambda: old_query(connection, offset, like))
+                    new = best_of(
+                        lambda: user_service.list_user_events(
+                            1, limit=PAGE, cursor=cursor, event_types=event_types
+                        )
+                    )
+                    print(f"{label + type_label:<34}{old:>18.2f}{new:>23.2f}")
+            connection.close()
+            user_service.db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
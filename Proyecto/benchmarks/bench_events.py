@@ -0,0 +1,96 @@
+"""
+Benchmark del registro de eventos de FortiFile.
+
+Compara el registro anterior (una transacción por evento, como hacía
+_log_event) con EventSink, que encola el evento y lo inserta por lotes en
+segundo plano. Para cada uno se mide la latencia que añade registrar un
+evento a la operación y el tiempo total hasta que todos están escritos.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_events.py --events 2000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.database.connection import DatabaseManager  # noqa: E402
+from backend.models.event_model import Evento  # noqa: E402
+from backend.services.event_sink import EventSink  # noqa: E402
+
+
+def log_sync(db_manager: DatabaseManager, description: str):
+    """Registro anterior: un commit por evento"""
+    session = db_manager.get_session()
+    try:
+        session.add(
+            Evento(
+                descripcion=description, usuario_id=1, fecha_evento=datetime.utcnow()
+            )
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def run(events: int, log, finish=None) -> dict:
+    """Registra `events` eventos y mide la latencia de cada llamada"""
+    latencies = []
+    start = time.perf_counter()
+    for index in range(events):
+        call_start = time.perf_counter()
+        log(f"Archivo descargado: archivo_{index}.txt")
+        latencies.append(time.perf_counter() - call_start)
+    if finish:
+        finish()
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "events_s": events / total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del registro de eventos")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--profile", default="performance")
+    args = parser.parse_args()
+
+    print(f"🔧 {args.events} eventos, perfil de BD '{args.profile}'")
+    print(f"\n{'Registro':<26}{'p50 (µs)':>10}{'p99 (µs)':>10}{'Eventos/s':>11}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_manager = DatabaseManager(
+            os.path.join(temp_dir, "bench.db"), profile=args.profile
+        )
+        db_manager.create_tables()
+
+        sync = run(args.events, lambda text: log_sync(db_manager, text))
+        sink = EventSink(db_manager)
+        batched = run(args.events, lambda text: sink.log(1, text), sink.flush)
+        sink.close()
+
+        for name, result in (
+            ("Un commit por evento", sync),
+            ("EventSink (por lotes)", batched),
+        ):
+            print(
+                f"{name:<26}{result['p50_us']:>10.0f}{result['p99_us']:>10.0f}"
+                f"{result['events_s']:>11.0f}"
+            )
+        print(f"Lotes escritos por EventSink: {sink.batches}")
+        db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark del formato en disco de los archivos cifrados de FortiFile.
+
+Guarda el mismo contenido como token Fernet (formato heredado, en base64)
+y como contenedor binario por bloques, y compara el tamaño en disco, la
+velocidad de descarga completa y la de leer un rango pequeño. También
+mide la conversión de los archivos heredados con upgrade_legacy_blobs.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_format.py --size-mb 64
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.crypto.compression import CODEC_NONE  # noqa: E402
+from backend.models.file_model import Archivo  # noqa: E402
+from backend.services.file_service import BLOB_FORMAT_FERNET, FileService  # noqa: E402
+
+RANGE_LENGTH = 4096
+
+
+def best_of(repeat: int, func) -> float:
+    """Ejecuta `func` varias veces y devuelve el menor tiempo en segundos"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def store_legacy(file_service: FileService, user_id: int, source_path: str) -> int:
+    """Registra `source_path` como un archivo heredado (token Fernet)"""
+    legacy_path = os.path.join(file_service.files_directory, "user_1_legacy.enc")
+    with open(source_path, "rb") as source:
+        token = file_service.cipher.encrypt(source.read())
+    with open(legacy_path, "wb") as f:
+        f.write(token)
+
+    session = file_service.db_manager.get_session()
+    try:
+        archivo = Archivo(
+            nombre_archivo="heredado.bin",
+            ruta_archivo=legacy_path,
+            usuario_id=user_id,
+            formato=BLOB_FORMAT_FERNET,
+        )
+        session.add(archivo)
+        session.commit()
+        return archivo.id_archivo
+    finally:
+        session.close()
+
+
+def measure_reads(file_service, file_id, output_path, size, repeat):
+    """Tamaño en disco y tiempos de descarga completa y de un rango central"""
+    session = file_service.db_manager.get_session()
+    try:
+        archivo = session.get(Archivo, file_id)
+        blob, key = archivo.ruta_archivo, archivo.clave_envuelta
+    finally:
+        session.close()
+
+    download = best_of(
+        repeat,
+        lambda: file_service._decrypt_to_path(blob, output_path, wrapped_key=key),
+    )
+    read_range = best_of(
+        repeat,
+        lambda: file_service._read_blob_range(blob, size // 2, RANGE_LENGTH, key),
+    )
+    return os.path.getsize(blob), download, read_range
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del formato en disco")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # FileService usa rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            # Sin compresión, para comparar solo el formato
+            file_service = FileService(compression=CODEC_NONE)
+            file_service.db_manager.create_tables()
+
+            source_path = os.path.join(temp_dir, "muestra.bin")
+            with open(source_path, "wb") as f:
+                f.write(os.urandom(size))
+            output_path = os.path.join(temp_dir, "salida.bin")
+
+            legacy_id = store_legacy(file_service, 1, source_path)
+            stream_id = file_service.upload_file(1, source_path)["file_id"]
+
+            rows = [
+                (
+                    name,
+                    *measure_reads(
+                        file_service, file_id, output_path, size, args.repeat
+                    ),
+                )
+                for name, file_id in (
+                    ("Fernet (heredado)", legacy_id),
+                    ("Contenedor binario", stream_id),
+                )
+            ]
+
+            print(f"🔧 Archivo de {args.size_mb} MB")
+            print(
+                f"\n{'Formato':<22}{'MB en disco':>13}{'Sobrecoste':>12}"
+                f"{'Descarga MB/s':>15}{'Rango 4 KB (ms)':>17}"
+            )
+            for name, disk_size, download, read_range in rows:
+                print(
+                    f"{name:<22}{disk_size / 1024 / 1024:>13.1f}"
+                    f"{(disk_size / size - 1) * 100:>11.1f}%"
+                    f"{args.size_mb / download:>15.1f}{read_range * 1000:>17.2f}"
+                )
+
+            # Convertir el archivo heredado al nuevo formato
+            file_service.delete_file(1, stream_id)
+            start = time.perf_counter()
+            result = file_service.upgrade_legacy_blobs()
+            print(
+                f"\nConversión de {result['upgraded']} archivo heredado: "
+                f"{time.perf_counter() - start:.2f} s"
+            )
+
+            file_service.db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
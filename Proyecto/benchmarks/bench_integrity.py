@@ -0,0 +1,125 @@
+"""
+Benchmark de la verificación de integridad.
+
+Sube archivos aleatorios y mide:
+
+- La verificación anterior: solo comprobar que existe la ruta de cada
+  registro, fila por fila.
+- Una pasada completa de IntegrityChecker (descifra todos los blobs y
+  compara su SHA-256) con distinta cantidad de hilos.
+- Una pasada incremental sin cambios y otra con un 1 % de blobs
+  modificados.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_integrity.py --files 200 --size-kb 1024
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.models.file_model import Archivo  # noqa: E402
+from backend.services.file_service import FileService  # noqa: E402
+from backend.services.integrity_checker import IntegrityChecker  # noqa: E402
+from backend.services.user_service import UserService  # noqa: E402
+
+
+def existence_check(db_manager) -> int:
+    """Verificación anterior: existencia de la ruta de cada registro"""
+    session = db_manager.get_session()
+    try:
+        return sum(
+            not os.path.exists(file.ruta_archivo) for file in session.query(Archivo)
+        )
+    finally:
+        session.close()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de verificación")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            file_service = FileService()
+            file_service.db_manager.create_tables()
+            user_id = UserService().register_user("bench", "BenchPassword1")["user_id"]
+            paths = []
+            for index in range(args.files):
+                source = os.path.join(temp_dir, f"archivo_{index}.bin")
+                with open(source, "wb") as f:
+                    f.write(os.urandom(args.size_kb * 1024))
+                paths.append(source)
+            results = file_service.upload_files(user_id, paths)["results"]
+            for path in paths:
+                os.remove(path)
+            total_mb = args.files * args.size_kb / 1024
+            print(
+                f"🔧 {args.files} archivos de {args.size_kb} KB ({total_mb:.0f} MB), "
+                f"{os.cpu_count()} CPU"
+            )
+
+            print(f"\n{'Pasada':<34}{'Verificados':>12}{'Tiempo (s)':>12}{'MB/s':>10}")
+            _, elapsed = timed(lambda: existence_check(file_service.db_manager))
+            print(f"{'Solo existencia (anterior)':<34}{0:>12}{elapsed:>12.3f}{'-':>10}")
+
+            for workers in (1, 2, 4):
+                checker = IntegrityChecker(
+                    file_service.db_manager,
+                    file_service.files_directory,
+                    file_service,
+                    workers=workers,
+                )
+                result, elapsed = timed(checker.run)
+                print(
+                    f"{f'Completa ({workers} hilo(s))':<34}{result['checked']:>12}"
+                    f"{elapsed:>12.3f}{total_mb / elapsed:>10.1f}"
+                )
+
+            result, elapsed = timed(lambda: checker.run(incremental=True))
+            print(
+                f"{'Incremental sin cambios':<34}{result['checked']:>12}"
+                f"{elapsed:>12.3f}{'-':>10}"
+            )
+
+            # Marcar como modificados el 1 % de los blobs
+            session = file_service.db_manager.get_session()
+            try:
+                changed = [
+                    session.get(Archivo, item["file_id"]).ruta_archivo
+                    for item in results[: max(1, args.files // 100)]
+                ]
+            finally:
+                session.close()
+            future = time.time() + 3600
+            for path in changed:
+                os.utime(path, (future, future))
+            result, elapsed = timed(lambda: checker.run(incremental=True))
+            print(
+                f"{'Incremental (1 % modificado)':<34}{result['checked']:>12}"
+                f"{elapsed:>12.3f}{'-':>10}"
+            )
+            file_service.db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark de la rotación de la clave maestra con cifrado en sobre.
+
+Registra muchos archivos con claves de datos envueltas (sin blobs: rotar
+no los lee) y compara:
+
+- FileService.rotate_master_key: vuelve a envolver las claves en la BD.
+- El costo estimado de rotar sin cifrado en sobre: reescribir todos los
+  blobs, medido cifrando --sample-mb con el cifrador por bloques.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_key_rotation.py --files 100000 --avg-mb 4
+"""
+
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.crypto.envelope import generate_data_key  # noqa: E402
+from backend.crypto.stream_cipher import StreamCipher  # noqa: E402
+from backend.services.file_service import FileService  # noqa: E402
+
+
+def populate(file_service: FileService, files: int, shared_every: int):
+    """Registra `files` archivos; uno de cada `shared_every` comparte blob"""
+    rows = []
+    wrapped = None
+    for index in range(files):
+        if wrapped is None or index % shared_every:
+            wrapped = file_service.key_wrapper.wrap(generate_data_key())
+        path = f"secure_files/objects/{index % 256:02x}/{index:064x}.enc"
+        rows.append((f"archivo_{index}.bin", path, wrapped))
+    connection = sqlite3.connect("fortifile.db")
+    connection.execute(
+        "INSERT INTO usuarios (id_usuario, username, password_hash) "
+        "VALUES (1, 'bench', 'x')"
+    )
+    connection.executemany(
+        "INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id, "
+        "formato, clave_envuelta) VALUES (?, ?, 1, 1, ?)",
+        rows,
+    )
+    connection.commit()
+    connection.close()
+
+
+def reencrypt_throughput(sample_mb: int) -> float:
+    """MB/s al cifrar de nuevo un blob (lectura en memoria)"""
+    data = os.urandom(sample_mb * 1024 * 1024)
+    cipher = StreamCipher(os.urandom(32))
+    start = time.perf_counter()
+    cipher.encrypt_stream(io.BytesIO(data), io.BytesIO())
+    return sample_mb / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de rotación de claves")
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--avg-mb", type=float, default=4)
+    parser.add_argument("--sample-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            file_service = FileService()
+            file_service.db_manager.create_tables()
+            populate(file_service, args.files, shared_every=10)
+
+            start = time.perf_counter()
+            result = file_service.rotate_master_key()
+            elapsed = time.perf_counter() - start
+            assert result["success"], result["message"]
+
+            total_mb = args.files * args.avg_mb
+            throughput = reencrypt_throughput(args.sample_mb)
+            print(
+                f"🔧 {args.files} archivos, {result['rewrapped']} claves de datos, "
+                f"{total_mb / 1024:.0f} GB estimados"
+            )
+            print(f"\n{'Rotación':<40}{'Tiempo (s)':>12}")
+            print(f"{'Envolver de nuevo las claves':<40}{elapsed:>12.2f}")
+            print(
+                f"{'Reescribir los blobs (estimado)':<40}"
+                f"{total_mb / throughput:>12.0f}"
+                f"   ({throughput:.0f} MB/s sin contar E/S)"
+            )
+            file_service.db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark de la retención del registro de eventos.
+
+Simula años de uso (inicios de sesión, subidas y descargas diarias) y
+compara, antes y después de aplicar la retención, el número de filas de
+`eventos`, el tamaño de la BD (tras VACUUM) y la latencia de
+get_user_events. También mide el tamaño del archivo gzip y lo que tarda
+consultar un mes archivado.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_retention.py --years 3 --events-per-day 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.database.connection import DatabaseManager  # noqa: E402
+from backend.models.event_model import Evento  # noqa: E402
+from backend.models.user_model import Usuario  # noqa: E402
+from backend.services.event_retention import EventRetention  # noqa: E402
+from backend.services.user_service import UserService  # noqa: E402
+
+DESCRIPTIONS = (
+    ["Inicio de sesión exitoso"] * 2
+    + ["Intento de inicio de sesión fallido (Intento 1/3)"]
+    + [f"Archivo subido y cifrado: informe_{index}.pdf" for index in range(3)]
+    + [f"Archivo descargado: foto_{index}.jpg" for index in range(6)]
+)
+
+
+def populate(db_manager: DatabaseManager, days: int, per_day: int, now: datetime):
+    """Inserta `per_day` eventos por día durante `days` días"""
+    generator = random.Random(1)
+    session = db_manager.get_session()
+    try:
+        session.add(Usuario(id_usuario=1, username="bench", password_hash="x"))
+        for day in range(days, 0, -1):
+            start = now - timedelta(days=day)
+            session.bulk_insert_mappings(
+                Evento,
+                [
+                    {
+                        "descripcion": generator.choice(DESCRIPTIONS),
+                        "usuario_id": 1,
+                        "fecha_evento": start
+                        + timedelta(seconds=index * 86400 // per_day),
+                    }
+                    for index in range(per_day)
+                ],
+            )
+        session.commit()
+    finally:
+        session.close()
+
+
+def measure(db_manager, db_path, user_service, repeat=20) -> dict:
+    """Filas, tamaño de la BD compactada y latencia de get_user_events"""
+    with db_manager.engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
+        rows = connection.exec_driver_sql("SELECT COUNT(*) FROM eventos").scalar()
+    db_manager.checkpoint()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        user_service.get_user_events(1, 50)
+        times.append(time.perf_counter() - start)
+    return {
+        "rows": rows,
+        "size_mb": os.path.getsize(db_path) / 1024 / 1024,
+        "events_ms": min(times) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de retención de eventos")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--events-per-day", type=int, default=300)
+    parser.add_argument("--max-age-days", type=int, default=90)
+    args = parser.parse_args()
+    now = datetime.utcnow()
+    days = args.years * 365
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            user_service = UserService()
+            db_manager = user_service.db_manager
+            populate(db_manager, days, args.events_per_day, now)
+            print(
+                f"🔧 {args.years} años, {args.events_per_day} eventos por día, "
+                f"retención de {args.max_age_days} días"
+            )
+
+            before = measure(db_manager, "fortifile.db", user_service)
+            retention = EventRetention(
+                db_manager, max_age_days=args.max_age_days, max_rows=None
+            )
+            start = time.perf_counter()
+            result = retention.apply(now=now)
+            apply_time = time.perf_counter() - start
+            after = measure(db_manager, "fortifile.db", user_service)
+
+            print(
+                f"\n{'Estado':<22}{'Filas':>10}{'BD (MB)':>10}"
+                f"{'get_user_events (ms)':>22}"
+            )
+            for name, data in (("Sin retención", before), ("Con retención", after)):
+                print(
+                    f"{name:<22}{data['rows']:>10}{data['size_mb']:>10.1f}"
+                    f"{data['events_ms']:>22.2f}"
+                )
+
+            archive_size = sum(
+                os.path.getsize(os.path.join("event_archive", name))
+                for name in os.listdir("event_archive")
+            )
+            start = time.perf_counter()
+            month = retention.query_archive(
+                1, since=now - timedelta(days=400), until=now - timedelta(days=370)
+            )
+            query_time = time.perf_counter() - start
+            print(
+                f"\nArchivados: {result['archived']} eventos en "
+                f"{result['segments']} segmento(s), {archive_size / 1024 / 1024:.1f} "
+                f"MB gzip, {result['summaries']} resúmenes ({apply_time:.1f} s)"
+            )
+            print(
+                f"Consulta de un mes archivado: {len(month)} eventos en "
+                f"{query_time * 1000:.0f} ms"
+            )
+            db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark de búsqueda de archivos por nombre de FortiFile.
+
+Crea una base de datos temporal con muchos archivos sintéticos (solo
+registros, sin contenido cifrado) y mide FileService.search_files con
+búsquedas cortas, largas, sin resultados y con errores de tipeo.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_search.py --files 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.services.file_service import FileService  # noqa: E402
+
+WORDS = [
+    "informe",
+    "factura",
+    "foto",
+    "vacaciones",
+    "proyecto",
+    "contrato",
+    "resumen",
+    "nomina",
+    "backup",
+    "presupuesto",
+    "scan",
+    "reunion",
+    "notas",
+    "cliente",
+    "datos",
+]
+EXTENSIONS = ["pdf", "txt", "jpg", "png", "docx", "xlsx", "csv", "zip"]
+QUERIES = [
+    "fa",
+    "zip",
+    "contrato_12",
+    "presupuesto_scan",
+    "factura_notas_4242",
+    "presupesto",
+    "xyzw",
+]
+
+
+def populate(db_path: str, count: int, user_id: int = 1):
+    """Inserta `count` registros de archivos con nombres sintéticos"""
+    generator = random.Random(1)
+
+    def rows():
+        for _ in range(count):
+            extension = generator.choice(EXTENSIONS)
+            name = (
+                f"{generator.choice(WORDS)}_{generator.choice(WORDS)}_"
+                f"{generator.randrange(100000)}.{extension}"
+            )
+            yield name, name.lower(), "sin_contenido", user_id, extension
+
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO archivos (nombre_archivo, nombre_minusculas, ruta_archivo, "
+        "usuario_id, extension, fecha_subida) "
+        "VALUES (?, ?, ?, ?, ?, datetime('now'))",
+        rows(),
+    )
+    connection.commit()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda FortiFile")
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # FileService usa rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            file_service = FileService()
+            file_service.db_manager.create_tables()
+
+            start = time.perf_counter()
+            populate("fortifile.db", args.files)
+            print(
+                f"🔧 {args.files} archivos indexados en "
+                f"{time.perf_counter() - start:.1f} s"
+            )
+
+            print(f"\n{'Búsqueda':<24}{'Resultados':>12}{'ms (media)':>12}")
+            for query in QUERIES:
+                file_service.search_files(1, query)  # Calentar caché
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    result = file_service.search_files(1, query)
+                elapsed_ms = (time.perf_counter() - start) / args.repeat * 1000
+                print(f"{query:<24}{result['count']:>12}{elapsed_ms:>12.2f}")
+
+            file_service.db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
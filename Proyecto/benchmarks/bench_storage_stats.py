@@ -0,0 +1,158 @@
+"""
+Benchmark de las estadísticas de almacenamiento.
+
+Crea un almacén con muchos blobs pequeños (y registros que comparten
+algunos) y compara lo que tarda obtener el estado del almacenamiento:
+
+- Recorrido: la versión anterior, que recorre el directorio y hace stat
+  de cada blob (get_system_status lo recorría dos veces).
+- Contadores: get_storage_info y get_system_status leyendo los contadores
+  que mantienen los triggers de `archivos`.
+
+También mide el coste de los triggers al insertar registros y lo que tarda
+reconcile_storage_stats.
+
+Uso (desde Proyecto/):
+    python benchmarks/bench_storage_stats.py --files 20000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from backend.services.file_service import FileService  # noqa: E402
+from backend.services.system_service import SystemService  # noqa: E402
+
+BLOB_SIZE = 4096
+# Uno de cada DUPLICATE_EVERY registros reutiliza el blob anterior
+DUPLICATE_EVERY = 4
+
+
+def populate(files: int) -> list:
+    """Escribe los blobs en disco y devuelve las filas de `archivos`"""
+    rows = []
+    for index in range(files):
+        blob_index = index - 1 if index % DUPLICATE_EVERY == 1 else index
+        directory = os.path.join("secure_files", "objects", f"{blob_index % 256:02x}")
+        path = os.path.join(directory, f"{blob_index:064x}.enc")
+        if blob_index == index:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"\0" * BLOB_SIZE)
+        rows.append((f"archivo_{index}.bin", path, 1, BLOB_SIZE - 60, BLOB_SIZE))
+    return rows
+
+
+def insert_rows(rows: list, triggers: bool) -> float:
+    """Inserta las filas en lotes de 500 y devuelve los segundos"""
+    connection = sqlite3.connect("fortifile.db")
+    saved = []
+    if not triggers:
+        saved = connection.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE 'archivos_stats_%'"
+        ).fetchall()
+        for name, _ in saved:
+            connection.execute(f"DROP TRIGGER {name}")
+    start = time.perf_counter()
+    for offset in range(0, len(rows), 500):
+        connection.executemany(
+            "INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id, "
+            "tamano_original, tamano_cifrado) VALUES (?, ?, ?, ?, ?)",
+            rows[offset : offset + 500],
+        )
+        connection.commit()
+    elapsed = time.perf_counter() - start
+    if not triggers:
+        connection.execute("DELETE FROM archivos")
+        for _, sql in saved:
+            connection.execute(sql)
+        connection.commit()
+    connection.close()
+    return elapsed
+
+
+def walk_status():
+    """Estado del almacenamiento como se calculaba antes (dos recorridos)"""
+    for _ in range(2):
+        count = size = 0
+        for directory, _, filenames in os.walk("secure_files"):
+            for filename in filenames:
+                count += 1
+                size += os.path.getsize(os.path.join(directory, filename))
+
+
+def best_of(func, repeat=5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de estadísticas de almacenamiento"
+    )
+    parser.add_argument("--files", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Los servicios usan rutas relativas al directorio actual
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            file_service = FileService()
+            file_service.db_manager.create_tables()
+            system_service = SystemService(file_service)
+            connection = sqlite3.connect("fortifile.db")
+            connection.execute(
+                "INSERT INTO usuarios (id_usuario, username, password_hash) "
+                "VALUES (1, 'bench', 'x')"
+            )
+            connection.commit()
+            connection.close()
+
+            rows = populate(args.files)
+            plain = insert_rows(rows, triggers=False)
+            with_triggers = insert_rows(rows, triggers=True)
+            blobs = len({row[1] for row in rows})
+            print(f"🔧 {args.files} registros, {blobs} blobs de {BLOB_SIZE} bytes")
+            print(
+                f"Inserción: {plain * 1e6 / len(rows):.1f} µs/registro sin "
+                f"triggers, {with_triggers * 1e6 / len(rows):.1f} µs con triggers"
+            )
+
+            print(f"\n{'Consulta':<28}{'Recorrido (ms)':>16}{'Contadores (ms)':>18}")
+            walk = best_of(walk_status)
+            print(
+                f"{'get_storage_info':<28}{walk / 2:>16.2f}"
+                f"{best_of(file_service.get_storage_info):>18.2f}"
+            )
+            print(
+                f"{'get_system_status':<28}{walk:>16.2f}"
+                f"{best_of(system_service.get_system_status):>18.2f}"
+            )
+
+            start = time.perf_counter()
+            result = file_service.reconcile_storage_stats()
+            print(
+                f"\nreconcile_storage_stats: {result['blobs']} blobs en "
+                f"{(time.perf_counter() - start) * 1000:.0f} ms "
+                f"(corregido: {result['corrected']})"
+            )
+            file_service.db_manager.engine.dispose()
+        finally:
+            os.chdir(previous_dir)
+
+
+if __name__ == "__main__":
+    main()
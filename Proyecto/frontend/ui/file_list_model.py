@@ -0,0 +1,154 @@
+import os
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+
+def to_ui_file(file_info):
+    """Convierte la información de un archivo del backend al formato de la UI."""
+    ext = os.path.splitext(file_info["nombre"])[1].lower()
+    return {
+        "id": file_info["id"],
+        "name": file_info["nombre"],
+        "path": "",  # No necesitamos la ruta cifrada en la UI
+        "type": ext[1:] if ext else "",
+        "size": file_info["size_bytes"],  # Tamaño exacto original
+        "date": (
+            file_info["fecha_subida"].strftime("%d/%m/%Y %H:%M")
+            if file_info["fecha_subida"]
+            else "Desconocida"
+        ),
+    }
+
+
+class FileListModel(QAbstractListModel):
+    """
+    Modelo de la lista de archivos del usuario.
+
+    Las filas se piden al backend por páginas a medida que la vista las
+    necesita (canFetchMore/fetchMore) y se identifican por `id_archivo`.
+    Los archivos marcados se guardan en un conjunto de IDs, por lo que
+    marcar, desmarcar o recorrer la selección no depende de buscar filas.
+    """
+
+    FileIdRole = Qt.UserRole + 1
+
+    def __init__(self, fetch_page, parent=None):
+        """
+        Args:
+            fetch_page (callable): Recibe el cursor de la página a cargar
+                (None para la primera) y devuelve el resultado del backend:
+                {"success": bool, "files": list, "next_cursor": str | None}
+        """
+        super().__init__(parent)
+        self._fetch_page = fetch_page
+        self._files = []
+        self._row_by_id = {}
+        self._checked = {}  # id_archivo -> archivo marcado
+        self._cursor = None
+        self._has_more = True
+
+    def reload(self):
+        """Descarta las filas cargadas y la selección; vuelve a la primera página."""
+        self.beginResetModel()
+        self._files = []
+        self._row_by_id = {}
+        self._checked = {}
+        self._cursor = None
+        self._has_more = True
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    # --- Interfaz de QAbstractListModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._files)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._files):
+            return None
+        file_data = self._files[index.row()]
+        if role == Qt.DisplayRole:
+            return file_data["name"]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if file_data["id"] in self._checked else Qt.Unchecked
+        if role == self.FileIdRole:
+            return file_data["id"]
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        file_data = self._files[index.row()]
+        if value == Qt.Checked:
+            self._checked[file_data["id"]] = file_data
+        else:
+            self._checked.pop(file_data["id"], None)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+
+        result = self._fetch_page(self._cursor)
+        if not result["success"]:
+            self._has_more = False
+            print(
+                f"❌ Error cargando archivos: {result.get('message', 'Error desconocido')}"
+            )
+            return
+
+        self._cursor = result.get("next_cursor")
+        self._has_more = self._cursor is not None
+
+        # Ignorar archivos ya cargados (p. ej. si la lista cambió entre páginas)
+        new_files = [
+            to_ui_file(f) for f in result["files"] if f["id"] not in self._row_by_id
+        ]
+        if not new_files:
+            return
+
+        first = len(self._files)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_files) - 1)
+        for row, file_data in enumerate(new_files, start=first):
+            self._files.append(file_data)
+            self._row_by_id[file_data["id"]] = row
+        self.endInsertRows()
+        print(f"✅ Cargados {len(new_files)} archivos del usuario")
+
+    # --- Acceso por ID y selección ---
+
+    def file_at(self, row):
+        """Archivo de la fila indicada (o None)."""
+        if 0 <= row < len(self._files):
+            return self._files[row]
+        return None
+
+    def row_of(self, file_id):
+        """Fila del archivo con ese ID (o None si no está cargado)."""
+        return self._row_by_id.get(file_id)
+
+    def checked_files(self):
+        """Archivos marcados, en el orden en que se marcaron."""
+        return list(self._checked.values())
+
+    def checked_count(self):
+        return len(self._checked)
+
+    def set_all_checked(self, checked):
+        """Marca o desmarca todas las filas cargadas con una sola notificación."""
+        if checked:
+            self._checked = {f["id"]: f for f in self._files}
+        else:
+            self._checked = {}
+        if self._files:
+            self.dataChanged.emit(
+                self.index(0), self.index(len(self._files) - 1), [Qt.CheckStateRole]
+            )
@@ -1,5 +1,7 @@
 from backend.services.file_service import FileService
 from ui.account_view import AccountWindow
+from ui.file_list_model import FileListModel
+from ui.transfer_manager import TransferManager, TransferQueuePanel
 from themes import colors, fonts
 import sys
 import os
@@ -11,10 +13,10 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QLabel,
     QLineEdit,
-    QListWidget,
+    QListView,
     QVBoxLayout,
     QHBoxLayout,
-    QListWidgetItem,
+    QCheckBox,
     QTextEdit,
     QFileDialog,
     QMessageBox,
@@ -24,7 +26,7 @@ from PyQt5.QtWidgets import (
     QFrame,
 )
 from PyQt5.QtGui import QFont, QCursor, QIcon, QPixmap, QPalette, QBrush, QPainter
-from PyQt5.QtCore import Qt, QDateTime
+from PyQt5.QtCore import Qt, QDateTime, QTimer
 
 # Agregar el directorio del proyecto al path para poder importar backend
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
@@ -32,6 +34,25 @@ sys.path.insert(0, project_root)
 
 
 IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".bmp", ".gif"]
+TEXT_EXTENSIONS = [".txt", ".csv"]
+
+# Bytes máximos que se descifran para la vista previa
+IMAGE_PREVIEW_MAX_BYTES = 4 * 1024 * 1024
+HEADER_PREVIEW_BYTES = 512
+
+# Archivos que se piden al backend por página
+FILE_PAGE_SIZE = 100
+
+# Espera tras la última tecla antes de buscar (ms)
+SEARCH_DEBOUNCE_MS = 200
+
+# Orden (criterio, dirección) de list_files para cada opción del filtro
+FILTER_SORTS = {
+    "Nombre": ("nombre", "asc"),
+    "Tipo": ("tipo", "asc"),
+    "Fecha (Recientes primero)": ("fecha", "desc"),
+    "Fecha (Antiguos primero)": ("fecha", "asc"),
+}
 
 # Diccionario para mostrar el nombre completo del tipo de archivo
 FILE_TYPE_NAMES = {
@@ -92,16 +113,27 @@ class FileManagerUI(QMainWindow):
     """Interfaz principal para gestión de archivos."""
 
     def __init__(
-        self, on_logout=None, go_to_start=None, go_to_account=None, user_id=None
+        self,
+        on_logout=None,
+        go_to_start=None,
+        go_to_account=None,
+        user_id=None,
+        file_service=None,
     ):
         super().__init__()
         self.on_logout = on_logout
         self.go_to_start = go_to_start
         self.go_to_account = go_to_account  # Callback para navegar a cuenta
         self.user_id = user_id  # ID del usuario actual
-        self.file_service = FileService()  # Inicializar el servicio de archivos
+        # Servicio de archivos (compartido por la aplicación si se recibe)
+        self.file_service = file_service or FileService()
+        # Subidas y descargas en segundo plano (la ventana no se congela)
+        self.transfer_manager = TransferManager(self.file_service, parent=self)
+        self.transfer_manager.transfer_finished.connect(self._on_transfer_finished)
+        self._upload_ids = set()
+        self._reload_after_uploads = False
         self.setWindowTitle("FortiFile")
-        self.resize(900, 500)
+        self.resize(900, 620)
 
         base_path = os.path.dirname(os.path.abspath(__file__))
 
@@ -129,8 +161,9 @@ class FileManagerUI(QMainWindow):
         palette.setBrush(QPalette.Window, QBrush(fondo_combinado))
         self.setPalette(palette)
 
-        self.files_data = []
         self.current_filter = "Nombre"
+        # Modelo con las filas cargadas por páginas y los archivos marcados
+        self.file_model = FileListModel(self._fetch_files_page, self)
 
         main_widget = QWidget()
         outer_layout = QVBoxLayout(main_widget)
@@ -194,7 +227,7 @@ class FileManagerUI(QMainWindow):
         container.setStyleSheet(
             f"background-color: {colors.DARKEST}; border-radius: 10px;"
         )
-        container.setFixedSize(820, 420)
+        container.setFixedSize(820, 540)
         container_layout = QHBoxLayout(container)
 
         left_panel = QVBoxLayout()
@@ -204,7 +237,12 @@ class FileManagerUI(QMainWindow):
         self.search_bar.setStyleSheet(
             f"background-color: {colors.LIGHT}; color: {colors.WHITE}; padding: 5px"
         )
-        self.search_bar.textChanged.connect(self.refresh_file_list)
+        # Buscar cuando el usuario deja de escribir, no en cada tecla
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.refresh_file_list)
+        self.search_bar.textChanged.connect(self.search_timer.start)
 
         self.filter_button = QPushButton("Filtro")
         self.filter_button.setStyleSheet(self.get_button_style())
@@ -212,15 +250,25 @@ class FileManagerUI(QMainWindow):
         self.filter_button.setToolTip("Filtrar archivos")
         self.filter_button.clicked.connect(self.show_filter_dialog)
 
+        self.select_all_checkbox = QCheckBox("Todos")
+        self.select_all_checkbox.setStyleSheet(f"color: {colors.WHITE}")
+        self.select_all_checkbox.setToolTip("Marcar todos los archivos cargados")
+        self.select_all_checkbox.toggled.connect(self.file_model.set_all_checked)
+
         search_layout = QHBoxLayout()
         search_layout.addWidget(self.search_bar)
         search_layout.addWidget(self.filter_button)
+        search_layout.addWidget(self.select_all_checkbox)
 
-        self.file_list = QListWidget()
+        # Vista virtualizada: solo se dibujan las filas visibles y el modelo
+        # pide la siguiente página al llegar al final de la lista
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setUniformItemSizes(True)
         self.file_list.setStyleSheet(
             f"background-color: {colors.DARK}; color: {colors.WHITE}"
         )
-        self.file_list.itemClicked.connect(self.show_file_details)
+        self.file_list.clicked.connect(self.show_file_details)
 
         button_layout = QHBoxLayout()
         self.add_button = QPushButton("Agregar")
@@ -239,9 +287,14 @@ class FileManagerUI(QMainWindow):
         button_layout.addWidget(self.delete_button)
         button_layout.addWidget(self.download_button)
 
+        # Cola de transferencias con avance, velocidad y cancelación
+        self.transfer_panel = TransferQueuePanel(self.transfer_manager)
+        self.transfer_panel.setFixedHeight(110)
+
         left_panel.addLayout(search_layout)
         left_panel.addWidget(self.file_list)
         left_panel.addLayout(button_layout)
+        left_panel.addWidget(self.transfer_panel)
 
         right_panel = QVBoxLayout()
 
@@ -276,6 +329,7 @@ class FileManagerUI(QMainWindow):
             "border: 1px solid #333; background-color: #222;"
         )
         self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setWordWrap(True)
 
         right_panel.addWidget(self.file_info_title)
         right_panel.addWidget(self.file_info_text)
@@ -295,63 +349,36 @@ class FileManagerUI(QMainWindow):
         self.load_user_files()
 
     def load_user_files(self):
-        """Carga los archivos del usuario desde la base de datos."""
+        """Recarga la lista de archivos del usuario desde la primera página."""
         if not self.user_id:
             print("❌ No hay usuario logueado")
             return
 
-        try:
-            result = self.file_service.get_user_files(self.user_id)
-
-            if result["success"]:
-                self.files_data = []
-                self.file_list.clear()
-
-                for file_info in result["files"]:
-                    # Convertir información del backend al formato esperado por la UI
-                    file_data = {
-                        "id": file_info["id"],
-                        "name": file_info["nombre"],
-                        "path": "",  # No necesitamos la ruta cifrada en la UI
-                        "type": self._get_file_extension(file_info["nombre"]),
-                        "size": (
-                            int(file_info["size_mb"] * 1024 * 1024)
-                            if file_info["size_mb"]
-                            else 0
-                        ),  # Convertir MB a bytes
-                        "date": (
-                            file_info["fecha_subida"].strftime("%d/%m/%Y %H:%M")
-                            if file_info["fecha_subida"]
-                            else "Desconocida"
-                        ),
-                    }
-
-                    self.files_data.append(file_data)
-
-                    # Agregar a la lista visual
-                    item = QListWidgetItem(file_data["name"])
-                    item.setFlags(
-                        item.flags() | Qt.ItemIsUserCheckable | Qt.ItemIsEnabled
-                    )
-                    item.setCheckState(Qt.Unchecked)
-                    self.file_list.addItem(item)
-
-                print(f"✅ Cargados {result['count']} archivos del usuario")
-            else:
-                print(
-                    f"❌ Error cargando archivos: {result.get('message', 'Error desconocido')}"
-                )
+        self.select_all_checkbox.blockSignals(True)
+        self.select_all_checkbox.setChecked(False)
+        self.select_all_checkbox.blockSignals(False)
 
+        try:
+            self.file_model.reload()
         except Exception as e:
             print(f"❌ Error inesperado cargando archivos: {e}")
             QMessageBox.warning(
                 self, "Error", f"No se pudieron cargar los archivos: {str(e)}"
             )
 
-    def _get_file_extension(self, filename):
-        """Obtiene la extensión de un archivo."""
-        ext = os.path.splitext(filename)[1].lower()
-        return ext[1:] if ext else ""
+    def _fetch_files_page(self, cursor):
+        """Pide al backend una página según la búsqueda y el filtro actuales."""
+        search_text = self.search_bar.text().strip()
+        if search_text:
+            # Resultados de búsqueda ordenados por relevancia (una sola página)
+            return self.file_service.search_files(
+                self.user_id, search_text, limit=FILE_PAGE_SIZE
+            )
+
+        sort, order = FILTER_SORTS.get(self.current_filter, ("nombre", "asc"))
+        return self.file_service.list_files(
+            self.user_id, sort=sort, order=order, limit=FILE_PAGE_SIZE, cursor=cursor
+        )
 
     def get_button_style(self):
         """Devuelve el estilo para los botones principales."""
@@ -376,6 +403,9 @@ class FileManagerUI(QMainWindow):
             QMessageBox.No,
         )
         if reply == QMessageBox.Yes and callable(self.on_logout):
+            # No dejar transferencias escribiendo tras cerrar la sesión
+            self.transfer_manager.cancel_all()
+            self.transfer_manager.wait()
             self.on_logout()
 
     def confirm_account_details(self, event):
@@ -383,14 +413,8 @@ class FileManagerUI(QMainWindow):
             self.go_to_account()
 
     def refresh_file_list(self):
-        search_text = self.search_bar.text().lower()
-        self.file_list.clear()
-        for file_info in self.files_data:
-            if search_text in file_info["name"].lower():
-                item = QListWidgetItem(file_info["name"])
-                item.setFlags(item.flags() | Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
-                item.setCheckState(Qt.Unchecked)
-                self.file_list.addItem(item)
+        # La búsqueda y el orden se resuelven en la base de datos
+        self.load_user_files()
 
     def show_filter_dialog(self):
         dialog = FilterDialog()
@@ -398,10 +422,9 @@ class FileManagerUI(QMainWindow):
             self.current_filter = dialog.selected_option()
             self.refresh_file_list()
 
-    def show_file_details(self, item):
+    def show_file_details(self, index):
         # Muestra detalles y previsualiza imagen si corresponde
-        file_name = item.text()
-        file_info = next((f for f in self.files_data if f["name"] == file_name), None)
+        file_info = self.file_model.file_at(index.row())
         if file_info:
             # Mejor estética y tipo de archivo con nombre completo y sigla
             ext = file_info["type"]
@@ -413,9 +436,35 @@ class FileManagerUI(QMainWindow):
                 f"<b>Fecha de agregado:</b> {file_info['date']}"
             )
             self.file_info_text.setHtml(details)
-            ext_dot = f".{ext}"
-            if ext_dot in IMAGE_EXTENSIONS and os.path.exists(file_info["path"]):
-                pixmap = QPixmap(file_info["path"])
+            self.show_file_preview(file_info)
+        else:
+            self.file_info_text.clear()
+            self.preview_label.clear()
+
+    def show_file_preview(self, file_info):
+        """Previsualiza el inicio del archivo descifrando solo ese rango."""
+        self.preview_label.clear()
+        if not self.user_id:
+            return
+
+        ext_dot = f".{file_info['type']}"
+        length = (
+            IMAGE_PREVIEW_MAX_BYTES
+            if ext_dot in IMAGE_EXTENSIONS
+            else HEADER_PREVIEW_BYTES
+        )
+        result = self.file_service.read_range(self.user_id, file_info["id"], 0, length)
+        if not result["success"] or not result["data"]:
+            return
+
+        data = result["data"]
+        if ext_dot in IMAGE_EXTENSIONS:
+            # Imágenes más grandes que el límite no se previsualizan
+            if result["total_size"] > len(data):
+                self.preview_label.setText("Imagen demasiado grande para previsualizar")
+                return
+            pixmap = QPixmap()
+            if pixmap.loadFromData(data):
                 self.preview_label.setPixmap(
                     pixmap.scaled(
                         self.preview_label.width(),
@@ -424,49 +473,51 @@ class FileManagerUI(QMainWindow):
                         Qt.SmoothTransformation,
                     )
                 )
-            else:
-                self.preview_label.clear()
+        elif ext_dot in TEXT_EXTENSIONS:
+            self.preview_label.setText(data.decode("utf-8", errors="replace"))
         else:
-            self.file_info_text.clear()
-            self.preview_label.clear()
+            # Cabecera del archivo (por ejemplo "%PDF-1.7")
+            header = "".join(
+                chr(byte) if 32 <= byte < 127 else "." for byte in data[:64]
+            )
+            self.preview_label.setText(f"Cabecera: {header}")
 
     def add_file(self):
-        """Agrega un archivo usando el backend con cifrado automático."""
+        """Encola la subida y cifrado de uno o varios archivos."""
         if not self.user_id:
             QMessageBox.warning(self, "Error", "No hay usuario logueado.")
             return
 
-        file_path, _ = QFileDialog.getOpenFileName(self, "Seleccionar archivo")
-        if not file_path:
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Seleccionar archivos")
+        if not file_paths:
             return
 
-        try:
-            # Mostrar mensaje de carga
-            QMessageBox.information(
-                self,
-                "Subiendo archivo",
-                "Subiendo y cifrando archivo, por favor espere...",
+        for path in file_paths:
+            try:
+                total_bytes = os.path.getsize(path)
+            except OSError:
+                total_bytes = 0
+            transfer_id = self.transfer_manager.upload(
+                self.user_id, path, os.path.basename(path), total_bytes
             )
+            self._upload_ids.add(transfer_id)
 
-            # Usar el servicio del backend para subir y cifrar el archivo
-            result = self.file_service.upload_file(self.user_id, file_path)
-
-            if result["success"]:
-                # Archivo subido exitosamente
-                QMessageBox.information(self, "Éxito", result["message"])
+    def _on_transfer_finished(self, transfer_id, state, result):
+        """Actualiza la lista cuando terminan las subidas en curso."""
+        if transfer_id in self._upload_ids:
+            self._upload_ids.discard(transfer_id)
+            if state == "completed":
+                self._reload_after_uploads = True
 
-                # Recargar la lista de archivos
-                self.load_user_files()
-
-            else:
-                # Error al subir archivo
-                QMessageBox.warning(
-                    self, "Error", f"Error al subir archivo: {result['message']}"
-                )
+        if state == "completed":
+            print(f"✅ {result.get('message', 'Transferencia completada')}")
+        else:
+            print(f"❌ {result.get('message', 'Transferencia no completada')}")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error Crítico", f"Error inesperado: {str(e)}")
-            print(f"❌ Error en add_file: {e}")
+        # Recargar una sola vez al terminar el lote de subidas
+        if self._reload_after_uploads and not self._upload_ids:
+            self._reload_after_uploads = False
+            self.load_user_files()
 
     def delete_checked_files(self):
         """Elimina los archivos seleccionados usando el backend."""
@@ -475,17 +526,7 @@ class FileManagerUI(QMainWindow):
             return
 
         # Obtener archivos seleccionados con sus IDs
-        checked_files = []
-        for i in range(self.file_list.count()):
-            item = self.file_list.item(i)
-            if item.checkState() == Qt.Checked:
-                file_name = item.text()
-                # Buscar el archivo correspondiente en files_data para obtener el ID
-                file_info = next(
-                    (f for f in self.files_data if f["name"] == file_name), None
-                )
-                if file_info:
-                    checked_files.append({"name": file_name, "id": file_info["id"]})
+        checked_files = self.file_model.checked_files()
 
         if not checked_files:
             QMessageBox.information(
@@ -552,17 +593,7 @@ class FileManagerUI(QMainWindow):
             return
 
         # Obtener archivos seleccionados con sus IDs
-        checked_files = []
-        for i in range(self.file_list.count()):
-            item = self.file_list.item(i)
-            if item.checkState() == Qt.Checked:
-                file_name = item.text()
-                # Buscar el archivo correspondiente en files_data para obtener el ID
-                file_info = next(
-                    (f for f in self.files_data if f["name"] == file_name), None
-                )
-                if file_info:
-                    checked_files.append({"name": file_name, "id": file_info["id"]})
+        checked_files = self.file_model.checked_files()
 
         if not checked_files:
             QMessageBox.information(
@@ -588,62 +619,55 @@ class FileManagerUI(QMainWindow):
         if not dest_dir:
             return
 
-        # Descargar archivos uno por uno usando el backend
-        downloaded_files = []
-        failed_files = []
+        # Con varios archivos se ofrece empaquetarlos en un único ZIP
+        archive_format = None
+        if len(checked_files) > 1:
+            reply = QMessageBox.question(
+                self,
+                "Exportar",
+                f"¿Deseas empaquetar los {len(checked_files)} archivos en un único ZIP?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No,
+            )
+            if reply == QMessageBox.Yes:
+                archive_format = "zip"
+
+        # Confirmar sobrescritura de archivos existentes
+        confirmed_files = []
 
         for file_info in checked_files:
-            try:
-                output_path = os.path.join(dest_dir, file_info["name"])
-
-                # Verificar si el archivo ya existe y preguntar al usuario
-                if os.path.exists(output_path):
-                    reply = QMessageBox.question(
-                        self,
-                        "Archivo Existente",
-                        f"El archivo '{file_info['name']}' ya existe en el destino.\n¿Deseas sobrescribirlo?",
-                        QMessageBox.Yes | QMessageBox.No,
-                        QMessageBox.No,
-                    )
-                    if reply != QMessageBox.Yes:
-                        failed_files.append(
-                            f"{file_info['name']}: Cancelado por el usuario"
-                        )
-                        continue
-
-                # Usar el servicio del backend para descargar y descifrar
-                result = self.file_service.download_file(
-                    self.user_id, file_info["id"], output_path
+            output_path = os.path.join(dest_dir, file_info["name"])
+
+            # Verificar si el archivo ya existe y preguntar al usuario
+            if not archive_format and os.path.exists(output_path):
+                reply = QMessageBox.question(
+                    self,
+                    "Archivo Existente",
+                    f"El archivo '{file_info['name']}' ya existe en el destino.\n¿Deseas sobrescribirlo?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No,
                 )
+                if reply != QMessageBox.Yes:
+                    continue
 
-                if result["success"]:
-                    downloaded_files.append(file_info["name"])
-                    print(f"✅ Archivo descargado: {file_info['name']}")
-                else:
-                    failed_files.append(f"{file_info['name']}: {result['message']}")
-                    print(
-                        f"❌ Error descargando {file_info['name']}: {result['message']}"
-                    )
+            confirmed_files.append(file_info)
 
-            except Exception as e:
-                failed_files.append(f"{file_info['name']}: Error inesperado - {str(e)}")
-                print(f"❌ Error inesperado descargando {file_info['name']}: {e}")
+        if not confirmed_files:
+            return
 
-        # Mostrar resultados
-        if downloaded_files and not failed_files:
-            QMessageBox.information(
-                self,
-                "Descarga Exitosa",
-                f"Se descargaron correctamente {len(downloaded_files)} archivo(s) en:\n{dest_dir}",
-            )
-        elif downloaded_files and failed_files:
-            message = (
-                f"Descargados correctamente: {len(downloaded_files)} archivo(s)\n\n"
-            )
-            message += "Errores en:\n" + "\n".join(failed_files)
-            QMessageBox.warning(self, "Descarga Parcial", message)
+        # Descargar en segundo plano en una sola operación del backend
+        if archive_format:
+            name = f"{len(confirmed_files)} archivos (ZIP)"
+        elif len(confirmed_files) == 1:
+            name = confirmed_files[0]["name"]
         else:
-            message = "No se pudo descargar ningún archivo:\n\n" + "\n".join(
-                failed_files
-            )
-            QMessageBox.critical(self, "Error de Descarga", message)
+            name = f"{len(confirmed_files)} archivos"
+
+        self.transfer_manager.download_files(
+            self.user_id,
+            [f["id"] for f in confirmed_files],
+            dest_dir,
+            archive_format,
+            name,
+            sum(f["size"] for f in confirmed_files),
+        )
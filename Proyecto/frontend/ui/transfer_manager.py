@@ -0,0 +1,300 @@
+import itertools
+import threading
+import time
+from themes import colors
+from PyQt5.QtWidgets import (
+    QHBoxLayout,
+    QHeaderView,
+    QPushButton,
+    QTreeWidget,
+    QTreeWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+
+# Transferencias que se ejecutan a la vez (el resto espera en cola)
+MAX_CONCURRENT_TRANSFERS = 2
+
+# Intervalo mínimo entre señales de progreso de una transferencia (s)
+PROGRESS_INTERVAL = 0.1
+
+
+class TransferSignals(QObject):
+    """Señales que un trabajador emite desde su hilo hacia la interfaz."""
+
+    started = pyqtSignal(int)
+    # id, bytes procesados, bytes totales, velocidad en bytes/s
+    progress = pyqtSignal(int, "qint64", "qint64", float)
+    # id, estado ("completed", "failed" o "cancelled"), resultado del backend
+    finished = pyqtSignal(int, str, dict)
+
+
+class TransferWorker(QRunnable):
+    """Ejecuta una subida o descarga del backend fuera del hilo de la interfaz."""
+
+    def __init__(self, transfer_id, operation, total_bytes, signals):
+        """
+        Args:
+            transfer_id (int): ID de la transferencia
+            operation (callable): Recibe (progress_callback, cancel_event) y
+                devuelve el diccionario de resultado del backend
+            total_bytes (int): Tamaño esperado para calcular el porcentaje
+            signals (TransferSignals): Señales compartidas del gestor
+        """
+        super().__init__()
+        self.transfer_id = transfer_id
+        self.operation = operation
+        self.total_bytes = total_bytes
+        self.signals = signals
+        self.cancel_event = threading.Event()
+        self._done_bytes = 0
+        self._started_at = None
+        self._last_emit = 0.0
+
+    def _on_progress(self, delta):
+        self._done_bytes += delta
+        now = time.monotonic()
+        if now - self._last_emit < PROGRESS_INTERVAL:
+            return
+        self._last_emit = now
+        self._emit_progress(now)
+
+    def _emit_progress(self, now):
+        elapsed = max(now - self._started_at, 1e-6)
+        self.signals.progress.emit(
+            self.transfer_id,
+            self._done_bytes,
+            self.total_bytes,
+            self._done_bytes / elapsed,
+        )
+
+    def run(self):
+        if self.cancel_event.is_set():
+            self.signals.finished.emit(
+                self.transfer_id,
+                "cancelled",
+                {"success": False, "message": "Transferencia cancelada"},
+            )
+            return
+
+        self.signals.started.emit(self.transfer_id)
+        self._started_at = time.monotonic()
+        try:
+            result = self.operation(self._on_progress, self.cancel_event)
+        except Exception as e:
+            result = {"success": False, "message": f"Error inesperado: {e}"}
+
+        if result.get("success"):
+            self._emit_progress(time.monotonic())
+            state = "completed"
+        elif self.cancel_event.is_set():
+            state = "cancelled"
+        else:
+            state = "failed"
+        self.signals.finished.emit(self.transfer_id, state, result)
+
+
+class TransferManager(QObject):
+    """
+    Cola de subidas y descargas en segundo plano con concurrencia acotada.
+
+    Cada transferencia se ejecuta en un QThreadPool propio, informa su
+    avance en bytes y su velocidad, y puede cancelarse: el backend elimina
+    los archivos cifrados o de salida parciales.
+    """
+
+    # id, tipo ("upload" o "download"), nombre, bytes totales
+    transfer_added = pyqtSignal(int, str, str, "qint64")
+    transfer_started = pyqtSignal(int)
+    transfer_progress = pyqtSignal(int, "qint64", "qint64", float)
+    transfer_finished = pyqtSignal(int, str, dict)
+
+    def __init__(
+        self, file_service, max_concurrent=MAX_CONCURRENT_TRANSFERS, parent=None
+    ):
+        super().__init__(parent)
+        self.file_service = file_service
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_concurrent)
+        self._ids = itertools.count(1)
+        self._workers = {}
+
+        self.signals = TransferSignals()
+        self.signals.started.connect(self.transfer_started)
+        self.signals.progress.connect(self.transfer_progress)
+        self.signals.finished.connect(self._on_finished)
+
+    def upload(self, user_id, source_path, name, total_bytes):
+        """Encola la subida y cifrado de un archivo. Devuelve su ID."""
+        return self._submit(
+            "upload",
+            name,
+            total_bytes,
+            lambda progress, cancel: self.file_service.upload_file(
+                user_id,
+                source_path,
+                progress_callback=progress,
+                cancel_event=cancel,
+            ),
+        )
+
+    def download_files(
+        self, user_id, file_ids, dest_dir, archive_format, name, total_bytes
+    ):
+        """
+        Encola la descarga de uno o varios archivos hacia `dest_dir` (o a un
+        único paquete si se indica `archive_format`). Devuelve su ID.
+        """
+        return self._submit(
+            "download",
+            name,
+            total_bytes,
+            lambda progress, cancel: self.file_service.download_files(
+                user_id,
+                file_ids,
+                dest_dir,
+                archive_format=archive_format,
+                progress_callback=progress,
+                cancel_event=cancel,
+            ),
+        )
+
+    def cancel(self, transfer_id):
+        """Cancela una transferencia en cola o en curso."""
+        worker = self._workers.get(transfer_id)
+        if worker:
+            worker.cancel_event.set()
+
+    def cancel_all(self):
+        for worker in list(self._workers.values()):
+            worker.cancel_event.set()
+
+    def active_count(self):
+        """Transferencias en cola o en curso."""
+        return len(self._workers)
+
+    def wait(self, msecs=-1):
+        """Espera a que terminen las transferencias en curso."""
+        return self.pool.waitForDone(msecs)
+
+    def _submit(self, kind, name, total_bytes, operation):
+        transfer_id = next(self._ids)
+        worker = TransferWorker(transfer_id, operation, total_bytes, self.signals)
+        self._workers[transfer_id] = worker
+        self.transfer_added.emit(transfer_id, kind, name, total_bytes)
+        self.pool.start(worker)
+        return transfer_id
+
+    def _on_finished(self, transfer_id, state, result):
+        self._workers.pop(transfer_id, None)
+        self.transfer_finished.emit(transfer_id, state, result)
+
+
+def _format_size(num_bytes):
+    """Tamaño legible (B, KB, MB o GB)."""
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024:
+            return (
+                f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+            )
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+
+class TransferQueuePanel(QWidget):
+    """Panel con la cola de transferencias, su avance y velocidad."""
+
+    STATE_TEXT = {
+        "queued": "En cola",
+        "completed": "Completado",
+        "failed": "Error",
+        "cancelled": "Cancelado",
+    }
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self._items = {}
+        self._finished = set()
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Transferencia", "Estado", "Velocidad"])
+        self.tree.setRootIsDecorated(False)
+        self.tree.setSelectionMode(QTreeWidget.ExtendedSelection)
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.tree.setStyleSheet(
+            f"background-color: {colors.DARK}; color: {colors.WHITE}"
+        )
+
+        self.cancel_button = QPushButton("Cancelar")
+        self.clear_button = QPushButton("Limpiar")
+        for button in (self.cancel_button, self.clear_button):
+            button.setStyleSheet(
+                f"background-color: {colors.GRAY_DARK}; color: {colors.WHITE}; "
+                "padding: 3px; border-radius: 4px;"
+            )
+        self.cancel_button.setToolTip("Cancelar las transferencias seleccionadas")
+        self.clear_button.setToolTip("Quitar las transferencias terminadas")
+        self.cancel_button.clicked.connect(self.cancel_selected)
+        self.clear_button.clicked.connect(self.clear_finished)
+
+        buttons = QVBoxLayout()
+        buttons.addWidget(self.cancel_button)
+        buttons.addWidget(self.clear_button)
+        buttons.addStretch()
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.tree)
+        layout.addLayout(buttons)
+
+        manager.transfer_added.connect(self._on_added)
+        manager.transfer_started.connect(self._on_started)
+        manager.transfer_progress.connect(self._on_progress)
+        manager.transfer_finished.connect(self._on_finished)
+
+    def _on_added(self, transfer_id, kind, name, total_bytes):
+        arrow = "⬆" if kind == "upload" else "⬇"
+        item = QTreeWidgetItem(
+            [f"{arrow} {name} ({_format_size(total_bytes)})", "En cola", ""]
+        )
+        item.setData(0, Qt.UserRole, transfer_id)
+        self.tree.addTopLevelItem(item)
+        self._items[transfer_id] = item
+
+    def _on_started(self, transfer_id):
+        item = self._items.get(transfer_id)
+        if item:
+            item.setText(1, "0%")
+
+    def _on_progress(self, transfer_id, done_bytes, total_bytes, speed):
+        item = self._items.get(transfer_id)
+        if not item:
+            return
+        if total_bytes > 0:
+            item.setText(1, f"{min(100, done_bytes * 100 // total_bytes)}%")
+        else:
+            item.setText(1, _format_size(done_bytes))
+        item.setText(2, f"{_format_size(speed)}/s")
+
+    def _on_finished(self, transfer_id, state, result):
+        item = self._items.get(transfer_id)
+        if not item:
+            return
+        self._finished.add(transfer_id)
+        item.setText(1, self.STATE_TEXT.get(state, state))
+        if state != "completed":
+            item.setText(2, "")
+        item.setToolTip(0, result.get("message", ""))
+        item.setToolTip(1, result.get("message", ""))
+
+    def cancel_selected(self):
+        for item in self.tree.selectedItems():
+            self.manager.cancel(item.data(0, Qt.UserRole))
+
+    def clear_finished(self):
+        for transfer_id in list(self._finished):
+            item = self._items.pop(transfer_id)
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+        self._finished.clear()
@@ -0,0 +1,208 @@
+"""
+Tests para la eliminación de cuentas por conjuntos y BlobReaper
+"""
+
+from backend.database.connection import dispose_engines
+from backend.models.file_model import Archivo, BlobPendiente
+from backend.models.event_model import Evento
+from backend.models.user_model import Usuario
+from backend.services.blob_reaper import get_blob_reaper
+from backend.services.event_sink import flush_all_event_sinks
+from backend.services.file_service import FileService
+from backend.services.user_service import UserService
+import os
+import pytest
+import shutil
+import tempfile
+import sys
+import threading
+from unittest import mock
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+
+class TestBlobReaper:
+    """Test suite para UserService.delete_account y BlobReaper"""
+
+    @pytest.fixture
+    def workspace(self):
+        """Fixture que ejecuta cada test en un directorio vacío"""
+        temp_dir = tempfile.mkdtemp()
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        yield temp_dir
+        # Escribir los eventos pendientes antes de borrar la BD
+        flush_all_event_sinks()
+        os.chdir(previous_dir)
+        dispose_engines(os.path.join(temp_dir, "fortifile.db"))
+        shutil.rmtree(temp_dir)
+
+    def _upload(self, file_service, user_id, directory, name, content):
+        source = os.path.join(directory, name)
+        with open(source, "wb") as f:
+            f.write(content)
+        result = file_service.upload_file(user_id, source)
+        assert result["success"], result["message"]
+        return result["file_id"]
+
+    def _blob_paths(self, file_service, user_id):
+        session = file_service.db_manager.get_session()
+        try:
+            return {
+                path
+                for (path,) in session.query(Archivo.ruta_archivo).filter(
+                    Archivo.usuario_id == user_id
+                )
+            }
+        finally:
+            session.close()
+
+    def test_delete_account_keeps_shared_blobs(self, workspace):
+        """Test 1: Borrado por conjuntos; los blobs compartidos se conservan"""
+        file_service = FileService()
+        user_service = UserService()
+        user_service.db_manager.create_tables()
+        owner = user_service.register_user("propietario", "Propietario123")["user_id"]
+        # FortiFile solo registra un usuario: el segundo se crea directamente
+        session = user_service.db_manager.get_session()
+        try:
+            companion = Usuario(username="companero", password_hash="x")
+            session.add(companion)
+            session.commit()
+            other = companion.id_usuario
+        finally:
+            session.close()
+
+        shared = os.urandom(50_000)
+        for index in range(3):
+            self._upload(
+                file_service, owner, workspace, f"u{index}.bin", os.urandom(20_000)
+            )
+        self._upload(file_service, owner, workspace, "comun.bin", shared)
+        self._upload(file_service, other, workspace, "comun2.bin", shared)
+        owner_blobs = self._blob_paths(file_service, owner)
+        shared_blobs = self._blob_paths(file_service, other)
+        assert len(owner_blobs) == 4 and shared_blobs <= owner_blobs
+
+        # La contraseña incorrecta no borra nada
+        assert not user_service.delete_account(owner, "Incorrecta123")["success"]
+        assert self._blob_paths(file_service, owner) == owner_blobs
+
+        result = user_service.delete_account(owner, "Propietario123")
+        assert result["success"], result["message"]
+        assert "4 archivo(s)" in result["message"]
+        assert get_blob_reaper(user_service.db_manager).wait(timeout=10)
+
+        session = user_service.db_manager.get_session()
+        try:
+            assert session.query(Archivo).filter_by(usuario_id=owner).count() == 0
+            assert session.query(Evento).filter_by(usuario_id=owner).count() == 0
+            assert session.query(BlobPendiente).count() == 0
+        finally:
+            session.close()
+        for path in owner_blobs - shared_blobs:
+            assert not os.path.exists(path)
+        for path in shared_blobs:
+            assert os.path.exists(path)
+
+        # Los contadores quedan coherentes con el disco
+        assert not file_service.reconcile_storage_stats()["corrected"]
+        assert file_service.get_storage_info()["total_files"] == 1
+
+    def test_pending_blobs_resume_after_restart(self, workspace):
+        """Test 2: Los blobs pendientes de otra ejecución se borran al iniciar"""
+        file_service = FileService()
+        file_service.db_manager.create_tables()
+        user_id = UserService().register_user("reinicio", "Reinicio123")["user_id"]
+        file_id = self._upload(
+            file_service, user_id, workspace, "a.bin", os.urandom(10_000)
+        )
+        kept = self._blob_paths(file_service, user_id).pop()
+        orphan = os.path.join(file_service.objects_directory, "huerfano.enc")
+        with open(orphan, "wb") as f:
+            f.write(b"x" * 10)
+
+        # Simular una caída: la lista quedó registrada sin borrar los blobs
+        session = file_service.db_manager.get_session()
+        try:
+            session.add_all(
+                [BlobPendiente(ruta_archivo=orphan), BlobPendiente(ruta_archivo=kept)]
+            )
+            session.commit()
+        finally:
+            session.close()
+        # Mientras estén en la lista no son huérfanos para la verificación
+        from backend.services.integrity_checker import IntegrityChecker
+
+        checker = IntegrityChecker(
+            file_service.db_manager, file_service.files_directory
+        )
+        assert checker.run()["orphans"] == []
+
+        FileService()
+        assert get_blob_reaper(file_service.db_manager).wait(timeout=10)
+        assert not os.path.exists(orphan)
+        # El blob todavía referenciado no se borra
+        assert os.path.exists(kept)
+        files = file_service.get_user_files(user_id)["files"]
+        assert [f["id"] for f in files] == [file_id]
+
+    def test_reaper_races_dedup_upload(self, workspace):
+        """Test 3: Una subida deduplicada durante el borrado conserva su blob"""
+        file_service = FileService()
+        user_service = UserService()
+        user_service.db_manager.create_tables()
+        owner = user_service.register_user("propietario", "Propietario123")["user_id"]
+        session = user_service.db_manager.get_session()
+        try:
+            companion = Usuario(username="companero", password_hash="x")
+            session.add(companion)
+            session.commit()
+            other = companion.id_usuario
+        finally:
+            session.close()
+
+        content = os.urandom(30_000)
+        self._upload(file_service, owner, workspace, "a.bin", content)
+        blob = self._blob_paths(file_service, owner).pop()
+
+        # El otro usuario sube el mismo contenido justo antes del borrado
+        uploaded = {}
+        uploader = threading.Thread(
+            target=lambda: uploaded.update(
+                file_id=self._upload(
+                    FileService(), other, workspace, "copia.bin", content
+                )
+            )
+        )
+        remove = os.remove
+
+        def racing_remove(path):
+            if path == blob and not uploader.is_alive() and not uploaded:
+                uploader.start()
+                # Con el lock del blob tomado, la subida espera
+                uploader.join(0.5)
+            remove(path)
+
+        with mock.patch(
+            "backend.services.blob_reaper.os.remove", side_effect=racing_remove
+        ):
+            result = user_service.delete_account(owner, "Propietario123")
+            assert result["success"], result["message"]
+            assert get_blob_reaper(user_service.db_manager).wait(timeout=10)
+            uploader.join(10)
+        assert "file_id" in uploaded
+
+        output = os.path.join(workspace, "salida.bin")
+        result = file_service.download_file(other, uploaded["file_id"], output)
+        assert result["success"], result["message"]
+        with open(output, "rb") as f:
+            assert f.read() == content
+        assert not file_service.reconcile_storage_stats()["missing_blobs"]
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -3,7 +3,7 @@ Tests para la conexión y gestión de base de datos - Versión adaptada a pytest
 """
 
 from backend.models.user_model import Usuario
-from backend.database.connection import DatabaseManager
+from backend.database.connection import DatabaseManager, dispose_engines
 import os
 import pytest
 import tempfile
@@ -24,9 +24,10 @@ class TestDatabase:
         with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
             db_path = tmp.name
         yield db_path
-        # Cleanup: eliminar el archivo después del test
-        if os.path.exists(db_path):
-            os.unlink(db_path)
+        # Cleanup: eliminar el archivo (y su WAL) después del test
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.unlink(path)
 
     @pytest.fixture
     def db_manager(self, temp_db_path):
@@ -149,6 +150,202 @@ class TestDatabase:
 
         print("✅ Estructura de información de BD válida")
 
+    def test_database_migrates_existing_tables(self, temp_db_path):
+        """Test 5: create_tables agrega columnas nuevas a una BD existente"""
+        import sqlite3
+        from sqlalchemy import inspect
+
+        # Esquema original de archivos, sin las columnas de metadatos
+        connection = sqlite3.connect(temp_db_path)
+        connection.executescript(
+            """
+            CREATE TABLE usuarios (
+                id_usuario INTEGER PRIMARY KEY AUTOINCREMENT,
+                username VARCHAR(50) NOT NULL UNIQUE,
+                password_hash VARCHAR(255) NOT NULL,
+                fecha_creacion DATETIME
+            );
+            CREATE TABLE archivos (
+                id_archivo INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre_archivo VARCHAR(255) NOT NULL,
+                ruta_archivo VARCHAR(500) NOT NULL,
+                fecha_subida DATETIME,
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id_usuario)
+            );
+            CREATE INDEX ix_archivos_usuario_nombre
+                ON archivos (usuario_id, lower(nombre_archivo), id_archivo);
+            INSERT INTO usuarios (username, password_hash) VALUES ('viejo', 'hash');
+            INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id)
+                VALUES ('antiguo.txt', 'secure_files/antiguo.enc', 1);
+            CREATE TABLE eventos (
+                id_evento INTEGER PRIMARY KEY AUTOINCREMENT,
+                descripcion VARCHAR(500) NOT NULL,
+                fecha_evento DATETIME,
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id_usuario)
+            );
+            INSERT INTO eventos (descripcion, usuario_id)
+                VALUES ('Archivo descargado: antiguo.txt', 1),
+                       ('Inicio de sesión exitoso', 1),
+                       ('Algo desconocido', 1);
+            """
+        )
+        connection.commit()
+        connection.close()
+
+        db_manager = DatabaseManager(temp_db_path)
+        assert db_manager.create_tables()
+
+        columns = {
+            column["name"]
+            for column in inspect(db_manager.engine).get_columns("archivos")
+        }
+        for column in (
+            "tamano_original",
+            "tamano_cifrado",
+            "tipo_mime",
+            "hash_contenido",
+            "extension",
+            "nombre_minusculas",
+        ):
+            assert column in columns, f"Falta la columna migrada '{column}'"
+
+        # El índice por lower() de SQLite se reemplaza por el de la columna
+        from sqlalchemy import text
+
+        with db_manager.engine.connect() as connection:
+            indexes = set(
+                connection.execute(
+                    text(
+                        "SELECT name FROM sqlite_master "
+                        "WHERE type = 'index' AND tbl_name = 'archivos'"
+                    )
+                ).scalars()
+            )
+        assert "ix_archivos_usuario_nombre" not in indexes
+        assert "ix_archivos_usuario_nombre_minusculas" in indexes
+
+        # Los datos existentes se conservan
+        session = db_manager.get_session()
+        try:
+            from backend.models.file_model import Archivo
+
+            archivo = session.query(Archivo).one()
+            assert archivo.nombre_archivo == "antiguo.txt"
+            assert archivo.tamano_original is None
+
+            # El índice de búsqueda se construye con los archivos existentes
+            found = session.execute(
+                text("SELECT rowid FROM archivos_fts WHERE archivos_fts MATCH 'tigu'")
+            ).all()
+            assert found == [(archivo.id_archivo,)]
+
+            # Los eventos existentes reciben su tipo según la descripción
+            from backend.models.event_model import Evento
+
+            tipos = [
+                evento.tipo
+                for evento in session.query(Evento).order_by(Evento.id_evento)
+            ]
+            assert tipos == ["descarga", "inicio_sesion", "otro"]
+
+            # Los contadores de almacenamiento incluyen los archivos existentes
+            from backend.models.file_model import (
+                GLOBAL_STATS_ID,
+                EstadisticaAlmacenamiento,
+            )
+
+            assert session.get(EstadisticaAlmacenamiento, 1).archivos == 1
+            assert session.get(EstadisticaAlmacenamiento, GLOBAL_STATS_ID).blobs == 1
+        finally:
+            session.close()
+        db_manager.engine.dispose()
+
+    def test_database_performance_profile(self, temp_db_path):
+        """Test 6: Cada conexión aplica los pragmas del perfil configurado"""
+        import threading
+
+        db_manager = DatabaseManager(temp_db_path)
+        assert db_manager.create_tables()
+
+        pragmas = db_manager.get_pragmas()
+        assert pragmas["journal_mode"] == "wal"
+        assert pragmas["synchronous"] == 1  # NORMAL
+        assert pragmas["busy_timeout"] == 5000
+
+        # Escrituras desde varios hilos con el pool y lectura tras checkpoint
+        def insert(index):
+            session = db_manager.get_session()
+            try:
+                session.add(Usuario(username=f"hilo{index}", password_hash="x"))
+                session.commit()
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=insert, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        db_manager.checkpoint()
+        assert os.path.getsize(temp_db_path + "-wal") == 0
+        session = db_manager.get_session()
+        try:
+            assert session.query(Usuario).count() == 8
+        finally:
+            session.close()
+        db_manager.engine.dispose()
+
+        # El perfil "safe" mantiene el journal de rollback con fsync completo
+        safe_manager = DatabaseManager(temp_db_path, profile="safe")
+        pragmas = safe_manager.get_pragmas()
+        assert pragmas["journal_mode"] == "delete"
+        assert pragmas["synchronous"] == 2  # FULL
+        safe_manager.engine.dispose()
+
+    def test_database_shared_engine(self, temp_db_path):
+        """Test 7: Los gestores de una misma BD comparten engine y esquema"""
+        from sqlalchemy import event
+
+        first = DatabaseManager(temp_db_path)
+        second = DatabaseManager(os.path.relpath(temp_db_path))
+        assert first.engine is second.engine
+        assert first.SessionLocal is second.SessionLocal
+
+        # El DDL solo se ejecuta la primera vez
+        statements = []
+        event.listen(
+            first.engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+        assert first.create_tables()
+        assert statements, "La primera llamada debería crear el esquema"
+        statements.clear()
+        assert second.create_tables()
+        assert DatabaseManager(temp_db_path).create_tables()
+        assert statements == []
+
+        # Si la BD se borra, el esquema se vuelve a crear en el archivo nuevo
+        first.dispose()
+        for path in (temp_db_path, temp_db_path + "-wal", temp_db_path + "-shm"):
+            if os.path.exists(path):
+                os.unlink(path)
+        assert second.create_tables()
+        session = second.get_session()
+        try:
+            session.add(Usuario(username="nuevo", password_hash="x"))
+            session.commit()
+            assert session.query(Usuario).count() == 1
+        finally:
+            session.close()
+        dispose_engines(temp_db_path)
+
+        # Tras olvidar el engine, se crea uno nuevo
+        third = DatabaseManager(temp_db_path)
+        assert third.engine is not first.engine
+        dispose_engines(temp_db_path)
+
 
 # Mantener compatibilidad con ejecución directa
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+"""
+Tests para el cifrado en sobre: claves de datos por blob y rotación
+"""
+
+from cryptography.fernet import Fernet
+from backend.crypto.envelope import (
+    WRAPPED_KEY_SIZE,
+    KeyUnwrapError,
+    KeyWrapper,
+    generate_data_key,
+)
+from backend.database.connection import dispose_engines
+from backend.models.file_model import Archivo
+from backend.services.event_sink import flush_all_event_sinks
+from backend.services.file_service import BLOB_FORMAT_FERNET, FileService
+from backend.services.user_service import UserService
+import os
+import pytest
+import shutil
+import tempfile
+import sys
+from unittest import mock
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+
+class TestEnvelope:
+    """Test suite para KeyWrapper y las claves de datos de FileService"""
+
+    @pytest.fixture
+    def workspace(self):
+        """Fixture que ejecuta cada test en un directorio vacío"""
+        temp_dir = tempfile.mkdtemp()
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        yield temp_dir
+        # Escribir los eventos pendientes antes de borrar la BD
+        flush_all_event_sinks()
+        os.chdir(previous_dir)
+        dispose_engines(os.path.join(temp_dir, "fortifile.db"))
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def vault(self, workspace):
+        """Fixture con el servicio de archivos y un usuario registrado"""
+        file_service = FileService()
+        file_service.db_manager.create_tables()
+        user_id = UserService().register_user("sobre", "Sobre12345")["user_id"]
+        return {"file_service": file_service, "user_id": user_id}
+
+    def _upload(self, file_service, user_id, directory, name, content):
+        source = os.path.join(directory, name)
+        with open(source, "wb") as f:
+            f.write(content)
+        result = file_service.upload_file(user_id, source)
+        assert result["success"], result["message"]
+        return result["file_id"]
+
+    def _row(self, file_service, file_id):
+        session = file_service.db_manager.get_session()
+        try:
+            return session.get(Archivo, file_id)
+        finally:
+            session.close()
+
+    def _download(self, file_service, user_id, file_id, directory):
+        output = os.path.join(directory, f"salida_{file_id}.bin")
+        result = file_service.download_file(user_id, file_id, output)
+        assert result["success"], result["message"]
+        with open(output, "rb") as f:
+            return f.read()
+
+    def test_key_wrapper(self):
+        """Test 1: Envolver y desenvolver claves de datos"""
+        wrapper = KeyWrapper(os.urandom(32))
+        data_key = generate_data_key()
+        wrapped = wrapper.wrap(data_key)
+        assert len(wrapped) == WRAPPED_KEY_SIZE
+        assert wrapper.unwrap(wrapped) == data_key
+
+        # Otra clave maestra o una clave alterada no se desenvuelven
+        assert not KeyWrapper(os.urandom(32)).can_unwrap(wrapped)
+        tampered = bytes([wrapped[0] ^ 1]) + wrapped[1:]
+        with pytest.raises(KeyUnwrapError):
+            wrapper.unwrap(tampered)
+        with pytest.raises(ValueError):
+            wrapper.wrap(b"corta")
+
+    def test_blob_keys_and_crypto_erase(self, vault, workspace):
+        """Test 2: Cada blob tiene su clave; eliminar destruye la clave"""
+        file_service = vault["file_service"]
+        user_id = vault["user_id"]
+        shared = os.urandom(100_000)
+        first = self._upload(file_service, user_id, workspace, "a.bin", shared)
+        copy = self._upload(file_service, user_id, workspace, "copia.bin", shared)
+        other = self._upload(
+            file_service, user_id, workspace, "b.bin", os.urandom(5000)
+        )
+
+        rows = {fid: self._row(file_service, fid) for fid in (first, copy, other)}
+        assert all(len(row.clave_envuelta) == WRAPPED_KEY_SIZE for row in rows.values())
+        # Las copias comparten blob y clave; otro contenido tiene otra clave
+        assert rows[first].ruta_archivo == rows[copy].ruta_archivo
+        assert rows[first].clave_envuelta == rows[copy].clave_envuelta
+        assert rows[first].clave_envuelta != rows[other].clave_envuelta
+        # La clave maestra por sí sola no descifra el blob
+        with pytest.raises(Exception):
+            file_service._blob_plaintext_size(rows[other].ruta_archivo)
+        assert file_service.get_storage_info()["total_files"] == 2
+
+        # Eliminar una copia conserva la clave de la otra
+        assert file_service.delete_file(user_id, first)["success"]
+        assert self._download(file_service, user_id, copy, workspace) == shared
+
+        # Sin registros, una copia del texto cifrado ya no se puede descifrar
+        leaked = os.path.join(workspace, "copia_robada.enc")
+        shutil.copyfile(rows[other].ruta_archivo, leaked)
+        assert file_service.delete_file(user_id, other)["success"]
+        assert not os.path.exists(rows[other].ruta_archivo)
+        with pytest.raises(Exception):
+            file_service._blob_plaintext_size(leaked)
+        assert file_service.db_manager.get_pragmas()["secure_delete"] == 1
+
+    def test_rotate_master_key(self, vault, workspace):
+        """Test 3: Rotar la clave maestra sin reescribir los blobs"""
+        file_service = vault["file_service"]
+        user_id = vault["user_id"]
+        content = os.urandom(300_000)
+        file_id = self._upload(file_service, user_id, workspace, "a.bin", content)
+        blob_path = self._row(file_service, file_id).ruta_archivo
+        # Otra instancia del proceso creada antes de la rotación
+        other_service = FileService()
+
+        # Un archivo heredado (clave maestra) impide rotar hasta convertirlo
+        legacy_path = os.path.join(file_service.files_directory, "heredado.enc")
+        with open(legacy_path, "wb") as f:
+            f.write(file_service.cipher.encrypt(b"contenido heredado"))
+        session = file_service.db_manager.get_session()
+        try:
+            legacy = Archivo(
+                nombre_archivo="heredado.txt",
+                ruta_archivo=legacy_path,
+                usuario_id=user_id,
+                formato=BLOB_FORMAT_FERNET,
+            )
+            session.add(legacy)
+            session.commit()
+            legacy_id = legacy.id_archivo
+        finally:
+            session.close()
+        result = file_service.rotate_master_key()
+        assert not result["success"] and "conviértelos" in result["message"]
+        assert file_service.upgrade_legacy_blobs()["upgraded"] == 1
+
+        with open("fortifile.key", "rb") as f:
+            old_key = f.read()
+        blob_stat = os.stat(blob_path)
+        result = file_service.rotate_master_key()
+        assert result["success"], result["message"]
+        assert result["rewrapped"] == 2
+        with open("fortifile.key", "rb") as f:
+            assert f.read() != old_key
+        assert not os.path.exists("fortifile.key.new")
+        # Los blobs no se reescriben
+        assert os.stat(blob_path).st_mtime_ns == blob_stat.st_mtime_ns
+
+        # Todas las instancias leen y suben con la clave nueva
+        assert self._download(other_service, user_id, file_id, workspace) == content
+        assert (
+            self._download(other_service, user_id, legacy_id, workspace)
+            == b"contenido heredado"
+        )
+        new_id = self._upload(other_service, user_id, workspace, "b.bin", b"nuevo")
+        restarted = FileService()
+        assert self._download(restarted, user_id, new_id, workspace) == b"nuevo"
+        # Las direcciones no cambian: el mismo contenido se deduplica
+        copy_id = self._upload(restarted, user_id, workspace, "copia.bin", content)
+        assert self._row(restarted, copy_id).ruta_archivo == blob_path
+
+    def test_interrupted_rotation(self, vault, workspace):
+        """Test 4: Una rotación interrumpida se completa o se descarta"""
+        file_service = vault["file_service"]
+        user_id = vault["user_id"]
+        content = os.urandom(20_000)
+        file_id = self._upload(file_service, user_id, workspace, "a.bin", content)
+
+        # Clave nueva escrita pero la BD no llegó a usarla: se descarta
+        with open("fortifile.key.new", "wb") as f:
+            f.write(Fernet.generate_key())
+        restarted = FileService()
+        assert not os.path.exists("fortifile.key.new")
+        assert self._download(restarted, user_id, file_id, workspace) == content
+
+        # Caída después del commit y antes de reemplazar la clave
+        real_replace = os.replace
+
+        def crash_on_key(source, destination):
+            if str(source).endswith("fortifile.key.new"):
+                raise OSError("Caída simulada")
+            return real_replace(source, destination)
+
+        with mock.patch(
+            "backend.services.file_service.os.replace", side_effect=crash_on_key
+        ):
+            with pytest.raises(OSError):
+                restarted.rotate_master_key()
+        assert os.path.exists("fortifile.key.new")
+        recovered = FileService()
+        assert not os.path.exists("fortifile.key.new")
+        assert self._download(recovered, user_id, file_id, workspace) == content
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,199 @@
+"""
+Tests para la retención, el resumen y el archivo de eventos
+"""
+
+from backend.database.connection import DatabaseManager, dispose_engines
+from backend.models.event_model import Evento, classify_event
+from backend.services.event_retention import EventRetention
+from datetime import date, datetime, timedelta
+import glob
+import os
+import pytest
+import shutil
+import tempfile
+import sys
+from unittest import mock
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+NOW = datetime(2024, 6, 30, 12, 0, 0)
+
+
+class TestEventRetention:
+    """Test suite para EventRetention"""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Fixture con un directorio temporal para la BD y el archivo"""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        dispose_engines(os.path.join(temp_dir, "eventos.db"))
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def db_manager(self, temp_dir):
+        """Fixture con una base de datos temporal con las tablas creadas"""
+        db_manager = DatabaseManager(os.path.join(temp_dir, "eventos.db"))
+        assert db_manager.create_tables()
+        return db_manager
+
+    def _retention(self, db_manager, temp_dir, **options):
+        return EventRetention(
+            db_manager, archive_directory=os.path.join(temp_dir, "archivo"), **options
+        )
+
+    def _add_events(self, db_manager, events):
+        """Inserta (usuario, descripción, días de antigüedad) en orden"""
+        session = db_manager.get_session()
+        try:
+            for user_id, description, days_ago in events:
+                session.add(
+                    Evento(
+                        descripcion=description,
+                        usuario_id=user_id,
+                        fecha_evento=NOW - timedelta(days=days_ago),
+                    )
+                )
+            session.commit()
+        finally:
+            session.close()
+
+    def _hot_events(self, db_manager):
+        session = db_manager.get_session()
+        try:
+            return [
+                event.descripcion
+                for event in session.query(Evento).order_by(Evento.id_evento)
+            ]
+        finally:
+            session.close()
+
+    def test_classify_event(self):
+        """Test 1: El tipo se obtiene del inicio de la descripción"""
+        assert classify_event("Inicio de sesión exitoso") == "inicio_sesion"
+        assert classify_event("Archivo descargado: a.txt") == "descarga"
+        assert (
+            classify_event("Intento de inicio de sesión fallido (Intento 1/3)")
+            == "inicio_sesion_fallido"
+        )
+        assert classify_event("Algo distinto") == "otro"
+
+    def test_old_events_are_summarized_and_archived(self, db_manager, temp_dir):
+        """Test 2: Los eventos antiguos pasan a resúmenes y segmentos gzip"""
+        self._add_events(
+            db_manager,
+            [
+                (1, "Inicio de sesión exitoso", 200),
+                (1, "Archivo descargado: a.txt", 200),
+                (1, "Archivo descargado: b.txt", 200),
+                (2, "Inicio de sesión exitoso", 150),
+                (1, "Archivo subido y cifrado: c.txt", 10),
+            ],
+        )
+        retention = self._retention(db_manager, temp_dir, max_age_days=90)
+
+        result = retention.apply(now=NOW)
+        assert result["success"], result["message"]
+        assert result["archived"] == 4
+        assert self._hot_events(db_manager) == ["Archivo subido y cifrado: c.txt"]
+        assert len(glob.glob(os.path.join(temp_dir, "archivo", "*.jsonl.gz"))) == 1
+
+        old_day = (NOW - timedelta(days=200)).date()
+        assert retention.get_summary(1) == [
+            {"fecha": old_day, "tipo": "descarga", "cantidad": 2},
+            {"fecha": old_day, "tipo": "inicio_sesion", "cantidad": 1},
+        ]
+
+        # Los eventos archivados siguen disponibles bajo demanda
+        archived = retention.query_archive(1)
+        assert [event["descripcion"] for event in archived] == [
+            "Archivo descargado: b.txt",
+            "Archivo descargado: a.txt",
+            "Inicio de sesión exitoso",
+        ]
+        assert retention.query_archive(1, event_type="inicio_sesion")[0]["id"] == 1
+        assert retention.query_archive(1, since=NOW - timedelta(days=100)) == []
+        assert len(retention.query_archive(2)) == 1
+
+        # Sin eventos vencidos, no hace nada
+        assert retention.apply(now=NOW)["archived"] == 0
+
+    def test_row_limit_archives_oldest_in_batches(self, db_manager, temp_dir):
+        """Test 3: El límite de filas archiva los más antiguos por lotes"""
+        self._add_events(
+            db_manager,
+            [(1, f"Archivo descargado: {index}.txt", 1) for index in range(12)],
+        )
+        retention = self._retention(
+            db_manager, temp_dir, max_age_days=None, max_rows=5, batch_size=3
+        )
+
+        result = retention.apply(now=NOW)
+        assert result["archived"] == 7
+        assert result["segments"] == 3
+        assert self._hot_events(db_manager) == [
+            f"Archivo descargado: {index}.txt" for index in range(7, 12)
+        ]
+        # Los lotes del mismo día se suman en un único resumen
+        assert retention.get_summary(1) == [
+            {
+                "fecha": (NOW - timedelta(days=1)).date(),
+                "tipo": "descarga",
+                "cantidad": 7,
+            }
+        ]
+        assert len(retention.query_archive(1, limit=4)) == 4
+
+    def test_purge_user_removes_archive_and_summaries(self, db_manager, temp_dir):
+        """Test 4: Eliminar un usuario borra sus eventos archivados"""
+        self._add_events(
+            db_manager,
+            [
+                (1, "Inicio de sesión exitoso", 200),
+                (2, "Inicio de sesión exitoso", 200),
+            ],
+        )
+        retention = self._retention(db_manager, temp_dir)
+        assert retention.apply(now=NOW)["archived"] == 2
+
+        # Si la transacción se revierte, el archivo no cambia
+        session = db_manager.get_session()
+        try:
+            retention.purge_user(session, 1)
+            session.rollback()
+        finally:
+            session.close()
+        assert len(retention.query_archive(1)) == 1
+        assert len(retention.get_summary(1)) == 1
+
+        session = db_manager.get_session()
+        try:
+            with mock.patch.object(
+                EventRetention, "_read_segment", side_effect=AssertionError
+            ):
+                # Dentro de la transacción no se leen los segmentos
+                segments = retention.purge_user(session, 1)
+            assert len(retention.query_archive(1)) == 1
+            session.commit()
+        finally:
+            session.close()
+        assert retention.purge_segments(1, segments) == (1, 0)
+        assert retention.query_archive(1) == []
+        assert retention.get_summary(1) == []
+        assert len(retention.query_archive(2)) == 1
+        assert retention.get_summary(2)[0]["fecha"] == date(2023, 12, 13)
+
+    def test_apply_without_tables(self, temp_dir):
+        """Test 5: En una instalación nueva, sin tablas, no hay nada que archivar"""
+        db_manager = DatabaseManager(os.path.join(temp_dir, "eventos.db"))
+        result = self._retention(db_manager, temp_dir).apply(now=NOW)
+        assert result["success"], result["message"]
+        assert result["archived"] == 0
+        assert not os.path.exists(os.path.join(temp_dir, "archivo"))
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
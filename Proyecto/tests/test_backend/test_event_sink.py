@@ -0,0 +1,186 @@
+"""
+Tests para el registro de eventos por lotes
+"""
+
+from backend.database.connection import DatabaseManager, dispose_engines
+from backend.models.event_model import Evento
+from backend.services.event_sink import EventSink
+import os
+import pytest
+import tempfile
+import threading
+import time
+from unittest import mock
+import sys
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+
+class TestEventSink:
+    """Test suite para EventSink"""
+
+    @pytest.fixture
+    def db_manager(self):
+        """Fixture con una base de datos temporal con las tablas creadas"""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db_path = tmp.name
+        db_manager = DatabaseManager(db_path)
+        assert db_manager.create_tables()
+        yield db_manager
+        dispose_engines(db_path)
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _descriptions(self, db_manager):
+        session = db_manager.get_session()
+        try:
+            return [
+                event.descripcion
+                for event in session.query(Evento).order_by(Evento.id_evento)
+            ]
+        finally:
+            session.close()
+
+    def test_events_are_written_in_batches(self, db_manager):
+        """Test 1: Los eventos se insertan en orden y en pocas transacciones"""
+        sink = EventSink(db_manager, batch_size=10, flush_interval=60)
+        for index in range(25):
+            sink.log(1, f"evento {index}")
+
+        assert sink.flush(timeout=5)
+        assert self._descriptions(db_manager) == [f"evento {i}" for i in range(25)]
+        assert sink.written == 25
+        assert sink.batches <= 3
+        sink.close()
+
+    def test_flush_interval_and_critical_events(self, db_manager):
+        """Test 2: Los eventos se escriben por tiempo; los críticos, al momento"""
+        sink = EventSink(db_manager, batch_size=100, flush_interval=0.05)
+        sink.log(1, "normal")
+        deadline = time.monotonic() + 5
+        while not self._descriptions(db_manager) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert self._descriptions(db_manager) == ["normal"]
+
+        sink.flush_interval = 60
+        sink.log(1, "pendiente")
+        sink.log(1, "Cuenta bloqueada", critical=True)
+        # El crítico y los anteriores ya están en la BD al volver
+        assert self._descriptions(db_manager) == [
+            "normal",
+            "pendiente",
+            "Cuenta bloqueada",
+        ]
+        sink.close()
+
+    def test_bounded_queue_applies_backpressure(self, db_manager):
+        """Test 3: Con la cola llena, registrar espera a que se escriba"""
+        sink = EventSink(db_manager, batch_size=1, flush_interval=0, max_pending=2)
+        gate = threading.Event()
+        write = sink._write
+
+        def slow_write(rows):
+            gate.wait(5)
+            write(rows)
+
+        with mock.patch.object(sink, "_write", side_effect=slow_write):
+            producer = threading.Thread(
+                target=lambda: [sink.log(1, f"evento {i}") for i in range(6)]
+            )
+            producer.start()
+            producer.join(0.3)
+            # Uno en escritura y dos en cola: el productor sigue bloqueado
+            assert producer.is_alive()
+            assert sink._queue.qsize() == 2
+
+            gate.set()
+            producer.join(5)
+            assert not producer.is_alive()
+            assert sink.flush(timeout=5)
+
+        assert len(self._descriptions(db_manager)) == 6
+
+    def test_close_writes_pending_events(self, db_manager):
+        """Test 4: Al cerrar se escriben los pendientes y los nuevos van directos"""
+        sink = EventSink(db_manager, flush_interval=60)
+        sink.log(1, "antes de cerrar")
+        sink.close()
+        assert self._descriptions(db_manager) == ["antes de cerrar"]
+
+        sink.log(1, "después de cerrar")
+        assert sink.flush()
+        assert self._descriptions(db_manager) == [
+            "antes de cerrar",
+            "después de cerrar",
+        ]
+
+    def test_failed_insert_is_reported(self, db_manager):
+        """Test 5: Un lote que no se puede insertar se reintenta o se informa"""
+        sink = EventSink(db_manager, flush_interval=60)
+        get_session = db_manager.get_session
+        failures = {"remaining": 0}
+
+        def failing_session():
+            session = get_session()
+            if failures["remaining"]:
+                failures["remaining"] -= 1
+                session.execute = mock.Mock(side_effect=RuntimeError("BD bloqueada"))
+            return session
+
+        with mock.patch.object(db_manager, "get_session", side_effect=failing_session):
+            # Un fallo transitorio se reintenta
+            failures["remaining"] = 1
+            assert sink.log(1, "Cuenta bloqueada", critical=True)
+            assert self._descriptions(db_manager) == ["Cuenta bloqueada"]
+
+            # Si todos los intentos fallan, el evento crítico informa del error
+            failures["remaining"] = 100
+            assert not sink.log(1, "Archivo eliminado", critical=True)
+            assert sink.failed == 1
+
+            # También flush() de un lote escrito en segundo plano
+            sink.log(1, "normal")
+            assert not sink.flush(timeout=5)
+            assert sink.failed == 2
+
+            # Los fallos ya informados no se repiten
+            failures["remaining"] = 0
+            sink.log(1, "siguiente")
+            assert sink.flush(timeout=5)
+
+        assert self._descriptions(db_manager) == ["Cuenta bloqueada", "siguiente"]
+        sink.close()
+
+    def test_failed_batches_with_full_queue(self, db_manager):
+        """Test 6: Un lote fallido con la cola llena no bloquea al productor"""
+        sink = EventSink(db_manager, batch_size=1, flush_interval=0, max_pending=2)
+        get_session = db_manager.get_session
+
+        def failing_session():
+            session = get_session()
+            session.execute = mock.Mock(side_effect=RuntimeError("BD bloqueada"))
+            return session
+
+        with (
+            mock.patch.object(db_manager, "get_session", side_effect=failing_session),
+            mock.patch("backend.services.event_sink.RETRY_DELAY", 0.01),
+        ):
+            producer = threading.Thread(
+                target=lambda: [sink.log(1, f"evento {i}") for i in range(8)]
+            )
+            producer.start()
+            producer.join(10)
+            assert not producer.is_alive()
+            assert not sink.flush(timeout=10)
+
+        assert sink.failed == 8
+        assert self._descriptions(db_manager) == []
+        sink.close()
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -225,22 +225,18 @@ class TestFileService:
         file_id = upload_result["file_id"]
 
         # Verificar que existe el archivo cifrado en secure_files
-        secure_files_dir = os.path.join(project_root, "secure_files")
+        from backend.models.file_model import Archivo
 
-        if os.path.exists(secure_files_dir):
-            # Buscar archivos .enc del usuario
-            encrypted_files = [
-                f
-                for f in os.listdir(secure_files_dir)
-                if f.startswith(f"user_{user_id}_") and f.endswith(".enc")
-            ]
+        session = file_service.db_manager.get_session()
+        try:
+            encrypted_file_path = session.get(Archivo, file_id).ruta_archivo
+        finally:
+            session.close()
 
-            assert (
-                len(encrypted_files) >= 1
-            ), "Debería haber al menos un archivo cifrado"
+        if os.path.exists(encrypted_file_path):
+            assert encrypted_file_path.endswith(".enc")
 
             # Verificar que el archivo cifrado no contiene el texto original
-            encrypted_file_path = os.path.join(secure_files_dir, encrypted_files[0])
 
             with open(encrypted_file_path, "rb") as f:
                 encrypted_content = f.read()
@@ -288,6 +284,917 @@ class TestFileService:
 
         print("   ✅ Operaciones inválidas manejadas correctamente")
 
+    def test_file_service_legacy_fernet_blob(
+        self, services, test_user, test_file, temp_dir
+    ):
+        """Test 7: Los archivos en formato Fernet antiguo siguen siendo legibles"""
+        from backend.models.file_model import Archivo
+
+        file_service = services["file_service"]
+        user_id = test_user
+
+        upload_result = file_service.upload_file(
+            user_id, test_file["path"], "archivo_antiguo.txt"
+        )
+        assert upload_result["success"]
+        file_id = upload_result["file_id"]
+
+        # Simular un archivo antiguo: token Fernet de archivo completo con el
+        # nombre que se usaba antes del almacén por contenido
+        legacy_path = os.path.join(
+            file_service.files_directory, f"user_{user_id}_legacy_archivo.txt.enc"
+        )
+        with open(legacy_path, "wb") as f:
+            f.write(file_service.cipher.encrypt(test_file["content"].encode()))
+
+        session = file_service.db_manager.get_session()
+        try:
+            archivo = session.get(Archivo, file_id)
+            blob_path = archivo.ruta_archivo
+            archivo.ruta_archivo = legacy_path
+            archivo.formato = None
+            session.commit()
+        finally:
+            session.close()
+        os.remove(blob_path)
+
+        # Al iniciar se detecta el formato a partir de la cabecera
+        assert file_service.backfill_file_metadata()["success"]
+        session = file_service.db_manager.get_session()
+        try:
+            assert session.get(Archivo, file_id).formato == 0
+        finally:
+            session.close()
+
+        download_path = os.path.join(temp_dir, "legacy_download.txt")
+        download_result = file_service.download_file(user_id, file_id, download_path)
+        assert download_result["success"], download_result["message"]
+
+        with open(download_path, "r") as f:
+            assert f.read() == test_file["content"]
+
+        # La primera lectura lo reescribe en el contenedor por bloques
+        session = file_service.db_manager.get_session()
+        try:
+            archivo = session.get(Archivo, file_id)
+            assert archivo.formato == 1
+            assert archivo.ruta_archivo == blob_path
+            assert archivo.tamano_cifrado == os.path.getsize(blob_path)
+        finally:
+            session.close()
+        assert not os.path.exists(legacy_path)
+
+        range_result = file_service.read_range(user_id, file_id, 10, 20)
+        assert range_result["data"] == test_file["content"].encode()[10:30]
+
+        file_service.delete_file(user_id, file_id)
+
+    def test_file_service_failed_download_leaves_no_output(
+        self, services, test_user, test_file, temp_dir
+    ):
+        """Test 8: Una descarga fallida no deja archivos parciales en el destino"""
+        from backend.models.file_model import Archivo
+
+        file_service = services["file_service"]
+        user_id = test_user
+
+        upload_result = file_service.upload_file(
+            user_id, test_file["path"], "archivo_corrupto.txt"
+        )
+        assert upload_result["success"]
+        file_id = upload_result["file_id"]
+
+        session = file_service.db_manager.get_session()
+        try:
+            encrypted_path = session.get(Archivo, file_id).ruta_archivo
+        finally:
+            session.close()
+
+        # Corromper un byte del primer bloque cifrado
+        with open(encrypted_path, "r+b") as f:
+            f.seek(50)
+            original_byte = f.read(1)
+            f.seek(50)
+            f.write(bytes([original_byte[0] ^ 0xFF]))
+
+        output_dir = os.path.join(temp_dir, "salida")
+        os.makedirs(output_dir)
+        download_path = os.path.join(output_dir, "corrupto.txt")
+        download_result = file_service.download_file(user_id, file_id, download_path)
+
+        assert download_result["success"] == False
+        assert os.listdir(output_dir) == [], "No deberían quedar archivos parciales"
+
+        file_service.delete_file(user_id, file_id)
+
+    def test_file_service_read_range(self, services, test_user, temp_dir):
+        """Test 9: Lectura por rango del contenido descifrado"""
+        file_service = services["file_service"]
+        user_id = test_user
+
+        content = os.urandom(300 * 1024)
+        source_path = os.path.join(temp_dir, "grande.bin")
+        with open(source_path, "wb") as f:
+            f.write(content)
+
+        upload_result = file_service.upload_file(user_id, source_path)
+        assert upload_result["success"]
+        file_id = upload_result["file_id"]
+
+        result = file_service.read_range(user_id, file_id, 100_000, 50_000)
+        assert result["success"], result["message"]
+        assert result["data"] == content[100_000:150_000]
+        assert result["total_size"] == len(content)
+
+        # Otro usuario no puede leer rangos del archivo
+        denied = file_service.read_range(999, file_id, 0, 10)
+        assert denied["success"] == False
+
+        file_service.delete_file(user_id, file_id)
+
+    def test_file_service_batch_upload(self, services, test_user, temp_dir):
+        """Test 10: Subida por lotes con resultados por archivo"""
+        file_service = services["file_service"]
+        user_id = test_user
+
+        paths = []
+        for i in range(5):
+            path = os.path.join(temp_dir, f"lote_{i}.txt")
+            with open(path, "w") as f:
+                f.write(f"Documento del lote número {i}")
+            paths.append(path)
+        paths.append(os.path.join(temp_dir, "no_existe.txt"))
+
+        result = file_service.upload_files(user_id, paths)
+
+        assert result["uploaded"] == 5
+        assert result["failed"] == 1
+        assert result["success"] == False
+        assert [r["success"] for r in result["results"]] == [True] * 5 + [False]
+
+        # Cada archivo subido se descarga con su contenido original
+        for i, file_result in enumerate(result["results"][:5]):
+            output_path = os.path.join(temp_dir, f"salida_{i}.txt")
+            download = file_service.download_file(
+                user_id, file_result["file_id"], output_path
+            )
+            assert download["success"]
+            with open(output_path) as f:
+                assert f.read() == f"Documento del lote número {i}"
+            file_service.delete_file(user_id, file_result["file_id"])
+
+    def test_file_service_bulk_download_and_export(
+        self, services, test_user, temp_dir
+    ):
+        """Test 11: Descarga masiva a carpeta y exportación ZIP/TAR"""
+        import tarfile
+        import zipfile
+
+        file_service = services["file_service"]
+        user_id = test_user
+
+        contents = {}
+        paths = []
+        for i in range(3):
+            # Dos archivos con el mismo nombre no deben sobrescribirse
+            folder = os.path.join(temp_dir, f"origen_{i}")
+            os.makedirs(folder)
+            path = os.path.join(folder, "informe.txt" if i < 2 else "otro.txt")
+            with open(path, "wb") as f:
+                f.write(os.urandom(100_000 + i))
+            paths.append(path)
+
+        upload = file_service.upload_files(user_id, paths)
+        assert upload["uploaded"] == 3
+        file_ids = [r["file_id"] for r in upload["results"]]
+        for file_id, path in zip(file_ids, paths):
+            with open(path, "rb") as f:
+                contents[file_id] = f.read()
+
+        # 1. Carpeta de destino (incluye un ID inexistente)
+        dest_dir = os.path.join(temp_dir, "destino")
+        os.makedirs(dest_dir)
+        result = file_service.download_files(user_id, file_ids + [99999], dest_dir)
+
+        assert result["downloaded"] == 3
+        assert result["failed"] == 1
+        assert sorted(os.listdir(dest_dir)) == [
+            "informe (2).txt",
+            "informe.txt",
+            "otro.txt",
+        ]
+        for file_result in result["results"][:3]:
+            with open(file_result["output_path"], "rb") as f:
+                assert f.read() == contents[file_result["file_id"]]
+
+        # 2. Paquetes ZIP y TAR con todos los archivos
+        for archive_format in ("zip", "tar"):
+            result = file_service.download_files(
+                user_id, file_ids, temp_dir, archive_format=archive_format
+            )
+            assert result["success"], result["message"]
+            archive_path = result["archive_path"]
+            assert archive_path.endswith(f".{archive_format}")
+
+            if archive_format == "zip":
+                with zipfile.ZipFile(archive_path) as zf:
+                    exported = [zf.read(name) for name in zf.namelist()]
+            else:
+                with tarfile.open(archive_path) as tf:
+                    exported = [tf.extractfile(m).read() for m in tf.getmembers()]
+
+            assert exported == [contents[file_id] for file_id in file_ids]
+
+        # Otro usuario no puede exportar los archivos
+        denied = file_service.download_files(999, file_ids, dest_dir)
+        assert denied["downloaded"] == 0
+
+        for file_id in file_ids:
+            file_service.delete_file(user_id, file_id)
+
+    def test_file_service_persisted_metadata(self, services, test_user, temp_dir):
+        """Test 12: El listado usa tamaños, tipo y hash guardados en la BD"""
+        import hashlib
+
+        file_service = services["file_service"]
+        user_id = test_user
+
+        content = os.urandom(123_457)
+        source_path = os.path.join(temp_dir, "reporte.pdf")
+        with open(source_path, "wb") as f:
+            f.write(content)
+
+        upload_result = file_service.upload_file(user_id, source_path)
+        assert upload_result["success"]
+        file_id = upload_result["file_id"]
+
+        files = file_service.get_user_files(user_id)["files"]
+        file_info = next(f for f in files if f["id"] == file_id)
+
+        assert file_info["size_bytes"] == len(content)
+        assert file_info["mime"] == "application/pdf"
+        assert file_info["hash"] == hashlib.sha256(content).hexdigest()
+        assert file_info["encrypted_size_bytes"] > len(content)
+
+        # Simular un archivo subido antes de guardar metadatos y completarlo
+        from backend.models.file_model import Archivo
+
+        session = file_service.db_manager.get_session()
+        try:
+            archivo = session.get(Archivo, file_id)
+            archivo.tamano_original = None
+            archivo.hash_contenido = None
+            session.commit()
+        finally:
+            session.close()
+
+        backfill = file_service.backfill_file_metadata()
+        assert backfill["success"]
+        assert backfill["updated"] >= 1
+
+        files = file_service.get_user_files(user_id)["files"]
+        file_info = next(f for f in files if f["id"] == file_id)
+        assert file_info["size_bytes"] == len(content)
+        assert file_info["hash"] == hashlib.sha256(content).hexdigest()
+
+        file_service.delete_file(user_id, file_id)
+
+
+    def test_file_service_list_files_pagination(self, services, test_user, temp_dir):
+        """Test 13: Listado paginado por cursor, ordenado y filtrado en la BD"""
+        file_service = services["file_service"]
+        user_id = test_user
+
+        # Partir de un listado vacío
+        for file_info in file_service.get_user_files(user_id)["files"]:
+            file_service.delete_file(user_id, file_info["id"])
+
+        names = ["b.txt", "A.pdf", "c.png", "d.txt", "e_1.csv", "E%2.csv", "f"]
+        for name in names:
+            source_path = os.path.join(temp_dir, name)
+            with open(source_path, "wb") as f:
+                f.write(name.encode())
+            assert file_service.upload_file(user_id, source_path)["success"]
+
+        def collect(**kwargs):
+            pages, cursor = [], None
+            while True:
+                result = file_service.list_files(
+                    user_id, limit=3, cursor=cursor, **kwargs
+                )
+                assert result["success"]
+                assert result["count"] <= 3
+                pages.append([f["nombre"] for f in result["files"]])
+                cursor = result["next_cursor"]
+                if cursor is None:
+                    return pages
+
+        # Orden por nombre sin distinguir mayúsculas, en páginas de 3
+        pages = collect(sort="nombre")
+        assert pages[0] == ["A.pdf", "b.txt", "c.png"]
+        assert sum(pages, []) == sorted(names, key=str.lower)
+
+        by_name_desc = sum(collect(sort="nombre", order="desc"), [])
+        assert by_name_desc == sorted(names, key=str.lower, reverse=True)
+
+        # Orden por tipo (extensión) y por fecha de subida
+        by_type = sum(collect(sort="tipo"), [])
+        assert by_type[0] == "f"
+        assert by_type[-2:] == ["b.txt", "d.txt"]
+        assert sum(collect(sort="fecha"), []) == names
+        assert sum(collect(sort="fecha", order="desc"), []) == names[::-1]
+
+        # Filtro por texto: los comodines de LIKE se buscan literalmente
+        assert sum(collect(query=".TXT"), []) == ["b.txt", "d.txt"]
+        assert sum(collect(query="_"), []) == ["e_1.csv"]
+        assert sum(collect(query="%"), []) == ["E%2.csv"]
+
+        # Filtro por extensión y por rango de fechas, combinables con el orden
+        assert sum(collect(extensions=["TXT", ".png"]), []) == [
+            "b.txt",
+            "c.png",
+            "d.txt",
+        ]
+        assert sum(collect(extensions=[""]), []) == ["f"]
+        assert sum(collect(sort="fecha", extensions=["csv"], query="2"), []) == [
+            "E%2.csv"
+        ]
+        dates = {
+            f["nombre"]: f["fecha_subida"]
+            for f in file_service.get_user_files(user_id)["files"]
+        }
+        after = sum(collect(sort="fecha", uploaded_after=dates["d.txt"]), [])
+        assert after == [n for n in names if dates[n] >= dates["d.txt"]]
+        before = sum(collect(sort="fecha", uploaded_before=dates["d.txt"]), [])
+        assert before == [n for n in names if dates[n] < dates["d.txt"]]
+        assert sorted(after + before) == sorted(names)
+
+        # Parámetros inválidos
+        assert not file_service.list_files(user_id, sort="tamaño")["success"]
+        first = file_service.list_files(user_id, limit=2)
+        mismatched = file_service.list_files(
+            user_id, sort="fecha", cursor=first["next_cursor"]
+        )
+        assert not mismatched["success"]
+
+        # Otro usuario no ve estos archivos
+        assert file_service.list_files(999)["count"] == 0
+
+        for file_info in file_service.get_user_files(user_id)["files"]:
+            file_service.delete_file(user_id, file_info["id"])
+
+    def test_file_service_search_files(self, services, test_user, temp_dir):
+        """Test 14: Búsqueda por nombre con índice FTS5 sincronizado"""
+        file_service = services["file_service"]
+        user_id = test_user
+
+        for file_info in file_service.get_user_files(user_id)["files"]:
+            file_service.delete_file(user_id, file_info["id"])
+
+        file_ids = {}
+        for name in [
+            "informe_anual.pdf",
+            "Presupuesto 2024.xlsx",
+            "foto_playa.jpg",
+            "anual_resumen.txt",
+            "Árbol genealógico.pdf",
+        ]:
+            source_path = os.path.join(temp_dir, name)
+            with open(source_path, "wb") as f:
+                f.write(name.encode())
+            upload_result = file_service.upload_file(user_id, source_path)
+            assert upload_result["success"]
+            file_ids[name] = upload_result["file_id"]
+
+        def search(query):
+            result = file_service.search_files(user_id, query)
+            assert result["success"], result.get("message")
+            return [(f["nombre"], f["match"]) for f in result["files"]]
+
+        # Los que empiezan por el texto van primero; sin distinguir mayúsculas
+        assert search("ANUAL") == [
+            ("anual_resumen.txt", "exact"),
+            ("informe_anual.pdf", "exact"),
+        ]
+        assert search("in") == [("informe_anual.pdf", "exact")]
+        assert search("2024") == [("Presupuesto 2024.xlsx", "exact")]
+        # Mayúsculas que no son ASCII (prefijo corto y con trigramas)
+        for query in ("ár", "ÁR", "árb", "ÁRBOL"):
+            assert search(query) == [("Árbol genealógico.pdf", "exact")], query
+
+        # Coincidencia aproximada con un error de tipeo
+        assert search("presupusto") == [("Presupuesto 2024.xlsx", "fuzzy")]
+        assert search("xyz") == []
+
+        # Los operadores de FTS5 se buscan como texto literal
+        assert search('"anual OR foto') == []
+        assert search("") == []
+
+        # Renombrar y eliminar actualizan el índice
+        rename = file_service.rename_file(
+            user_id, file_ids["foto_playa.jpg"], "vacaciones.jpg"
+        )
+        assert rename["success"]
+        assert search("playa") == []
+        assert search("vacaciones") == [("vacaciones.jpg", "exact")]
+        assert not file_service.rename_file(
+            user_id, file_ids["anual_resumen.txt"], "../fuera.txt"
+        )["success"]
+
+        file_service.delete_file(user_id, file_ids["anual_resumen.txt"])
+        assert search("anual") == [("informe_anual.pdf", "exact")]
+
+        # Otro usuario no encuentra estos archivos
+        assert file_service.search_files(999, "informe")["count"] == 0
+
+        for file_info in file_service.get_user_files(user_id)["files"]:
+            file_service.delete_file(user_id, file_info["id"])
+
+    def test_file_service_progress_and_cancellation(
+        self, services, test_user, temp_dir
+    ):
+        """Test 15: Avance por bytes y cancelación sin archivos parciales"""
+        import threading
+
+        file_service = services["file_service"]
+        user_id = test_user
+
+        content = os.urandom(3 * 1024 * 1024 + 11)
+        source_path = os.path.join(temp_dir, "grande.bin")
+        with open(source_path, "wb") as f:
+            f.write(content)
+
+        # Subida con avance: se informan todos los bytes leídos
+        progress = []
+        upload_result = file_service.upload_file(
+            user_id, source_path, progress_callback=progress.append
+        )
+        assert upload_result["success"]
+        assert sum(progress) == len(content)
+        assert len(progress) > 1
+        file_id = upload_result["file_id"]
+
+        # Subida cancelada a mitad: no queda archivo cifrado parcial
+        # (con otro contenido, para que no se reutilice el blob ya guardado)
+        def stored_files():
+            return {
+                os.path.join(directory, name)
+                for directory, _, names in os.walk(file_service.files_directory)
+                for name in names
+            }
+
+        other_path = os.path.join(temp_dir, "otro.bin")
+        with open(other_path, "wb") as f:
+            f.write(content + b"x")
+
+        stored_before = stored_files()
+        cancel_event = threading.Event()
+        cancelled = file_service.upload_file(
+            user_id,
+            other_path,
+            progress_callback=lambda n: cancel_event.set(),
+            cancel_event=cancel_event,
+        )
+        assert not cancelled["success"]
+        assert stored_files() == stored_before
+
+        # Descarga con avance
+        progress = []
+        output_path = os.path.join(temp_dir, "salida.bin")
+        download_result = file_service.download_file(
+            user_id, file_id, output_path, progress_callback=progress.append
+        )
+        assert download_result["success"]
+        assert sum(progress) == len(content)
+
+        # Descargas canceladas: sin salida ni temporales
+        dest_dir = os.path.join(temp_dir, "cancelado")
+        os.makedirs(dest_dir)
+        cancel_event = threading.Event()
+        cancelled = file_service.download_file(
+            user_id,
+            file_id,
+            os.path.join(dest_dir, "salida.bin"),
+            progress_callback=lambda n: cancel_event.set(),
+            cancel_event=cancel_event,
+        )
+        assert not cancelled["success"]
+
+        for archive_format in (None, "zip"):
+            cancelled = file_service.download_files(
+                user_id,
+                [file_id],
+                dest_dir,
+                archive_format=archive_format,
+                cancel_event=cancel_event,
+            )
+            assert cancelled["downloaded"] == 0
+        assert os.listdir(dest_dir) == []
+
+        file_service.delete_file(user_id, file_id)
+
+    def test_file_service_deduplicated_storage(self, services, test_user, temp_dir):
+        """Test 16: Archivos idénticos comparten un único blob cifrado"""
+        file_service = services["file_service"]
+        user_id = test_user
+
+        content = os.urandom(2 * 1024 * 1024)
+        paths = []
+        for name in ("original.bin", "copia.bin"):
+            path = os.path.join(temp_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            paths.append(path)
+
+        storage_before = file_service.get_storage_info()
+        first = file_service.upload_file(user_id, paths[0])
+        assert first["success"]
+
+        # La segunda subida no cifra nada: reutiliza el blob existente
+        with mock.patch(
+            "backend.services.file_service.StreamCipher.encrypt_stream",
+            side_effect=AssertionError("No debería volver a cifrar"),
+        ):
+            second = file_service.upload_file(user_id, paths[1])
+            batch = file_service.upload_files(user_id, paths)
+        assert second["success"]
+        assert all(r["success"] for r in batch["results"])
+        file_ids = [first["file_id"], second["file_id"]] + [
+            r["file_id"] for r in batch["results"]
+        ]
+
+        from backend.models.file_model import Archivo
+
+        session = file_service.db_manager.get_session()
+        try:
+            blob_paths = {session.get(Archivo, fid).ruta_archivo for fid in file_ids}
+        finally:
+            session.close()
+        assert len(blob_paths) == 1
+        blob_path = blob_paths.pop()
+
+        storage = file_service.get_storage_info()
+        assert storage["total_files"] == storage_before["total_files"] + 1
+        assert storage["file_records"] == storage_before["file_records"] + 4
+        assert storage["deduplicated_savings_mb"] >= 5.9
+
+        # Cada registro se descarga con su propio nombre
+        output_path = os.path.join(temp_dir, "salida.bin")
+        assert file_service.download_file(user_id, file_ids[1], output_path)[
+            "success"
+        ]
+        with open(output_path, "rb") as f:
+            assert f.read() == content
+
+        # El blob se conserva mientras quede alguna referencia
+        for file_id in file_ids[:-1]:
+            assert file_service.delete_file(user_id, file_id)["success"]
+            assert os.path.exists(blob_path)
+        assert file_service.delete_file(user_id, file_ids[-1])["success"]
+        assert not os.path.exists(blob_path)
+
+    def test_file_service_compression(self, services, test_user, temp_dir):
+        """Test 17: Los archivos compresibles se comprimen antes de cifrarse"""
+        from backend.crypto.compression import CODEC_NAMES, DEFAULT_CODEC
+
+        file_service = services["file_service"]
+        user_id = test_user
+
+        content = b"fecha;cuenta;importe\n" + b"2024-01-01;ES12;100.00\n" * 50_000
+        text_path = os.path.join(temp_dir, "movimientos.csv")
+        photo_path = os.path.join(temp_dir, "movimientos.jpg")
+        for path, data in ((text_path, content), (photo_path, content + b"!")):
+            with open(path, "wb") as f:
+                f.write(data)
+
+        text_upload = file_service.upload_file(user_id, text_path)
+        photo_upload = file_service.upload_file(user_id, photo_path)
+        assert text_upload["success"] and photo_upload["success"]
+
+        files = {f["id"]: f for f in file_service.get_user_files(user_id)["files"]}
+        text_info = files[text_upload["file_id"]]
+        photo_info = files[photo_upload["file_id"]]
+        assert text_info["compression"] == CODEC_NAMES[DEFAULT_CODEC]
+        assert text_info["encrypted_size_bytes"] < len(content) // 4
+        # Las extensiones de formatos ya comprimidos se cifran sin comprimir
+        assert photo_info["compression"] == "none"
+        assert photo_info["encrypted_size_bytes"] > len(content)
+
+        # Descarga completa y por rango del archivo comprimido
+        output_path = os.path.join(temp_dir, "salida.csv")
+        assert file_service.download_file(
+            user_id, text_upload["file_id"], output_path
+        )["success"]
+        with open(output_path, "rb") as f:
+            assert f.read() == content
+        range_result = file_service.read_range(
+            user_id, text_upload["file_id"], 500_000, 100
+        )
+        assert range_result["success"]
+        assert range_result["data"] == content[500_000:500_100]
+
+        file_service.delete_file(user_id, text_upload["file_id"])
+        file_service.delete_file(user_id, photo_upload["file_id"])
+
+    def test_file_service_storage_counters(self, services, test_user, temp_dir):
+        """Test 18: Contadores de almacenamiento al subir, eliminar y recalcular"""
+        from backend.models.file_model import (
+            GLOBAL_STATS_ID,
+            EstadisticaAlmacenamiento,
+        )
+
+        file_service = services["file_service"]
+        user_id = test_user
+        # Partir de contadores coherentes con el disco
+        assert file_service.reconcile_storage_stats()["success"]
+        before = file_service.get_storage_info()
+        user_before = file_service.get_storage_info(user_id)
+
+        content = os.urandom(1024 * 1024)
+        paths = []
+        for name in ("a.bin", "b.bin"):
+            path = os.path.join(temp_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            paths.append(path)
+        unique_path = os.path.join(temp_dir, "c.bin")
+        with open(unique_path, "wb") as f:
+            f.write(os.urandom(512 * 1024))
+
+        first = file_service.upload_file(user_id, paths[0])
+        batch = file_service.upload_files(user_id, [paths[1], unique_path])
+        assert first["success"] and batch["success"]
+        file_ids = [first["file_id"]] + [r["file_id"] for r in batch["results"]]
+
+        # Lectura O(1): no recorre el directorio de archivos cifrados
+        with mock.patch("os.walk", side_effect=AssertionError("Recorre el disco")):
+            storage = file_service.get_storage_info()
+            user_storage = file_service.get_storage_info(user_id)
+        assert storage["file_records"] == before["file_records"] + 3
+        assert storage["total_files"] == before["total_files"] + 2
+        assert storage["deduplicated_savings_mb"] >= before[
+            "deduplicated_savings_mb"
+        ] + 0.9
+        assert user_storage["file_records"] == user_before["file_records"] + 3
+        assert user_storage["original_size_mb"] == pytest.approx(
+            user_before["original_size_mb"] + 2.5, abs=0.02
+        )
+        assert "total_files" not in user_storage
+
+        # Eliminar una copia no libera el blob compartido
+        assert file_service.delete_file(user_id, file_ids[0])["success"]
+        storage = file_service.get_storage_info()
+        assert storage["file_records"] == before["file_records"] + 2
+        assert storage["total_files"] == before["total_files"] + 2
+        assert not file_service.reconcile_storage_stats()["corrected"]
+
+        # Recalcular corrige contadores alterados e informa de blobs sin uso
+        session = file_service.db_manager.get_session()
+        try:
+            session.get(EstadisticaAlmacenamiento, GLOBAL_STATS_ID).blobs = 999
+            session.get(EstadisticaAlmacenamiento, user_id).archivos = 0
+            session.commit()
+        finally:
+            session.close()
+        orphan_path = os.path.join(file_service.objects_directory, "huerfano.enc")
+        with open(orphan_path, "wb") as f:
+            f.write(b"x" * 10)
+        result = file_service.reconcile_storage_stats()
+        assert result["success"] and result["corrected"]
+        assert os.path.normpath(orphan_path) in result["orphan_blobs"]
+        assert result["missing_blobs"] == []
+        assert file_service.get_storage_info() == storage
+        assert file_service.get_storage_info(user_id)["file_records"] == (
+            user_before["file_records"] + 2
+        )
+        os.remove(orphan_path)
+
+        for file_id in file_ids[1:]:
+            assert file_service.delete_file(user_id, file_id)["success"]
+        storage = file_service.get_storage_info()
+        assert storage["file_records"] == before["file_records"]
+        assert storage["total_files"] == before["total_files"]
+        assert storage["total_size_mb"] == before["total_size_mb"]
+
+    def test_file_service_list_files_non_ascii(self, services, test_user, temp_dir):
+        """Test 19: Paginación por nombre con nombres que no son ASCII"""
+        file_service = services["file_service"]
+        user_id = test_user
+
+        for file_info in file_service.get_user_files(user_id)["files"]:
+            file_service.delete_file(user_id, file_info["id"])
+
+        names = [
+            "Árbol.txt",
+            "árbol 2.txt",
+            "arco.txt",
+            "Ñandú.png",
+            "ñu.png",
+            "Éxito.pdf",
+            "bote.txt",
+            "zeta.txt",
+        ]
+        for name in names:
+            source_path = os.path.join(temp_dir, name)
+            with open(source_path, "wb") as f:
+                f.write(name.encode())
+            assert file_service.upload_file(user_id, source_path)["success"]
+
+        for order in ("asc", "desc"):
+            # Orden de referencia: una sola página
+            single = file_service.list_files(user_id, order=order, limit=100)
+            expected = [f["nombre"] for f in single["files"]]
+            assert sorted(expected) == sorted(names)
+
+            # Ningún tamaño de página salta ni repite archivos
+            for limit in (1, 2, 3):
+                collected, cursor = [], None
+                while True:
+                    result = file_service.list_files(
+                        user_id, order=order, limit=limit, cursor=cursor
+                    )
+                    assert result["success"], result.get("message")
+                    collected += [f["nombre"] for f in result["files"]]
+                    cursor = result["next_cursor"]
+                    if cursor is None:
+                        break
+                assert collected == expected
+
+        for file_info in file_service.get_user_files(user_id)["files"]:
+            file_service.delete_file(user_id, file_info["id"])
+
+    def test_file_service_release_races_dedup_upload(
+        self, services, test_user, temp_dir
+    ):
+        """Test 20: Liberar un blob no borra el que reutiliza otra subida"""
+        import threading
+
+        file_service = services["file_service"]
+        user_id = test_user
+        # La interfaz y SystemService crean sus propias instancias
+        other_service = FileService()
+
+        content = os.urandom(300_000)
+        paths = []
+        for name in ("liberado.bin", "reutilizado.bin"):
+            path = os.path.join(temp_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            paths.append(path)
+        first = file_service.upload_file(user_id, paths[0])
+        assert first["success"]
+
+        from backend.models.file_model import Archivo
+
+        session = file_service.db_manager.get_session()
+        try:
+            blob_path = session.get(Archivo, first["file_id"]).ruta_archivo
+        finally:
+            session.close()
+
+        # La otra subida del mismo contenido llega entre la comprobación de
+        # referencias y el borrado del blob
+        real_remove = os.remove
+        uploads = []
+
+        def remove_after_upload(path):
+            if path == blob_path and not uploads:
+                thread = threading.Thread(
+                    target=lambda: uploads.append(
+                        other_service.upload_file(user_id, paths[1])
+                    )
+                )
+                uploads.append(thread)
+                thread.start()
+                thread.join(timeout=0.5)
+            return real_remove(path)
+
+        with mock.patch(
+            "backend.services.file_service.os.remove", side_effect=remove_after_upload
+        ):
+            assert file_service.delete_file(user_id, first["file_id"])["success"]
+            uploads[0].join(timeout=10)
+        second = uploads[1]
+        assert second["success"], second["message"]
+
+        output_path = os.path.join(temp_dir, "descargado.bin")
+        download = file_service.download_file(user_id, second["file_id"], output_path)
+        assert download["success"], download["message"]
+        with open(output_path, "rb") as f:
+            assert f.read() == content
+        assert file_service.delete_file(user_id, second["file_id"])["success"]
+
+    def test_file_service_legacy_upgrade_races_dedup_upload(
+        self, services, test_user, temp_dir
+    ):
+        """Test 21: Una subida durante la conversión de un Fernet reutiliza su clave"""
+        import threading
+        from backend.models.file_model import Archivo
+        from backend.services.file_service import BLOB_FORMAT_FERNET
+
+        file_service = services["file_service"]
+        user_id = test_user
+        other_service = FileService()
+
+        content = os.urandom(100_000)
+        paths = []
+        for name in ("antiguo.bin", "copia.bin"):
+            path = os.path.join(temp_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            paths.append(path)
+        first = file_service.upload_file(user_id, paths[0])
+        assert first["success"]
+
+        # Convertirlo en un token Fernet heredado
+        legacy_path = os.path.join(file_service.files_directory, "heredado_21.enc")
+        with open(legacy_path, "wb") as f:
+            f.write(file_service.cipher.encrypt(content))
+        session = file_service.db_manager.get_session()
+        try:
+            archivo = session.get(Archivo, first["file_id"])
+            blob_path = archivo.ruta_archivo
+            archivo.ruta_archivo = legacy_path
+            archivo.formato = BLOB_FORMAT_FERNET
+            archivo.clave_envuelta = None
+            session.commit()
+        finally:
+            session.close()
+        os.remove(blob_path)
+
+        # La otra subida llega con el blob nuevo escrito y antes del commit
+        master_key_lock = file_service._master_key_lock
+        uploads = []
+
+        def upload_before_commit():
+            if not uploads:
+                thread = threading.Thread(
+                    target=lambda: uploads.append(
+                        other_service.upload_file(user_id, paths[1])
+                    )
+                )
+                uploads.append(thread)
+                thread.start()
+                thread.join(timeout=10)
+            return master_key_lock()
+
+        session = file_service.db_manager.get_session()
+        try:
+            archivo = session.get(Archivo, first["file_id"])
+            with mock.patch.object(
+                file_service, "_master_key_lock", side_effect=upload_before_commit
+            ):
+                assert file_service._upgrade_legacy_blob(session, archivo)
+        finally:
+            session.close()
+        second = uploads[1]
+        assert second["success"], second["message"]
+
+        for file_id in (first["file_id"], second["file_id"]):
+            output_path = os.path.join(temp_dir, f"descargado_{file_id}.bin")
+            download = file_service.download_file(user_id, file_id, output_path)
+            assert download["success"], download["message"]
+            with open(output_path, "rb") as f:
+                assert f.read() == content
+            assert file_service.delete_file(user_id, file_id)["success"]
+
+    def test_file_service_reconcile_scans_disk_without_lock(
+        self, services, test_user, temp_dir
+    ):
+        """Test 22: Recalcular las estadísticas no bloquea la BD en el recorrido"""
+        import sqlite3
+
+        file_service = services["file_service"]
+        path = os.path.join(temp_dir, "recuento.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(10_000))
+        uploaded = file_service.upload_file(test_user, path)
+        assert uploaded["success"]
+
+        real_walk = os.walk
+        writes = []
+
+        def walk_while_writing(directory):
+            # Otra conexión puede escribir mientras se recorre el disco
+            connection = sqlite3.connect(file_service.db_manager.db_path, timeout=0.1)
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.rollback()
+                writes.append(True)
+            except sqlite3.OperationalError:
+                writes.append(False)
+            finally:
+                connection.close()
+            return real_walk(directory)
+
+        with mock.patch(
+            "backend.services.file_service.os.walk", side_effect=walk_while_writing
+        ):
+            result = file_service.reconcile_storage_stats()
+        assert result["success"], result["message"]
+        assert writes == [True]
+        assert not result["missing_blobs"]
+        assert file_service.delete_file(test_user, uploaded["file_id"])["success"]
 
 # Mantener compatibilidad con ejecución directa
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+"""
+Tests para la verificación de integridad de los blobs cifrados
+"""
+
+from backend.database.connection import dispose_engines
+from backend.models.file_model import Archivo
+from backend.services.event_sink import flush_all_event_sinks
+from backend.services.file_service import FileService
+from backend.services.integrity_checker import IntegrityChecker
+from backend.services.user_service import UserService
+from datetime import datetime, timedelta
+import os
+import pytest
+import shutil
+import tempfile
+import sys
+import time
+from unittest import mock
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+
+class TestIntegrityChecker:
+    """Test suite para IntegrityChecker"""
+
+    @pytest.fixture
+    def workspace(self):
+        """Fixture que ejecuta cada test en un directorio vacío"""
+        temp_dir = tempfile.mkdtemp()
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        yield temp_dir
+        # Escribir los eventos pendientes antes de borrar la BD
+        flush_all_event_sinks()
+        os.chdir(previous_dir)
+        dispose_engines(os.path.join(temp_dir, "fortifile.db"))
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def file_service(self, workspace):
+        """Fixture con un servicio de archivos sobre una BD nueva"""
+        file_service = FileService()
+        file_service.db_manager.create_tables()
+        return file_service
+
+    @pytest.fixture
+    def uploads(self, file_service, workspace):
+        """Fixture que sube tres archivos (dos con el mismo contenido)"""
+        user_id = UserService().register_user("integridad", "Integridad123")["user_id"]
+        contents = {
+            "a.bin": os.urandom(300 * 1024),
+            "copia_a.bin": None,
+            "b.txt": b"linea de texto\n" * 20_000,
+            "c.bin": os.urandom(1024),
+        }
+        contents["copia_a.bin"] = contents["a.bin"]
+        paths = {}
+        for name, data in contents.items():
+            source = os.path.join(workspace, name)
+            with open(source, "wb") as f:
+                f.write(data)
+            result = file_service.upload_file(user_id, source)
+            assert result["success"], result["message"]
+            paths[name] = self._blob_path(file_service, result["file_id"])
+        return paths
+
+    def _blob_path(self, file_service, file_id):
+        session = file_service.db_manager.get_session()
+        try:
+            return session.get(Archivo, file_id).ruta_archivo
+        finally:
+            session.close()
+
+    def _checker(self, file_service, **options):
+        return IntegrityChecker(
+            file_service.db_manager,
+            file_service.files_directory,
+            file_service,
+            **options,
+        )
+
+    def test_full_pass_detects_corruption_missing_and_orphans(
+        self, file_service, uploads
+    ):
+        """Test 1: Detecta blobs corruptos, truncados, faltantes y huérfanos"""
+        checker = self._checker(file_service, workers=3)
+        progress = []
+        result = checker.run(progress_callback=lambda *args: progress.append(args))
+        assert result["integrity_ok"], result["issues"]
+        # El blob compartido se verifica una sola vez
+        assert result["checked"] == 3
+        assert progress[-1] == (3, 3)
+
+        # Cambiar un byte de un bloque, truncar otro blob y borrar el último
+        with open(uploads["a.bin"], "r+b") as f:
+            f.seek(1000)
+            byte = f.read(1)
+            f.seek(1000)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        with open(uploads["b.txt"], "r+b") as f:
+            f.truncate(os.path.getsize(uploads["b.txt"]) - 100)
+        os.remove(uploads["c.bin"])
+        orphan = os.path.join(file_service.objects_directory, "ff", "huerfano.enc")
+        os.makedirs(os.path.dirname(orphan), exist_ok=True)
+        with open(orphan, "wb") as f:
+            f.write(b"sin registro")
+
+        result = checker.run()
+        assert not result["integrity_ok"]
+        assert result["missing"] == ["c.bin"]
+        assert result["orphans"] == [orphan]
+        corrupted = {item["path"]: item for item in result["corrupted"]}
+        assert set(corrupted) == {uploads["a.bin"], uploads["b.txt"]}
+        assert corrupted[uploads["a.bin"]]["files"] == ["a.bin", "copia_a.bin"]
+        assert len(result["issues"]) == 4
+
+        # Los blobs corruptos quedan sin fecha de verificación
+        session = file_service.db_manager.get_session()
+        try:
+            dates = {
+                file.nombre_archivo: file.fecha_verificacion
+                for file in session.query(Archivo)
+            }
+        finally:
+            session.close()
+        assert dates["a.bin"] is None and dates["b.txt"] is None
+        assert dates["c.bin"] is not None
+
+    def test_incremental_pass_only_rechecks_changed_or_stale(
+        self, file_service, uploads, workspace
+    ):
+        """Test 2: El modo incremental solo verifica blobs nuevos o cambiados"""
+        checker = self._checker(file_service)
+        now = datetime.utcnow() + timedelta(seconds=5)
+        assert checker.run(now=now)["checked"] == 3
+
+        result = checker.run(incremental=True, now=now)
+        assert result["checked"] == 0 and result["skipped"] == 3
+
+        # Un blob modificado después de su verificación se vuelve a verificar
+        modified = (now + timedelta(seconds=30) - datetime(1970, 1, 1)).total_seconds()
+        os.utime(uploads["b.txt"], (modified, modified))
+        later = now + timedelta(minutes=1)
+        result = checker.run(incremental=True, now=later)
+        assert result["checked"] == 1 and result["skipped"] == 2
+
+        # Un archivo nuevo todavía no tiene verificación
+        source = os.path.join(workspace, "nuevo.bin")
+        with open(source, "wb") as f:
+            f.write(os.urandom(2048))
+        user_id = UserService().authenticate_user("integridad", "Integridad123")[
+            "user_id"
+        ]
+        assert file_service.upload_file(user_id, source)["success"]
+        result = checker.run(incremental=True, now=later + timedelta(minutes=2))
+        assert result["checked"] == 1 and result["skipped"] == 3
+
+        # Las verificaciones vencidas se repiten
+        result = checker.run(
+            incremental=True, max_age_days=30, now=later + timedelta(days=31)
+        )
+        assert result["checked"] == 4 and result["integrity_ok"]
+
+    def test_without_keys_only_compares_database_and_directory(
+        self, file_service, uploads
+    ):
+        """Test 3: Sin servicio de archivos no descifra, solo compara rutas"""
+        os.remove(uploads["c.bin"])
+        checker = IntegrityChecker(
+            file_service.db_manager, file_service.files_directory
+        )
+        result = checker.run()
+        assert result["checked"] == 0
+        assert result["missing"] == ["c.bin"]
+        assert result["issues"] == ["Archivo referenciado en BD no existe: c.bin"]
+
+    def test_blobs_changed_during_scan_are_not_orphans(self, file_service, uploads):
+        """Test 4: Los blobs escritos o borrados durante la pasada no son huérfanos"""
+        from backend.services import integrity_checker
+
+        objects = file_service.objects_directory
+        old = os.path.join(objects, "ab", "antiguo.enc")
+        released = os.path.join(objects, "ab", "liberado.enc")
+        for path in (old, released):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * 10)
+            past = time.time() - 3600
+            os.utime(path, (past, past))
+
+        scan_directory = integrity_checker._scan_directory
+
+        def scan_during_uploads(directory):
+            # Subida en curso: el blob ya está escrito y su registro no
+            with open(os.path.join(objects, "ab", "nuevo.enc"), "wb") as f:
+                f.write(b"y" * 10)
+            entries = scan_directory(directory)
+            # Blob liberado justo después de recorrer el directorio
+            os.remove(released)
+            return entries
+
+        with mock.patch.object(
+            integrity_checker, "_scan_directory", side_effect=scan_during_uploads
+        ):
+            result = self._checker(file_service).run()
+        assert result["orphans"] == [old]
+        assert result["missing"] == [] and result["corrupted"] == []
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,175 @@
+"""
+Tests para el contenedor de cifrado por bloques
+"""
+
+from backend.crypto.compression import (
+    CODEC_LZMA,
+    CODEC_NONE,
+    CODEC_ZLIB,
+    available_codecs,
+    choose_codec,
+)
+from backend.crypto.stream_cipher import (
+    HEADER_SIZE,
+    InvalidContainerError,
+    StreamCipher,
+    container_codec,
+    is_stream_container,
+)
+import io
+import os
+import pytest
+import sys
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+
+class TestStreamCipher:
+    """Test suite para StreamCipher"""
+
+    @pytest.fixture
+    def cipher(self):
+        """Fixture con un cifrador de bloques pequeños para forzar varios bloques"""
+        return StreamCipher(os.urandom(32), chunk_size=1024)
+
+    def _encrypt(self, cipher, data):
+        encrypted = io.BytesIO()
+        info = cipher.encrypt_stream(io.BytesIO(data), encrypted)
+        return encrypted.getvalue(), info
+
+    @pytest.mark.parametrize("size", [0, 1, 1024, 1025, 10 * 1024 + 7])
+    def test_roundtrip(self, cipher, size):
+        """Test 1: Cifrar y descifrar devuelve el contenido original"""
+        data = os.urandom(size)
+        encrypted, info = self._encrypt(cipher, data)
+
+        assert is_stream_container(encrypted[:HEADER_SIZE])
+        assert info["plaintext_size"] == size
+        assert info["ciphertext_size"] == len(encrypted)
+
+        output = io.BytesIO()
+        written = cipher.decrypt_stream(io.BytesIO(encrypted), output)
+        assert written == size
+        assert output.getvalue() == data
+
+    def test_tampered_frame_is_rejected(self, cipher):
+        """Test 2: Modificar un byte del texto cifrado hace fallar el descifrado"""
+        encrypted, _ = self._encrypt(cipher, os.urandom(3000))
+        tampered = bytearray(encrypted)
+        tampered[HEADER_SIZE + 10] ^= 0x01
+
+        with pytest.raises(InvalidContainerError):
+            cipher.decrypt_stream(io.BytesIO(bytes(tampered)), io.BytesIO())
+
+    def test_truncated_container_is_rejected(self, cipher):
+        """Test 3: Eliminar el último bloque se detecta como truncamiento"""
+        encrypted, info = self._encrypt(cipher, os.urandom(3000))
+        assert info["frames"] == 3
+
+        # Conservar solo los dos primeros bloques (prefijo + bloque + tag)
+        truncated = encrypted[: HEADER_SIZE + 2 * (4 + 1024 + 16)]
+
+        with pytest.raises(InvalidContainerError):
+            cipher.decrypt_stream(io.BytesIO(truncated), io.BytesIO())
+
+    def test_wrong_key_is_rejected(self, cipher):
+        """Test 4: Otra clave no puede descifrar el contenedor"""
+        encrypted, _ = self._encrypt(cipher, b"datos confidenciales")
+        other = StreamCipher(os.urandom(32), chunk_size=1024)
+
+        with pytest.raises(InvalidContainerError):
+            other.decrypt_stream(io.BytesIO(encrypted), io.BytesIO())
+
+    @pytest.mark.parametrize(
+        "offset,length",
+        [(0, 10), (1000, 100), (1024, 1024), (2500, 10_000), (5000, 10), (0, 0)],
+    )
+    def test_read_range(self, cipher, offset, length):
+        """Test 5: La lectura por rango coincide con el slice del original"""
+        data = os.urandom(3000)
+        encrypted, _ = self._encrypt(cipher, data)
+        source = io.BytesIO(encrypted)
+
+        index = cipher.read_index(source)
+        assert index.plaintext_size == len(data)
+        assert index.frame_count == 3
+
+        assert (
+            cipher.read_range(source, offset, length) == data[offset : offset + length]
+        )
+
+    def test_read_range_only_touches_needed_frames(self, cipher):
+        """Test 6: Un rango se descifra aunque otros bloques estén corruptos"""
+        data = os.urandom(3000)
+        encrypted, _ = self._encrypt(cipher, data)
+        source = io.BytesIO(encrypted)
+        index = cipher.read_index(source)
+
+        # Corromper el segundo bloque
+        tampered = bytearray(encrypted)
+        tampered[index.offsets[1] + 10] ^= 0x01
+        source = io.BytesIO(bytes(tampered))
+
+        assert cipher.read_range(source, 0, 100) == data[:100]
+        with pytest.raises(InvalidContainerError):
+            cipher.read_range(source, 1500, 10)
+
+    def test_parallel_encryption_roundtrip(self, cipher):
+        """Test 7: El cifrado en paralelo produce un contenedor equivalente"""
+        data = os.urandom(3 * 1024 * 1024 + 123)
+        encrypted = io.BytesIO()
+        info = cipher.encrypt_stream(io.BytesIO(data), encrypted, workers=3)
+
+        assert info["plaintext_size"] == len(data)
+        assert info["frames"] == len(data) // 1024 + 1
+
+        output = io.BytesIO()
+        cipher.decrypt_stream(io.BytesIO(encrypted.getvalue()), output)
+        assert output.getvalue() == data
+        assert cipher.read_range(encrypted, 2_000_000, 10) == data[2_000_000:2_000_010]
+
+    @pytest.mark.parametrize(
+        "codec", [c for c in available_codecs() if c != CODEC_NONE]
+    )
+    def test_compressed_roundtrip_and_range(self, cipher, codec):
+        """Test 8: Los bloques comprimidos se descifran completos y por rango"""
+        # Mezcla de bloques compresibles y aleatorios (estos se guardan tal cual)
+        data = b"registro;valor;fecha\n" * 300 + os.urandom(2000) + b"x" * 5000
+        encrypted = io.BytesIO()
+        info = cipher.encrypt_stream(io.BytesIO(data), encrypted, codec=codec)
+
+        assert container_codec(encrypted.getvalue()[:HEADER_SIZE]) == codec
+        assert info["plaintext_size"] == len(data)
+        assert info["ciphertext_size"] < len(data)
+
+        output = io.BytesIO()
+        cipher.decrypt_stream(io.BytesIO(encrypted.getvalue()), output)
+        assert output.getvalue() == data
+        for offset in (0, 1000, 6500, len(data) - 5):
+            assert (
+                cipher.read_range(encrypted, offset, 3000)
+                == data[offset : offset + 3000]
+            )
+
+        # El códec forma parte de la cabecera autenticada
+        tampered = bytearray(encrypted.getvalue())
+        tampered[5] ^= CODEC_LZMA << 4 if codec != CODEC_LZMA else CODEC_ZLIB << 4
+        with pytest.raises(InvalidContainerError):
+            cipher.decrypt_stream(io.BytesIO(bytes(tampered)), io.BytesIO())
+
+    def test_codec_selection(self):
+        """Test 9: No se comprimen formatos ya comprimidos ni datos aleatorios"""
+        text = b"Lorem ipsum dolor sit amet. " * 1000
+
+        assert choose_codec("informe.txt", text, CODEC_ZLIB) == CODEC_ZLIB
+        assert choose_codec("foto.JPG", text, CODEC_ZLIB) == CODEC_NONE
+        assert choose_codec("datos.bin", os.urandom(65536), CODEC_ZLIB) == CODEC_NONE
+        assert choose_codec("informe.txt", text, CODEC_NONE) == CODEC_NONE
+        assert choose_codec("vacio.txt", b"", CODEC_ZLIB) == CODEC_NONE
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
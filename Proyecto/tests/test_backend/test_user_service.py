@@ -22,9 +22,10 @@ class TestUserService:
         with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
             db_path = tmp.name
         yield db_path
-        # Cleanup: eliminar el archivo después del test
-        if os.path.exists(db_path):
-            os.unlink(db_path)
+        # Cleanup: eliminar el archivo (y su WAL) después del test
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.unlink(path)
 
     @pytest.fixture
     def user_service(self, temp_db):
@@ -333,6 +334,96 @@ class TestUserService:
 
         print("   ✅ Validación de contraseñas completa")
 
+    def test_list_user_events_pagination_and_filters(self, user_service):
+        """Test 14: Historial paginado por cursor con filtros de tipo y fecha"""
+        from datetime import datetime, timedelta
+        from backend.models.event_model import (
+            EVENT_DOWNLOAD,
+            EVENT_LOGIN,
+            EVENT_UPLOAD,
+            Evento,
+        )
+
+        user_id = user_service.register_user("historial", "MiPassword123")["user_id"]
+        start = datetime(2024, 1, 1)
+        kinds = [EVENT_LOGIN, EVENT_UPLOAD, EVENT_DOWNLOAD]
+        session = user_service.db_manager.get_session()
+        try:
+            # Eventos con la misma fecha de a pares para probar el desempate
+            for index in range(30):
+                session.add(
+                    Evento(
+                        descripcion=f"evento {index}",
+                        usuario_id=user_id,
+                        fecha_evento=start + timedelta(hours=index // 2),
+                        tipo=kinds[index % 3],
+                    )
+                )
+            session.commit()
+        finally:
+            session.close()
+
+        # Recorrer todo el historial de 7 en 7 sin repetir ni saltar eventos
+        seen = []
+        cursor = None
+        while True:
+            page = user_service.list_user_events(
+                user_id, limit=7, cursor=cursor, until=datetime(2030, 1, 1)
+            )
+            assert page["success"], page.get("message")
+            seen.extend(event["descripcion"] for event in page["events"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        # El registro del usuario es el evento más reciente
+        assert seen[0] == "Usuario registrado exitosamente"
+        assert seen[1:] == [f"evento {index}" for index in range(29, -1, -1)]
+
+        # Filtro por varios tipos y por rango de fechas, también paginado
+        seen = []
+        cursor = None
+        while True:
+            page = user_service.list_user_events(
+                user_id,
+                limit=4,
+                cursor=cursor,
+                since=start + timedelta(hours=3),
+                until=start + timedelta(hours=12),
+                event_types=[EVENT_UPLOAD, EVENT_DOWNLOAD],
+            )
+            assert all(
+                event["tipo"] in (EVENT_UPLOAD, EVENT_DOWNLOAD)
+                for event in page["events"]
+            )
+            seen.extend(event["descripcion"] for event in page["events"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        expected = [
+            f"evento {index}"
+            for index in range(23, 5, -1)
+            if kinds[index % 3] != EVENT_LOGIN
+        ]
+        assert seen == expected
+
+        invalid = user_service.list_user_events(user_id, cursor="no-es-un-cursor")
+        assert not invalid["success"]
+
+        # Las consultas usan los índices compuestos, sin ordenar en memoria
+        with user_service.db_manager.engine.connect() as connection:
+            for type_filter in ("", "AND tipo = 'descarga' "):
+                plan = " ".join(
+                    row[3]
+                    for row in connection.exec_driver_sql(
+                        "EXPLAIN QUERY PLAN SELECT * FROM eventos "
+                        f"WHERE usuario_id = 1 {type_filter}"
+                        "AND (fecha_evento, id_evento) < ('2024-01-02', 10) "
+                        "ORDER BY fecha_evento DESC, id_evento DESC LIMIT 8"
+                    )
+                )
+                assert "USING INDEX ix_eventos_usuario" in plan
+                assert "TEMP B-TREE" not in plan
+
 
 # Mantener compatibilidad con ejecución directa
 if __name__ == "__main__":
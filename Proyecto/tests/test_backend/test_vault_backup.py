@@ -0,0 +1,186 @@
+"""
+Tests para el respaldo incremental y la restauración del almacén
+"""
+
+from backend.database.connection import dispose_engines
+from backend.services.event_sink import flush_all_event_sinks
+from backend.services.file_service import FileService
+from backend.services.system_service import SystemService
+from backend.services.user_service import UserService
+from backend.services.vault_backup import BACKUP_DATABASE, BACKUP_BLOBS, VaultBackup
+import os
+import pytest
+import shutil
+import sqlite3
+import tempfile
+import sys
+from unittest import mock
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+
+class TestVaultBackup:
+    """Test suite para VaultBackup y SystemService.backup_system"""
+
+    @pytest.fixture
+    def workspace(self):
+        """Fixture que ejecuta cada test en un directorio vacío"""
+        temp_dir = tempfile.mkdtemp()
+        previous_dir = os.getcwd()
+        os.chdir(temp_dir)
+        yield temp_dir
+        # Escribir los eventos pendientes antes de borrar la BD
+        flush_all_event_sinks()
+        os.chdir(previous_dir)
+        dispose_engines(os.path.join(temp_dir, "fortifile.db"))
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def vault(self, workspace):
+        """Fixture con un usuario y dos archivos subidos"""
+        file_service = FileService()
+        file_service.db_manager.create_tables()
+        user_id = UserService().register_user("respaldo", "Respaldo123")["user_id"]
+        file_ids = [
+            self._upload(file_service, user_id, workspace, name, size)
+            for name, size in (("a.bin", 200_000), ("b.bin", 5000))
+        ]
+        return {"file_service": file_service, "user_id": user_id, "ids": file_ids}
+
+    def _upload(self, file_service, user_id, directory, name, size):
+        source = os.path.join(directory, name)
+        with open(source, "wb") as f:
+            f.write(os.urandom(size))
+        result = file_service.upload_file(user_id, source)
+        assert result["success"], result["message"]
+        return result["file_id"]
+
+    def _backup_rows(self, backup_path):
+        connection = sqlite3.connect(os.path.join(backup_path, BACKUP_DATABASE))
+        try:
+            return sorted(
+                row[0] for row in connection.execute("SELECT id_archivo FROM archivos")
+            )
+        finally:
+            connection.close()
+
+    def test_repeated_backups_copy_only_changes(self, vault, workspace):
+        """Test 1: Los respaldos repetidos solo copian los blobs cambiados"""
+        file_service = vault["file_service"]
+        backup_path = os.path.join(workspace, "respaldo")
+
+        result = SystemService().backup_system(backup_path)
+        assert result["success"], result["message"]
+        assert result["copied"] == 2 and result["unchanged"] == 0
+        assert result["backup_items"] == ["Base de datos", "Archivos cifrados"]
+        assert self._backup_rows(backup_path) == vault["ids"]
+
+        backup = VaultBackup(file_service.db_manager)
+        result = backup.backup(backup_path)
+        assert result["copied"] == 0 and result["unchanged"] == 2
+        assert result["bytes_copied"] == 0
+
+        # Un archivo nuevo y uno eliminado: una copia y un borrado
+        new_id = self._upload(file_service, vault["user_id"], workspace, "c.bin", 1000)
+        assert file_service.delete_file(vault["user_id"], vault["ids"][0])["success"]
+        result = backup.backup(backup_path)
+        assert (result["copied"], result["unchanged"], result["removed"]) == (1, 1, 1)
+        assert self._backup_rows(backup_path) == [vault["ids"][1], new_id]
+        assert len(os.listdir(os.path.join(backup_path, BACKUP_BLOBS, "objects"))) == 2
+        assert backup.verify(backup_path)["success"]
+
+    def test_backup_does_not_wait_for_writers(self, vault, workspace):
+        """Test 2: La instantánea no espera a una escritura en curso"""
+        writer = sqlite3.connect("fortifile.db")
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute(
+            "INSERT INTO archivos (nombre_archivo, ruta_archivo, usuario_id) "
+            "VALUES ('sin_confirmar.bin', 'secure_files/x.enc', ?)",
+            (vault["user_id"],),
+        )
+        try:
+            backup_path = os.path.join(workspace, "respaldo")
+            backup = VaultBackup(vault["file_service"].db_manager, pages_per_step=1)
+            result = backup.backup(backup_path)
+            assert result["success"], result["message"]
+        finally:
+            writer.rollback()
+            writer.close()
+        # Solo incluye transacciones confirmadas
+        assert self._backup_rows(backup_path) == vault["ids"]
+
+    def test_restore_verifies_backup_and_result(self, vault, workspace):
+        """Test 3: Restaurar verifica el respaldo y el sistema restaurado"""
+        file_service = vault["file_service"]
+        user_id = vault["user_id"]
+        backup_path = os.path.join(workspace, "respaldo")
+        system_service = SystemService()
+        assert system_service.backup_system(backup_path)["success"]
+
+        # Perder un archivo y dañar el blob del otro
+        session = file_service.db_manager.get_session()
+        try:
+            from backend.models.file_model import Archivo
+
+            damaged_path = session.get(Archivo, vault["ids"][1]).ruta_archivo
+        finally:
+            session.close()
+        assert file_service.delete_file(user_id, vault["ids"][0])["success"]
+        with open(damaged_path, "r+b") as f:
+            f.seek(100)
+            f.write(b"\0" * 16)
+
+        result = system_service.restore_system(backup_path)
+        assert result["success"], result["message"]
+        assert result["restored_blobs"] == 2
+        assert result["issues"] == []
+
+        files = file_service.get_user_files(user_id)["files"]
+        assert sorted(f["id"] for f in files) == vault["ids"]
+        output = os.path.join(workspace, "salida.bin")
+        assert file_service.download_file(user_id, vault["ids"][1], output)["success"]
+
+        # Un respaldo alterado no se restaura
+        blob = next(
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(os.path.join(backup_path, BACKUP_BLOBS))
+            for name in names
+        )
+        with open(blob, "ab") as f:
+            f.write(b"x")
+        result = system_service.restore_system(backup_path)
+        assert not result["success"]
+        assert "Blob modificado" in result["message"]
+
+    def test_system_service_reuses_file_service(self, vault, workspace):
+        """Test 4: SystemService reutiliza un único servicio de archivos"""
+        file_service = vault["file_service"]
+        backup_path = os.path.join(workspace, "respaldo")
+
+        # Con un servicio inyectado no se crea ninguno
+        system_service = SystemService(file_service)
+        with mock.patch(
+            "backend.services.system_service.FileService",
+            side_effect=AssertionError("No debería crearse otro FileService"),
+        ):
+            assert system_service.backup_system(backup_path)["success"]
+            assert system_service.restore_system(backup_path)["success"]
+            result = system_service.verify_system_integrity()
+        assert result["integrity_ok"], result["issues"]
+
+        # Sin inyectarlo se crea uno la primera vez y se reutiliza
+        system_service = SystemService()
+        with mock.patch(
+            "backend.services.system_service.FileService", wraps=FileService
+        ) as factory:
+            assert system_service.verify_system_integrity()["integrity_ok"]
+            assert system_service.restore_system(backup_path)["success"]
+            assert system_service.verify_system_integrity()["integrity_ok"]
+        assert factory.call_count == 1
+
+
+# Mantener compatibilidad con ejecución directa
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -38,6 +38,7 @@ class TestMainApp(unittest.TestCase):
                 "ui.register_view.RegisterView", return_value=self.register_view_mock
             ),
             patch("ui.file_view.FileManagerUI", return_value=self.file_view_mock),
+            patch("frontend.app.FileService"),
         ]
 
         # Iniciar todos los patches
@@ -127,6 +128,26 @@ class TestMainApp(unittest.TestCase):
         self.assertEqual(self.main_app.current_user_id, 1)
         print("✅ Test de fallback user_id pasado")
 
+    def test_login_reuses_file_service(self):
+        """Test 4: Cada login reutiliza el servicio de archivos de la aplicación"""
+        import frontend.app
+
+        with patch.object(frontend.app, "FileManagerUI") as mock_file_ui:
+            with patch.object(frontend.app, "AccountWindow") as mock_account:
+                mock_file_ui.return_value = QWidget()
+                mock_account.return_value = QWidget()
+
+                with patch.object(self.main_app, "show_file_view"):
+                    self.main_app.handle_login_success(1)
+                    mock_file_ui.return_value = QWidget()
+                    self.main_app.handle_login_success(2)
+
+        services = [c.kwargs["file_service"] for c in mock_file_ui.call_args_list]
+        self.assertEqual(len(services), 2)
+        self.assertIs(services[0], self.main_app.file_service)
+        self.assertIs(services[1], self.main_app.file_service)
+        print("✅ Test de servicio de archivos compartido pasado")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,130 @@
+from PyQt5.QtCore import QModelIndex, Qt
+from PyQt5.QtWidgets import QApplication
+from datetime import datetime
+import unittest
+import sys
+import os
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "frontend"))
+
+from ui.file_list_model import FileListModel  # noqa: E402
+
+
+def make_files(count):
+    """Archivos con el formato que devuelve FileService.list_files"""
+    return [
+        {
+            "id": file_id,
+            "nombre": f"archivo_{file_id:05d}.txt",
+            "fecha_subida": datetime(2024, 1, 1),
+            "size_bytes": file_id,
+        }
+        for file_id in range(1, count + 1)
+    ]
+
+
+class FakePager:
+    """Simula list_files con paginación por cursor (el cursor es un índice)"""
+
+    def __init__(self, files, page_size):
+        self.files = files
+        self.page_size = page_size
+        self.calls = 0
+
+    def __call__(self, cursor):
+        self.calls += 1
+        start = cursor or 0
+        end = start + self.page_size
+        return {
+            "success": True,
+            "files": self.files[start:end],
+            "next_cursor": end if end < len(self.files) else None,
+        }
+
+
+class TestFileListModel(unittest.TestCase):
+    """Test suite para el modelo paginado de la lista de archivos"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Configuración que se ejecuta una vez para toda la clase"""
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_pages_are_fetched_lazily(self):
+        """Test 1: Solo se pide la siguiente página cuando la vista la necesita"""
+        pager = FakePager(make_files(250), page_size=100)
+        model = FileListModel(pager)
+        model.reload()
+
+        self.assertEqual(model.rowCount(), 100)
+        self.assertEqual(pager.calls, 1)
+        self.assertTrue(model.canFetchMore(QModelIndex()))
+
+        model.fetchMore(QModelIndex())
+        model.fetchMore(QModelIndex())
+        self.assertEqual(model.rowCount(), 250)
+        self.assertFalse(model.canFetchMore(QModelIndex()))
+
+        model.fetchMore(QModelIndex())
+        self.assertEqual(pager.calls, 3)
+
+        index = model.index(120)
+        self.assertEqual(model.data(index), "archivo_00121.txt")
+        self.assertEqual(model.data(index, FileListModel.FileIdRole), 121)
+        self.assertEqual(model.row_of(121), 120)
+        self.assertEqual(model.file_at(120)["type"], "txt")
+
+    def test_checked_state_is_keyed_by_id(self):
+        """Test 2: Los archivos marcados se guardan por ID"""
+        model = FileListModel(FakePager(make_files(30), page_size=10))
+        model.reload()
+
+        model.setData(model.index(3), Qt.Checked, Qt.CheckStateRole)
+        model.setData(model.index(7), Qt.Checked, Qt.CheckStateRole)
+        model.setData(model.index(3), Qt.Unchecked, Qt.CheckStateRole)
+
+        self.assertEqual(model.data(model.index(7), Qt.CheckStateRole), Qt.Checked)
+        self.assertEqual(model.data(model.index(3), Qt.CheckStateRole), Qt.Unchecked)
+        self.assertEqual([f["id"] for f in model.checked_files()], [8])
+
+        # La marca se conserva al cargar más páginas
+        model.fetchMore(QModelIndex())
+        self.assertEqual(model.checked_count(), 1)
+
+    def test_select_all_is_a_single_notification(self):
+        """Test 3: Marcar todo emite un único dataChanged aun con muchas filas"""
+        model = FileListModel(FakePager(make_files(100_000), page_size=100_000))
+        model.reload()
+
+        notifications = []
+        model.dataChanged.connect(lambda *args: notifications.append(args))
+
+        model.set_all_checked(True)
+        self.assertEqual(model.checked_count(), 100_000)
+        self.assertEqual(len(notifications), 1)
+
+        model.set_all_checked(False)
+        self.assertEqual(model.checked_files(), [])
+
+    def test_reload_and_errors(self):
+        """Test 4: Recargar limpia la selección y un error detiene la carga"""
+        pager = FakePager(make_files(5), page_size=2)
+        model = FileListModel(pager)
+        model.reload()
+        model.set_all_checked(True)
+
+        model.reload()
+        self.assertEqual(model.rowCount(), 2)
+        self.assertEqual(model.checked_count(), 0)
+
+        failing = FileListModel(lambda cursor: {"success": False, "message": "x"})
+        failing.reload()
+        self.assertEqual(failing.rowCount(), 0)
+        self.assertFalse(failing.canFetchMore(QModelIndex()))
+
+
+if __name__ == "__main__":
+    unittest.main()
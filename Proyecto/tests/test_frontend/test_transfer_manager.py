@@ -0,0 +1,119 @@
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtWidgets import QApplication
+import threading
+import unittest
+import sys
+import os
+
+# Agregar el directorio del proyecto al path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "frontend"))
+
+from ui.transfer_manager import TransferManager, TransferQueuePanel  # noqa: E402
+
+
+class FakeFileService:
+    """Simula FileService: informa avance y respeta la cancelación"""
+
+    def __init__(self, chunks=10, chunk_size=1000):
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.gate = threading.Event()
+        self.gate.set()
+        self.threads = set()
+
+    def _transfer(self, progress_callback, cancel_event):
+        self.threads.add(threading.get_ident())
+        self.gate.wait(5)
+        for _ in range(self.chunks):
+            if cancel_event.is_set():
+                return {"success": False, "message": "Transferencia cancelada"}
+            progress_callback(self.chunk_size)
+        return {"success": True, "message": "Listo"}
+
+    def upload_file(self, user_id, path, progress_callback=None, cancel_event=None):
+        return self._transfer(progress_callback, cancel_event)
+
+    def download_files(
+        self,
+        user_id,
+        file_ids,
+        dest_dir,
+        archive_format=None,
+        progress_callback=None,
+        cancel_event=None,
+    ):
+        return self._transfer(progress_callback, cancel_event)
+
+
+class TestTransferManager(unittest.TestCase):
+    """Test suite para la cola de transferencias en segundo plano"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Configuración que se ejecuta una vez para toda la clase"""
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.service = FakeFileService()
+        self.manager = TransferManager(self.service, max_concurrent=1)
+        self.progress = []
+        self.finished = {}
+        self.manager.transfer_progress.connect(lambda *args: self.progress.append(args))
+        self.manager.transfer_finished.connect(
+            lambda transfer_id, state, result: self.finished.update(
+                {transfer_id: state}
+            )
+        )
+
+    def _wait(self):
+        self.assertTrue(self.manager.wait(5000))
+        # Entregar las señales encoladas desde los hilos de trabajo
+        QCoreApplication.processEvents()
+
+    def test_transfers_run_off_the_ui_thread(self):
+        """Test 1: Las transferencias corren en otro hilo e informan su avance"""
+        upload_id = self.manager.upload(1, "a.txt", "a.txt", 10_000)
+        download_id = self.manager.download_files(1, [1], "/tmp", None, "b", 10_000)
+        self._wait()
+
+        self.assertEqual(
+            self.finished, {upload_id: "completed", download_id: "completed"}
+        )
+        self.assertNotIn(threading.get_ident(), self.service.threads)
+        self.assertEqual(self.manager.active_count(), 0)
+
+        # El último aviso de cada transferencia informa el total y la velocidad
+        final = [p for p in self.progress if p[0] == upload_id][-1]
+        self.assertEqual(final[1:3], (10_000, 10_000))
+        self.assertGreater(final[3], 0)
+
+    def test_cancel_running_and_queued(self):
+        """Test 2: Se cancelan tanto la transferencia en curso como las en cola"""
+        self.service.gate.clear()
+        running = self.manager.upload(1, "a.txt", "a.txt", 10_000)
+        queued = self.manager.upload(1, "b.txt", "b.txt", 10_000)
+        self.assertEqual(self.manager.active_count(), 2)
+
+        self.manager.cancel_all()
+        self.service.gate.set()
+        self._wait()
+
+        self.assertEqual(self.finished, {running: "cancelled", queued: "cancelled"})
+
+    def test_queue_panel_tracks_transfers(self):
+        """Test 3: El panel muestra cada transferencia y limpia las terminadas"""
+        panel = TransferQueuePanel(self.manager)
+        self.manager.upload(1, "a.txt", "a.txt", 10_000)
+        self.assertEqual(panel.tree.topLevelItemCount(), 1)
+
+        self._wait()
+        self.assertEqual(panel.tree.topLevelItem(0).text(1), "Completado")
+
+        panel.clear_finished()
+        self.assertEqual(panel.tree.topLevelItemCount(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()